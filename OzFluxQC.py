@@ -26,6 +26,7 @@ import qcgf
 import qcio
 import qcls
 import qcplot
+import qcprof
 import qcrp
 import qcts
 import qcutils
@@ -315,6 +316,7 @@ class qcgui(tk.Tk):
         infilename = qcio.get_infilenamefromcf(self.cf)
         if not qcutils.file_exists(infilename): self.do_progress(text='An error occurred, check the console ...'); return
         self.do_progress(text='Doing L2 QC ...')
+        qcprof.start("L2",qcio.get_profileoptionsfromcf(self.cf))
         self.ds1 = qcio.nc_read_series(infilename)
         if len(self.ds1.series.keys())==0: self.do_progress(text='An error occurred, check the console ...'); del self.ds1; return
         self.update_startenddate(str(self.ds1.series['DateTime']['Data'][0]),
@@ -326,9 +328,11 @@ class qcgui(tk.Tk):
         outfilename = qcio.get_outfilenamefromcf(self.cf)
         if len(outfilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         ncFile = qcio.nc_open_write(outfilename)
-        qcio.nc_write_series(ncFile,self.ds2)                                  # save the L2 data
+        write_options = qcio.get_ncwriteoptionsfromcf(self.cf)
+        qcio.nc_write_series(ncFile,self.ds2,write_options=write_options)   # save the L2 data
         self.do_progress(text='Finished saving L2 QC data')              # tdo_progressell the user we are done
         logging.info(' Finished saving L2 QC data')
+        qcprof.stop()
         logging.info("") 
 
     def do_l3qc(self):
@@ -409,6 +413,7 @@ class qcgui(tk.Tk):
             return
         infilename = qcio.get_infilenamefromcf(self.cf)
         if not qcutils.file_exists(infilename): self.do_progress(text='An error occurred, check the console ...'); return
+        qcprof.start("L3",qcio.get_profileoptionsfromcf(self.cf))
         self.ds2 = qcio.nc_read_series(infilename)
         if len(self.ds2.series.keys())==0: self.do_progress(text='An error occurred, check the console ...'); del self.ds2; return
         self.update_startenddate(str(self.ds2.series['DateTime']['Data'][0]),
@@ -424,9 +429,11 @@ class qcgui(tk.Tk):
         if len(outfilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         ncFile = qcio.nc_open_write(outfilename)
         outputlist = qcio.get_outputlistfromcf(self.cf,'nc')
-        qcio.nc_write_series(ncFile,self.ds3,outputlist=outputlist)             # save the L3 data
+        write_options = qcio.get_ncwriteoptionsfromcf(self.cf)
+        qcio.nc_write_series(ncFile,self.ds3,outputlist=outputlist,write_options=write_options)   # save the L3 data
         self.do_progress(text='Finished saving L3 QC & Corrected NetCDF data')  # tell the user we are done
         logging.info(' Finished saving L3 QC & Corrected NetCDF data')
+        qcprof.stop()
         logging.info("") 
 
     def do_l4qc(self):
@@ -464,6 +471,7 @@ class qcgui(tk.Tk):
         infilename = qcio.get_infilenamefromcf(cf)
         if len(infilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         if not qcutils.file_exists(infilename): self.do_progress(text='An error occurred, check the console ...'); return
+        qcprof.start("L4",qcio.get_profileoptionsfromcf(cf))
         ds3 = qcio.nc_read_series(infilename)
         if len(ds3.series.keys())==0: self.do_progress(text='An error occurred, check the console ...'); del ds3; return
         ds3.globalattributes['controlfile_name'] = cf['controlfile_name']
@@ -485,9 +493,11 @@ class qcgui(tk.Tk):
             if len(outfilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
             ncFile = qcio.nc_open_write(outfilename)
             outputlist = qcio.get_outputlistfromcf(cf,'nc')
-            qcio.nc_write_series(ncFile,ds4,outputlist=outputlist)         # save the L4 data
+            write_options = qcio.get_ncwriteoptionsfromcf(cf)
+            qcio.nc_write_series(ncFile,ds4,outputlist=outputlist,write_options=write_options)   # save the L4 data
             self.do_progress(text='Finished saving L4 gap filled data')    # tell the user we are done
             logging.info(' Finished saving L4 gap filled data')
+        qcprof.stop()
         logging.info("")        
 
     def do_l5qc(self):
@@ -500,6 +510,7 @@ class qcgui(tk.Tk):
         infilename = qcio.get_infilenamefromcf(cf)
         if len(infilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         if not qcutils.file_exists(infilename): self.do_progress(text='An error occurred, check the console ...'); return
+        qcprof.start("L5",qcio.get_profileoptionsfromcf(cf))
         ds4 = qcio.nc_read_series(infilename)
         if len(ds4.series.keys())==0: self.do_progress(text='An error occurred, check the console ...'); del ds4; return
         ds4.globalattributes['controlfile_name'] = cf['controlfile_name']
@@ -521,9 +532,11 @@ class qcgui(tk.Tk):
             if len(outfilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
             ncFile = qcio.nc_open_write(outfilename)
             outputlist = qcio.get_outputlistfromcf(cf,'nc')
-            qcio.nc_write_series(ncFile,ds5,outputlist=outputlist)           # save the L5 data
+            write_options = qcio.get_ncwriteoptionsfromcf(cf)
+            qcio.nc_write_series(ncFile,ds5,outputlist=outputlist,write_options=write_options)   # save the L5 data
             self.do_progress(text='Finished saving L5 gap filled data')      # tell the user we are done
             logging.info(' Finished saving L5 gap filled data')
+        qcprof.stop()
         logging.info("")
 
     def do_l6qc(self):
@@ -536,6 +549,7 @@ class qcgui(tk.Tk):
         infilename = qcio.get_infilenamefromcf(cf)
         if len(infilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         if not qcutils.file_exists(infilename): self.do_progress(text='An error occurred, check the console ...'); return
+        qcprof.start("L6",qcio.get_profileoptionsfromcf(cf))
         ds5 = qcio.nc_read_series(infilename)
         if len(ds5.series.keys())==0: self.do_progress(text='An error occurred, check the console ...'); del ds5; return
         ds5.globalattributes['controlfile_name'] = cf['controlfile_name']
@@ -553,9 +567,11 @@ class qcgui(tk.Tk):
         if len(outfilename)==0: self.do_progress(text='An error occurred, check the console ...'); return
         ncFile = qcio.nc_open_write(outfilename)
         outputlist = qcio.get_outputlistfromcf(cf,'nc')
-        qcio.nc_write_series(ncFile,ds6,outputlist=outputlist)             # save the L6 data
+        write_options = qcio.get_ncwriteoptionsfromcf(cf)
+        qcio.nc_write_series(ncFile,ds6,outputlist=outputlist,write_options=write_options)   # save the L6 data
         self.do_progress(text='Finished saving L6 partitioned data')      # tell the user we are done
         logging.info(' Finished saving L6 partitioned data')
+        qcprof.stop()
         logging.info("")
 
     def do_nc2fn(self):
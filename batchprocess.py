@@ -1,220 +1,447 @@
 import ast
 import datetime
 import logging
+import multiprocessing
 import ntpath
 import os
 import sys
 sys.path.append('scripts')
 import time
+import qccache
 import qcclim
 import qccpd
 import qcio
 import qcls
 import qcplot
+import qcprof
 import qcutils
 
-#log = qcutils.startlog('batch','logfiles/batch.log')
-t = time.localtime()
-rundatetime = datetime.datetime(t[0],t[1],t[2],t[3],t[4],t[5]).strftime("%Y%m%d%H%M")
-log_filename = 'logfiles/batchprocess_'+rundatetime+'.log'
-logging.basicConfig(filename=log_filename,
-                    format='%(asctime)s %(levelname)s %(message)s',
-                    datefmt = '%H:%M:%S',
-                    level=logging.DEBUG)
-console = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%H:%M:%S')
-console.setFormatter(formatter)
-console.setLevel(logging.INFO)
-logging.getLogger('').addHandler(console)
-
-# get the batch processing control file
-if len(sys.argv)==1:
-    cf_batch = qcio.load_controlfile(path='controlfiles')
-    if len(cf_batch)==0: sys.exit()
-else:
-    cfname = sys.argv[1]
-    if os.path.exists(cfname):
-        cf_batch = qcio.get_controlfilecontents(cfname)
+# options from the batch control file [Options] section that are passed
+# on to the control file for each level
+batch_options = {}
+batch_option_list = ["Incremental","IncrementalWarmUp","Profile","SOLOBackend","SOLOWorkers","FFNETWorkers"]
+# result cache options, see qcio.get_cacheoptionsfromcf
+cache_options = {"enabled":False,"force":False}
+
+def get_levelcontrolfile(cfname):
+    """
+    Purpose:
+     Read the control file for a level and add the options set in the batch
+     control file unless the level control file sets them itself.
+    Usage:
+     cf = get_levelcontrolfile(cfname)
+    """
+    cf = qcio.get_controlfilecontents(cfname)
+    for item in batch_options.keys():
+        if "Options" not in cf: cf["Options"] = {}
+        if item not in cf["Options"]: cf["Options"][item] = batch_options[item]
+    return cf
+
+def do_fingerprints(file_name):
+    """ Plot the fingerprints for a netCDF file produced by the batch run."""
+    cf_fp = qcio.get_controlfilecontents("controlfiles/standard/fingerprint.txt")
+    if "Files" not in dir(cf_fp): cf_fp["Files"] = {}
+    file_path = ntpath.split(file_name)[0]+"/"
+    cf_fp["Files"]["file_path"] = file_path
+    cf_fp["Files"]["in_filename"] = ntpath.split(file_name)[1]
+    cf_fp["Files"]["plot_path"] = file_path[:file_path.index("Data")]+"Plots/"
+    if "Options" not in cf_fp: cf_fp["Options"]={}
+    cf_fp["Options"]["call_mode"] = "batch"
+    cf_fp["Options"]["show_plots"] = "no"
+    logging.info('Doing fingerprint plots using '+cf_fp["Files"]["in_filename"])
+    qcplot.plot_fingerprint(cf_fp)
+    logging.info('Finished fingerprint plots')
+
+def do_L1(cfname):
+    logging.info('Starting L1 processing with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    qcio.xl2nc(cf,'L1')
+    logging.info('Finished L1 processing with '+cfname)
+    logging.info('')
+
+def do_L2(cfname):
+    logging.info('Starting L2 processing with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    qcprof.start("L2",qcio.get_profileoptionsfromcf(cf))
+    infilename = qcio.get_infilenamefromcf(cf)
+    ds1 = qcio.nc_read_series(infilename)
+    ds2 = qcls.incremental_qc(cf,ds1,qcls.l2qc)
+    outfilename = qcio.get_outfilenamefromcf(cf)
+    ncFile = qcio.nc_open_write(outfilename)
+    write_options = qcio.get_ncwriteoptionsfromcf(cf)
+    qcio.nc_write_series(ncFile,ds2,write_options=write_options)
+    qcprof.stop()
+    logging.info('Finished L2 processing with '+cfname)
+    logging.info('')
+
+def do_L3(cfname):
+    logging.info('Starting L3 processing with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    qcprof.start("L3",qcio.get_profileoptionsfromcf(cf))
+    infilename = qcio.get_infilenamefromcf(cf)
+    ds2 = qcio.nc_read_series(infilename)
+    ds3 = qcls.incremental_qc(cf,ds2,qcls.l3qc)
+    outfilename = qcio.get_outfilenamefromcf(cf)
+    outputlist = qcio.get_outputlistfromcf(cf,'nc')
+    ncFile = qcio.nc_open_write(outfilename)
+    write_options = qcio.get_ncwriteoptionsfromcf(cf)
+    qcio.nc_write_series(ncFile,ds3,outputlist=outputlist,write_options=write_options)
+    qcprof.stop()
+    logging.info('Finished L3 processing with '+cfname)
+    logging.info('')
+
+def do_fluxnet(cfname):
+    # convert netCDF files to FluxNet CSV files
+    logging.info('Starting FluxNet output with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    qcio.fn_write_csv(cf)
+    logging.info('Finished FluxNet output with '+cfname)
+    logging.info('')
+
+def do_concatenate(cfname):
+    logging.info('Starting concatenation with '+cfname)
+    cf_cc = get_levelcontrolfile(cfname)
+    qcio.nc_concatenate(cf_cc)
+    logging.info('Finished concatenation with '+cfname)
+    # now plot the fingerprints for the concatenated files
+    opt = qcutils.get_keyvaluefromcf(cf_cc,["Options"],"DoFingerprints", default="yes")
+    if opt.lower()=="no": return
+    do_fingerprints(cf_cc["Files"]["Out"]["ncFileName"])
+    logging.info('')
+
+def do_climatology(cfname):
+    logging.info('Starting climatology with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    qcclim.climatology(cf)
+    logging.info('Finished climatology with '+cfname)
+    logging.info('')
+
+def do_cpd(cfname):
+    # ustar threshold from change point detection
+    logging.info('Starting CPD with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    if "Options" not in cf: cf["Options"]={}
+    cf["Options"]["call_mode"] = "batch"
+    cf["Options"]["show_plots"] = False
+    qccpd.cpd_main(cf)
+    logging.info('Finished CPD with '+cfname)
+    logging.info('')
+
+def do_L4(cfname):
+    logging.info('Starting L4 processing with '+cfname)
+    cf_l4 = get_levelcontrolfile(cfname)
+    if "Options" not in cf_l4: cf_l4["Options"]={}
+    cf_l4["Options"]["call_mode"] = "batch"
+    cf_l4["Options"]["show_plots"] = False
+    qcprof.start("L4",qcio.get_profileoptionsfromcf(cf_l4))
+    infilename = qcio.get_infilenamefromcf(cf_l4)
+    ds3 = qcio.nc_read_series(infilename)
+    ds4 = qcls.l4qc(cf_l4,ds3)
+    outfilename = qcio.get_outfilenamefromcf(cf_l4)
+    outputlist = qcio.get_outputlistfromcf(cf_l4,'nc')
+    ncFile = qcio.nc_open_write(outfilename)
+    write_options = qcio.get_ncwriteoptionsfromcf(cf_l4)
+    qcio.nc_write_series(ncFile,ds4,outputlist=outputlist,write_options=write_options)
+    qcprof.stop()
+    logging.info('Finished L4 processing with '+cfname)
+    # now plot the fingerprints for the L4 files
+    do_fingerprints(outfilename)
+    logging.info('')
+
+def do_L5(cfname):
+    logging.info('Starting L5 processing with '+cfname)
+    cf_l5 = get_levelcontrolfile(cfname)
+    if "Options" not in cf_l5: cf_l5["Options"]={}
+    cf_l5["Options"]["call_mode"] = "batch"
+    cf_l5["Options"]["show_plots"] = False
+    qcprof.start("L5",qcio.get_profileoptionsfromcf(cf_l5))
+    infilename = qcio.get_infilenamefromcf(cf_l5)
+    ds4 = qcio.nc_read_series(infilename)
+    ds5 = qcls.l5qc(cf_l5,ds4)
+    outfilename = qcio.get_outfilenamefromcf(cf_l5)
+    outputlist = qcio.get_outputlistfromcf(cf_l5,'nc')
+    ncFile = qcio.nc_open_write(outfilename)
+    write_options = qcio.get_ncwriteoptionsfromcf(cf_l5)
+    qcio.nc_write_series(ncFile,ds5,outputlist=outputlist,write_options=write_options)
+    qcprof.stop()
+    logging.info('Finished L5 processing with '+cfname)
+    # now plot the fingerprints for the L5 files
+    do_fingerprints(outfilename)
+    logging.info('')
+
+def do_L6(cfname):
+    logging.info('Starting L6 processing with '+cfname)
+    cf = get_levelcontrolfile(cfname)
+    if "Options" not in cf: cf["Options"]={}
+    cf["Options"]["call_mode"] = "batch"
+    cf["Options"]["show_plots"] = False
+    qcprof.start("L6",qcio.get_profileoptionsfromcf(cf))
+    infilename = qcio.get_infilenamefromcf(cf)
+    ds5 = qcio.nc_read_series(infilename)
+    ds6 = qcls.l6qc(cf,ds5)
+    outfilename = qcio.get_outfilenamefromcf(cf)
+    outputlist = qcio.get_outputlistfromcf(cf,'nc')
+    ncFile = qcio.nc_open_write(outfilename)
+    write_options = qcio.get_ncwriteoptionsfromcf(cf)
+    qcio.nc_write_series(ncFile,ds6,outputlist=outputlist,write_options=write_options)
+    qcprof.stop()
+    logging.info('Finished L6 processing with '+cfname)
+    logging.info('')
+
+level_functions = {"l1":do_L1,"l2":do_L2,"l3":do_L3,"fluxnet":do_fluxnet,
+                   "concatenate":do_concatenate,"climatology":do_climatology,
+                   "cpd":do_cpd,"l4":do_L4,"l5":do_L5,"l6":do_L6}
+
+def get_cf_files(cf):
+    """
+    Purpose:
+     Return the names of all existing files referred to anywhere in a control
+     file, for example the alternate (AWS, ACCESS, BIOS2) and climatology
+     files read at L4 and the import files.  Names are tried as given and
+     relative to the [Files] file_path.
+    Usage:
+     file_names = get_cf_files(cf)
+    """
+    file_path = qcutils.get_keyvaluefromcf(cf,["Files"],"file_path",default="",mode="quiet")
+    file_names = []
+    sections = [cf]
+    while len(sections)!=0:
+        section = sections.pop()
+        for key in section.keys():
+            value = section[key]
+            if isinstance(value,dict):
+                sections.append(value)
+                continue
+            if not isinstance(value,basestring) or len(value)==0: continue
+            for file_name in [value,os.path.join(file_path,value)]:
+                if os.path.isfile(file_name):
+                    file_names.append(os.path.abspath(file_name))
+                    break
+    return sorted(set(file_names))
+
+def get_job_files(level,cfname):
+    """
+    Purpose:
+     Return the lists of files read and written by a batch job.  These are
+     used to work out which jobs depend on each other and, for the result
+     cache, whether the inputs of a job have changed.  Every existing file
+     named in the control file that is not an output is treated as an input.
+    Usage:
+     infiles,outfiles = get_job_files(level,cfname)
+    """
+    infiles = []
+    outfiles = []
+    try:
+        cf = qcio.get_controlfilecontents(cfname,mode="quiet")
+    except Exception:
+        return infiles,outfiles
+    if "Files" not in cf: return infiles,outfiles
+    level = level.lower()
+    if level=="concatenate":
+        if "In" in cf["Files"]: infiles = [cf["Files"]["In"][i] for i in cf["Files"]["In"].keys()]
+        if "Out" in cf["Files"] and "ncFileName" in cf["Files"]["Out"]:
+            outfiles = [cf["Files"]["Out"]["ncFileName"]]
     else:
-        logging.error("Control file "+cfname+" does not exist")
-        sys.exit()
-
-level_list = ['L1','L2','L3','concatenate','climatology','cpd','L4','L5','L6']
-if "Options" in cf_batch:
-    if "levels" in cf_batch["Options"]: level_list = ast.literal_eval(cf_batch["Options"]["levels"])
-for level in level_list:
-    if level.lower()=="l1":
-        # L1 processing
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L1 processing with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            qcio.xl2nc(cf,'L1')
-            logging.info('Finished L1 processing with '+cfname)
-            logging.info('')
-    elif level.lower()=="l2":
-        # L2 processing
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L2 processing with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            infilename = qcio.get_infilenamefromcf(cf)
-            ds1 = qcio.nc_read_series(infilename)
-            ds2 = qcls.l2qc(cf,ds1)
-            outfilename = qcio.get_outfilenamefromcf(cf)
-            ncFile = qcio.nc_open_write(outfilename)
-            qcio.nc_write_series(ncFile,ds2)
-            logging.info('Finished L2 processing with '+cfname)
-            logging.info('')
-    elif level.lower()=="l3":
-        # L3 processing
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L3 processing with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            infilename = qcio.get_infilenamefromcf(cf)
-            ds2 = qcio.nc_read_series(infilename)
-            ds3 = qcls.l3qc(cf,ds2)
-            outfilename = qcio.get_outfilenamefromcf(cf)
-            outputlist = qcio.get_outputlistfromcf(cf,'nc')
-            ncFile = qcio.nc_open_write(outfilename)
-            qcio.nc_write_series(ncFile,ds3,outputlist=outputlist)
-            logging.info('Finished L3 processing with '+cfname)
-            logging.info('')
-    elif level.lower()=="fluxnet":
-        # convert netCDF files to FluxNet CSV files
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting FluxNet output with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            qcio.fn_write_csv(cf)
-            logging.info('Finished FluxNet output with '+cfname)
-            logging.info('')
-    elif level.lower()=="concatenate":
-        # concatenate netCDF files
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting concatenation with '+cfname)
-            cf_cc = qcio.get_controlfilecontents(cfname)
-            qcio.nc_concatenate(cf_cc)
-            logging.info('Finished concatenation with '+cfname)
-            # now plot the fingerprints for the concatenated files
-            opt = qcutils.get_keyvaluefromcf(cf_cc,["Options"],"DoFingerprints", default="yes")
-            if opt.lower()=="no": continue
-            cf_fp = qcio.get_controlfilecontents("controlfiles/standard/fingerprint.txt")
-            if "Files" not in dir(cf_fp): cf_fp["Files"] = {}
-            file_name = cf_cc["Files"]["Out"]["ncFileName"]
-            file_path = ntpath.split(file_name)[0]+"/"
-            cf_fp["Files"]["file_path"] = file_path
-            cf_fp["Files"]["in_filename"] = ntpath.split(file_name)[1]
-            cf_fp["Files"]["plot_path"] = file_path[:file_path.index("Data")]+"Plots/"
-            if "Options" not in cf_fp: cf_fp["Options"]={}
-            cf_fp["Options"]["call_mode"] = "batch"
-            cf_fp["Options"]["show_plots"] = "no"
-            logging.info('Doing fingerprint plots using '+cf_fp["Files"]["in_filename"])
-            qcplot.plot_fingerprint(cf_fp)
-            logging.info('Finished fingerprint plots')
-            logging.info('')
-    elif level.lower()=="climatology":
-        # climatology
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting climatology with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            qcclim.climatology(cf)
-            logging.info('Finished climatology with '+cfname)
-            logging.info('')
-    elif level.lower()=="cpd":
-        # ustar threshold from change point detection
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting CPD with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            if "Options" not in cf: cf["Options"]={}
-            cf["Options"]["call_mode"] = "batch"
-            cf["Options"]["show_plots"] = False
-            qccpd.cpd_main(cf)
-            logging.info('Finished CPD with '+cfname)
-            logging.info('')
-    elif level.lower()=="l4":
-        # L4 processing
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L4 processing with '+cfname)
-            cf_l4 = qcio.get_controlfilecontents(cfname)
-            if "Options" not in cf_l4: cf_l4["Options"]={}
-            cf_l4["Options"]["call_mode"] = "batch"
-            cf_l4["Options"]["show_plots"] = False
-            infilename = qcio.get_infilenamefromcf(cf_l4)
-            ds3 = qcio.nc_read_series(infilename)
-            ds4 = qcls.l4qc(cf_l4,ds3)
-            outfilename = qcio.get_outfilenamefromcf(cf_l4)
-            outputlist = qcio.get_outputlistfromcf(cf_l4,'nc')
-            ncFile = qcio.nc_open_write(outfilename)
-            qcio.nc_write_series(ncFile,ds4,outputlist=outputlist)
-            logging.info('Finished L4 processing with '+cfname)
-            # now plot the fingerprints for the L4 files
-            cf_fp = qcio.get_controlfilecontents("controlfiles/standard/fingerprint.txt")
-            if "Files" not in dir(cf_fp): cf_fp["Files"] = {}
-            file_name = qcio.get_outfilenamefromcf(cf_l4)
-            file_path = ntpath.split(file_name)[0]+"/"
-            cf_fp["Files"]["file_path"] = file_path
-            cf_fp["Files"]["in_filename"] = ntpath.split(file_name)[1]
-            cf_fp["Files"]["plot_path"] = file_path[:file_path.index("Data")]+"Plots/"
-            if "Options" not in cf_fp: cf_fp["Options"]={}
-            cf_fp["Options"]["call_mode"] = "batch"
-            cf_fp["Options"]["show_plots"] = "no"
-            logging.info('Doing fingerprint plots using '+cf_fp["Files"]["in_filename"])
-            qcplot.plot_fingerprint(cf_fp)
-            logging.info('Finished fingerprint plots')
-            logging.info('')
-    elif level.lower()=="l5":
-        # L5 processing
-        for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L5 processing with '+cfname)
-            cf_l5 = qcio.get_controlfilecontents(cfname)
-            if "Options" not in cf_l5: cf_l5["Options"]={}
-            cf_l5["Options"]["call_mode"] = "batch"
-            cf_l5["Options"]["show_plots"] = False
-            infilename = qcio.get_infilenamefromcf(cf_l5)
-            ds4 = qcio.nc_read_series(infilename)
-            ds5 = qcls.l5qc(cf_l5,ds4)
-            outfilename = qcio.get_outfilenamefromcf(cf_l5)
-            outputlist = qcio.get_outputlistfromcf(cf_l5,'nc')
-            ncFile = qcio.nc_open_write(outfilename)
-            qcio.nc_write_series(ncFile,ds5,outputlist=outputlist)
-            logging.info('Finished L5 processing with '+cfname)
-            # now plot the fingerprints for the L5 files
-            cf_fp = qcio.get_controlfilecontents("controlfiles/standard/fingerprint.txt")
-            if "Files" not in dir(cf_fp): cf_fp["Files"] = {}
-            file_name = qcio.get_outfilenamefromcf(cf_l5)
-            file_path = ntpath.split(file_name)[0]+"/"
-            cf_fp["Files"]["file_path"] = file_path
-            cf_fp["Files"]["in_filename"] = ntpath.split(file_name)[1]
-            cf_fp["Files"]["plot_path"] = file_path[:file_path.index("Data")]+"Plots/"
-            if "Options" not in cf_fp: cf_fp["Options"]={}
-            cf_fp["Options"]["call_mode"] = "batch"
-            cf_fp["Options"]["show_plots"] = "no"
-            logging.info('Doing fingerprint plots using '+cf_fp["Files"]["in_filename"])
-            qcplot.plot_fingerprint(cf_fp)
-            logging.info('Finished fingerprint plots')
-            logging.info('')
-    elif level.lower()=="l6":
-        # L6 processing
+        infilename = qcio.get_infilenamefromcf(cf)
+        outfilename = qcio.get_outfilenamefromcf(cf)
+        if level=="cpd":
+            outfilename = infilename.replace(".nc","_CPD.xls")
+        elif level=="climatology":
+            outfilename = infilename.replace(".nc","_Climatology.xls")
+        if "cpd_filename" in cf["Files"]:
+            infiles.append(qcutils.get_keyvaluefromcf(cf,["Files"],"file_path",default="")+cf["Files"]["cpd_filename"])
+        infiles.append(infilename)
+        outfiles.append(outfilename)
+    infiles = [os.path.abspath(f) for f in infiles if len(os.path.basename(f))!=0]
+    outfiles = [os.path.abspath(f) for f in outfiles if len(os.path.basename(f))!=0]
+    for f in get_cf_files(cf):
+        if f not in infiles and f not in outfiles: infiles.append(f)
+    return infiles,outfiles
+
+def get_chains(jobs):
+    """
+    Purpose:
+     Group the batch jobs into chains of dependent jobs, usually one chain
+     for each site.  Two jobs are in the same chain if one reads a file
+     written by the other or if their control files are in the same
+     directory.  Jobs in a chain keep the order of the level list, jobs in
+     different chains are independent and can be run at the same time.
+    Usage:
+     chains = get_chains(jobs)
+     where jobs is a list of (level,cfname) tuples in processing order
+           chains is a list of lists of (level,cfname) tuples
+    """
+    parent = range(len(jobs))
+    def find(i):
+        while parent[i]!=i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    def union(i,j):
+        parent[find(i)] = find(j)
+    writers = {}
+    directories = {}
+    job_files = [get_job_files(level,cfname) for level,cfname in jobs]
+    for n,(level,cfname) in enumerate(jobs):
+        for f in job_files[n][1]:
+            if f in writers: union(n,writers[f])
+            writers[f] = n
+        cfdir = os.path.dirname(os.path.abspath(cfname))
+        if cfdir in directories: union(n,directories[cfdir])
+        directories[cfdir] = n
+    for n in range(len(jobs)):
+        for f in job_files[n][0]:
+            if f in writers: union(n,writers[f])
+    chains = {}
+    for n in range(len(jobs)):
+        chains.setdefault(find(n),[]).append(jobs[n])
+    return [chains[key] for key in sorted(chains.keys())]
+
+def get_chain_name(chain):
+    """ Name a chain after the directory of its first control file."""
+    cfdir = os.path.dirname(os.path.abspath(chain[0][1]))
+    return os.path.basename(cfdir).replace(" ","")
+
+def do_job(job):
+    """
+    Purpose:
+     Run a batch job.  If the result cache is enabled, the job is skipped
+     when its control file, the batch options and the OzFluxQC version and
+     scripts are the same as when it was last run and its input files (all
+     existing files named in the control file) and output files have not
+     changed since.
+    Usage:
+     do_job((level,cfname))
+    """
+    level,cfname = job
+    if not cache_options["enabled"]:
+        level_functions[level.lower()](cfname)
+        return
+    cache_dir = cache_options["directory"]
+    infiles,outfiles = get_job_files(level,cfname)
+    key = qccache.get_cachekey(level,cfname,options=batch_options)
+    if not cache_options["force"] and qccache.check_entry(cache_dir,key,infiles):
+        logging.info('Skipping '+level+' with '+cfname+', inputs unchanged since last run')
+        logging.info('')
+        return
+    qccache.remove_entry(cache_dir,key)
+    level_functions[level.lower()](cfname)
+    qccache.add_entry(cache_dir,key,level,cfname,infiles,outfiles)
+
+def do_chain(args):
+    """
+    Purpose:
+     Run the jobs in a chain one after the other in a worker process.  The
+     log messages for the chain are written to a separate log file.  If a
+     job fails, the rest of the chain is skipped because it depends on it.
+    Usage:
+     pool.map(do_chain,[(chain,log_filename,batch_options,cache_options),...])
+    """
+    chain,chain_log_filename,options,cache = args
+    batch_options.update(options)
+    cache_options.update(cache)
+    qccache.set_solarcacheoptions(cache_options)
+    qccache.set_modelcacheoptions(cache_options)
+    logger = logging.getLogger('')
+    for handler in list(logger.handlers):
+        if isinstance(handler,logging.FileHandler): logger.removeHandler(handler)
+    fh = logging.FileHandler(chain_log_filename)
+    fh.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s','%H:%M:%S'))
+    fh.setLevel(logging.DEBUG)
+    logger.addHandler(fh)
+    for job in chain:
+        try:
+            do_job(job)
+        except Exception:
+            logging.exception('Error processing '+job[0]+' with '+job[1]+', skipping rest of chain')
+            return False
+    return True
+
+if __name__=="__main__":
+    #log = qcutils.startlog('batch','logfiles/batch.log')
+    t = time.localtime()
+    rundatetime = datetime.datetime(t[0],t[1],t[2],t[3],t[4],t[5]).strftime("%Y%m%d%H%M")
+    log_filename = 'logfiles/batchprocess_'+rundatetime+'.log'
+    logging.basicConfig(filename=log_filename,
+                        format='%(asctime)s %(levelname)s %(message)s',
+                        datefmt = '%H:%M:%S',
+                        level=logging.DEBUG)
+    console = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s', '%H:%M:%S')
+    console.setFormatter(formatter)
+    console.setLevel(logging.INFO)
+    logging.getLogger('').addHandler(console)
+
+    # command line flags, --force reprocesses every level and --clear-cache
+    # empties the result cache before starting
+    cl_args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    cl_flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    # get the batch processing control file
+    if len(cl_args)==0:
+        cf_batch = qcio.load_controlfile(path='controlfiles')
+        if len(cf_batch)==0: sys.exit()
+    else:
+        cfname = cl_args[0]
+        if os.path.exists(cfname):
+            cf_batch = qcio.get_controlfilecontents(cfname)
+        else:
+            logging.error("Control file "+cfname+" does not exist")
+            sys.exit()
+
+    level_list = ['L1','L2','L3','concatenate','climatology','cpd','L4','L5','L6']
+    if "Options" in cf_batch:
+        if "levels" in cf_batch["Options"]: level_list = ast.literal_eval(cf_batch["Options"]["levels"])
+    # options passed on to the level control files
+    for item in batch_option_list:
+        if "Options" in cf_batch and item in cf_batch["Options"]:
+            batch_options[item] = cf_batch["Options"][item]
+    # result cache
+    cache_options.update(qcio.get_cacheoptionsfromcf(cf_batch))
+    cache_options["force"] = ("--force" in cl_flags)
+    qccache.set_solarcacheoptions(cache_options)
+    qccache.set_modelcacheoptions(cache_options)
+    if cache_options["enabled"]:
+        if "--clear-cache" in cl_flags:
+            qccache.clear(cache_options["directory"])
+        else:
+            qccache.evict(cache_options["directory"],max_entries=cache_options["max_entries"],
+                          max_age=cache_options["max_age"])
+    if cache_options["solar_enabled"] and "--clear-cache" in cl_flags:
+        qccache.clear_solar(qccache.solar_cache_options["directory"])
+    if cache_options["model_enabled"] and "--clear-cache" in cl_flags:
+        qccache.clear_models(qccache.model_cache_options["directory"])
+    # number of worker processes, 1 processes the levels one after the other
+    # the workers are daemonic and can't start their own pools so SOLOWorkers
+    # and FFNETWorkers are ignored, and the SOLO and FFNET jobs run one after
+    # the other, when workers>1
+    workers = int(qcutils.get_keyvaluefromcf(cf_batch,["Options"],"workers",default=1,mode="quiet"))
+    # list of jobs in processing order
+    jobs = []
+    for level in level_list:
+        if level.lower() not in level_functions:
+            logging.warning('Unrecognised level '+level+' in batch control file, skipping ...')
+            continue
+        if level not in cf_batch["Levels"]: continue
         for i in cf_batch["Levels"][level].keys():
-            cfname = cf_batch["Levels"][level][i]
-            logging.info('Starting L6 processing with '+cfname)
-            cf = qcio.get_controlfilecontents(cfname)
-            if "Options" not in cf: cf["Options"]={}
-            cf["Options"]["call_mode"] = "batch"
-            cf["Options"]["show_plots"] = False
-            infilename = qcio.get_infilenamefromcf(cf)
-            ds5 = qcio.nc_read_series(infilename)
-            ds6 = qcls.l6qc(cf,ds5)
-            outfilename = qcio.get_outfilenamefromcf(cf)
-            outputlist = qcio.get_outputlistfromcf(cf,'nc')
-            ncFile = qcio.nc_open_write(outfilename)
-            qcio.nc_write_series(ncFile,ds6,outputlist=outputlist)
-            logging.info('Finished L6 processing with '+cfname)
-            logging.info('')
+            jobs.append((level,cf_batch["Levels"][level][i]))
+    chains = get_chains(jobs)
+    if workers<=1 or len(chains)<=1:
+        for job in jobs:
+            do_job(job)
+    else:
+        workers = min(workers,len(chains))
+        logging.info('Processing '+str(len(chains))+' independent chains with '+str(workers)+' workers')
+        args = []
+        for n,chain in enumerate(chains):
+            chain_name = get_chain_name(chain)
+            chain_log_filename = log_filename.replace('.log','_'+str(n)+'_'+chain_name+'.log')
+            logging.info(' Chain '+str(n)+' ('+chain_name+'): '+', '.join([job[0] for job in chain])+
+                         ', logging to '+chain_log_filename)
+            args.append((chain,chain_log_filename,batch_options,cache_options))
+        pool = multiprocessing.Pool(processes=workers)
+        results = pool.map(do_chain,args,chunksize=1)
+        pool.close()
+        pool.join()
+        for (chain,chain_log_filename,options,cache),ok in zip(args,results):
+            if not ok: logging.error('Errors processing chain '+get_chain_name(chain)+', see '+chain_log_filename)
+        logging.info('Finished batch processing')
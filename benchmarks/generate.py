@@ -0,0 +1,487 @@
+"""
+Generate synthetic flux tower data and control files for benchmarking
+OzFluxQC.
+
+The synthetic data set is written as an L1 netCDF file together with a
+synthetic alternate (ACCESS-like) netCDF file and control files for L2,
+L3, climatology, CPD, L4, L5 and L6.  The data are not meant to be
+realistic in detail, they have realistic magnitudes, diurnal and seasonal
+cycles and the relationships between the series that the processing
+levels need (fluxes and covariances, radiation components, drivers for
+the gap filling).
+
+Usage:
+ python benchmarks/generate.py [--years 2] [--time-step 30] [--extra 0]
+                               [--gaps 0.05] [--seed 0] [--out benchmarks/data]
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","scripts"))
+import matplotlib
+matplotlib.use("Agg")
+import numpy
+from configobj import ConfigObj
+import constants as c
+import qcio
+import qcutils
+
+log = logging.getLogger('qc.benchmark')
+
+site_defaults = {"site_name":"Synthetic","latitude":"-35.0","longitude":"148.0",
+                 "time_zone":"Australia/Sydney","elevation":"500","canopy_height":"20",
+                 "tower_height":"30"}
+
+# variable name, units, long name and height
+series_info = {"Fsd":["W/m2","Down-welling short wave","30m"],
+               "Fsu":["W/m2","Up-welling short wave","30m"],
+               "Fld":["W/m2","Down-welling long wave","30m"],
+               "Flu":["W/m2","Up-welling long wave","30m"],
+               "Fn_NR":["W/m2","Net radiation","30m"],
+               "Ta_HMP_30m":["C","Air temperature","30m"],
+               "Ah_HMP_30m":["g/m3","Absolute humidity","30m"],
+               "ps":["kPa","Air pressure","2m"],
+               "Ws_WS4":["m/s","Wind speed","30m"],
+               "Wd_WS4":["deg","Wind direction","30m"],
+               "Ws_CSAT":["m/s","Wind speed","30m"],
+               "Wd_CSAT":["deg","Wind direction","30m"],
+               "Ux":["m/s","Longitudinal wind component","30m"],
+               "Uy":["m/s","Lateral wind component","30m"],
+               "Uz":["m/s","Vertical wind component","30m"],
+               "Tv_CSAT":["C","Virtual air temperature","30m"],
+               "ustar":["m/s","Friction velocity","30m"],
+               "Fh":["W/m2","Sensible heat flux","30m"],
+               "Fe":["W/m2","Latent heat flux","30m"],
+               "Fc":["mg/m2/s","CO2 flux","30m"],
+               "Fm":["kg/m/s2","Momentum flux","30m"],
+               "Cc_7500_Av":["mg/m3","CO2 concentration","30m"],
+               "Ah_7500_Av":["g/m3","Absolute humidity","30m"],
+               "Ah_7500_Sd":["g/m3","Absolute humidity standard deviation","30m"],
+               "Cc_7500_Sd":["mg/m3","CO2 concentration standard deviation","30m"],
+               "UxUz":["m2/s2","Covariance of Ux and Uz","30m"],
+               "UyUz":["m2/s2","Covariance of Uy and Uz","30m"],
+               "UxUy":["m2/s2","Covariance of Ux and Uy","30m"],
+               "UxUx":["m2/s2","Variance of Ux","30m"],
+               "UyUy":["m2/s2","Variance of Uy","30m"],
+               "UzUz":["m2/s2","Variance of Uz","30m"],
+               "UzT":["mC/s","Covariance of Uz and T","30m"],
+               "UxT":["mC/s","Covariance of Ux and T","30m"],
+               "UyT":["mC/s","Covariance of Uy and T","30m"],
+               "UzA":["g/m2/s","Covariance of Uz and A","30m"],
+               "UxA":["g/m2/s","Covariance of Ux and A","30m"],
+               "UyA":["g/m2/s","Covariance of Uy and A","30m"],
+               "UzC":["mg/m2/s","Covariance of Uz and C","30m"],
+               "UxC":["mg/m2/s","Covariance of Ux and C","30m"],
+               "UyC":["mg/m2/s","Covariance of Uy and C","30m"],
+               "Diag_CSAT":["none","CSAT diagnostic value","30m"],
+               "Diag_7500":["none","Li-7500 diagnostic value","30m"],
+               "AGC_7500":["none","Li-7500 automatic gain control","30m"],
+               "Fg_8cma":["W/m2","Ground heat flux","-0.08m"],
+               "Fg_8cmb":["W/m2","Ground heat flux","-0.08m"],
+               "Ts_8cma":["C","Soil temperature","-0.08m"],
+               "Sws_8cma":["frac","Soil water content","-0.08m"],
+               "Precip":["mm","Rainfall","2m"]}
+
+# series from the sonic anemometer and the open path IRGA, these are missing together
+ec_series = ["Ux","Uy","Uz","Tv_CSAT","Ws_CSAT","Wd_CSAT","ustar","Fh","Fe","Fc","Fm",
+             "Cc_7500_Av","Ah_7500_Av","Ah_7500_Sd","Cc_7500_Sd","UxUz","UyUz","UxUy",
+             "UxUx","UyUy","UzUz","UzT","UxT","UyT","UzA","UxA","UyA","UzC","UxC","UyC",
+             "Diag_CSAT","Diag_7500","AGC_7500"]
+
+def get_synthetic_datetime(start_year,years,ts):
+    """ Return a list of datetimes covering whole years at time step ts."""
+    start = datetime.datetime(start_year,1,1,0,0)+datetime.timedelta(minutes=ts)
+    end = datetime.datetime(start_year+years,1,1,0,0)
+    nrecs = int((end-start).total_seconds()/(60*ts))+1
+    return [start+datetime.timedelta(minutes=ts*i) for i in range(nrecs)]
+
+def get_synthetic_fsd(ldt,latitude,rng):
+    """ Clear sky Fsd from a simple solar geometry with random cloudiness."""
+    doy = numpy.array([dt.timetuple().tm_yday for dt in ldt],dtype=numpy.float64)
+    hour = numpy.array([dt.hour+dt.minute/float(60) for dt in ldt],dtype=numpy.float64)
+    declination = numpy.radians(23.45)*numpy.sin(numpy.radians(360.0*(284+doy)/365.0))
+    hour_angle = numpy.radians(15.0*(hour-12.0))
+    lat = numpy.radians(latitude)
+    sin_alt = (numpy.sin(lat)*numpy.sin(declination)+
+               numpy.cos(lat)*numpy.cos(declination)*numpy.cos(hour_angle))
+    sin_alt = numpy.maximum(sin_alt,0)
+    # daily cloudiness persists through the day
+    ndays = int(numpy.ceil(len(ldt)/float(1440/((ldt[1]-ldt[0]).seconds/60))))+1
+    cloud = numpy.clip(rng.beta(2,5,size=ndays),0,0.9)
+    day_index = numpy.array([(dt-ldt[0]).days for dt in ldt])
+    return 1100*sin_alt**1.2*(1-cloud[day_index]),sin_alt,doy,hour
+
+def make_dataset(site_name="Synthetic",start_year=2012,years=2,ts=30,extra=0,gaps=0.05,seed=0):
+    """
+    Purpose:
+     Make a synthetic L1 data structure.
+    Usage:
+     ds = make_dataset(years=2,ts=30,extra=0,gaps=0.05,seed=0)
+     where years is the number of years of data
+           ts is the time step in minutes
+           extra is the number of extra (random) series added to the data structure
+           gaps is the fraction of missing data in each series
+           seed is the seed for the random number generator
+    """
+    rng = numpy.random.RandomState(seed)
+    ldt = get_synthetic_datetime(start_year,years,ts)
+    nrecs = len(ldt)
+    ds = qcio.DataStructure()
+    for item in site_defaults.keys(): ds.globalattributes[item] = site_defaults[item]
+    ds.globalattributes["site_name"] = site_name
+    ds.globalattributes["time_step"] = str(ts)
+    ds.globalattributes["nc_nrecs"] = str(nrecs)
+    ds.globalattributes["nc_level"] = "L1"
+    ds.globalattributes["xl_datemode"] = "0"
+    ds.globalattributes["irga_type"] = "Li-7500"
+    ds.globalattributes["featureType"] = "timeseries"
+    ds.globalattributes["start_date"] = str(ldt[0])
+    ds.globalattributes["end_date"] = str(ldt[-1])
+    ds.series["DateTime"] = {"Data":ldt,"Flag":numpy.zeros(nrecs,dtype=numpy.int32),
+                             "Attr":{"long_name":"Datetime in local timezone","units":"None"}}
+    qcutils.get_xldatefromdatetime(ds)
+    qcutils.get_ymdhmsfromdatetime(ds)
+    # radiation
+    data = {}
+    latitude = float(site_defaults["latitude"])
+    Fsd,sin_alt,doy,hour = get_synthetic_fsd(ldt,latitude,rng)
+    season = numpy.cos(2*numpy.pi*(doy-15)/365.0)
+    diurnal = numpy.sin(2*numpy.pi*(hour-9)/24.0)
+    data["Fsd"] = Fsd+rng.normal(0,5,nrecs)*(Fsd>0)
+    data["Fsu"] = 0.15*data["Fsd"]
+    Ta = 14+8*season+6*diurnal+rng.normal(0,1,nrecs)
+    data["Ta_HMP_30m"] = Ta
+    data["Fld"] = 300+3*Ta+rng.normal(0,10,nrecs)
+    data["Flu"] = c.sb*(Ta+c.C2K)**4+0.02*data["Fsd"]
+    data["Fn_NR"] = data["Fsd"]-data["Fsu"]+data["Fld"]-data["Flu"]
+    # humidity, pressure and CO2
+    data["Ah_HMP_30m"] = numpy.maximum(8+3*season+rng.normal(0,0.5,nrecs),1)
+    data["Ah_7500_Av"] = data["Ah_HMP_30m"]+rng.normal(0,0.1,nrecs)
+    data["ps"] = 95+rng.normal(0,0.3,nrecs)
+    data["Cc_7500_Av"] = 700-40*(data["Fsd"]/1000.0)+rng.normal(0,5,nrecs)
+    data["Ah_7500_Sd"] = numpy.abs(rng.normal(0.1,0.02,nrecs))
+    data["Cc_7500_Sd"] = numpy.abs(rng.normal(1,0.2,nrecs))
+    # wind
+    Ws = rng.gamma(2.0,1.5,nrecs)+0.2
+    Wd = rng.uniform(0,360,nrecs)
+    data["Ws_WS4"] = Ws
+    data["Wd_WS4"] = Wd
+    data["Ws_CSAT"] = Ws+rng.normal(0,0.1,nrecs)
+    data["Wd_CSAT"] = numpy.mod(Wd+rng.normal(0,5,nrecs),360)
+    data["Ux"] = -Ws*numpy.sin(numpy.radians(Wd))
+    data["Uy"] = -Ws*numpy.cos(numpy.radians(Wd))
+    data["Uz"] = rng.normal(0,0.05,nrecs)
+    ustar = numpy.maximum(0.08*Ws+rng.normal(0,0.03,nrecs),0.01)
+    data["ustar"] = ustar
+    # turbulent fluxes
+    rho = 1.2
+    Fh = 0.35*data["Fsd"]-20+rng.normal(0,15,nrecs)
+    Fe = 0.4*data["Fsd"]+10+rng.normal(0,15,nrecs)
+    ER = 2.0*numpy.exp(0.07*(Ta-15))
+    GPP = 20*data["Fsd"]/(data["Fsd"]+400)
+    Fc_umol = ER-GPP+rng.normal(0,1,nrecs)
+    # umol/m2/s to mg/m2/s
+    Fc = Fc_umol*c.Mc
+    data["Fh"] = Fh
+    data["Fe"] = Fe
+    data["Fc"] = Fc
+    data["Fm"] = rho*ustar**2
+    data["Tv_CSAT"] = Ta+0.5+rng.normal(0,0.2,nrecs)
+    data["UzT"] = Fh/(rho*c.Cpd)
+    data["UzA"] = Fe/c.Lv*1000.0
+    data["UzC"] = Fc
+    data["UxUz"] = -ustar**2*numpy.cos(numpy.radians(Wd))
+    data["UyUz"] = -ustar**2*numpy.sin(numpy.radians(Wd))
+    data["UxUx"] = (2.4*ustar)**2
+    data["UyUy"] = (1.9*ustar)**2
+    data["UzUz"] = (1.25*ustar)**2
+    data["UxUy"] = 0.1*ustar**2*rng.normal(0,1,nrecs)
+    for item in ["T","A","C"]:
+        data["Ux"+item] = -0.5*data["Uz"+item]+0.1*numpy.abs(data["Uz"+item])*rng.normal(0,1,nrecs)
+        data["Uy"+item] = 0.1*numpy.abs(data["Uz"+item])*rng.normal(0,1,nrecs)
+    data["Diag_CSAT"] = numpy.zeros(nrecs)
+    data["Diag_7500"] = numpy.zeros(nrecs)
+    data["AGC_7500"] = 55+rng.normal(0,1,nrecs)
+    # soil
+    data["Fg_8cma"] = 0.1*data["Fn_NR"]+rng.normal(0,5,nrecs)
+    data["Fg_8cmb"] = data["Fg_8cma"]+rng.normal(0,5,nrecs)
+    data["Ts_8cma"] = 16+7*season+2*numpy.sin(2*numpy.pi*(hour-14)/24.0)+rng.normal(0,0.2,nrecs)
+    data["Sws_8cma"] = numpy.clip(0.2+0.05*season+rng.normal(0,0.005,nrecs),0.02,0.45)
+    data["Precip"] = numpy.where(rng.rand(nrecs)<0.02,rng.exponential(2,nrecs),0)
+    # put the series into the data structure with gaps, the eddy covariance
+    # series share the same gaps so that the fluxes calculated from them at
+    # L3 are missing for about the same fraction of the time as the inputs
+    ec_missing = get_missing(nrecs,gaps,rng,ts)
+    for label in sorted(data.keys()):
+        units,long_name,height = series_info[label]
+        missing = ec_missing if label in ec_series else get_missing(nrecs,gaps,rng,ts)
+        create_series(ds,label,data[label],units,long_name,height,missing)
+    for i in range(extra):
+        label = "Extra_"+str(i)
+        create_series(ds,label,rng.normal(0,1,nrecs),"none","Extra series "+str(i),"30m",
+                      get_missing(nrecs,gaps,rng,ts))
+    return ds
+
+def get_missing(nrecs,gaps,rng,ts):
+    """ Return a boolean mask with random short and long gaps, ts is the time step in minutes."""
+    missing = rng.rand(nrecs)<gaps/2.0
+    # half of the missing data is in gaps of up to 2 days, 1 day on average
+    nperday = 24*60/int(ts)
+    nblocks = int(gaps/2.0*nrecs/nperday)
+    for si in rng.randint(0,nrecs,nblocks):
+        missing[si:si+rng.randint(1,2*nperday)] = True
+    return missing
+
+def create_series(ds,label,data,units,long_name,height,missing):
+    """ Add a series to the data structure with the data missing where missing is True."""
+    nrecs = len(data)
+    data = numpy.array(data,dtype=numpy.float64)
+    data[missing] = c.missing_value
+    flag = numpy.where(missing,numpy.int32(1),numpy.int32(0)).astype(numpy.int32)
+    attr = qcutils.MakeAttributeDictionary(long_name=long_name,units=units,height=height)
+    qcutils.CreateSeries(ds,label,data,Flag=flag,Attr=attr)
+
+def make_alternate(ds,seed=1):
+    """
+    Purpose:
+     Make a synthetic alternate (ACCESS-like) data set from a synthetic L1
+     data structure.  The alternate data have no gaps, a bias and noise
+     added to the tower data and are used at L4 by GapFillFromAlternate.
+    Usage:
+     ds_alt = make_alternate(ds)
+    """
+    rng = numpy.random.RandomState(seed)
+    nrecs = int(ds.globalattributes["nc_nrecs"])
+    ds_alt = qcio.DataStructure()
+    for item in ds.globalattributes.keys(): ds_alt.globalattributes[item] = ds.globalattributes[item]
+    ds_alt.globalattributes["site_name"] = ds.globalattributes["site_name"]+"_ACCESS"
+    ldt = list(ds.series["DateTime"]["Data"])
+    ds_alt.series["DateTime"] = {"Data":ldt,"Flag":numpy.zeros(nrecs,dtype=numpy.int32),
+                                 "Attr":dict(ds.series["DateTime"]["Attr"])}
+    qcutils.get_xldatefromdatetime(ds_alt)
+    qcutils.get_ymdhmsfromdatetime(ds_alt)
+    for label,source in [("Fsd","Fsd"),("Fsu","Fsu"),("Fld","Fld"),("Flu","Flu"),("Fn","Fn_NR"),
+                         ("Ta","Ta_HMP_30m"),("Ah","Ah_HMP_30m"),("ps","ps"),("Ws","Ws_WS4"),
+                         ("Wd","Wd_WS4"),("Fg","Fg_8cma"),("Ts","Ts_8cma"),("Sws","Sws_8cma"),
+                         ("Precip","Precip")]:
+        data,flag,attr = qcutils.GetSeriesasMA(ds,source)
+        data = numpy.ma.filled(data,numpy.ma.median(data))
+        noise = rng.normal(0,0.1*numpy.std(data),nrecs) if label not in ["Precip","Wd"] else 0
+        data = 1.05*data+noise
+        attr = qcutils.MakeAttributeDictionary(long_name=attr["long_name"],units=attr["units"],
+                                               height=attr["height"])
+        qcutils.CreateSeries(ds_alt,label,data,Flag=numpy.zeros(nrecs,dtype=numpy.int32),Attr=attr)
+    Fa = ds_alt.series["Fn"]["Data"]-ds_alt.series["Fg"]["Data"]
+    attr = qcutils.MakeAttributeDictionary(long_name="Available energy",units="W/m2")
+    qcutils.CreateSeries(ds_alt,"Fa",Fa,Flag=numpy.zeros(nrecs,dtype=numpy.int32),Attr=attr)
+    return ds_alt
+
+def write_controlfile(cf_dict,cf_name):
+    """ Write a nested dictionary as a control file, sections keep their order."""
+    cf = ConfigObj(indent_type="    ")
+    cf.filename = cf_name
+    add_sections(cf,cf_dict)
+    cf.write()
+
+def add_sections(section,items):
+    for key,value in items:
+        if isinstance(value,list):
+            section[key] = {}
+            add_sections(section[key],value)
+        else:
+            section[key] = value
+
+def range_check(lower,upper):
+    """
+    Purpose:
+     Return a RangeCheck section with only the lower limit.  With an upper
+     limit qcck.do_rangecheck sets the valid_range attribute to a
+     "lower,upper" string and netCDF4 1.4 and later refuse to write that
+     because they expect valid_range to be numeric.  The synthetic data are
+     generated inside the upper limits so the checks would not remove
+     anything.
+    Usage:
+     item = range_check(lower,upper)
+    """
+    return ("RangeCheck",[("Lower","["+str(lower)+"]*12")])
+
+def write_controlfiles(data_path,cf_path,site_name,start_year,years,ts):
+    """
+    Purpose:
+     Write the control files for processing the synthetic data from L2 to L6.
+    Usage:
+     cf_names = write_controlfiles(data_path,cf_path,site_name,start_year,years,ts)
+     where cf_names is a dictionary of control file names keyed by level
+    """
+    if not os.path.isdir(cf_path): os.makedirs(cf_path)
+    data_path = os.path.abspath(data_path)+"/"
+    prefix = site_name+"_"
+    start_date = str(datetime.datetime(start_year,1,1,0,0))
+    end_date = str(datetime.datetime(start_year+years,1,1,0,0))
+    plot_path = os.path.join(os.path.abspath(os.path.join(data_path,"..")),"Plots")+"/"
+    cf_names = {}
+    # L2
+    l2_vars = [("Fsd",[range_check(-10,1500)]),("Fsu",[range_check(-10,500)]),
+               ("Fld",[range_check(150,550)]),("Flu",[range_check(150,700)]),
+               ("Fn_NR",[range_check(-150,1100)]),("Ta_HMP_30m",[range_check(-10,50)]),
+               ("Ah_HMP_30m",[range_check(0,35)]),("ps",[range_check(80,110)]),
+               ("Ws_WS4",[range_check(0,30)]),("Wd_WS4",[range_check(0,360)]),
+               ("Ux",[range_check(-30,30)]),("Uy",[range_check(-30,30)]),("Uz",[range_check(-5,5)]),
+               ("ustar",[range_check(0,3)]),("Fh",[range_check(-200,800)]),
+               ("Fe",[range_check(-200,800)]),("Fc",[range_check(-2,2)]),
+               ("Cc_7500_Av",[range_check(500,1000)]),("Ah_7500_Av",[range_check(0,35)]),
+               ("Tv_CSAT",[range_check(-10,50)]),("UzT",[range_check(-0.5,1.0)]),
+               ("UzA",[range_check(-0.1,0.5)]),("UzC",[range_check(-2,2)]),
+               ("UxUz",[range_check(-10,10)]),("UyUz",[range_check(-10,10)]),
+               ("Fg_8cma",[range_check(-300,300)]),("Fg_8cmb",[range_check(-300,300)]),
+               ("Ts_8cma",[range_check(-10,60)]),("Sws_8cma",[range_check(0,0.5)]),
+               ("Precip",[range_check(0,50)])]
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L1.nc"),("out_filename",prefix+"L2.nc")]),
+          ("Variables",l2_vars)]
+    cf_names["L2"] = os.path.join(cf_path,"L2.txt")
+    write_controlfile(cf,cf_names["L2"])
+    # L3
+    merge = lambda source: ("MergeSeries",[("Source",str(source))])
+    average = lambda source: ("AverageSeries",[("Source",str(source))])
+    cf = [("General",[("zms","30")]),
+          ("Files",[("file_path",data_path),("in_filename",prefix+"L2.nc"),("out_filename",prefix+"L3.nc")]),
+          ("Options",[("CO2Units","umol/mol"),("FcUnits","umol/m2/s")]),
+          ("Soil",[("FgDepth","0.08"),("BulkDensity","1200"),("OrganicContent","0.01"),
+                   ("SwsDefault","0.2"),("SwsSeries",str(["Sws"]))]),
+          ("Variables",[("Fn",[merge(["Fn_NR"]),range_check(-150,1100)]),
+                        ("Fh",[range_check(-100,600)]),("Fe",[range_check(-100,600)]),
+                        ("Fc",[range_check(-50,50)]),("Fm",[range_check(-1,1)]),
+                        ("ustar",[range_check(0,2)]),
+                        ("Ta",[merge(["Ta_HMP_30m","Ta_CSAT"]),range_check(-10,50)]),
+                        ("Ah",[merge(["Ah_HMP_30m","Ah_7500_Av"]),range_check(0,35)]),
+                        ("Cc",[merge(["Cc_7500_Av"]),range_check(250,900)]),
+                        ("Ws",[merge(["Ws_WS4","Ws_CSAT"]),range_check(0,30)]),
+                        ("Wd",[merge(["Wd_WS4","Wd_CSAT"]),range_check(0,360)]),
+                        ("Fg",[average(["Fg_8cma","Fg_8cmb"]),range_check(-300,300)]),
+                        ("Sws",[average(["Sws_8cma"]),range_check(0,0.5)]),
+                        ("Ts",[average(["Ts_8cma"]),range_check(-10,60)])])]
+    cf_names["L3"] = os.path.join(cf_path,"L3.txt")
+    write_controlfile(cf,cf_names["L3"])
+    # climatology
+    fmt = [(item,[("Format","0.00")]) for item in ["Ta","Ah","Cc","Ws","Wd","ps","Fld","Flu",
+                                                   "Fn","Fsd","Fsu","Ts","Sws","Fg","Fa",
+                                                   "Fe","Fh","Fc","ustar"]]
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L3.nc"),
+                    ("out_filename",prefix+"L3_Climatology.xls")]),
+          ("Variables",fmt)]
+    cf_names["climatology"] = os.path.join(cf_path,"climatology.txt")
+    write_controlfile(cf,cf_names["climatology"])
+    # CPD
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L3.nc"),
+                    ("out_filename",prefix+"L3_CPD.xls"),("plot_path",plot_path)]),
+          ("Options",[("Fsd_threshold","10"),("Num_bootstraps","10"),("Output_results","True"),
+                      ("Output_plots","False"),("Plot_TClass","False")]),
+          ("Variables",[(item,[("AltVarName",item)]) for item in ["Fc","Ta","ustar","Fsd"]])]
+    cf_names["cpd"] = os.path.join(cf_path,"cpd.txt")
+    write_controlfile(cf,cf_names["cpd"])
+    # L4
+    drivers = []
+    for item in ["Ah","Fa","Fg","Fld","Flu","Fn","Fsd","Fsu","ps","Sws","Ta","Ts","Ws","Wd","Precip"]:
+        alternate = [(item+"_access",[("source","ACCESS")])]
+        if item in ["Ws","Wd","Precip","Sws"]:
+            alternate = [(item+"_access",[("source","ACCESS"),("fit","replace"),("lag","no")])]
+        climatology = [(item+"_cli",[("method","interpolated daily")])]
+        source = [item,item+"_access",item+"_cli"]
+        if item=="Precip":
+            drivers.append((item,[("GapFillFromAlternate",alternate),
+                                  ("MergeSeries",[("Source",str(source[:2]))])]))
+        else:
+            drivers.append((item,[("GapFillFromAlternate",alternate),
+                                  ("GapFillFromClimatology",climatology),
+                                  ("MergeSeries",[("Source",str(source))])]))
+    drivers.append(("Cc",[("GapFillFromClimatology",[("Cc_cli",[("method","interpolated daily")])]),
+                          ("MergeSeries",[("Source",str(["Cc","Cc_cli"]))])]))
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L3.nc"),("out_filename",prefix+"L4.nc"),
+                    ("plot_path",plot_path),("access",data_path+prefix+"ACCESS.nc"),
+                    ("climatology",data_path+prefix+"L3_Climatology.xls")]),
+          ("Options",[("MaxGapInterpolate","3")]),
+          ("GUI",[("Alternate",[("period_option","manual"),("overwrite","no"),("show_plots","no"),
+                                ("show_all","no"),("auto_complete","yes"),("min_percent","50")])]),
+          ("Drivers",drivers)]
+    cf_names["L4"] = os.path.join(cf_path,"L4.txt")
+    write_controlfile(cf,cf_names["L4"])
+    # L5
+    solo_gui = [("period_option","manual"),("overwrite","no"),("show_plots","no"),
+                ("auto_complete","yes"),("min_percent","50"),("nodes","auto"),
+                ("training","500"),("nda_factor","5"),("learning","0.001"),("iterations","500")]
+    fluxes = []
+    for item,drv in [("ustar",["Ws","Fn","Ta","q"]),("Fe",["Fa","SHD","Ta","Ws"]),
+                     ("Fh",["Fa","Ta","Ws"]),("Fc",["Fn","Fg","q","VPD","Ta","Ts"])]:
+        fluxes.append((item,[("GapFillUsingSOLO",[(item+"_SOLO",[("drivers",str(drv))])]),
+                             ("MergeSeries",[("Source",str([item,item+"_SOLO"]))])]))
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L4.nc"),("out_filename",prefix+"L5.nc"),
+                    ("plot_path",plot_path)]),
+          ("Options",[("MaxGapInterpolate","0"),("FilterList",str(["Fc"])),("TurbulenceFilter","ustar"),
+                      ("DayNightFilter","Fsd"),("UseFsdsyn_threshold","No"),("AcceptDayTimes","Yes"),
+                      ("UseEveningFilter","No"),("EveningFilterLength","3"),("Fsd_threshold","10"),
+                      ("sa_threshold","-5")]),
+          ("ustar_threshold",[("0",str([start_date,end_date,0.25]))]),
+          ("GUI",[("SOLO",solo_gui)]),
+          ("Fluxes",fluxes)]
+    cf_names["L5"] = os.path.join(cf_path,"L5.txt")
+    write_controlfile(cf,cf_names["L5"])
+    # L6, ER is only observed at night and when ustar is above the threshold
+    # so the minimum percentage of points is lower than at L5
+    er_gui = [(key,"10") if key=="min_percent" else (key,value) for key,value in solo_gui]
+    cf = [("Files",[("file_path",data_path),("in_filename",prefix+"L5.nc"),("out_filename",prefix+"L6.nc"),
+                    ("plot_path",plot_path)]),
+          ("Options",[("MaxGapInterpolate","0")]),
+          ("GUI",[("SOLO",er_gui)]),
+          ("ER",[("ER_SOLO",[("ERUsingSOLO",[("target","ER"),("drivers",str(["Ts","Ta","Sws"])),
+                                             ("output","ER_SOLO_all")]),
+                             ("MergeSeries",[("Source",str(["ER","ER_SOLO_all"]))])]),
+                 ("ER_LT",[("ERUsingLloydTaylor",[("target","ER"),("drivers",str(["Ta"])),
+                                                  ("output","ER_LT_all"),
+                                                  ("minimum_temperature_spread","5"),
+                                                  ("step_size_days","5"),("window_size_days","15"),
+                                                  ("minimum_percent_annual","10"),
+                                                  ("minimum_percent_noct_window","20"),
+                                                  ("output_plots","False")]),
+                           ("MergeSeries",[("Source",str(["ER","ER_LT_all"]))])])]),
+          ("NEE",[("NEE_SOLO",[("Fc","Fc"),("ER","ER_SOLO")]),("NEE_LT",[("Fc","Fc"),("ER","ER_LT")])]),
+          ("GPP",[("GPP_SOLO",[("NEE","NEE_SOLO"),("ER","ER_SOLO")]),("GPP_LT",[("NEE","NEE_LT"),("ER","ER_LT")])])]
+    cf_names["L6"] = os.path.join(cf_path,"L6.txt")
+    write_controlfile(cf,cf_names["L6"])
+    return cf_names
+
+def generate(out_path,site_name="Synthetic",start_year=2012,years=2,ts=30,extra=0,gaps=0.05,seed=0):
+    """
+    Purpose:
+     Generate the synthetic L1 and alternate netCDF files and the control
+     files for a benchmark case.
+    Usage:
+     cf_names = generate("benchmarks/data/case",years=2,ts=30)
+    """
+    data_path = os.path.join(out_path,"Data")
+    if not os.path.isdir(data_path): os.makedirs(data_path)
+    if not os.path.isdir(os.path.join(out_path,"Plots")): os.makedirs(os.path.join(out_path,"Plots"))
+    log.info(" Generating "+str(years)+" years of "+str(ts)+" minute data for "+site_name)
+    ds = make_dataset(site_name=site_name,start_year=start_year,years=years,ts=ts,
+                      extra=extra,gaps=gaps,seed=seed)
+    ncFile = qcio.nc_open_write(os.path.join(data_path,site_name+"_L1.nc"))
+    qcio.nc_write_series(ncFile,ds)
+    ds_alt = make_alternate(ds,seed=seed+1)
+    ncFile = qcio.nc_open_write(os.path.join(data_path,site_name+"_ACCESS.nc"))
+    qcio.nc_write_series(ncFile,ds_alt)
+    return write_controlfiles(data_path,os.path.join(out_path,"controlfiles"),site_name,start_year,years,ts)
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic OzFluxQC benchmark data")
+    parser.add_argument("--years",type=int,default=2,help="number of years of data")
+    parser.add_argument("--time-step",type=int,default=30,choices=[30,60],help="time step, minutes")
+    parser.add_argument("--extra",type=int,default=0,help="number of extra series")
+    parser.add_argument("--gaps",type=float,default=0.05,help="fraction of missing data")
+    parser.add_argument("--seed",type=int,default=0,help="random number seed")
+    parser.add_argument("--site",default="Synthetic",help="site name")
+    parser.add_argument("--out",default=os.path.join("benchmarks","data"),help="output directory")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,format='%(asctime)s %(levelname)s %(message)s',datefmt='%H:%M:%S')
+    generate(args.out,site_name=args.site,years=args.years,ts=args.time_step,
+             extra=args.extra,gaps=args.gaps,seed=args.seed)
@@ -0,0 +1,335 @@
+"""
+Run the OzFluxQC benchmarks on synthetic data and write the timings to a
+JSON file.
+
+Each benchmark case generates a synthetic data set (see generate.py) and
+then times the netCDF read and write paths and the processing levels from
+L2 to L6, including the climatology and CPD steps, in the order they are
+run in a batch job.  The wall clock time and CPU time of each step and the
+peak memory use of the process at the end of each step are written to a
+JSON file together with the git commit and the OzFluxQC version so that
+results from different commits can be compared.
+
+Usage:
+ python benchmarks/run.py [--years 2] [--time-step 30] [--extra 0] [--gaps 0.05]
+                          [--solo-backend python] [--steps L2,L3]
+                          [--output results.json] [--compare old.json]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","scripts"))
+import matplotlib
+matplotlib.use("Agg")
+import numpy
+import cfg
+import qccache
+import qcclim
+import qccpd
+import qcio
+import qcls
+import qcsolo
+import generate
+
+log = logging.getLogger('qc.benchmark')
+
+step_list = ["nc_write","nc_read","nc_read_lazy","L2","L3","climatology","cpd","L4","L5","L6"]
+# steps that use the output of earlier steps, a step is skipped if one of these failed
+step_dependencies = {"L3":["L2"],"climatology":["L3"],"cpd":["L3"],"L4":["L3","climatology"],
+                     "L5":["L4"],"L6":["L5"]}
+
+def get_git_commit():
+    """ Return the git commit of the working tree, or an empty string if it is not known."""
+    try:
+        repo = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+        commit = subprocess.check_output(["git","rev-parse","HEAD"],cwd=repo,stderr=subprocess.STDOUT)
+        return commit.strip()
+    except Exception:
+        return ""
+
+def get_max_rss():
+    """
+    Purpose:
+     Return the peak resident memory of this process in MB.  This is the peak
+     over the life of the process so far, not the peak during the last step,
+     a step only shows up if it uses more memory than all earlier steps.
+    Usage:
+     process_max_rss_mb = get_max_rss()
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OSX and in kB on Linux
+    if sys.platform=="darwin": return max_rss/float(2**20)
+    return max_rss/float(2**10)
+
+def time_step(name,function,*args):
+    """
+    Purpose:
+     Call function(*args) and return a dictionary with the wall clock time,
+     CPU time and the peak memory use of the process at the end of the call.
+     Exceptions, including SystemExit raised by sys.exit in the processing
+     levels, are caught and returned in the dictionary so that one failed
+     step does not stop the benchmark.
+    Usage:
+     result,value = time_step(name,function,*args)
+    """
+    result = {"name":name}
+    t0 = time.time()
+    c0 = os.times()
+    try:
+        value = function(*args)
+        result["status"] = "ok"
+    except (Exception,SystemExit) as e:
+        value = None
+        result["status"] = "error"
+        result["error"] = str(e) if len(str(e))!=0 else e.__class__.__name__
+        log.error(" Benchmark step "+name+" failed")
+        log.error(traceback.format_exc())
+    c1 = os.times()
+    result["seconds"] = time.time()-t0
+    result["cpu_seconds"] = (c1[0]-c0[0])+(c1[1]-c0[1])
+    result["process_max_rss_mb"] = get_max_rss()
+    log.info(" Benchmark step "+name+" took "+"%.2f"%result["seconds"]+" s ("+result["status"]+")")
+    return result,value
+
+def skip_step(name,reason):
+    """ Return the result for a step that was not run, reason says why."""
+    log.warning(" Benchmark step "+name+" skipped, "+reason)
+    return {"name":name,"status":"skipped","reason":reason,"seconds":0.0,"cpu_seconds":0.0,
+            "process_max_rss_mb":get_max_rss()}
+
+def get_missinginputs(cf):
+    """ Return the input files named in the [Files] section of a control file that do not exist."""
+    file_names = [qcio.get_infilenamefromcf(cf)]
+    for item in ["access","climatology"]:
+        if item in cf["Files"]: file_names.append(str(cf["Files"][item]))
+    return [file_name for file_name in file_names if not os.path.isfile(file_name)]
+
+def write_ncfile(nc_name,ds,outputlist=None,write_options=None):
+    """
+    Purpose:
+     Write a data structure to a netCDF file.  If the write fails the file
+     is closed and removed so that later steps do not read a partial file.
+    Usage:
+     write_ncfile(nc_name,ds,outputlist=outputlist,write_options=write_options)
+    """
+    ncFile = qcio.nc_open_write(nc_name)
+    if ncFile=="": raise IOError("unable to open "+nc_name+" for writing")
+    try:
+        qcio.nc_write_series(ncFile,ds,outputlist=outputlist,write_options=write_options)
+    except Exception:
+        exc_info = sys.exc_info()
+        try:
+            ncFile.close()
+        except RuntimeError:
+            # already closed
+            pass
+        if os.path.exists(nc_name): os.remove(nc_name)
+        raise exc_info[0],exc_info[1],exc_info[2]
+
+def get_solobackend():
+    """
+    Purpose:
+     Return the SOLO backend to use, "external" if the SOFM, SOLO and SEQSOLO
+     executables for this platform are in solo/bin, otherwise "python" so
+     that the L5 and L6 steps do not skip the SOLO runs.
+    Usage:
+     solo_backend = get_solobackend()
+    """
+    for name in ["sofm","solo","seqsolo"]:
+        if not os.path.isfile(qcsolo.get_executable(name)):
+            log.warning(" SOLO executables not found in solo/bin, using SOLOBackend = python")
+            return "python"
+    return "external"
+
+def run_level(cfname,level,options=None):
+    """
+    Purpose:
+     Run a processing level the same way batchprocess.py does and return
+     the timings of the read, QC and write parts separately.  The level is
+     skipped if its input files do not exist.  The items in options are
+     added to the [Options] section of the control file.
+    Usage:
+     results = run_level(cfname,"L3")
+    """
+    functions = {"L2":qcls.l2qc,"L3":qcls.l3qc,"L4":qcls.l4qc,"L5":qcls.l5qc,"L6":qcls.l6qc}
+    cf = qcio.get_controlfilecontents(cfname,mode="quiet")
+    if "Options" not in cf: cf["Options"] = {}
+    cf["Options"]["call_mode"] = "batch"
+    cf["Options"]["show_plots"] = False
+    if options is not None: cf["Options"].update(options)
+    missing = get_missinginputs(cf)
+    if len(missing)!=0:
+        return [skip_step(level,"input file "+missing[0]+" not found")]
+    results = []
+    result,ds_in = time_step(level+"_read",qcio.nc_read_series,qcio.get_infilenamefromcf(cf))
+    results.append(result)
+    if result["status"]!="ok": return results
+    result,ds_out = time_step(level,functions[level],cf,ds_in)
+    results.append(result)
+    if result["status"]!="ok": return results
+    if not ds_out:
+        result["status"] = "error"
+        result["error"] = level+" returned no data"
+        return results
+    outputlist = qcio.get_outputlistfromcf(cf,'nc') if level!="L2" else None
+    result,value = time_step(level+"_write",write_ncfile,qcio.get_outfilenamefromcf(cf),ds_out,
+                             outputlist,qcio.get_ncwriteoptionsfromcf(cf))
+    results.append(result)
+    return results
+
+def link_solo(work_path):
+    """
+    Purpose:
+     Make the SOLO executables in the OzFluxQC solo/bin directory available
+     as solo/bin in work_path.  The external SOLO backend looks for them
+     relative to the current directory and the benchmarks are run from
+     work_path so that nothing is written to the OzFluxQC directory.
+    Usage:
+     link_solo(work_path)
+    """
+    solo_bin = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","solo","bin")
+    work_bin = os.path.join(work_path,"solo","bin")
+    if os.path.exists(work_bin) or not os.path.isdir(solo_bin): return
+    if not os.path.isdir(os.path.dirname(work_bin)): os.makedirs(os.path.dirname(work_bin))
+    if hasattr(os,"symlink"):
+        os.symlink(os.path.abspath(solo_bin),work_bin)
+    else:
+        shutil.copytree(solo_bin,work_bin)
+
+def run_case(work_path,years=2,ts=30,extra=0,gaps=0.05,seed=0,steps=None,solo_backend="external"):
+    """
+    Purpose:
+     Generate a synthetic data set in work_path and run the benchmark steps.
+     A step is recorded as "skipped" if a step it depends on (see
+     step_dependencies) did not complete or if its input files do not exist.
+     The solar geometry and model caches are kept in work_path so that the
+     timings do not depend on what is in the user's cache.
+    Usage:
+     results = run_case(work_path,years=2,ts=30)
+    """
+    if steps is None: steps = step_list
+    qccache.solar_cache_options["directory"] = os.path.join(work_path,"cache","solar")
+    qccache.model_cache_options["directory"] = os.path.join(work_path,"cache","models")
+    results = []
+    t0 = time.time()
+    cf_names = generate.generate(work_path,years=years,ts=ts,extra=extra,gaps=gaps,seed=seed)
+    results.append({"name":"generate","status":"ok","seconds":time.time()-t0,
+                    "cpu_seconds":0,"process_max_rss_mb":get_max_rss()})
+    l1_name = os.path.join(work_path,"Data","Synthetic_L1.nc")
+    if "nc_read" in steps or "nc_write" in steps:
+        ds = qcio.nc_read_series(l1_name)
+        if "nc_write" in steps:
+            nc_name = os.path.join(work_path,"Data","nc_write.nc")
+            results.append(time_step("nc_write",write_ncfile,nc_name,ds)[0])
+        if "nc_read" in steps:
+            results.append(time_step("nc_read",qcio.nc_read_series,l1_name)[0])
+        del ds
+    if "nc_read_lazy" in steps:
+        def read_lazy(nc_name):
+            ds = qcio.nc_read_series(nc_name,lazy=True)
+            # touch every series so the timing includes reading the data
+            for label in ds.series.keys(): ds.series[label]["Data"]
+            return ds
+        results.append(time_step("nc_read_lazy",read_lazy,l1_name)[0])
+    # status of each processing step, "ok" only if all of its parts were ok
+    status = {}
+    for step in steps:
+        if step not in cf_names: continue
+        failed = [item for item in step_dependencies.get(step,[]) if status.get(item,"ok")!="ok"]
+        if len(failed)!=0:
+            step_results = [skip_step(step,"depends on "+failed[0]+" which did not complete")]
+        elif step in ["L2","L3","L4","L5","L6"]:
+            step_results = run_level(cf_names[step],step,options={"SOLOBackend":solo_backend})
+        else:
+            cf = qcio.get_controlfilecontents(cf_names[step],mode="quiet")
+            if "Options" not in cf: cf["Options"] = {}
+            cf["Options"]["call_mode"] = "batch"
+            cf["Options"]["show_plots"] = False
+            missing = get_missinginputs(cf)
+            if len(missing)!=0:
+                step_results = [skip_step(step,"input file "+missing[0]+" not found")]
+            elif step=="climatology":
+                step_results = [time_step(step,qcclim.climatology,cf)[0]]
+            else:
+                step_results = [time_step(step,qccpd.cpd_main,cf)[0]]
+        statuses = [result["status"] for result in step_results]
+        status[step] = "ok" if statuses.count("ok")==len(statuses) else "failed"
+        results = results+step_results
+    return results
+
+def compare(results,old_name):
+    """ Print the ratio of the step times in results to those in an earlier results file."""
+    with open(old_name,'r') as f:
+        old = json.load(f)
+    old_steps = dict([(step["name"],step) for step in old["steps"]])
+    print "%-20s %10s %10s %8s"%("step","old (s)","new (s)","ratio")
+    for step in results["steps"]:
+        if step["name"] not in old_steps: continue
+        old_step = old_steps[step["name"]]
+        if step["status"]!="ok" or old_step["status"]!="ok":
+            # only steps that completed in both runs are compared
+            print "%-20s %10s %10s %8s"%(step["name"],old_step["status"],step["status"],"-")
+            continue
+        t_old = old_step["seconds"]
+        t_new = step["seconds"]
+        ratio = t_new/t_old if t_old>0 else numpy.nan
+        print "%-20s %10.3f %10.3f %8.2f"%(step["name"],t_old,t_new,ratio)
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Run the OzFluxQC benchmarks on synthetic data")
+    parser.add_argument("--years",type=int,default=2,help="number of years of data")
+    parser.add_argument("--time-step",type=int,default=30,choices=[30,60],help="time step, minutes")
+    parser.add_argument("--extra",type=int,default=0,help="number of extra series")
+    parser.add_argument("--gaps",type=float,default=0.05,help="fraction of missing data")
+    parser.add_argument("--seed",type=int,default=0,help="random number seed")
+    parser.add_argument("--solo-backend",default=None,choices=["external","python"],
+                        help="SOLO backend for L5 and L6, default is external if the executables are in solo/bin")
+    parser.add_argument("--steps",default=",".join(step_list),help="comma separated list of steps to run")
+    parser.add_argument("--work",default=None,help="working directory, default is a temporary directory")
+    parser.add_argument("--output",default=None,help="JSON results file")
+    parser.add_argument("--compare",default=None,help="earlier JSON results file to compare with")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,format='%(asctime)s %(levelname)s %(message)s',datefmt='%H:%M:%S')
+    work_path = args.work
+    if work_path is None: work_path = tempfile.mkdtemp(prefix="ozfluxqc_benchmark_")
+    work_path = os.path.abspath(work_path)
+    if args.output is not None: args.output = os.path.abspath(args.output)
+    if args.compare is not None: args.compare = os.path.abspath(args.compare)
+    # run from the work directory, the external SOLO backend finds the
+    # executables in solo/bin relative to the current directory
+    if not os.path.isdir(work_path): os.makedirs(work_path)
+    link_solo(work_path)
+    cwd = os.getcwd()
+    os.chdir(work_path)
+    steps = [step.strip() for step in args.steps.split(",")]
+    solo_backend = args.solo_backend
+    if solo_backend is None: solo_backend = get_solobackend()
+    case = {"years":args.years,"time_step":args.time_step,"extra":args.extra,
+            "gaps":args.gaps,"seed":args.seed,"solo_backend":solo_backend}
+    try:
+        steps = run_case(work_path,steps=steps,years=args.years,ts=args.time_step,
+                         extra=args.extra,gaps=args.gaps,seed=args.seed,
+                         solo_backend=solo_backend)
+    finally:
+        os.chdir(cwd)
+        if args.work is None: shutil.rmtree(work_path,ignore_errors=True)
+    results = {"case":case,"steps":steps,"git_commit":get_git_commit(),
+               "version":cfg.version_name+" "+cfg.version_number,
+               "python":platform.python_version(),"numpy":numpy.__version__,
+               "platform":platform.platform(),"date":str(datetime.datetime.now())}
+    if args.output is None:
+        args.output = "benchmark_"+datetime.datetime.now().strftime("%Y%m%d%H%M")+".json"
+    with open(args.output,'w') as f:
+        json.dump(results,f,indent=1,sort_keys=True)
+    log.info(" Results written to "+args.output)
+    if args.compare is not None: compare(results,args.compare)
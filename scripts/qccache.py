@@ -0,0 +1,503 @@
+import hashlib
+import json
+import logging
+import numpy
+import os
+import time
+import zipfile
+import cfg
+import solarposition
+
+log = logging.getLogger('qc.cache')
+
+# default cache directory, per user so that the caches are not written to the
+# OzFluxQC directory or to whatever the current directory happens to be
+default_directory = os.path.join(os.path.expanduser("~"),".ozfluxqc","cache")
+# options for the solar geometry cache, set from the batch control file by
+# set_solarcacheoptions, the defaults are used by the GUI
+solar_cache_options = {"enabled":True,"directory":os.path.join(default_directory,"solar"),"max_mb":500.0}
+# change this if the way the solar altitude or synthetic Fsd are calculated changes
+solar_cache_version = "1"
+# options for the trained model cache used by SOLO and FFNET, set from the batch
+# control file by set_modelcacheoptions, the defaults are used by the GUI
+model_cache_options = {"enabled":True,"directory":os.path.join(default_directory,"models"),"max_mb":200.0}
+# change this if the way SOLO or FFNET are trained changes
+model_cache_version = "1"
+# digest of the OzFluxQC code, see get_codedigest
+code_digest = {}
+
+def file_digest(file_name,blocksize=2**20):
+    """
+    Purpose:
+     Return the SHA1 digest of the contents of a file.
+    Usage:
+     digest = qccache.file_digest(file_name)
+    """
+    sha = hashlib.sha1()
+    with open(file_name,'rb') as f:
+        while True:
+            block = f.read(blocksize)
+            if len(block)==0: break
+            sha.update(block)
+    return sha.hexdigest()
+
+def file_stat(file_name):
+    """ Return the size and modification time of a file."""
+    s = os.stat(file_name)
+    return {"size":s.st_size,"mtime":s.st_mtime}
+
+def get_codedigest(file_names):
+    """
+    Purpose:
+     Return the SHA1 digest of the contents of a list of files, for example
+     the OzFluxQC scripts.  The digest is only calculated once for each list.
+    Usage:
+     digest = qccache.get_codedigest(file_names)
+    """
+    names = tuple(sorted(file_names))
+    if names not in code_digest:
+        sha = hashlib.sha1()
+        for file_name in names:
+            sha.update(os.path.basename(file_name))
+            if os.path.isfile(file_name): sha.update(file_digest(file_name))
+        code_digest[names] = sha.hexdigest()
+    return code_digest[names]
+
+def get_scriptfiles():
+    """ Return the names of the OzFluxQC scripts, the Python files in the directory of this module."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return [os.path.join(script_dir,item) for item in os.listdir(script_dir) if item.endswith(".py")]
+
+def get_cachekey(level,cfname,options=None):
+    """
+    Purpose:
+     Return the cache key for a job.  The key is a SHA1 digest of the level,
+     the control file name and contents, any batch options passed on to the
+     control file, the OzFluxQC version number and the digest of the
+     OzFluxQC scripts.  The input files are not part of the key, they are
+     checked against the cache entry when it is looked up.
+    Usage:
+     key = qccache.get_cachekey(level,cfname,options=batch_options)
+    """
+    sha = hashlib.sha1()
+    sha.update(level.lower())
+    sha.update(os.path.abspath(cfname))
+    with open(cfname,'rb') as f:
+        sha.update(f.read())
+    if options is not None:
+        sha.update(json.dumps(options,sort_keys=True))
+    sha.update(cfg.version_number)
+    sha.update(get_codedigest(get_scriptfiles()))
+    return sha.hexdigest()
+
+def get_entryname(cache_dir,key):
+    return os.path.join(cache_dir,key+".json")
+
+def read_entry(cache_dir,key):
+    """ Read a cache entry, returns None if it does not exist or can't be read."""
+    entry_name = get_entryname(cache_dir,key)
+    if not os.path.isfile(entry_name): return None
+    try:
+        with open(entry_name,'r') as f:
+            return json.load(f)
+    except (IOError,ValueError):
+        return None
+
+def write_entry(cache_dir,key,entry):
+    """ Write a cache entry, the entry is renamed into place so readers never see a partial file."""
+    if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+    entry_name = get_entryname(cache_dir,key)
+    tmp_name = entry_name+"."+str(os.getpid())+".tmp"
+    with open(tmp_name,'w') as f:
+        json.dump(entry,f,indent=1,sort_keys=True)
+    if os.path.exists(entry_name): os.remove(entry_name)
+    os.rename(tmp_name,entry_name)
+
+def check_entry(cache_dir,key,infiles):
+    """
+    Purpose:
+     Check whether the outputs recorded in the cache entry for key are still
+     valid.  The entry is valid if the input files are the same as when the
+     entry was written and the output files have not changed since.  Input
+     files whose size or modification time have changed are compared using
+     the digest of their contents so that a file that has been rewritten
+     with the same contents does not invalidate the entry.
+    Usage:
+     valid = qccache.check_entry(cache_dir,key,infiles)
+    """
+    entry = read_entry(cache_dir,key)
+    if entry is None: return False
+    if sorted(entry["inputs"].keys())!=sorted(infiles): return False
+    updated = False
+    for file_name in infiles:
+        if not os.path.isfile(file_name): return False
+        stat = file_stat(file_name)
+        recorded = entry["inputs"][file_name]
+        if stat["size"]!=recorded["size"]: return False
+        if stat["mtime"]!=recorded["mtime"]:
+            if file_digest(file_name)!=recorded["sha1"]: return False
+            recorded["mtime"] = stat["mtime"]
+            updated = True
+    if len(entry["outputs"])==0: return False
+    for file_name in entry["outputs"].keys():
+        if not os.path.isfile(file_name): return False
+        if file_stat(file_name)!=entry["outputs"][file_name]: return False
+    entry["last_used"] = time.time()
+    write_entry(cache_dir,key,entry)
+    if updated:
+        log.info(" Input files touched but unchanged for "+entry["cfname"])
+    return True
+
+def add_entry(cache_dir,key,level,cfname,infiles,outfiles):
+    """
+    Purpose:
+     Record the input and output files of a job that has just run.  Nothing
+     is recorded if any of the output files does not exist.
+    Usage:
+     qccache.add_entry(cache_dir,key,level,cfname,infiles,outfiles)
+    """
+    outfiles = [f for f in outfiles if os.path.isfile(f)]
+    if len(outfiles)==0: return
+    entry = {"level":level,"cfname":os.path.abspath(cfname),"version":cfg.version_number,
+             "created":time.time(),"last_used":time.time(),"inputs":{},"outputs":{}}
+    for file_name in infiles:
+        if not os.path.isfile(file_name): return
+        entry["inputs"][file_name] = file_stat(file_name)
+        entry["inputs"][file_name]["sha1"] = file_digest(file_name)
+    for file_name in outfiles:
+        entry["outputs"][file_name] = file_stat(file_name)
+    write_entry(cache_dir,key,entry)
+
+def remove_entry(cache_dir,key):
+    entry_name = get_entryname(cache_dir,key)
+    if os.path.exists(entry_name): os.remove(entry_name)
+
+def evict(cache_dir,max_entries=1000,max_age=90):
+    """
+    Purpose:
+     Remove cache entries that have not been used for more than max_age
+     days, then remove the least recently used entries until there are no
+     more than max_entries left.
+    Usage:
+     qccache.evict(cache_dir,max_entries=1000,max_age=90)
+    """
+    if not os.path.isdir(cache_dir): return
+    entries = []
+    for item in os.listdir(cache_dir):
+        if not item.endswith(".json"): continue
+        key = item[:-len(".json")]
+        entry = read_entry(cache_dir,key)
+        last_used = 0 if entry is None else entry.get("last_used",0)
+        entries.append((last_used,key))
+    entries.sort(reverse=True)
+    now = time.time()
+    nremoved = 0
+    for n,(last_used,key) in enumerate(entries):
+        if n>=max_entries or (now-last_used)>max_age*86400:
+            remove_entry(cache_dir,key)
+            nremoved = nremoved + 1
+    if nremoved!=0:
+        log.info(" Removed "+str(nremoved)+" entries from cache "+cache_dir)
+
+def clear(cache_dir):
+    """ Remove all entries from the cache."""
+    evict(cache_dir,max_entries=0)
+
+def set_solarcacheoptions(cache_options):
+    """
+    Purpose:
+     Set the solar geometry cache options from the result cache options
+     returned by qcio.get_cacheoptionsfromcf.  The solar geometry cache is
+     kept in the "solar" sub-directory of the cache directory.
+    Usage:
+     qccache.set_solarcacheoptions(cache_options)
+    """
+    solar_cache_options["enabled"] = cache_options["solar_enabled"]
+    solar_cache_options["directory"] = os.path.join(cache_options["directory"],"solar")
+    solar_cache_options["max_mb"] = cache_options["solar_max_mb"]
+
+def get_solarkey(latitude,longitude,ts):
+    """ Return the cache key for the solar geometry at a site and time step."""
+    sha = hashlib.sha1()
+    sha.update("%.6f,%.6f,%d,"%(float(latitude),float(longitude),int(ts)))
+    sha.update(solar_cache_version)
+    return sha.hexdigest()
+
+def get_solardataname(cache_dir,key):
+    return os.path.join(cache_dir,key+".dat")
+
+def calculate_solar(latitude,longitude,dt64):
+    """ Return the solar altitude and synthetic Fsd as the columns of an array."""
+    if len(dt64)==0: return numpy.zeros((0,2),dtype=numpy.float64)
+    alt_solar = solarposition.GetAltitude(latitude,longitude,dt64)
+    Fsd_syn = solarposition.GetRadiationDirect(dt64,alt_solar)
+    return numpy.column_stack((alt_solar,Fsd_syn))
+
+def read_solardata(cache_dir,key,entry):
+    """ Memory map the solar geometry for a cache entry, returns None if it can't be read."""
+    data_name = get_solardataname(cache_dir,key)
+    if not os.path.isfile(data_name): return None
+    if os.path.getsize(data_name)!=entry["nrecs"]*2*8: return None
+    return numpy.memmap(data_name,dtype=numpy.float64,mode='r',shape=(entry["nrecs"],2))
+
+def write_solardata(cache_dir,key,entry,data):
+    """ Write the solar geometry and its cache entry, the data file is renamed into place."""
+    if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+    data_name = get_solardataname(cache_dir,key)
+    tmp_name = data_name+"."+str(os.getpid())+".tmp"
+    numpy.ascontiguousarray(data,dtype=numpy.float64).tofile(tmp_name)
+    if os.path.exists(data_name): os.remove(data_name)
+    os.rename(tmp_name,data_name)
+    entry["nrecs"] = len(data)
+    write_entry(cache_dir,key,entry)
+
+def get_solar(latitude,longitude,ts,ldt_UTC):
+    """
+    Purpose:
+     Return the solar altitude and the synthetic downwelling shortwave
+     radiation at the UTC times in ldt_UTC.  These only depend on the site
+     location and the time so they are cached on disk, one entry for each
+     latitude, longitude and time step.  An entry holds the values for a
+     regular series of times, the requested times are read from the entry
+     (memory mapped) if the entry covers them, otherwise only the missing
+     records at the start or end are calculated and the entry is extended.
+     If the gap between the entry and the requested times is longer than the
+     request the entry is replaced instead, so the entry does not grow to
+     cover all of the time between widely separated requests.
+     The cache is not used if the times are not on a regular time step.
+    Usage:
+     alt_solar,Fsd_syn = qccache.get_solar(latitude,longitude,ts,ldt_UTC)
+     where latitude and longitude are the site location in degrees
+           ts is the time step in minutes
+           ldt_UTC is a list of UTC datetimes or an array of datetime64
+    """
+    dt64 = solarposition.GetDatetime64(ldt_UTC)
+    nRecs = len(dt64)
+    step = numpy.timedelta64(int(ts)*60*1000000,"us")
+    if (not solar_cache_options["enabled"] or nRecs==0 or
+        not numpy.all(numpy.diff(dt64)==step)):
+        data = calculate_solar(latitude,longitude,dt64)
+        return data[:,0],data[:,1]
+    cache_dir = solar_cache_options["directory"]
+    key = get_solarkey(latitude,longitude,ts)
+    entry = read_entry(cache_dir,key)
+    cached = None
+    if entry is not None and entry.get("version")==solar_cache_version:
+        cached = read_solardata(cache_dir,key,entry)
+    if cached is not None:
+        entry_start = numpy.datetime64(entry["start"],"us")
+        offset = (dt64[0]-entry_start).astype(numpy.int64)
+        if offset%step.astype(numpy.int64)!=0:
+            # the times are not on the same grid as the entry, replace it
+            cached = None
+    if cached is not None:
+        # index of the first requested time in the entry, may be negative
+        i0 = int(offset//step.astype(numpy.int64))
+        i1 = i0+nRecs
+        # number of records between the entry and the requested times
+        ngap = max(0,i0-entry["nrecs"])+max(0,-i1)
+        if ngap>nRecs:
+            # the gap is longer than the request, replace the entry
+            cached = None
+    if cached is None:
+        data = calculate_solar(latitude,longitude,dt64)
+        entry = {"latitude":float(latitude),"longitude":float(longitude),"time_step":int(ts),
+                 "version":solar_cache_version,"start":str(dt64[0]),"created":time.time(),
+                 "last_used":time.time()}
+        write_solardata(cache_dir,key,entry,data)
+        log.info(" Solar geometry calculated and added to cache")
+        evict_solar(cache_dir,max_mb=solar_cache_options["max_mb"],keep=key)
+        return data[:,0],data[:,1]
+    entry["last_used"] = time.time()
+    if i0>=0 and i1<=entry["nrecs"]:
+        data = numpy.array(cached[i0:i1])
+        del cached
+        write_entry(cache_dir,key,entry)
+        log.info(" Solar geometry read from cache")
+        return data[:,0],data[:,1]
+    # extend the entry with the records missing at the start and the end
+    nbefore = max(0,-i0)
+    nafter = max(0,i1-entry["nrecs"])
+    entry_start = numpy.datetime64(entry["start"],"us")
+    entry_end = entry_start+(entry["nrecs"]-1)*step
+    before = calculate_solar(latitude,longitude,entry_start-step*numpy.arange(nbefore,0,-1))
+    after = calculate_solar(latitude,longitude,entry_end+step*numpy.arange(1,nafter+1))
+    extended = numpy.concatenate((before,numpy.array(cached),after))
+    del cached
+    entry["start"] = str(entry_start-nbefore*step)
+    write_solardata(cache_dir,key,entry,extended)
+    log.info(" Solar geometry cache extended by "+str(nbefore+nafter)+" records")
+    evict_solar(cache_dir,max_mb=solar_cache_options["max_mb"],keep=key)
+    i0 = i0+nbefore
+    data = extended[i0:i0+nRecs]
+    return data[:,0],data[:,1]
+
+def evict_bysize(cache_dir,max_mb,suffix,keep=None,description="cache"):
+    """
+    Purpose:
+     Remove the least recently used entries from a cache directory until the
+     data files (the entry key followed by suffix) take up no more than max_mb
+     megabytes.  The entry given by keep is not removed.
+    Usage:
+     qccache.evict_bysize(cache_dir,500,".dat",description="solar geometry cache")
+    """
+    if not os.path.isdir(cache_dir): return
+    entries = []
+    total = 0
+    for item in os.listdir(cache_dir):
+        if not item.endswith(".json"): continue
+        key = item[:-len(".json")]
+        entry = read_entry(cache_dir,key)
+        last_used = 0 if entry is None else entry.get("last_used",0)
+        data_name = os.path.join(cache_dir,key+suffix)
+        size = os.path.getsize(data_name) if os.path.isfile(data_name) else 0
+        total = total + size
+        entries.append((last_used,key,size))
+    entries.sort()
+    nremoved = 0
+    for last_used,key,size in entries:
+        if total<=max_mb*2**20: break
+        if key==keep: continue
+        remove_entry(cache_dir,key)
+        data_name = os.path.join(cache_dir,key+suffix)
+        if os.path.exists(data_name): os.remove(data_name)
+        total = total - size
+        nremoved = nremoved + 1
+    if nremoved!=0:
+        log.info(" Removed "+str(nremoved)+" entries from "+description+" "+cache_dir)
+
+def evict_solar(cache_dir,max_mb=500.0,keep=None):
+    """
+    Purpose:
+     Remove the least recently used solar geometry cache entries until the
+     data files take up no more than max_mb megabytes.  The entry given by
+     keep is not removed.
+    Usage:
+     qccache.evict_solar(cache_dir,max_mb=500)
+    """
+    evict_bysize(cache_dir,max_mb,".dat",keep=keep,description="solar geometry cache")
+
+def clear_solar(cache_dir):
+    """ Remove all entries from the solar geometry cache."""
+    evict_solar(cache_dir,max_mb=0)
+
+def set_modelcacheoptions(cache_options):
+    """
+    Purpose:
+     Set the trained model cache options from the result cache options
+     returned by qcio.get_cacheoptionsfromcf.  The model cache is kept in
+     the "models" sub-directory of the cache directory.
+    Usage:
+     qccache.set_modelcacheoptions(cache_options)
+    """
+    model_cache_options["enabled"] = cache_options["model_enabled"]
+    model_cache_options["directory"] = os.path.join(cache_options["directory"],"models")
+    model_cache_options["max_mb"] = cache_options["model_max_mb"]
+
+def get_modelkey(kind,arrays,settings):
+    """
+    Purpose:
+     Return the cache key for a trained model.  The key is a hash of the
+     contents of the arrays used to train the model and make the predictions,
+     the settings (hyperparameters and the window start and end) and the
+     kind of model ("solo" or "ffnet").
+    Usage:
+     key = qccache.get_modelkey("solo",[drivers,target],settings)
+     where settings is a dictionary
+    """
+    sha = hashlib.sha1()
+    sha.update(kind+","+model_cache_version+",")
+    for data in arrays:
+        data = numpy.ascontiguousarray(data,dtype=numpy.float64)
+        sha.update(str(data.shape))
+        sha.update(data)
+    sha.update(json.dumps(settings,sort_keys=True))
+    return sha.hexdigest()
+
+def get_codekey(key,file_names):
+    """
+    Purpose:
+     Return a model cache key that also depends on the contents of the files
+     used to train the model, for example qcsolo.py or the SOLO executables,
+     so that models trained by a different version of the code are not used.
+    Usage:
+     key = qccache.get_codekey(qccache.get_modelkey("solo",arrays,settings),file_names)
+    """
+    sha = hashlib.sha1()
+    sha.update(key)
+    sha.update(get_codedigest(file_names))
+    return sha.hexdigest()
+
+def get_modeldataname(cache_dir,key):
+    return os.path.join(cache_dir,key+".npz")
+
+def get_model(key):
+    """
+    Purpose:
+     Return the arrays stored for a trained model as a dictionary, None if
+     the model cache is not enabled or the model is not in the cache.  An
+     entry whose data file can not be read is removed from the cache.
+    Usage:
+     model = qccache.get_model(key)
+    """
+    if not model_cache_options["enabled"]: return None
+    cache_dir = model_cache_options["directory"]
+    entry = read_entry(cache_dir,key)
+    if entry is None or entry.get("version")!=model_cache_version: return None
+    data_name = get_modeldataname(cache_dir,key)
+    try:
+        with open(data_name,'rb') as f:
+            npz = numpy.load(f)
+            model = dict([(item,npz[item]) for item in npz.files])
+    except (IOError,ValueError,zipfile.BadZipfile):
+        # missing, truncated or corrupt, remove the entry so it is not tried again
+        log.warning(" Unable to read model "+key+" from the model cache, removing it")
+        remove_entry(cache_dir,key)
+        if os.path.exists(data_name): os.remove(data_name)
+        return None
+    entry["last_used"] = time.time()
+    write_entry(cache_dir,key,entry)
+    return model
+
+def put_model(key,kind,model):
+    """
+    Purpose:
+     Store the arrays for a trained model (eg the weights, the SOFM codebook
+     and the predictions) in the model cache.  The size of the cache is not
+     checked here, see evict_modelcache.
+    Usage:
+     qccache.put_model(key,"solo",{"modelled":modelled,"index":index})
+    """
+    if not model_cache_options["enabled"]: return
+    cache_dir = model_cache_options["directory"]
+    if not os.path.isdir(cache_dir): os.makedirs(cache_dir)
+    data_name = get_modeldataname(cache_dir,key)
+    tmp_name = data_name+"."+str(os.getpid())+".tmp"
+    with open(tmp_name,'wb') as f:
+        numpy.savez(f,**model)
+    if os.path.exists(data_name): os.remove(data_name)
+    os.rename(tmp_name,data_name)
+    entry = {"kind":kind,"version":model_cache_version,"created":time.time(),"last_used":time.time()}
+    write_entry(cache_dir,key,entry)
+
+def evict_modelcache():
+    """
+    Purpose:
+     Remove the least recently used models if the model cache is larger than
+     the maximum size.  This scans the whole cache so it is called once at
+     the end of L5 and L6 rather than each time a model is stored.
+    Usage:
+     qccache.evict_modelcache()
+    """
+    if not model_cache_options["enabled"]: return
+    cache_dir = model_cache_options["directory"]
+    if not os.path.isdir(cache_dir): return
+    evict_models(cache_dir,max_mb=model_cache_options["max_mb"])
+
+def evict_models(cache_dir,max_mb=200.0,keep=None):
+    """ Remove the least recently used models until the cache is no larger than max_mb megabytes."""
+    evict_bysize(cache_dir,max_mb,".npz",keep=keep,description="model cache")
+
+def clear_models(cache_dir):
+    """ Remove all entries from the model cache."""
+    evict_models(cache_dir,max_mb=0)
@@ -4,6 +4,7 @@ import constants as c
 import datetime
 import numpy
 import time
+import qcprof
 import qcrp
 import qcts
 import qcutils
@@ -11,6 +12,7 @@ import logging
 
 log = logging.getLogger('qc.ck')
 
+@qcprof.profile
 def ApplyTurbulenceFilter(cf,ds,ustar_threshold=None):
     """
     Purpose:
@@ -31,12 +33,12 @@ def ApplyTurbulenceFilter(cf,ds,ustar_threshold=None):
         ustar_dict = qcrp.get_ustar_thresholds_annual(ldt,ustar_threshold)
     # initialise a dictionary for the indicator series
     indicators = {}
-    # get data for the indicator series
-    ustar,ustar_flag,ustar_attr = qcutils.GetSeriesasMA(ds,"ustar")
-    Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd")
+    # get data for the indicator series, these are only read so get views
+    ustar,ustar_flag,ustar_attr = qcutils.GetSeriesasMA(ds,"ustar",copy=False)
+    Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd",copy=False)
     if "solar_altitude" not in ds.series.keys(): qcts.get_synthetic_fsd(ds)
-    Fsd_syn,f,a = qcutils.GetSeriesasMA(ds,"Fsd_syn")
-    sa,f,a = qcutils.GetSeriesasMA(ds,"solar_altitude")
+    Fsd_syn,f,a = qcutils.GetSeriesasMA(ds,"Fsd_syn",copy=False)
+    sa,f,a = qcutils.GetSeriesasMA(ds,"solar_altitude",copy=False)
     # get the turbulence indicator series
     if opt["turbulence_filter"].lower()=="ustar":
         # indicators["turbulence"] = 1 ==> turbulent, indicators["turbulence"] = 0 ==> not turbulent
@@ -201,6 +203,7 @@ def rangecheckseriesupper(data,upper):
         data[index] = numpy.float64(c.missing_value)
     return data
 
+@qcprof.profile
 def CoordinateFluxGaps(cf,ds,Fc_in='Fc',Fe_in='Fe',Fh_in='Fh'):
     if not qcutils.cfoptionskeylogical(cf,Key='CoordinateFluxGaps'): return
     if qcutils.cfkeycheck(cf,Base='FunctionArgs',ThisOne='gapsvars'):
@@ -238,6 +241,7 @@ def CoordinateFluxGaps(cf,ds,Fc_in='Fc',Fe_in='Fe',Fh_in='Fh'):
     ds.series[Fh_in]['Data']=numpy.ma.filled(Fh,float(c.missing_value))
     log.info(' Finished gap co-ordination')
 
+@qcprof.profile
 def CreateNewSeries(cf,ds):
     '''Create a new series using the MergeSeries or AverageSeries instructions.'''
     log.info(' Checking for new series to create')
@@ -247,6 +251,7 @@ def CreateNewSeries(cf,ds):
         if 'AverageSeries' in cf['Variables'][ThisOne].keys():
             qcts.AverageSeriesByElements(cf,ds,ThisOne)
 
+@qcprof.profile
 def do_IRGAcheck(cf,ds):
     """
     Purpose:
@@ -398,6 +403,7 @@ def do_EC155check(cf,ds):
     if 'EC155Check' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+',EC155Check'
 
+@qcprof.profile
 def CoordinateAh7500AndFcGaps(cf,ds,Fcvar='Fc'):
     '''Cleans up Ah_7500_Av based upon Fc gaps to for QA check on Ah_7500_Av v Ah_HMP.'''
     if not qcutils.cfoptionskeylogical(cf,Key='CoordinateAh7500&FcGaps'): return
@@ -418,6 +424,7 @@ def CoordinateAh7500AndFcGaps(cf,ds,Fcvar='Fc'):
     if 'CoordinateAh7500AndFcGaps' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+',CoordinateAh7500AndFcGaps'
 
+@qcprof.profile
 def do_CSATcheck(cf,ds):
     '''Rejects data values for series specified in CSATList for times when the Diag_CSAT
        flag is non-zero.  If the Diag_CSAT flag is not present in the data structure passed
@@ -446,6 +453,7 @@ def do_CSATcheck(cf,ds):
     if 'CSATCheck' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+',CSATCheck'
 
+@qcprof.profile
 def do_dependencycheck(cf,ds,section='',series='',code=23,mode="quiet"):
     if len(section)==0 and len(series)==0: return
     if len(section)==0: section = qcutils.get_cfsection(cf,series=series,mode='quiet')
@@ -563,6 +571,7 @@ def do_excludehours(cf,ds,section='',series='',code=7):
     if 'ExcludeHours' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+',ExcludeHours'
 
+@qcprof.profile
 def do_linear(cf,ds):
     level = ds.globalattributes['nc_level']
     for ThisOne in cf['Variables'].keys():
@@ -602,6 +611,7 @@ def do_rangecheck(cf,ds,section='',series='',code=2):
     if 'RangeCheck' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+',RangeCheck'
 
+@qcprof.profile
 def do_qcchecks(cf,ds,mode="verbose"):
     if "nc_level" in ds.globalattributes:
         level = str(ds.globalattributes["nc_level"])
@@ -641,6 +651,7 @@ def do_qcchecks(cf,ds,mode="verbose"):
         # if so, do dependency check
         do_dependencycheck(cf,ds,section=section,series=series,code=23,mode="quiet")
 
+@qcprof.profile
 def do_qcchecks_oneseries(cf,ds,section='',series=''):
     if len(section)==0:
         section = qcutils.get_cfsection(cf,series=series,mode='quiet')
@@ -363,7 +363,7 @@ def CPD_run(cf):
             names[item] = item
     # read the netcdf file
     log.info(' Reading netCDF file '+file_in)   
-    ds = qcio.nc_read_series(file_in)
+    ds = qcio.nc_read_series(file_in,lazy=True)
     dates_list = ds.series["DateTime"]["Data"]
     nrecs = int(ds.globalattributes["nc_nrecs"])
     # now get the data
@@ -373,6 +373,7 @@ def CPD_run(cf):
         data,flag,attr = qcutils.GetSeries(ds,item)
         d[item] = np.where(data==c.missing_value,np.nan,data)
         f[item] = flag
+    qcio.nc_close_series(ds)
     # set all data to NaNs if any flag not 0 or 10
     for item in f.keys():
         for f_OK in [0,10]:
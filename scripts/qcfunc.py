@@ -1,9 +1,12 @@
 import datetime
 import dateutil
+import logging
 import meteorologicalfunctions as mf
 import numpy
 import qcutils
 
+log = logging.getLogger('qc.func')
+
 def AhfromRH(ds,Ah_out,RH_in,Ta_in):
     """
     Purpose:
@@ -99,14 +102,15 @@ def DateTimeFromDoY(ds,Year_in,DoY_in,Hdh_in):
     ds.globalattributes["nc_nrecs"] = nRecs
     return 1
 
-def DateTimeFromTimeStamp(ds,TimeStamp_in):
+def DateTimeFromTimeStamp(ds,TimeStamp_in,fmt=None):
     if TimeStamp_in not in ds.series.keys():
         log.error(" Required series "+TimeStamp_in+" not found")
         return 0
-    TimeStamp = ds.series[TimeStamp_in]["Data"]
+    TimeStamp = numpy.array(ds.series[TimeStamp_in]["Data"],dtype=str)
     # guard against empty fields in what we assume is the datetime
-    idx = [i for i in range(len(TimeStamp)) if len(str(TimeStamp[i]))>0]
-    dt = [dateutil.parser.parse(str(TimeStamp[i])) for i in idx]
+    idx = numpy.where(numpy.core.defchararray.str_len(TimeStamp)>0)[0]
+    # parse the timestamps in one go
+    dt = qcutils.convert_stringtodatetime(TimeStamp[idx],fmt=fmt)
     # we have finished with the timestamp so delete it from the data structure
     del ds.series[TimeStamp_in]
     nRecs = len(dt)
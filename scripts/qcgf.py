@@ -2,7 +2,6 @@ import ast
 from calendar import isleap
 from configobj import ConfigObj
 import constants as c
-import csv
 import datetime
 import dateutil
 import logging
@@ -11,17 +10,17 @@ import matplotlib as mpl
 import matplotlib.dates as mdt
 import matplotlib.pyplot as plt
 import os
-import platform
 import pylab
 import qcck
 import qcio
+import qcprof
+import qcsolo
 import qcts
 import qcutils
 import scipy
 import scipy.odr
 import shutil
 import statsmodels.api as sm
-import subprocess
 import sys
 import Tkinter
 import xlrd
@@ -29,6 +28,7 @@ import xlrd
 log = logging.getLogger('qc.gf')
 
 # GapFillParseControlFile parses the L4 control file
+@qcprof.profile
 def GapFillParseControlFile(cf,ds,series,ds_alt):
     # find the section containing the series
     section = qcutils.get_cfsection(cf,series=series,mode="quiet")
@@ -161,6 +161,7 @@ def GapFillFluxUsingMDS(cf,ds,series=""):
         return
 
 # functions for GapFillFromClimatology
+@qcprof.profile
 def GapFillFromClimatology(ds):
     '''
     Gap fill missing data using data from the climatology spreadsheet produced by
@@ -245,6 +246,7 @@ def gfClimatology_createdict(cf,ds,series):
             data,flag,attr = qcutils.MakeEmptySeries(ds,output)
             qcutils.CreateSeries(ds,output,data,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def gfClimatology_interpolateddaily(ds,series,output,xlbooks):
     """ 
     Gap fill using data interpolated over a 2D array where the days are
@@ -306,6 +308,7 @@ def gfClimatology_interpolateddaily(ds,series,output,xlbooks):
     # put the gap filled data back into the data structure
     qcutils.CreateSeries(ds,output,data,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def gfClimatology_monthly(ds,series,output,xlbook):
     """ Gap fill using monthly climatology."""
     thissheet = xlbook.sheet_by_name(series)
@@ -322,6 +325,7 @@ def gfClimatology_monthly(ds,series,output,xlbook):
     ds.series[output]['Flag'][index] = numpy.int32(40)
 
 # functions for GapFillFromAlternate
+@qcprof.profile
 def GapFillFromAlternate(cf,ds4,ds_alt):
     '''
     This is the gap fill from alternate data GUI.
@@ -802,6 +806,7 @@ def gfalternate_done(ds,alt_gui):
     # put the return code into ds.alternate
     ds.returncodes["alternate"] = "normal"
 
+@qcprof.profile
 def gfalternate_getalternatevaratmaxr(ds_tower,ds_alternate,alternate_info,mode="verbose"):
     """
     Purpose:
@@ -818,13 +823,13 @@ def gfalternate_getalternatevaratmaxr(ds_tower,ds_alternate,alternate_info,mode=
     enddate = alternate_info["enddate"]
     ts = alternate_info["time_step"]
     ldt_tower = ds_tower.series["DateTime"]["Data"]
-    si_tower = qcutils.GetDateIndex(ldt_tower,startdate,ts=ts)
-    ei_tower = qcutils.GetDateIndex(ldt_tower,enddate,ts=ts)
+    si_tower = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),startdate,ts=ts)
+    ei_tower = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),enddate,ts=ts)
     data_tower,flag_tower,attr_tower = qcutils.GetSeriesasMA(ds_tower,label_tower,si=si_tower,ei=ei_tower)
     # local pointers to the start and end indices
     ldt_alternate = ds_alternate.series["DateTime"]["Data"]
-    si_alternate = qcutils.GetDateIndex(ldt_alternate,startdate,ts=ts)
-    ei_alternate = qcutils.GetDateIndex(ldt_alternate,enddate,ts=ts)
+    si_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),startdate,ts=ts)
+    ei_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),enddate,ts=ts)
     # create an array for the correlations and a list for the alternate variables in order of decreasing correlation
     if "usevars" not in ds_tower.alternate[label_output]:
         altvar_list = gfalternate_getalternatevarlist(ds_alternate,alternate_info["alternate_name"])
@@ -971,6 +976,7 @@ def gfalternate_getlabeloutputlist(ds_tower,label_tower):
         if item in olist: label_output_list.append(item)
     return label_output_list
 
+@qcprof.profile
 def gfalternate_getcorrecteddata(ds_alternate,data_dict,stat_dict,alternate_info,mode="quiet"):
     label_tower = alternate_info["label_tower"]
     label_output = alternate_info["label_output"]
@@ -1012,8 +1018,8 @@ def gfalternate_getlagcorrecteddata(ds_alternate, data_dict,stat_dict,alternate_
     startdate = alternate_info["startdate"]
     enddate = alternate_info["enddate"]
     ts = alternate_info["time_step"]
-    si_alternate = qcutils.GetDateIndex(ldt_alternate,startdate,ts=ts)
-    ei_alternate = qcutils.GetDateIndex(ldt_alternate,enddate,ts=ts)
+    si_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),startdate,ts=ts)
+    ei_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),enddate,ts=ts)
     if alternate_info["lag"].lower()=="yes":
         maxlags = alternate_info["max_lags"]
         minpoints = alternate_info["min_points"]
@@ -1340,8 +1346,8 @@ def gfalternate_loadoutputdata(ds_tower,data_dict,alternate_info):
     label_alternate = alternate_info["label_alternate"]
     data_tower = data_dict[label_tower]["data"]
     ts = alternate_info["time_step"]
-    si = qcutils.GetDateIndex(ldt_tower,alternate_info["startdate"],ts=ts)
-    ei = qcutils.GetDateIndex(ldt_tower,alternate_info["enddate"],ts=ts)
+    si = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),alternate_info["startdate"],ts=ts)
+    ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),alternate_info["enddate"],ts=ts)
     if alternate_info["overwrite"]:
         ind1 = numpy.where(numpy.ma.getmaskarray(data_dict[label_output][label_alternate]["data"])==False)[0]
     else:
@@ -1466,6 +1472,7 @@ def gfalternate_matchstartendtimes(ds,ds_alternate):
             qcutils.CreateSeries(ds_alternate,series,data,Flag=flag,Attr=attr)
     ds.returncodes["GapFillFromAlternate"] = "normal"
 
+@qcprof.profile
 def gfalternate_main(ds_tower,ds_alt,alternate_info,label_tower_list=[]):
     '''
     This is the main routine for using alternate data to gap fill drivers.
@@ -1490,8 +1497,8 @@ def gfalternate_main(ds_tower,ds_alt,alternate_info,label_tower_list=[]):
     # get local pointer to the datetime series
     dt_tower = ds_tower.series["DateTime"]["Data"]
     attr_ldt_tower = ds_tower.series["DateTime"]["Attr"]
-    si_tower = qcutils.GetDateIndex(dt_tower,alternate_info["startdate"],ts=ts,default=0)
-    ei_tower = qcutils.GetDateIndex(dt_tower,alternate_info["enddate"],ts=ts,default=len(dt_tower)-1)
+    si_tower = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),alternate_info["startdate"],ts=ts,default=0)
+    ei_tower = qcutils.GetDateIndex(qcutils.get_datetime64(ds_tower),alternate_info["enddate"],ts=ts,default=len(dt_tower)-1)
     ldt_tower = dt_tower[si_tower:ei_tower+1]
     # now loop over the variables to be gap filled using the alternate data
     if len(label_tower_list)==0:
@@ -1527,8 +1534,8 @@ def gfalternate_main(ds_tower,ds_alt,alternate_info,label_tower_list=[]):
             ds_alternate = ds_alt[ds_tower.alternate[label_output]["file_name"]]
             ldt_alternate = ds_alternate.series["DateTime"]["Data"]
             # start and end idices for this time range in the alternate data
-            si_alternate = qcutils.GetDateIndex(ldt_alternate,alternate_info["startdate"],ts=ts,default=0)
-            ei_alternate = qcutils.GetDateIndex(ldt_alternate,alternate_info["enddate"],ts=ts,default=len(ldt_alternate)-1)
+            si_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),alternate_info["startdate"],ts=ts,default=0)
+            ei_alternate = qcutils.GetDateIndex(qcutils.get_datetime64(ds_alternate),alternate_info["enddate"],ts=ts,default=len(ldt_alternate)-1)
             # get the alternate series that has the highest correlation with the tower data
             label_alternate_list = gfalternate_getalternatevaratmaxr(ds_tower,ds_alternate,alternate_info,mode=mode)
             # loop over alternate variables
@@ -1573,6 +1580,7 @@ def gfalternate_main(ds_tower,ds_alt,alternate_info,label_tower_list=[]):
     if "GapFillFromalternate" not in ds_tower.globalattributes["Functions"]:
         ds_tower.globalattributes["Functions"] = ds_tower.globalattributes["Functions"]+", GapFillFromalternate"
 
+@qcprof.profile
 def gfalternate_plotcomposite(nfig,data_dict,stat_dict,diel_avg,alternate_info,pd):
     # set up some local pointers
     label_tower = alternate_info["label_tower"]
@@ -2193,6 +2201,7 @@ def gfalternate_update_alternate_info(ds_tower,alternate_info):
         alternate_info["lag"] = "no"
 
 # functions for GapFillUsingInterpolation
+@qcprof.profile
 def GapFillUsingInterpolation(cf,ds):
     if "Drivers" in cf:
         section_name = "Drivers"
@@ -2219,6 +2228,7 @@ def GapFillUsingInterpolation(cf,ds):
             qcts.InterpolateOverMissing(ds,series=ThisOne,maxlen=2)
 
 # functions for GapFillUsingSOLO
+@qcprof.profile
 def GapFillUsingSOLO(cf,dsa,dsb):
     '''
     This is the "Run SOLO" GUI.
@@ -2406,7 +2416,12 @@ def gfSOLO_autocomplete(dsa,dsb,solo_info):
             solo_info["startdate"] = ldt[si].strftime("%Y-%m-%d %H:%M")
             solo_info["enddate"] = ldt[ei].strftime("%Y-%m-%d %H:%M")
             gfSOLO_main(dsa,dsb,solo_info,output_list=[output])
-            gfSOLO_plotcoveragelines(dsb,solo_info)
+            # queued jobs have no results yet, the coverage is plotted after gfSOLO_dispatch
+            if "dispatch" not in solo_info: gfSOLO_plotcoveragelines(dsb,solo_info)
+    # run any queued SOLO jobs and plot the coverage once they are done
+    if "dispatch" in solo_info and len(solo_info["dispatch"])!=0:
+        gfSOLO_dispatch(dsa,dsb,solo_info)
+        gfSOLO_plotcoveragelines(dsb,solo_info)
 
 def gfSOLO_createdict(cf,ds,series):
     """ Creates a dictionary in ds to hold information about the SOLO data used
@@ -2457,6 +2472,40 @@ def gfSOLO_createdict(cf,ds,series):
             data,flag,attr = qcutils.MakeEmptySeries(ds,output)
             qcutils.CreateSeries(ds,output,data,Flag=flag,Attr=attr)
 
+@qcprof.profile
+def gfSOLO_dispatch(dsa,dsb,solo_info):
+    """
+    Purpose:
+     Run the SOLO jobs queued by gfSOLO_main using a pool of worker processes,
+     then put the modelled data into the data structure and plot the results
+     in the order the jobs were queued.  The jobs are independent because each
+     uses a different period or series.
+    Usage:
+     gfSOLO_dispatch(dsa,dsb,solo_info)
+    """
+    if "dispatch" not in solo_info or len(solo_info["dispatch"])==0: return
+    queue = solo_info["dispatch"]
+    solo_info["dispatch"] = []
+    jobs = [item["job"] for item in queue if not item["skip"]]
+    results = qcsolo.run_jobs(jobs,workers=solo_info["workers"])
+    n = 0
+    for item in queue:
+        output = item["output"]
+        if item["skip"]:
+            gfSOLO_skipresults(dsb,output)
+            continue
+        modelled,goodindex = results[n]
+        n = n + 1
+        series = item["series"]
+        if modelled is None:
+            log.error(' gfSOLO_dispatch: SOLO did not run for '+series)
+            gfSOLO_skipresults(dsb,output)
+            continue
+        gfSOLO_putresults(dsa,dsb,series,output,modelled,goodindex,si=item["si"],ei=item["ei"])
+        pd = gfSOLO_initplot(site_name=item["site_name"],label=series,fig_num=item["fig_num"],
+                             title=item["title"],nDrivers=len(item["drivers"]))
+        gfSOLO_plot(pd,dsa,dsb,item["drivers"],series,output,item["solo_info"],si=item["si"],ei=item["ei"])
+
 def gfSOLO_done(ds,solo_gui,solo_info):
     # plot the summary statistics if required
     if solo_gui.peropt.get()==1: gfSOLO_plotsummary(ds,solo_info)
@@ -2465,6 +2514,18 @@ def gfSOLO_done(ds,solo_gui,solo_info):
     # remove the solo dictionary from the data structure
     ds.returncodes["solo"] = "normal"
 
+def gfSOLO_getjob(dsb,driverlist,targetlabel,nRecs,solo_info,si=0,ei=-1):
+    """ Return a SOLO job (see qcsolo.run_job) for the target and drivers between si and ei."""
+    drivers = numpy.zeros((nRecs,len(driverlist)))
+    for i,TheseOnes in enumerate(driverlist):
+        drivers[:,i],flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
+    target,flag,attr = qcutils.GetSeries(dsb,targetlabel,si=si,ei=ei)
+    ldt = dsb.series["DateTime"]["Data"]
+    return {"drivers":drivers,"target":target,"backend":solo_info["backend"],
+            "nodes":solo_info["nodes_target"],"training":solo_info["training"],
+            "nda_factor":solo_info["factor"],"learningrate":solo_info["learningrate"],
+            "iterations":solo_info["iterations"],"window":[str(ldt[si]),str(ldt[ei])]}
+
 def gfSOLO_getserieslist(cf):
     series_list = []
     if "Drivers" in cf.keys():
@@ -2488,6 +2549,7 @@ def gfSOLO_initplot(**kwargs):
     pd["ts_height"] = (1.0 - pd["margin_top"] - pd["ts_bottom"])/float(pd["nDrivers"]+1)
     return pd
 
+@qcprof.profile
 def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
     '''
     This is the main routine for running SOLO, an artifical neural network for gap filling fluxes.
@@ -2503,6 +2565,12 @@ def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
     solo_info["plot_path"] = cf["Files"]["plot_path"]
     # put the control file object in the solo_info dictionary
     dsb.cf = cf.copy()
+    # SOLO backend, "python" runs SOFM, SOLO and SEQSOLO in memory, "external"
+    # runs the executables in solo/bin, set by the run_nogui routine from the
+    # control file passed in (which includes the batch options) if not run from the GUI
+    if "backend" not in solo_info:
+        opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOBackend",default="external",mode="quiet")
+        solo_info["backend"] = str(opt).lower()
     # get some useful things
     site_name = dsa.globalattributes["site_name"]
     # get the time step and a local pointer to the datetime series
@@ -2510,8 +2578,8 @@ def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
     ldt = dsb.series["DateTime"]["Data"]
     xldt = dsb.series["xlDateTime"]["Data"]
     # get the start and end datetime indices
-    si = qcutils.GetDateIndex(ldt,startdate,ts=ts,default=0,match="exact")
-    ei = qcutils.GetDateIndex(ldt,enddate,ts=ts,default=len(ldt)-1,match="exact")
+    si = qcutils.GetDateIndex(qcutils.get_datetime64(dsb),startdate,ts=ts,default=0,match="exact")
+    ei = qcutils.GetDateIndex(qcutils.get_datetime64(dsb),enddate,ts=ts,default=len(ldt)-1,match="exact")
     # check the start and end indices
     if si >= ei:
         print " GapFillUsingSOLO: end datetime index ("+str(ei)+") smaller that start ("+str(si)+")"
@@ -2545,12 +2613,10 @@ def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
         d,f,a = qcutils.GetSeriesasMA(dsb,series,si=si,ei=ei)
         if numpy.ma.count(d)<solo_info["min_points"]:
             log.warning("gfSOLO: Less than "+str(solo_info["min_points"])+" points available for series "+series+" ...")
-            dsb.solo[output]["results"]["No. points"].append(float(0))
-            results_list = dsb.solo[output]["results"].keys()
-            for item in ["startdate","enddate","No. points"]:
-                if item in results_list: results_list.remove(item)
-            for item in results_list:
-                dsb.solo[output]["results"][item].append(float(c.missing_value))
+            if "dispatch" in solo_info:
+                solo_info["dispatch"].append({"output":output,"skip":True})
+            else:
+                gfSOLO_skipresults(dsb,output)
             continue
         drivers = dsb.solo[output]["drivers"]
         if str(solo_info["nodes"]).lower()=="auto":
@@ -2567,20 +2633,25 @@ def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
             solo_info["factor"] = dsb.solo[output]["solo_settings"]["factor"]
             solo_info["learningrate"] = dsb.solo[output]["solo_settings"]["learningrate"]
             solo_info["iterations"] = dsb.solo[output]["solo_settings"]["iterations"]
-        # write the inf files for sofm, solo and seqsolo
-        gfSOLO_writeinffiles(solo_info)
-        # run SOFM
-        result = gfSOLO_runsofm(dsa,dsb,drivers,series,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # run SOLO
-        result = gfSOLO_runsolo(dsa,dsb,drivers,series,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # run seqsolo and put the solo_modelled data into the ds series
-        result = gfSOLO_runseqsolo(dsa,dsb,drivers,series,output,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # plot the results
         fig_num = fig_num + 1
         title = site_name+' : Comparison of tower and SOLO data for '+series
+        if "dispatch" in solo_info:
+            # queue the run, the queued runs are done by gfSOLO_dispatch
+            job = gfSOLO_getjob(dsb,drivers,series,nRecs,solo_info,si=si,ei=ei)
+            info = dict([(k,v) for k,v in solo_info.items() if k!="dispatch"])
+            solo_info["dispatch"].append({"output":output,"skip":False,"series":series,"drivers":drivers,
+                                          "si":si,"ei":ei,"fig_num":fig_num,"title":title,
+                                          "site_name":site_name,"solo_info":info,"job":job})
+            continue
+        if solo_info["backend"]=="external":
+            # run the SOFM, SOLO and SEQSOLO executables and put the modelled data into the ds series
+            result = gfSOLO_runexternal(dsa,dsb,drivers,series,output,nRecs,solo_info,si=si,ei=ei)
+            if result!=1: return
+        else:
+            # run SOFM, SOLO and SEQSOLO in memory and put the modelled data into the ds series
+            result = gfSOLO_runpython(dsa,dsb,drivers,series,output,nRecs,solo_info,si=si,ei=ei)
+            if result!=1: return
+        # plot the results
         pd = gfSOLO_initplot(site_name=site_name,label=series,fig_num=fig_num,title=title,
                              nDrivers=len(drivers))
         gfSOLO_plot(pd,dsa,dsb,drivers,series,output,solo_info,si=si,ei=ei)
@@ -2589,6 +2660,7 @@ def gfSOLO_main(dsa,dsb,solo_info,output_list=[]):
     if 'GapFillUsingSOLO' not in dsb.globalattributes['Functions']:
         dsb.globalattributes['Functions'] = dsb.globalattributes['Functions']+', GapFillUsingSOLO'
 
+@qcprof.profile
 def gfSOLO_plot(pd,dsa,dsb,driverlist,targetlabel,outputlabel,solo_info,si=0,ei=-1):
     """ Plot the results of the SOLO run. """
     # get the time step
@@ -2885,6 +2957,20 @@ def gfSOLO_progress(solo_gui,text):
     solo_gui.progress.grid(row=solo_gui.progress_row,column=0,columnspan=6,sticky="W")
     solo_gui.update()
 
+def gfSOLO_putresults(dsa,dsb,targetlabel,outputlabel,modelled,goodindex,si=0,ei=-1):
+    """ Put the SOLO modelled data into the output series and set the attributes."""
+    if ei==-1:
+        dsb.series[outputlabel]['Data'][si:][goodindex] = modelled
+        dsb.series[outputlabel]['Flag'][si:][goodindex] = numpy.int32(30)
+    else:
+        dsb.series[outputlabel]['Data'][si:ei+1][goodindex] = modelled
+        dsb.series[outputlabel]['Flag'][si:ei+1][goodindex] = numpy.int32(30)
+    # set the attributes
+    if targetlabel in dsa.series.keys():
+        for attr in dsa.series[targetlabel]["Attr"].keys():
+            dsb.series[outputlabel]["Attr"][attr] = dsa.series[targetlabel]["Attr"][attr]
+    dsb.series[outputlabel]["Attr"]["long_name"] = dsb.series[outputlabel]["Attr"]["long_name"]+", modeled by SOLO"
+
 def gfSOLO_quit(ds,solo_gui):
     # destroy the GUI
     solo_gui.destroy()
@@ -3038,6 +3124,25 @@ def gfSOLO_run_nogui(cf,dsa,dsb,solo_info):
     # learning iterations
     opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"iterations",default="500",mode="quiet")
     solo_info["iterations"] = str(opt)
+    # SOLO backend, "python" runs SOFM, SOLO and SEQSOLO in memory, "external"
+    # runs the executables in solo/bin
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOBackend",default="external",mode="quiet")
+    solo_info["backend"] = str(opt).lower()
+    # number of worker processes, independent periods and series are queued and
+    # run in parallel by gfSOLO_dispatch if this is more than 1
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOWorkers",default=1,mode="quiet")
+    solo_info["workers"] = max(int(opt),1)
+    if solo_info["workers"]>1: solo_info["dispatch"] = []
+    # warm start option, each period starts from the model for the previous period
+    solo_info["warm_start"] = False
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"warm_start",default="no",mode="quiet")
+    if opt.lower()=="yes": solo_info["warm_start"] = True
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"warm_fraction",default=0.2,mode="quiet")
+    solo_info["warm_fraction"] = float(opt)
+    solo_info["warm_models"] = {}
+    if solo_info["warm_start"] and "dispatch" in solo_info:
+        log.warning(" GapFillUsingSOLO: warm start needs the periods in order, not used with SOLOWorkers > 1")
+        solo_info["warm_start"] = False
     # now set up the rest of the solo_info dictionary
     solo_info["site_name"] = dsb.globalattributes["site_name"]
     solo_info["time_step"] = int(dsb.globalattributes["time_step"])
@@ -3051,6 +3156,7 @@ def gfSOLO_run_nogui(cf,dsa,dsb,solo_info):
     log.info(" Gap filling "+str(series_list)+" using SOLO")
     if solo_info["peropt"]==1:
         gfSOLO_main(dsa,dsb,solo_info)
+        gfSOLO_dispatch(dsa,dsb,solo_info)
         log.info(" GapFillUsingSOLO: Finished manual run ...")
     elif solo_info["peropt"]==2:
         # get the start datetime entered in the SOLO GUI
@@ -3066,6 +3172,7 @@ def gfSOLO_run_nogui(cf,dsa,dsb,solo_info):
             enddate = startdate+dateutil.relativedelta.relativedelta(months=1)
             solo_info["startdate"] = startdate.strftime("%Y-%m-%d %H:%M")
             solo_info["enddate"] = enddate.strftime("%Y-%m-%d %H:%M")
+        gfSOLO_dispatch(dsa,dsb,solo_info)
         # now fill any remaining gaps
         gfSOLO_autocomplete(dsa,dsb,solo_info)
         log.info(" GapFillUsingSOLO: Finished auto (monthly) run ...")
@@ -3084,137 +3191,141 @@ def gfSOLO_run_nogui(cf,dsa,dsb,solo_info):
             enddate = startdate+dateutil.relativedelta.relativedelta(days=nDays)
             solo_info["startdate"] = startdate.strftime("%Y-%m-%d %H:%M")
             solo_info["enddate"] = enddate.strftime("%Y-%m-%d %H:%M")
+        gfSOLO_dispatch(dsa,dsb,solo_info)
         # now fill any remaining gaps
         gfSOLO_autocomplete(dsa,dsb,solo_info)
         log.info(" GapFillUsingSOLO: Finished auto (days) run ...")
     elif solo_info["peropt"]==4:
         pass
+    if "dispatch" in solo_info: del solo_info["dispatch"]
     # write the SOLO fit statistics to an Excel file
     qcio.xl_write_SOLOStats(dsb)
     # plot the summary statistics
     gfSOLO_plotsummary(dsb,solo_info)
 
-def gfSOLO_runseqsolo(dsa,dsb,driverlist,targetlabel,outputlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def gfSOLO_runexternal(dsa,dsb,driverlist,targetlabel,outputlabel,nRecs,solo_info,si=0,ei=-1):
+    '''
+    Run the SOFM, SOLO and SEQSOLO executables in their own working directory.
+    The modelled data are read from the model cache if this period has been
+    run before with the same data and settings.
+    '''
+    job = gfSOLO_getjob(dsb,driverlist,targetlabel,nRecs,solo_info,si=si,ei=ei)
+    key = qcsolo.get_jobkey(job)
+    cached = qcsolo.get_cachedjob(key)
+    if cached is not None:
+        gfSOLO_putresults(dsa,dsb,targetlabel,outputlabel,cached[0],cached[1],si=si,ei=ei)
+        return 1
+    # each run uses its own working directory for the inf, input and output files
+    workdir = qcsolo.make_workdir()
+    try:
+        # write the inf files for sofm, solo and seqsolo
+        gfSOLO_writeinffiles(solo_info,workdir=workdir)
+        # run SOFM
+        result = gfSOLO_runsofm(dsa,dsb,driverlist,targetlabel,nRecs,si=si,ei=ei,workdir=workdir)
+        # run SOLO
+        if result==1:
+            result = gfSOLO_runsolo(dsa,dsb,driverlist,targetlabel,nRecs,si=si,ei=ei,workdir=workdir)
+        # run seqsolo and put the solo_modelled data into the ds series
+        if result==1:
+            result = gfSOLO_runseqsolo(dsa,dsb,driverlist,targetlabel,outputlabel,nRecs,si=si,ei=ei,workdir=workdir)
+    finally:
+        qcsolo.remove_workdir(workdir)
+    if result==1:
+        index = numpy.where(qcsolo.get_goodindex(job["drivers"]))[0]
+        modelled = dsb.series[outputlabel]['Data'][si:si+nRecs][index]
+        qcsolo.put_cachedjob(key,(modelled,index,None))
+    return result
+
+@qcprof.profile
+def gfSOLO_runpython(dsa,dsb,driverlist,targetlabel,outputlabel,nRecs,solo_info,si=0,ei=-1):
+    '''
+    Run SOFM, SOLO and SEQSOLO in memory using the numpy implementation in qcsolo.
+    '''
+    job = gfSOLO_getjob(dsb,driverlist,targetlabel,nRecs,solo_info,si=si,ei=ei)
+    if solo_info.get("warm_start",False):
+        # start from the model trained for this series in the previous period
+        job["warm"] = solo_info["warm_models"].get(outputlabel)
+        job["warm_fraction"] = solo_info["warm_fraction"]
+    modelled,goodindex,model = qcsolo.run_jobmodel(job)
+    if modelled is None:
+        log.error(' gfSOLO_runpython: SOLO did not run for '+targetlabel)
+        return 0
+    if solo_info.get("warm_start",False): solo_info["warm_models"][outputlabel] = model
+    # put the SOLO modelled data back into the data series
+    gfSOLO_putresults(dsa,dsb,targetlabel,outputlabel,modelled,goodindex,si=si,ei=ei)
+    return 1
+
+@qcprof.profile
+def gfSOLO_runseqsolo(dsa,dsb,driverlist,targetlabel,outputlabel,nRecs,si=0,ei=-1,workdir="."):
     '''
     Run SEQSOLO.
     '''
-    # get the number of drivers    
+    # get the number of drivers
     ndrivers = len(driverlist)
     # add an extra column for the target data
     seqsoloinputdata = numpy.zeros((nRecs,ndrivers+1))
     # now fill the driver data array
-    i = 0
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
-        seqsoloinputdata[:,i] = driver[:]
-        i = i + 1
-    ## a clean copy of the target is pulled from the unmodified ds each time
-    #target,flag,attr = qcutils.GetSeries(dsa,targetlabel,si=si,ei=ei)
+    for i,TheseOnes in enumerate(driverlist):
+        seqsoloinputdata[:,i],flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
     # get the target data
-    target,flag,attr = qcutils.GetSeries(dsb,targetlabel,si=si,ei=ei)
-    # now load the target data into the data array
-    seqsoloinputdata[:,ndrivers] = target[:]
-    # now strip out the bad data
-    cind = numpy.zeros(nRecs)
-    iind = numpy.arange(nRecs)
-    # do only the drivers not the target
-    for i in range(ndrivers):
-        index = numpy.where(seqsoloinputdata[:,i]==c.missing_value)[0]
-        if len(index!=0): cind[index] = 1
-    # index of good data
-    index = numpy.where(cind==0)[0]
-    nRecs_good = len(index)
-    gooddata = numpy.zeros((nRecs_good,ndrivers+1))
-    for i in range(ndrivers+1):
-        gooddata[:,i] = seqsoloinputdata[:,i][index]
-    # keep track of the good data indices
-    goodindex = iind[index]
+    seqsoloinputdata[:,ndrivers],flag,attr = qcutils.GetSeries(dsb,targetlabel,si=si,ei=ei)
+    # keep track of the records with good drivers, missing target data is modelled
+    goodindex = numpy.where(qcsolo.get_goodindex(seqsoloinputdata[:,0:ndrivers]))[0]
     # and then write the seqsolo input file
-    seqsolofile = open('solo/input/seqsolo_input.csv','wb')
-    wr = csv.writer(seqsolofile,delimiter=',')
-    for i in range(gooddata.shape[0]):
-        wr.writerow(gooddata[i,0:ndrivers+1])
-    seqsolofile.close()
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/seqsolo_input.csv'),seqsoloinputdata[goodindex])
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/seqOut2.out'): os.remove('solo/output/seqOut2.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/seqOut2.out')): os.remove(os.path.join(workdir,'solo/output/seqOut2.out'))
     # now run SEQSOLO
     #log.info(' GapFillUsingSOLO: running SEQSOLO')
-    seqsolologfile = open('solo/log/seqsolo.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/seqsolo.exe','solo/inf/seqsolo.inf'],stdout=seqsolologfile)
-    else:
-        subprocess.call(['./solo/bin/seqsolo','solo/inf/seqsolo.inf'],stdout=seqsolologfile)
-    seqsolologfile.close()
+    qcsolo.call_executable("seqsolo",workdir)
     # check to see if the solo output file exists, this is used to indicate that solo ran correctly
-    if os.path.exists('solo/output/seqOut2.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/seqOut2.out')):
         # now read in the seqsolo results, use the seqOut2 file so that the learning capability of
         # seqsolo can be used via the "learning rate" and "Iterations" GUI options
-        seqdata = numpy.genfromtxt('solo/output/seqOut2.out')
+        seqdata = qcsolo.read_outputfile(os.path.join(workdir,'solo/output/seqOut2.out'))
         # put the SOLO modelled data back into the data series
-        if ei==-1:
-            dsb.series[outputlabel]['Data'][si:][goodindex] = seqdata[:,1]
-            dsb.series[outputlabel]['Flag'][si:][goodindex] = numpy.int32(30)
-        else:
-            dsb.series[outputlabel]['Data'][si:ei+1][goodindex] = seqdata[:,1]
-            dsb.series[outputlabel]['Flag'][si:ei+1][goodindex] = numpy.int32(30)
-        # set the attributes
-        if targetlabel in dsa.series.keys():
-            for attr in dsa.series[targetlabel]["Attr"].keys():
-                dsb.series[outputlabel]["Attr"][attr] = dsa.series[targetlabel]["Attr"][attr]
-        dsb.series[outputlabel]["Attr"]["long_name"] = dsb.series[outputlabel]["Attr"]["long_name"]+", modeled by SOLO"
+        gfSOLO_putresults(dsa,dsb,targetlabel,outputlabel,seqdata[:,1],goodindex,si=si,ei=ei)
         return 1
     else:
         log.error(' gfSOLO_runseqsolo: SEQSOLO did not run correctly, check the SOLO GUI and the log files')
         return 0
 
-def gfSOLO_runsofm(dsa,dsb,driverlist,targetlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def gfSOLO_runsofm(dsa,dsb,driverlist,targetlabel,nRecs,si=0,ei=-1,workdir="."):
     '''
     Run sofm, the pre-processor for SOLO.
     '''
     # get the number of drivers
     ndrivers = len(driverlist)
-    # add an extra column for the target data
-    sofminputdata = numpy.zeros((nRecs,ndrivers))
     # now fill the driver data array
-    i = 0
-    badlines = []
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
-        index = numpy.where(abs(driver-float(c.missing_value)<c.eps))[0]
-        if len(index)!=0:
-            log.error(' GapFillUsingSOLO: c.missing_value found in driver '+TheseOnes+' at lines '+str(index))
-            badlines = badlines+index.tolist()
-        sofminputdata[:,i] = driver[:]
-        i = i + 1
-    if len(badlines)!=0:
-        nBad = len(badlines)
-        goodlines = [x for x in range(0,nRecs) if x not in badlines]
-        sofminputdata = sofminputdata[goodlines,:]
+    sofminputdata = numpy.zeros((nRecs,ndrivers))
+    goodlines = numpy.ones(nRecs,dtype=bool)
+    for i,TheseOnes in enumerate(driverlist):
+        sofminputdata[:,i],flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
+        badlines = ~qcsolo.get_goodindex(sofminputdata[:,i])
+        if numpy.any(badlines):
+            log.error(' GapFillUsingSOLO: c.missing_value found in driver '+TheseOnes+' at lines '+str(numpy.where(badlines)[0]))
+            goodlines = goodlines & ~badlines
+    if not numpy.all(goodlines):
+        nBad = numpy.sum(~goodlines)
+        sofminputdata = sofminputdata[goodlines]
         log.info(' GapFillUsingSOLO: removed '+str(nBad)+' lines from sofm input file')
-        nRecs = len(goodlines)
     # now write the drivers to the SOFM input file
-    sofmfile = open('solo/input/sofm_input.csv','wb')
-    wr = csv.writer(sofmfile,delimiter=',')
-    for i in range(sofminputdata.shape[0]):
-        wr.writerow(sofminputdata[i,0:ndrivers])
-    sofmfile.close()
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/sofm_input.csv'),sofminputdata)
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/sofm_4.out'): os.remove('solo/output/sofm_4.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/sofm_4.out')): os.remove(os.path.join(workdir,'solo/output/sofm_4.out'))
     # now run SOFM
-    sofmlogfile = open('solo/log/sofm.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/sofm.exe','solo/inf/sofm.inf'],stdout=sofmlogfile)
-    else:
-        subprocess.call(['./solo/bin/sofm','solo/inf/sofm.inf'],stdout=sofmlogfile)
-    sofmlogfile.close()
+    qcsolo.call_executable("sofm",workdir)
     # check to see if the sofm output file exists, this is used to indicate that sofm ran correctly
-    if os.path.exists('solo/output/sofm_4.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/sofm_4.out')):
         return 1
     else:
         log.error(' gfSOLO_runsofm: SOFM did not run correctly, check the SOLO GUI and the log files')
         return 0
 
-def gfSOLO_runsolo(dsa,dsb,driverlist,targetlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def gfSOLO_runsolo(dsa,dsb,driverlist,targetlabel,nRecs,si=0,ei=-1,workdir="."):
     '''
     Run SOLO.
     '''
@@ -3222,45 +3333,21 @@ def gfSOLO_runsolo(dsa,dsb,driverlist,targetlabel,nRecs,si=0,ei=-1):
     # add an extra column for the target data
     soloinputdata = numpy.zeros((nRecs,ndrivers+1))
     # now fill the driver data array, drivers come from the modified ds
-    i = 0
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
-        soloinputdata[:,i] = driver[:]
-        i = i + 1
-    ## a clean copy of the target is pulled from the unmodified ds each time
-    #target,flag,attr = qcutils.GetSeries(dsa,targetlabel,si=si,ei=ei)
+    for i,TheseOnes in enumerate(driverlist):
+        soloinputdata[:,i],flag,attr = qcutils.GetSeries(dsb,TheseOnes,si=si,ei=ei)
     # get the target data
-    target,flag,attr = qcutils.GetSeries(dsb,targetlabel,si=si,ei=ei)
-    # now load the target data into the data array
-    soloinputdata[:,ndrivers] = target[:]
-    # now strip out the bad data
-    cind = numpy.zeros(nRecs)
-    for i in range(ndrivers+1):
-        index = numpy.where(soloinputdata[:,i]==c.missing_value)[0]
-        if len(index!=0): cind[index] = 1
-    index = numpy.where(cind==0)[0]
-    nRecs_good = len(index)
-    gooddata = numpy.zeros((nRecs_good,ndrivers+1))
-    for i in range(ndrivers+1):
-        gooddata[:,i] = soloinputdata[:,i][index]
-    # and then write the solo input file, the name is assumed by the solo.inf control file
-    solofile = open('solo/input/solo_input.csv','wb')
-    wr = csv.writer(solofile,delimiter=',')
-    for i in range(gooddata.shape[0]):
-        wr.writerow(gooddata[i,0:ndrivers+1])
-    solofile.close()
+    soloinputdata[:,ndrivers],flag,attr = qcutils.GetSeries(dsb,targetlabel,si=si,ei=ei)
+    # and then write the records with no missing data to the solo input file, the
+    # name is assumed by the solo.inf control file
+    goodlines = qcsolo.get_goodindex(soloinputdata)
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/solo_input.csv'),soloinputdata[goodlines])
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/eigenValue.out'): os.remove('solo/output/eigenValue.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/eigenValue.out')): os.remove(os.path.join(workdir,'solo/output/eigenValue.out'))
     # now run SOLO
     #log.info(' GapFillUsingSOLO: running SOLO')
-    solologfile = open('solo/log/solo.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/solo.exe','solo/inf/solo.inf'],stdout=solologfile)
-    else:
-        subprocess.call(['./solo/bin/solo','solo/inf/solo.inf'],stdout=solologfile)
-    solologfile.close()
+    qcsolo.call_executable("solo",workdir)
     # check to see if the solo output file exists, this is used to indicate that solo ran correctly
-    if os.path.exists('solo/output/eigenValue.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/eigenValue.out')):
         return 1
     else:
         log.error(' gfSOLO_runsolo: SOLO did not run correctly, check the SOLO GUI and the log files')
@@ -3274,100 +3361,19 @@ def gfSOLO_setnodesEntry(solo_gui,drivers):
         solo_gui.nodesEntry.insert(0,str(len(drivers)+1))
     return nodesAuto
 
-def gfSOLO_writeinffiles(solo_info):
-    # sofm inf file
-    f = open('solo/inf/sofm.inf','w')
-    f.write(str(solo_info["nodes_target"])+'\n')
-    f.write(str(solo_info["training"])+'\n')
-    f.write(str(20)+'\n')
-    f.write(str(0.01)+'\n')
-    f.write(str(1234)+'\n')
-    f.write('solo/input/sofm_input.csv'+'\n')
-    f.write('solo/output/sofm_1.out'+'\n')
-    f.write('solo/output/sofm_2.out'+'\n')
-    f.write('solo/output/sofm_3.out'+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write(str(50)+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: No. of training iterations - default is 500 (changeable via GUI if used)\n')
-    f.write('Line 3: No. of iterations per screen output - default is 20\n')
-    f.write('Line 4: Spacing between initial weights - default is 0.01\n')
-    f.write('Line 5: Seed for random number generator - default is 1234\n')
-    f.write('Line 6: input data filename with path relative to current directory\n')
-    f.write('Line 7: first output filename with path relative to current directory\n')
-    f.write('Line 8: second output filename with path relative to current directory\n')
-    f.write('Line 9: third output filename with path relative to current directory\n')
-    f.write('Line 10: fourth output filename with path relative to current directory (used by SOLO)\n')
-    f.write('Line 11: No. iterations per write of weights to screen - default is 50\n')
-    f.close()
-    # solo inf file
-    f = open('solo/inf/solo.inf','w')
-    f.write(str(solo_info["nodes_target"])+'\n')
-    f.write(str(solo_info["factor"])+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write('solo/input/solo_input.csv'+'\n')
-    f.write('training'+'\n')
-    f.write(str(5678)+'\n')
-    f.write(str(0)+'\n')
-    f.write('solo/output/eigenValue.out'+'\n')
-    f.write('solo/output/eigenVector.out'+'\n')
-    f.write('solo/output/accumErr.out'+'\n')
-    f.write('solo/output/accumRR.out'+'\n')
-    f.write('solo/output/trainProcess.out'+'\n')
-    f.write('solo/output/freqTable.out'+'\n')
-    f.write('solo/output/hidOutputWt.out'+'\n')
-    f.write('solo/output/errorMap.out'+'\n')
-    f.write('solo/output/finResult.out'+'\n')
-    f.write('solo/output/trainWin.out'+'\n')
-    f.write('solo/output/trainWout.out'+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: multiplier for minimum number of points per node (NdaFactor) - default is 5 (ie 5*(no. of drivers+1) (changeable via GUI if used)\n')
-    f.write('Line 3: fourth output file from SOFM, used as input to SOLO\n')
-    f.write('Line 4: input data filename with path relative to current directory\n')
-    f.write('Line 5: type of run ("training" or "simulation", always "training" for SOLO)\n')
-    f.write('Line 6: seed for random number generator - default is 5678\n')
-    f.write('Line 7: "calThreshold", not used by SOLO\n')
-    f.write('Lines 8 to 18: output files from SOLO with path relative to current directory\n')
-    f.close()
-    # seqsolo inf file
-    f = open('solo/inf/seqsolo.inf','w')
-    f.write(str(solo_info["nodes_target"])+'\n')
-    f.write(str(0)+'\n')
-    f.write(str(solo_info["learningrate"])+'\n')
-    f.write(str(solo_info["iterations"])+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write('solo/input/seqsolo_input.csv'+'\n')
-    f.write('simulation'+'\n')
-    f.write(str(9100)+'\n')
-    f.write(str(0)+'\n')
-    f.write('solo/output/eigenValue.out'+'\n')
-    f.write('solo/output/eigenVector.out'+'\n')
-    f.write('solo/output/trainWout.out'+'\n')
-    f.write('solo/output/freqTable.out'+'\n')
-    f.write('solo/output/errorMap.out'+'\n')
-    f.write('solo/output/finResult.out'+'\n')
-    f.write('solo/output/trainingRMSE.out'+'\n')
-    f.write('solo/output/seqOut0.out'+'\n')
-    f.write('solo/output/seqOut1.out'+'\n')
-    f.write('solo/output/seqOut2.out'+'\n')
-    f.write('solo/output/seqHidOutW.out'+'\n')
-    f.write('solo/output/seqFreqMap.out'+'\n')
-    f.write(str(c.missing_value)+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: NdaFactor - not used by SEQSOLO, default value is 0\n')
-    f.write('Line 3: learning rate - default value 0.01 (must be between 0.0 1nd 1.0, changeable via GUI if used)\n')
-    f.write('Line 4: number of iterations for sequential training, default value is 500 (changeable via GUI if used)\n')
-    f.write('Line 5: fourth output file from SOFM, used as input file by SEQSOLO\n')
-    f.write('Line 6: input data filename with path relative to current directory\n')
-    f.write('Line 7: type of run ("training" or "simulation", always "simulation" for SEQSOLO)\n')
-    f.write('Line 8: seed for random number generator - default is 9100\n')
-    f.write('Line 9: "calThreshold" - minimum number of data points for SOLO node to be used in simulation, default value is 0 (use all nodes)\n')
-    f.write('Lines 10 to 21: output files from SEQSOLO with path relative to current directory\n')
-    f.write('Line 22: missing data value, default value is c.missing_value.0\n')
-    f.close()
+def gfSOLO_skipresults(dsb,output):
+    """ Add missing values to the results for a period when SOLO was not run."""
+    dsb.solo[output]["results"]["No. points"].append(float(0))
+    results_list = dsb.solo[output]["results"].keys()
+    for item in ["startdate","enddate","No. points"]:
+        if item in results_list: results_list.remove(item)
+    for item in results_list:
+        dsb.solo[output]["results"][item].append(float(c.missing_value))
+
+def gfSOLO_writeinffiles(solo_info,workdir="."):
+    """ Write the inf files for SOFM, SOLO and SEQSOLO in the working directory."""
+    qcsolo.write_inffiles(workdir,solo_info["nodes_target"],solo_info["training"],solo_info["factor"],
+                          solo_info["learningrate"],solo_info["iterations"])
 
 # miscellaneous L4 routines
 #def gf_getdiurnalstats(DecHour,Data,dt):
@@ -3446,6 +3452,7 @@ def gf_getdateticks(start, end):
         fmt = mdt.DateFormatter('%d/%m/%y')
     return loc,fmt
 
+@qcprof.profile
 def ImportSeries(cf,ds):
     # check to see if there is an Imports section
     if "Imports" not in cf.keys(): return
@@ -3467,7 +3474,7 @@ def ImportSeries(cf,ds):
             msg = " ImportSeries: variable name not found in control file, skipping ..."
             log.warning(msg)
             continue
-        ds_import = qcio.nc_read_series(import_filename)
+        ds_import = qcio.nc_read_series(import_filename,lazy=True)
         ts_import = ds_import.globalattributes["time_step"]
         ldt_import = ds_import.series["DateTime"]["Data"]
         si = qcutils.GetDateIndex(ldt_import,str(start_date),ts=ts_import,default=0,match="exact")
@@ -3475,6 +3482,7 @@ def ImportSeries(cf,ds):
         data = numpy.ma.ones(nRecs)*float(c.missing_value)
         flag = numpy.ma.ones(nRecs)
         data_import,flag_import,attr_import = qcutils.GetSeriesasMA(ds_import,var_name,si=si,ei=ei)
+        qcio.nc_close_series(ds_import)
         ldt_import = ldt_import[si:ei+1]
         index = qcutils.FindIndicesOfBInA(ldt_import,ldt)
         data[index] = data_import
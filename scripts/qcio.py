@@ -6,11 +6,13 @@ import copy
 import csv
 import datetime
 import dateutil
+import gzip
 import logging
 import netCDF4
 import numpy
 import ntpath
 import os
+import pandas
 import pdb
 import platform
 import sys
@@ -19,17 +21,29 @@ import Tkinter, tkFileDialog
 import xlrd
 import xlwt
 import xlsxwriter
+# openpyxl is optional, it is only used to stream large .xlsx files
+try:
+    import openpyxl
+except ImportError:
+    pass
 # OzFluxQC modules
 import cfg
 import constants as c
 import meteorologicalfunctions as mf
+import qccache
 import qcck
 import qcfunc
+import qcprof
 import qcts
 import qcutils
 
 log = logging.getLogger('qc.io')
 
+# variables that describe the time axis, these are always read from
+# netCDF files even when the rest of the file is read lazily
+nc_timeaxis_list = ["time","xlDateTime","Year","Month","Day","Hour","Minute",
+                    "Second","Microseconds","Hdh","Ddd"]
+
 class DataStructure(object):
     def __init__(self):
         self.series = {}
@@ -38,6 +52,184 @@ class DataStructure(object):
         self.mergeserieslist = []
         self.averageserieslist = []
         self.returncodes = {}
+        # cache of numpy datetime64 time axes, see qcutils.get_datetime64
+        self.timeaxis = {}
+
+class LazySeries(dict):
+    """
+    Purpose:
+     A series in ds.series whose "Data" and "Flag" are read from an open
+     netCDF file the first time either of them is accessed.  The "Attr"
+     dictionary is read when the series is created.
+     Once loaded, the series behaves like any other series dictionary.
+     The netCDF file is closed when the last pending series that uses it
+     has been loaded or when qcio.nc_close_series is called, series that are
+     used after the file has been closed open it again just to read them.
+    Usage:
+     ds = qcio.nc_read_series(nc_name,lazy=True)
+     Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd")   # Fsd read from file here
+    """
+    def __init__(self,reader,label,attr):
+        dict.__init__(self)
+        self.reader = reader
+        self.label = label
+        dict.__setitem__(self,"Data",None)
+        dict.__setitem__(self,"Flag",None)
+        dict.__setitem__(self,"Attr",attr)
+        self.loaded = False
+        reader["pending"].add(label)
+    def load(self):
+        """ Read the data and QC flag from the netCDF file."""
+        if self.loaded: return
+        if self.reader["ncFile"] is None:
+            # the file has been closed by nc_close_series, open it for this series only
+            ncFile = netCDF4.Dataset(self.reader["file_name"],'r')
+            data,flag = nc_read_var_data(ncFile,self.label)
+            ncFile.close()
+        else:
+            data,flag = nc_read_var_data(self.reader["ncFile"],self.label)
+        # make sure all values of -9999 have non-zero QC flag
+        qcutils.CheckSeriesQCFlags(data,flag)
+        dict.__setitem__(self,"Data",data)
+        dict.__setitem__(self,"Flag",flag)
+        self.loaded = True
+        # close the netCDF file when there is nothing left to read from it
+        self.reader["pending"].discard(self.label)
+        if len(self.reader["pending"])==0: nc_close_reader(self.reader)
+    def __getitem__(self,key):
+        if key in ["Data","Flag"]: self.load()
+        return dict.__getitem__(self,key)
+    def __setitem__(self,key,value):
+        # load before a partial write so that "Data" and "Flag" stay consistent
+        if key in ["Data","Flag"]: self.load()
+        dict.__setitem__(self,key,value)
+    def get(self,key,default=None):
+        if key in self: return self[key]
+        return default
+    def items(self):
+        self.load()
+        return dict.items(self)
+    def iteritems(self):
+        self.load()
+        return dict.iteritems(self)
+    def values(self):
+        self.load()
+        return dict.values(self)
+    def itervalues(self):
+        self.load()
+        return dict.itervalues(self)
+    def copy(self):
+        self.load()
+        return dict(dict.items(self))
+    def __deepcopy__(self,memo):
+        # copies are ordinary series dictionaries, they do not hold the file open
+        return copy.deepcopy(self.copy(),memo)
+    def __reduce__(self):
+        return (dict,(self.copy(),))
+
+class CowSeries(dict):
+    """
+    Purpose:
+     A copy-on-write series in ds.series.  The "Data", "Flag" and "Attr" of
+     the series are shared with a source series (usually the same series at
+     the previous processing level) until they are accessed through the
+     series dictionary, at which point a private copy is made.  This means
+     routines that change the series in place, for example
+      ds.series[label]["Data"][index] = c.missing_value
+     only ever change the private copy.
+     Read-only access should use qcutils.GetSeries, qcutils.GetSeriesasMA
+     or qcutils.get_seriesitem, these do not make a private copy.
+     The source series is never written to, both the input and the output
+     data structures of copy_datastructure_cow hold CowSeries that refer
+     to it.
+    Usage:
+     ds3 = qcio.copy_datastructure_cow(ds2)
+    """
+    def __init__(self,source):
+        dict.__init__(self)
+        self.source = source
+        self.shared = set(source.keys())
+        for key in self.shared:
+            dict.__setitem__(self,key,None)
+    def peek(self,key):
+        """ Return the item without making a private copy."""
+        if key in self.shared: return self.source[key]
+        return dict.__getitem__(self,key)
+    def materialise(self,key):
+        """ Replace a shared item with a private copy."""
+        if key in self.shared:
+            dict.__setitem__(self,key,cow_copy_item(self.source[key]))
+            self.shared.discard(key)
+    def __getitem__(self,key):
+        self.materialise(key)
+        return dict.__getitem__(self,key)
+    def __setitem__(self,key,value):
+        self.shared.discard(key)
+        dict.__setitem__(self,key,value)
+    def __delitem__(self,key):
+        self.shared.discard(key)
+        dict.__delitem__(self,key)
+    def get(self,key,default=None):
+        if key in self: return self[key]
+        return default
+    def pop(self,key,*args):
+        if key in self: self.materialise(key)
+        return dict.pop(self,key,*args)
+    def items(self):
+        return [(key,self[key]) for key in self.keys()]
+    def iteritems(self):
+        return iter(self.items())
+    def values(self):
+        return [self[key] for key in self.keys()]
+    def itervalues(self):
+        return iter(self.values())
+    def copy(self):
+        return dict(self.items())
+    def __deepcopy__(self,memo):
+        return copy.deepcopy(dict([(key,self.peek(key)) for key in self.keys()]),memo)
+    def __reduce__(self):
+        return (dict,(dict([(key,self.peek(key)) for key in self.keys()]),))
+
+def cow_copy_item(item):
+    """ Return a private copy of a series item for CowSeries."""
+    if isinstance(item,numpy.ndarray): return item.copy()
+    # lists of datetimes, the datetimes themselves are immutable
+    if isinstance(item,list): return list(item)
+    return copy.deepcopy(item)
+
+@qcprof.profile
+def copy_datastructure_cow(ds_in):
+    """
+    Purpose:
+     Return a copy of a data structure that shares the series data with the
+     original.  A private copy of a series item is only made when it is
+     accessed for writing in either data structure (see CowSeries), so
+     deriving one processing level from another no longer holds two copies
+     of every series.
+     The global attributes and the other contents of the data structure are
+     copied as before.
+    Usage:
+     ds3 = qcio.copy_datastructure_cow(ds2)
+     where ds2 is the data structure to be copied
+           ds3 is the copy
+    """
+    ds_out = DataStructure()
+    for item in ds_in.__dict__.keys():
+        if item in ["series","timeaxis"]: continue
+        setattr(ds_out,item,copy.deepcopy(getattr(ds_in,item)))
+    for label in ds_in.series.keys():
+        series = ds_in.series[label]
+        if isinstance(series,CowSeries):
+            if len(series.shared)==len(series):
+                source = series.source
+            else:
+                # freeze the private items of the input series
+                source = dict([(key,series.peek(key)) for key in series.keys()])
+        else:
+            source = series
+        ds_in.series[label] = CowSeries(source)
+        ds_out.series[label] = CowSeries(source)
+    return ds_out
 
 def convert_v27tov28():
     """ Convert V2.7 (1D) netCDF files to V2.8 (3D). """
@@ -60,6 +252,7 @@ def convert_v27tov28():
     ncFile = nc_open_write(ncV28name,nctype='NETCDF4')
     nc_write_series(ncFile, ds)
 
+@qcprof.profile
 def copy_datastructure(cf,ds_in):
     '''
     Return a copy of a data structure based on the following rules:
@@ -83,14 +276,14 @@ def copy_datastructure(cf,ds_in):
     # if the L4 file does not exist then create the L4 data structure as a copy
     # of the L3 data structure
     if not os.path.exists(ct_filename):
-        ds_out = copy.deepcopy(ds_in)
+        ds_out = copy_datastructure_cow(ds_in)
     # if the L4 file does exist ...
     if os.path.exists(ct_filename):
         # check to see if the user wants to use it
         if qcutils.get_keyvaluefromcf(cf,["Options"],"UseExistingOutFile",default="No")!='Yes':
             # if the user doesn't want to use the existing L4 data then create
             # the L4 data structure as a copy of the L3 data structure
-            ds_out = copy.deepcopy(ds_in)
+            ds_out = copy_datastructure_cow(ds_in)
         else:
             # the user wants to use the data from an existing L4 file
             # get the netCDF file name at the "input" level
@@ -101,7 +294,7 @@ def copy_datastructure(cf,ds_in):
             sd_file = str(dt_file[0])
             ed_file = str(dt_file[-1])
             # create a copy of the data
-            ds_out = copy.deepcopy(ds_in)
+            ds_out = copy_datastructure_cow(ds_in)
             dt_out = ds_out.series['DateTime']['Data']
             ts = ds_out.globalattributes['time_step']
             sd_out = str(dt_out[0])
@@ -142,6 +335,67 @@ def copy_datastructure(cf,ds_in):
                         pass
     return ds_out
 
+def csv_compression(csv_filename):
+    """
+    Purpose:
+     Return "gzip" if the file is gzip compressed, otherwise return None.
+     The check uses the gzip magic number so compressed files are detected
+     whatever their extension.
+    Usage:
+     compression = qcio.csv_compression(csv_filename)
+    """
+    with open(csv_filename,'rb') as f:
+        magic = f.read(2)
+    if magic=='\x1f\x8b':
+        return "gzip"
+    return None
+
+def csv_open(csv_filename):
+    """
+    Purpose:
+     Open a CSV file for reading, gzip compressed files are decompressed
+     on the fly.
+    Usage:
+     csv_file = qcio.csv_open(csv_filename)
+    """
+    if csv_compression(csv_filename)=="gzip":
+        return gzip.open(csv_filename,'rb')
+    return open(csv_filename,'rb')
+
+def csv_read_columns(csv_filename,delimiter,skiprows,col_list,chunksize=100000,na_values=None):
+    """
+    Purpose:
+     Read the columns in col_list from a CSV file using the pandas C parser.
+     The file is read in chunks of chunksize lines to limit the memory used
+     by the parser.  Numeric columns are returned as float64 arrays with
+     missing values set to c.missing_value, other columns are returned as
+     arrays of strings with missing values set to "".
+    Usage:
+     columns = qcio.csv_read_columns(csv_filename,delimiter,skiprows,col_list)
+     where columns is a dictionary of arrays keyed by column number
+    """
+    if na_values is None:
+        na_values = ["NA","N/A","NAN","#NAME?","#VALUE!","#DIV/0!","#REF!"]
+    chunks = dict([(col,[]) for col in col_list])
+    reader = pandas.read_csv(csv_filename,sep=delimiter,header=None,skiprows=skiprows,
+                             usecols=col_list,na_values=na_values,float_precision="high",
+                             compression=csv_compression(csv_filename),chunksize=int(chunksize))
+    for chunk in reader:
+        for col in col_list:
+            chunks[col].append(chunk[col])
+    columns = {}
+    for col in col_list:
+        if len(chunks[col])==0:
+            columns[col] = numpy.array([],dtype=numpy.float64)
+            continue
+        series = pandas.concat(chunks[col],ignore_index=True)
+        if series.dtype.kind in ["i","u","f","b"]:
+            columns[col] = series.fillna(c.missing_value).values.astype(numpy.float64)
+        else:
+            columns[col] = series.fillna("").values.astype(str)
+    return columns
+
+@qcprof.profile
 def csv_read_series(cf):
     """
     Purpose:
@@ -154,6 +408,7 @@ def csv_read_series(cf):
          of the datetime
       4) missing data in the CSV file is represented by a blank
          or by "NA".
+     Gzip compressed CSV files are read transparently.
     Usage:
      ds = csv_read_series(cf)
      where cf is a control file
@@ -184,7 +439,7 @@ def csv_read_series(cf):
     opt = qcutils.get_keyvaluefromcf(cf,["Files"],"in_unitsrow",default=-1)
     units_row = int(opt)
     # sniff the file to find out the dialect and the delimiter
-    csv_file = open(csv_filename,'rb')
+    csv_file = csv_open(csv_filename)
     dialect = csv.Sniffer().sniff(csv_file.readline(), [' ',',','\t'])
     # rewind file
     csv_file.seek(0)
@@ -207,7 +462,7 @@ def csv_read_series(cf):
                 csv_varnames[item] = str(opt)
         elif "xl" in cf["Variables"][item].keys():
             opt = qcutils.get_keyvaluefromcf(cf,["Variables",item,"xl"],"name",default="")
-            if csv_varname in header:
+            if opt in header:
                 csv_varnames[item] = str(opt)
         elif "Function" not in cf["Variables"][item].keys():
             msg = " No csv, xl or Function section in control file for "+item
@@ -215,19 +470,11 @@ def csv_read_series(cf):
     var_list = csv_varnames.keys()
     csv_list = [csv_varnames[x] for x in var_list]
     col_list = [header.index(item) for item in csv_list]
-    # read the csv file using numpy's genfromtxt
+    # read the csv file in chunks using the pandas C parser
     log.info(" Reading from "+csv_filename)
     skip = first_data_row-1
-    # define the missing values and the value with which to fill them
-    missing_values = {}
-    filling_values = {}
-    for item in col_list:
-        missing_values[item] = ["NA","N/A","NAN","#NAME?","#VALUE!","#DIV/0!","#REF!"]
-        filling_values[item] = c.missing_value
-    # read the CSV file
-    data = numpy.genfromtxt(csv_filename,delimiter=dialect.delimiter,skip_header=skip,
-                            names=header,usecols=col_list,missing_values=missing_values,
-                            filling_values=filling_values,dtype=None)
+    chunksize = qcutils.get_keyvaluefromcf(cf,["Options"],"CSVChunkSize",default=100000,mode="quiet")
+    data = csv_read_columns(csv_filename,dialect.delimiter,skip,col_list,chunksize=chunksize)
     # get a data structure
     ds = DataStructure()
     # get the variables and put them into the data structure
@@ -238,9 +485,10 @@ def csv_read_series(cf):
     # NOTE: we will let the function to be called deal with missing
     # dates or empty lines
     for var in var_list:
+        col = header.index(csv_varnames[var])
         ds.series[var] = {}
-        ds.series[var]["Data"] = data[csv_varnames[var]]
-        ds.series[var]["Flag"] = numpy.zeros(len(data[csv_varnames[var]]),dtype=numpy.int32)
+        ds.series[var]["Data"] = data[col]
+        ds.series[var]["Flag"] = numpy.zeros(len(data[col]),dtype=numpy.int32)
     # call the function given in the control file
     # NOTE: the function being called needs to deal with missing date values
     # and empty lines
@@ -273,62 +521,32 @@ def nc_2xls(ncfilename,outputlist=None):
         xlsxfilename= ncfilename.replace('.nc','.xlsx')
         xlsx_write_series(ds,xlsxfilename,outputlist=outputlist)
 
+@qcprof.profile
 def read_eddypro_full(csvname):
     ds = DataStructure()
-    csvfile = open(csvname,'rb')
+    # the first line is a header, the second has the variable names and the third the units
+    csvfile = csv_open(csvname)
     csvreader = csv.reader(csvfile)
-    n = 0
-    adatetime = []
-    us_data_list = []
-    us_flag_list = []
-    Fh_data_list = []
-    Fh_flag_list = []
-    Fe_data_list = []
-    Fe_flag_list = []
-    Fc_data_list = []
-    Fc_flag_list = []
-    for row in csvreader:
-        if n==0:
-            header=row
-        elif n==1:
-            varlist=row
-            us_data_col = varlist.index('u*')
-            us_flag_col = varlist.index('qc_Tau')
-            Fh_data_col = varlist.index('H')
-            Fh_flag_col = varlist.index('qc_H')
-            Fe_data_col = varlist.index('LE')
-            Fe_flag_col = varlist.index('qc_LE')
-            Fc_data_col = varlist.index('co2_flux')
-            Fc_flag_col = varlist.index('qc_co2_flux')
-        elif n==2:
-            unitlist=row
-        else:
-            adatetime.append(datetime.datetime.strptime(row[1]+' '+row[2],'%Y-%m-%d %H:%M'))
-            us_data_list.append(float(row[us_data_col]))
-            us_flag_list.append(float(row[us_flag_col]))
-            Fh_data_list.append(float(row[Fh_data_col]))
-            Fh_flag_list.append(float(row[Fh_flag_col]))
-            Fe_data_list.append(float(row[Fe_data_col]))
-            Fe_flag_list.append(float(row[Fe_flag_col]))
-            Fc_data_list.append(float(row[Fc_data_col]))
-            Fc_flag_list.append(float(row[Fc_flag_col]))
-        n = n + 1
+    header = csvreader.next()
+    varlist = csvreader.next()
+    unitlist = csvreader.next()
+    csvfile.close()
+    labels = {"ustar":["u*","qc_Tau"],"Fh":["H","qc_H"],"Fe":["LE","qc_LE"],"Fc":["co2_flux","qc_co2_flux"]}
+    col_list = [1,2]
+    for label in labels.keys():
+        col_list = col_list+[varlist.index(item) for item in labels[label]]
+    columns = csv_read_columns(csvname,",",3,sorted(set(col_list)),na_values=[])
+    # parse the date and time columns in one go
+    dt_string = numpy.core.defchararray.add(numpy.core.defchararray.add(columns[1]," "),columns[2])
+    adatetime = pandas.to_datetime(dt_string,format='%Y-%m-%d %H:%M').to_pydatetime()
     nRecs = len(adatetime)
     ds.series['DateTime'] = {}
-    ds.series['DateTime']['Data'] = adatetime
+    ds.series['DateTime']['Data'] = list(adatetime)
     qcutils.round_datetime(ds,mode="nearest_timestep")
-    ds.series['ustar'] = {}
-    ds.series['ustar']['Data'] = numpy.array(us_data_list,dtype=numpy.float64)
-    ds.series['ustar']['Flag'] = numpy.array(us_flag_list,dtype=numpy.int32)
-    ds.series['Fh'] = {}
-    ds.series['Fh']['Data'] = numpy.array(Fh_data_list,dtype=numpy.float64)
-    ds.series['Fh']['Flag'] = numpy.array(Fh_flag_list,dtype=numpy.int32)
-    ds.series['Fe'] = {}
-    ds.series['Fe']['Data'] = numpy.array(Fe_data_list,dtype=numpy.float64)
-    ds.series['Fe']['Flag'] = numpy.array(Fe_flag_list,dtype=numpy.int32)
-    ds.series['Fc'] = {}
-    ds.series['Fc']['Data'] = numpy.array(Fc_data_list,dtype=numpy.float64)
-    ds.series['Fc']['Flag'] = numpy.array(Fc_flag_list,dtype=numpy.int32)
+    for label in ["ustar","Fh","Fe","Fc"]:
+        ds.series[label] = {}
+        ds.series[label]['Data'] = columns[varlist.index(labels[label][0])]
+        ds.series[label]['Flag'] = columns[varlist.index(labels[label][1])].astype(numpy.int32)
     ds.globalattributes["nc_nrecs"] = nRecs
     return ds
 
@@ -614,6 +832,7 @@ def smap_writeheaders(cf,csvfile):
     writer.writerow(row_list)
     return writer
 
+@qcprof.profile
 def xl2nc(cf,InLevel):
     # get the data series from the Excel file
     in_filename = get_infilenamefromcf(cf)
@@ -660,7 +879,7 @@ def xl2nc(cf,InLevel):
     # write the data to the netCDF file
     outfilename = get_outfilenamefromcf(cf)
     ncFile = nc_open_write(outfilename)
-    nc_write_series(ncFile,ds)
+    nc_write_series(ncFile,ds,write_options=get_ncwriteoptionsfromcf(cf))
     return 1
 
 def ep_biomet_write_csv(cf):
@@ -837,6 +1056,7 @@ def ep_biomet_write_csv(cf):
     csvfile.close()
     return
 
+@qcprof.profile
 def fn_write_csv(cf):
     # get the file names
     ncFileName = get_infilenamefromcf(cf)
@@ -1068,6 +1288,151 @@ def get_outputlistfromcf(cf,filetype):
         outputlist = None
     return outputlist
 
+def get_ncwriteoptionsfromcf(cf):
+    """
+    Purpose:
+     Get the netCDF write options from the [Options] section of the control
+     file.  The options are;
+      NetCDFCompression      - "Yes" to compress variables with zlib, default "No"
+      NetCDFCompressionLevel - zlib compression level (1 to 9), default 4
+      NetCDFShuffle          - "Yes" to use the HDF5 shuffle filter, default "Yes"
+      NetCDFChunkSize        - number of records in each chunk along the time
+                               dimension, default is 1 year of data or the
+                               number of records, whichever is smaller
+      NetCDFFloat32          - list of series to be written as float32 instead
+                               of float64, eg "['Ux_Sd','Uy_Sd','Uz_Sd']"
+    Usage:
+     nc_options = qcio.get_ncwriteoptionsfromcf(cf)
+     qcio.nc_write_series(nc_file,ds,write_options=nc_options)
+    """
+    opt = {}
+    compression = qcutils.get_keyvaluefromcf(cf,["Options"],"NetCDFCompression",default="No",mode="quiet")
+    opt["zlib"] = (str(compression).lower()=="yes")
+    opt["complevel"] = int(qcutils.get_keyvaluefromcf(cf,["Options"],"NetCDFCompressionLevel",default=4,mode="quiet"))
+    shuffle = qcutils.get_keyvaluefromcf(cf,["Options"],"NetCDFShuffle",default="Yes",mode="quiet")
+    opt["shuffle"] = (str(shuffle).lower()=="yes")
+    opt["chunksize"] = int(qcutils.get_keyvaluefromcf(cf,["Options"],"NetCDFChunkSize",default=0,mode="quiet"))
+    float32_list = qcutils.get_keyvaluefromcf(cf,["Options"],"NetCDFFloat32",default=[],mode="quiet")
+    if isinstance(float32_list,basestring):
+        float32_list = ast.literal_eval(float32_list)
+    opt["float32"] = list(float32_list)
+    return opt
+
+def get_cacheoptionsfromcf(cf):
+    """
+    Purpose:
+     Get the result cache options from the [Options] section of the batch
+     control file.  The options are;
+      Cache            - "Yes" to skip jobs whose inputs have not changed,
+                         default "No"
+      CacheDirectory   - directory for the cache entries, default
+                         .ozfluxqc/cache in the user's home directory
+      CacheMaxEntries  - maximum number of entries kept, default 1000
+      CacheMaxAge      - entries not used for this many days are removed,
+                         default 90
+      SolarCache       - "Yes" to cache the solar altitude and synthetic Fsd
+                         for each site in the "solar" sub-directory of the
+                         cache directory, default "Yes"
+      SolarCacheMaxSize - maximum size of the solar geometry cache in MB,
+                         default 500
+      ModelCache       - "Yes" to cache the SOLO and FFNET models trained for
+                         each window in the "models" sub-directory of the
+                         cache directory, default "Yes"
+      ModelCacheMaxSize - maximum size of the model cache in MB, default 200
+    Usage:
+     cache_options = qcio.get_cacheoptionsfromcf(cf)
+    """
+    cache_options = {}
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"Cache",default="No",mode="quiet")
+    cache_options["enabled"] = (str(opt).lower()=="yes")
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"CacheDirectory",default=qccache.default_directory,mode="quiet")
+    cache_options["directory"] = str(opt)
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"CacheMaxEntries",default=1000,mode="quiet")
+    cache_options["max_entries"] = int(opt)
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"CacheMaxAge",default=90,mode="quiet")
+    cache_options["max_age"] = float(opt)
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SolarCache",default="Yes",mode="quiet")
+    cache_options["solar_enabled"] = (str(opt).lower()=="yes")
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SolarCacheMaxSize",default=500,mode="quiet")
+    cache_options["solar_max_mb"] = float(opt)
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"ModelCache",default="Yes",mode="quiet")
+    cache_options["model_enabled"] = (str(opt).lower()=="yes")
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"ModelCacheMaxSize",default=200,mode="quiet")
+    cache_options["model_max_mb"] = float(opt)
+    cache_options["force"] = False
+    return cache_options
+
+def get_profileoptionsfromcf(cf):
+    """
+    Purpose:
+     Get the profiling options from the [Options] section of the control
+     file.  The options are;
+      Profile           - "Yes" to time each step of the level, default "No"
+      ProfileFile       - JSON file for the profile, default is the output
+                          file name with "_profile.json" in place of the
+                          extension
+      ProfileMinPercent - only steps taking more than this percentage of
+                          the total time are written to the log, default 1
+    Usage:
+     profile_options = qcio.get_profileoptionsfromcf(cf)
+    """
+    profile_options = {}
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"Profile",default="No",mode="quiet")
+    profile_options["enabled"] = (str(opt).lower()=="yes")
+    file_name = ""
+    if "Files" in cf and "out_filename" in cf["Files"]:
+        file_name = os.path.splitext(get_outfilenamefromcf(cf))[0]+"_profile.json"
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"ProfileFile",default=file_name,mode="quiet")
+    profile_options["file_name"] = str(opt)
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"ProfileMinPercent",default=1,mode="quiet")
+    profile_options["min_percent"] = float(opt)
+    return profile_options
+
+def get_incrementaloptionsfromcf(cf):
+    """
+    Purpose:
+     Get the incremental processing options from the [Options] section of
+     the control file.  The options are;
+      Incremental        - "Yes" to use the existing output file as a checkpoint
+                           and only process data after it, default "No"
+      IncrementalWarmUp  - number of days before the end of the existing output
+                           file that are processed again, default 30
+     Incremental processing is only done at L2 and L3 (see qcls.incremental_qc),
+     the gap filling at L4 to L6 trains over windows that would include the
+     previously filled data so these levels are always done in full.
+    Usage:
+     opt = qcio.get_incrementaloptionsfromcf(cf)
+    """
+    opt = {}
+    incremental = qcutils.get_keyvaluefromcf(cf,["Options"],"Incremental",default="No",mode="quiet")
+    opt["incremental"] = (str(incremental).lower()=="yes")
+    opt["warmup_days"] = float(qcutils.get_keyvaluefromcf(cf,["Options"],"IncrementalWarmUp",default=30,mode="quiet"))
+    return opt
+
+def get_ncvariablekwargs(ncFile,write_options,dim):
+    """
+    Purpose:
+     Return the keyword arguments for netCDF4.Dataset.createVariable that
+     implement the compression and chunking write options.
+     Compression and chunking are only used for NETCDF4 files.
+    Usage:
+     kwargs = qcio.get_ncvariablekwargs(ncFile,write_options,("time",))
+    """
+    kwargs = {}
+    if write_options is None or not write_options.get("zlib",False): return kwargs
+    if not ncFile.data_model.startswith("NETCDF4"): return kwargs
+    kwargs["zlib"] = True
+    kwargs["complevel"] = write_options["complevel"]
+    kwargs["shuffle"] = write_options["shuffle"]
+    # chunk along the time dimension only, series are read and written whole
+    nRecs = len(ncFile.dimensions["time"])
+    chunksize = write_options["chunksize"]
+    if chunksize<=0: chunksize = write_options.get("chunksize_default",nRecs)
+    chunksize = max(1,min(chunksize,nRecs))
+    kwargs["chunksizes"] = (chunksize,)+(1,)*(len(dim)-1)
+    return kwargs
+
+@qcprof.profile
 def get_seriesstats(cf,ds):
     # open an Excel file for the flag statistics
     level = ds.globalattributes['nc_level']
@@ -1175,162 +1540,122 @@ def load_controlfile(path='.',title='Choose a control file'):
     cf = get_controlfilecontents(name)
     return cf
 
+@qcprof.profile
 def nc_concatenate(cf):
-    # initialise logicals
-    TimeGap = False
+    """
+    Purpose:
+     Concatenate the netCDF files listed in the [Files] [In] section of the
+     control file and write the result to the file given in [Files] [Out].
+     The files are concatenated in two passes to limit the memory used:
+      1) the time axis and variable attributes of each file are read, the
+         overlap between consecutive files is found and the length of the
+         concatenated record is worked out
+      2) the concatenated series are allocated and the data of each file are
+         read one variable at a time into their place in the concatenated
+         series
+    Usage:
+     qcio.nc_concatenate(cf)
+    """
     # get an instance of the data structure
     ds = DataStructure()
     # get the input file list
     InFile_list = cf['Files']['In'].keys()
-    # read in the first file
     baseFileName = cf['Files']['In'][InFile_list[0]]
-    log.info(' Reading data from '+baseFileName)
     fixtimestepmethod = qcutils.get_keyvaluefromcf(cf,["Options"],"FixTimeStepMethod",default="round")
-    ds_n = nc_read_series(baseFileName,fixtimestepmethod=fixtimestepmethod)
-    if len(ds_n.series.keys())==0:
-        log.error(' An error occurred reading netCDF file: '+baseFileName)
-        return
-    # fill the global attributes
-    for ThisOne in ds_n.globalattributes.keys():
-        ds.globalattributes[ThisOne] = ds_n.globalattributes[ThisOne]
-    # find the first datetime in the file where more than 50% of the variables are present.
-    dt = ds_n.series["DateTime"]["Data"]
-    cond_idx = numpy.zeros(len(dt))
-    series_list = ds_n.series.keys()
-    # remove non-data series
-    for item in ["DateTime","DateTime_UTC","xlDateTime",
-                 "Year","Month","Day","Hour","Minute","Second",
-                 "Hdh","Ddd","time"]:
-        if item in series_list: series_list.remove(item)
-    # loop over the data series and calculate fraction of data present
-    for item in series_list:
-        data,flag,attr = qcutils.GetSeriesasMA(ds_n,item)
-        idx = numpy.ma.where(data.mask==False)
+    # pass 1: read the time axis and the attributes of each file, the data
+    # are left in the files until they are needed (see LazySeries)
+    ds_list = []
+    si_list = []
+    for n,InFile in enumerate(InFile_list):
+        ncFileName = cf['Files']['In'][InFile]
+        log.info(' Reading data from '+ncFileName)
+        ds_n = nc_read_series(ncFileName,fixtimestepmethod=fixtimestepmethod,lazy=True)
+        if len(ds_n.series.keys())==0:
+            log.error(' An error occurred reading netCDF file: '+ncFileName)
+            return
+        dt_n = ds_n.series["DateTime"]["Data"]
+        if n==0:
+            # fill the global attributes
+            for ThisOne in ds_n.globalattributes.keys():
+                ds.globalattributes[ThisOne] = ds_n.globalattributes[ThisOne]
+            ts = int(ds.globalattributes['time_step'])
+            # the data series in the first file, used to find the start date below
+            first_list = [item for item in ds_n.series.keys() if item not in
+                          ["DateTime","DateTime_UTC","xlDateTime","Year","Month","Day",
+                           "Hour","Minute","Second","Hdh","Ddd","time"]]
+            si = 0
+        else:
+            if dt_n[0]<dt_end+datetime.timedelta(minutes=ts):
+                log.info(' Overlapping times detected in consecutive files')
+                si = qcutils.GetDateIndex(dt_n,str(dt_end),ts=ts)+1
+            if dt_n[0]==dt_end+datetime.timedelta(minutes=ts):
+                log.info(' Start and end times OK in consecutive files')
+                si = 0
+            if dt_n[0]>dt_end+datetime.timedelta(minutes=ts):
+                log.info(' Gap between start and end times in consecutive files')
+                si = 0
+        if si<len(dt_n): dt_end = dt_n[-1]
+        # check that we have 'Ws' and 'Wd' series
+        nc_concatenate_windseries(ds_n)
+        ds_list.append(ds_n)
+        si_list.append(si)
+    # pass 2: allocate the concatenated series and copy the data from each
+    # file into them one variable at a time
+    nRecs_list = [max(0,len(ds_n.series["DateTime"]["Data"])-si) for ds_n,si in zip(ds_list,si_list)]
+    offset_list = list(numpy.cumsum([0]+nRecs_list[:-1]))
+    nRecs = sum(nRecs_list)
+    series_list = []
+    for ds_n in ds_list:
+        series_list = series_list+[item for item in ds_n.series.keys() if item not in series_list]
+    for ThisOne in series_list:
+        for ds_n,si,offset,nRecs_n in zip(ds_list,si_list,offset_list,nRecs_list):
+            if ThisOne not in ds_n.series.keys(): continue
+            data = ds_n.series[ThisOne]["Data"]
+            flag = ds_n.series[ThisOne]["Flag"]
+            attr = ds_n.series[ThisOne]["Attr"]
+            if ThisOne=="Fc" and attr["units"]=='mg/m2/s':
+                log.info("Converting Fc to umol/m2/s")
+                Fc,flag,attr = qcutils.GetSeriesasMA(ds_n,ThisOne)
+                data = numpy.ma.filled(mf.Fc_umolpm2psfrommgpm2ps(Fc),float(c.missing_value))
+                attr['units'] = 'umol/m2/s'
+                attr['standard_name'] = 'surface_upward_mole_flux_of_carbon_dioxide'
+            if ThisOne not in ds.series.keys():
+                # series that are not in a file are missing data with a QC flag of 1
+                ds.series[ThisOne] = {}
+                if isinstance(data,list):
+                    ds.series[ThisOne]['Data'] = [None]*nRecs
+                else:
+                    ds.series[ThisOne]['Data'] = numpy.full(nRecs,c.missing_value,dtype=data.dtype)
+                ds.series[ThisOne]['Flag'] = numpy.ones(nRecs,dtype=numpy.int32)
+                ds.series[ThisOne]['Attr'] = {}
+                for item in attr.keys():
+                    ds.series[ThisOne]['Attr'][item] = attr[item]
+            ds.series[ThisOne]['Data'][offset:offset+nRecs_n] = data[si:]
+            ds.series[ThisOne]['Flag'][offset:offset+nRecs_n] = flag[si:]
+            # release the memory used by this variable in the input file
+            del ds_n.series[ThisOne]
+    for ds_n in ds_list:
+        nc_close_series(ds_n)
+    # find the first datetime in the first file where more than 50% of the variables are present.
+    cond_idx = numpy.zeros(nRecs_list[0])
+    for item in first_list:
+        data = ds.series[item]["Data"][:nRecs_list[0]]
+        idx = numpy.where(abs(data-numpy.float64(c.missing_value))>=c.eps)[0]
         cond_idx[idx] = cond_idx[idx] + 1
-    cond_idx = cond_idx/len(series_list)
+    cond_idx = cond_idx/len(first_list)
     # find the first element where more than 50% data is present
     idx = numpy.where(cond_idx>=0.50)[0]
     # skip if enough data is present from the start of the file
     if len(idx)!=0 and idx[0]!=0:
         si = idx[0]
+        dt = ds.series["DateTime"]["Data"]
         msg = " Start date truncated from "+str(dt[0])
         msg = msg+" to "+str(dt[si])
         log.warning(msg)
-        # update the relevent global attributes
-        ds_n.globalattributes["start_date"] = dt[si]
-        ds_n.globalattributes["nc_nrecs"] = len(dt[si:])
         # now loop over the data series and truncate
-        series_list = ds_n.series.keys()
-        for item in series_list:
-            ds_n.series[item]["Data"] = ds_n.series[item]["Data"][si:]
-            ds_n.series[item]["Flag"] = ds_n.series[item]["Flag"][si:]
-    # check that we have 'Ws' and 'Wd' series
-    if "Ws" not in ds_n.series.keys():
-        if "Ws_CSAT" in ds_n.series.keys():
-            msg = " Ws not found, copying series Ws_CSAT to Ws"
-            log.info(msg)
-            ds_n.series["Ws"] = ds_n.series["Ws_CSAT"].copy()
-        else:
-            msg = "Both Ws and Ws_CSAT missing from file"
-            log.warning(msg)
-    if "Wd" not in ds_n.series.keys():
-        if "Wd_CSAT" in ds_n.series.keys():
-            msg = " Wd not found, copying series Wd_CSAT to Wd"
-            log.info(msg)
-            ds_n.series["Wd"] = ds_n.series["Wd_CSAT"].copy()
-        else:
-            msg = "Both Wd and Wd_CSAT missing from file"
-            log.warning(msg)
-    # fill the variables
-    for ThisOne in ds_n.series.keys():
-        if ThisOne=="Fc":
-            Fc,flag,attr = qcutils.GetSeriesasMA(ds_n, ThisOne)
-            if attr['units']=='mg/m2/s':
-                log.info("Converting Fc to umol/m2/s")
-                Fc = mf.Fc_umolpm2psfrommgpm2ps(Fc)
-                attr['units'] = 'umol/m2/s'
-                attr['standard_name'] = 'surface_upward_mole_flux_of_carbon_dioxide'
-                qcutils.CreateSeries(ds_n,ThisOne,Fc,Flag=flag,Attr=attr)
-        ds.series[ThisOne] = {}
-        ds.series[ThisOne]['Data'] = ds_n.series[ThisOne]['Data']
-        ds.series[ThisOne]['Flag'] = ds_n.series[ThisOne]['Flag']
-        ds.series[ThisOne]['Attr'] = {}
-        for attr in ds_n.series[ThisOne]['Attr'].keys():
-            ds.series[ThisOne]['Attr'][attr] = ds_n.series[ThisOne]['Attr'][attr]
-    ts = int(ds.globalattributes['time_step'])
-    # loop over the remaining files given in the control file
-    for n in InFile_list[1:]:
-        ncFileName = cf['Files']['In'][InFile_list[int(n)]]
-        log.info(' Reading data from '+ncFileName)
-        #print 'ncconcat: reading data from '+ncFileName
-        ds_n = nc_read_series(ncFileName,fixtimestepmethod=fixtimestepmethod)
-        if len(ds.series.keys())==0:
-            log.error(' An error occurred reading the netCDF file: '+ncFileName)
-            return
-        dt_n = ds_n.series['DateTime']['Data']
-        dt = ds.series['DateTime']['Data']
-        nRecs_n = len(ds_n.series["DateTime"]["Data"])
-        nRecs = len(ds.series["DateTime"]["Data"])
-        # check that we have 'Ws' and 'Wd' series
-        if "Ws" not in ds_n.series.keys():
-            if "Ws_CSAT" in ds_n.series.keys():
-                msg = " Ws not found, copying series Ws_CSAT to Ws"
-                log.info(msg)
-                ds_n.series["Ws"] = ds_n.series["Ws_CSAT"].copy()
-            else:
-                msg = " Both Ws and Ws_CSAT missing from file"
-                log.warning(msg)
-        if "Wd" not in ds_n.series.keys():
-            if "Wd_CSAT" in ds_n.series.keys():
-                msg = " Wd not found, copying series Wd_CSAT to Wd"
-                log.info(msg)
-                ds_n.series["Wd"] = ds_n.series["Wd_CSAT"].copy()
-            else:
-                msg = " Both Wd and Wd_CSAT missing from file"
-                log.warning(msg)
-        #print ds.series['DateTime']['Data'][-1],ds_n.series['DateTime']['Data'][-1]
-        #print dt[-1],dt[-1]+datetime.timedelta(minutes=ts),dt_n[0]
-        if dt_n[0]<dt[-1]+datetime.timedelta(minutes=ts):
-            log.info(' Overlapping times detected in consecutive files')
-            si = qcutils.GetDateIndex(dt_n,str(dt[-1]),ts=ts)+1
-            ei = -1
-        if dt_n[0]==dt[-1]+datetime.timedelta(minutes=ts):
-            log.info(' Start and end times OK in consecutive files')
-            si = 0; ei = -1
-        if dt_n[0]>dt[-1]+datetime.timedelta(minutes=ts):
-            log.info(' Gap between start and end times in consecutive files')
-            si = 0; ei = -1
-            #TimeGap = True
-        # loop over the data series in the concatenated file
-        for ThisOne in ds.series.keys():
-            # does this series exist in the file being added to the concatenated file
-            if ThisOne in ds_n.series.keys():
-                # if so, then append this series to the concatenated series
-                if type(ds.series[ThisOne]["Data"]) is list:
-                    ds.series[ThisOne]['Data'] = ds.series[ThisOne]['Data']+ds_n.series[ThisOne]['Data'][si:ei]
-                else:
-                    ds.series[ThisOne]['Data'] = numpy.append(ds.series[ThisOne]['Data'],ds_n.series[ThisOne]['Data'][si:ei])
-                ds.series[ThisOne]['Flag'] = numpy.append(ds.series[ThisOne]['Flag'],ds_n.series[ThisOne]['Flag'][si:ei])
-            else:
-                # if not, then create a dummy series and concatenate that
-                ds_n.series[ThisOne] = {}
-                ds_n.series[ThisOne]['Data'] = numpy.array([c.missing_value]*nRecs_n,dtype=numpy.float64)
-                ds_n.series[ThisOne]['Flag'] = numpy.array([1]*nRecs_n,dtype=numpy.int32)
-                ds.series[ThisOne]['Data'] = numpy.append(ds.series[ThisOne]['Data'],ds_n.series[ThisOne]['Data'][si:ei])
-                ds.series[ThisOne]['Flag'] = numpy.append(ds.series[ThisOne]['Flag'],ds_n.series[ThisOne]['Flag'][si:ei])
-        # and now loop over the series in the file being concatenated
-        for ThisOne in ds_n.series.keys():
-            # does this series exist in the concatenated data
-            if ThisOne not in ds.series.keys():
-                # if not then add it
-                ds.series[ThisOne] = {}
-                ds.series[ThisOne]['Data'] = numpy.array([c.missing_value]*nRecs,dtype=numpy.float64)
-                ds.series[ThisOne]['Flag'] = numpy.array([1]*nRecs,dtype=numpy.int32)
-                ds.series[ThisOne]['Data'] = numpy.append(ds.series[ThisOne]['Data'],ds_n.series[ThisOne]['Data'][si:ei])
-                ds.series[ThisOne]['Flag'] = numpy.append(ds.series[ThisOne]['Flag'],ds_n.series[ThisOne]['Flag'][si:ei])
-                ds.series[ThisOne]['Attr'] = {}
-                for attr in ds_n.series[ThisOne]['Attr'].keys():
-                    ds.series[ThisOne]['Attr'][attr] = ds_n.series[ThisOne]['Attr'][attr]
+        for item in ds.series.keys():
+            ds.series[item]["Data"] = ds.series[item]["Data"][si:]
+            ds.series[item]["Flag"] = ds.series[item]["Flag"][si:]
     # find the last datetime in the file where more than 50% of the variables are present.
     ds.globalattributes["nc_nrecs"] = len(ds.series["DateTime"]["Data"])
     dt = ds.series["DateTime"]["Data"]
@@ -1424,7 +1749,26 @@ def nc_concatenate(cf):
         # now the base file will not be overwritten
     ncFile = nc_open_write(outFileName)
     ndims = int(qcutils.get_keyvaluefromcf(cf,["Options"],"NumberOfDimensions", default=3))
-    nc_write_series(ncFile,ds,ndims=ndims)
+    nc_write_series(ncFile,ds,ndims=ndims,write_options=get_ncwriteoptionsfromcf(cf))
+
+def nc_concatenate_windseries(ds_n):
+    """ Check that a file being concatenated has 'Ws' and 'Wd' series."""
+    if "Ws" not in ds_n.series.keys():
+        if "Ws_CSAT" in ds_n.series.keys():
+            msg = " Ws not found, copying series Ws_CSAT to Ws"
+            log.info(msg)
+            ds_n.series["Ws"] = ds_n.series["Ws_CSAT"].copy()
+        else:
+            msg = " Both Ws and Ws_CSAT missing from file"
+            log.warning(msg)
+    if "Wd" not in ds_n.series.keys():
+        if "Wd_CSAT" in ds_n.series.keys():
+            msg = " Wd not found, copying series Wd_CSAT to Wd"
+            log.info(msg)
+            ds_n.series["Wd"] = ds_n.series["Wd_CSAT"].copy()
+        else:
+            msg = " Both Wd and Wd_CSAT missing from file"
+            log.warning(msg)
 
 def nc_split():
     split_info = {}
@@ -1555,7 +1899,8 @@ def ncsplit_progress(split_gui,text):
     split_gui.progress.grid(row=9,column=0,columnspan=6,sticky="W")
     split_gui.update()
 
-def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
+@qcprof.profile
+def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod="",lazy=False):
     """
     Purpose:
      Reads a netCDF file and returns the meta-data and data in a DataStructure.
@@ -1578,6 +1923,11 @@ def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
      ds = qcio.nc_read_series(nc_name)
      where nc_name is the full name of the netCDF file to be read
            ds is the returned data structure
+     ds = qcio.nc_read_series(nc_name,lazy=True)
+     reads the global attributes, the variable attributes and the time axis
+     but leaves the data and QC flags of all other variables in the netCDF
+     file until they are first used, see qcio.LazySeries.  This is much
+     faster and uses much less memory when only a few variables are needed.
     Side effects:
      This routine checks the time step of the data read from the netCDF file
      against the value of the global attribute "time_step", see qcutils.CheckTimeStep.
@@ -1589,6 +1939,7 @@ def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
      is not implemented yet but will interpolate the data from the original time
      step to a regular time step.  Rounding will round any non-itegral time steps
      to the nearest time step.
+     Repairing the time step reads all variables, even when lazy is True.
     Author: PRI
     Date: Back in the day
     """
@@ -1610,10 +1961,16 @@ def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
         if "time_step" in ds.globalattributes: c.ts = ds.globalattributes["time_step"]
     # get a list of the variables in the netCDF file (not their QC flags)
     varlist = [x for x in ncFile.variables.keys() if "_QCFlag" not in x]
+    # the lazy reader keeps the netCDF file open until all variables have been read
+    reader = {"ncFile":ncFile,"file_name":ncFullName,"pending":set()}
     for ThisOne in varlist:
         # skip variables that do not have time as a dimension
         dimlist = [x.lower() for x in ncFile.variables[ThisOne].dimensions]
         if "time" not in dimlist: continue
+        if lazy and ThisOne not in nc_timeaxis_list:
+            # defer reading the data and QC flag until they are used
+            ds.series[unicode(ThisOne)] = LazySeries(reader,ThisOne,nc_read_var_attr(ncFile,ThisOne))
+            continue
         # create the series in the data structure
         ds.series[unicode(ThisOne)] = {}
         # get the data and the QC flag
@@ -1621,9 +1978,12 @@ def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
         ds.series[ThisOne]["Data"] = data
         ds.series[ThisOne]["Flag"] = flag
         ds.series[ThisOne]["Attr"] = attr
-    ncFile.close()
+    if len(reader["pending"])==0: nc_close_reader(reader)
     # make sure all values of -9999 have non-zero QC flag
-    qcutils.CheckQCFlags(ds)
+    # NOTE: lazy series do this when they are read
+    for ThisOne in ds.series.keys():
+        if isinstance(ds.series[ThisOne],LazySeries): continue
+        qcutils.CheckSeriesQCFlags(ds.series[ThisOne]["Data"],ds.series[ThisOne]["Flag"])
     # get a series of Python datetime objects
     if "time" in ds.series.keys():
         time,f,a = qcutils.GetSeries(ds,"time")
@@ -1646,6 +2006,29 @@ def nc_read_series(ncFullName,checktimestep=True,fixtimestepmethod=""):
     log.info(msg)
     return ds
 
+def nc_close_reader(reader):
+    """ Close the netCDF file used by the lazy series of a reader if it is open."""
+    if reader["ncFile"] is None: return
+    reader["ncFile"].close()
+    reader["ncFile"] = None
+
+def nc_close_series(ds):
+    """
+    Purpose:
+     Close the netCDF files held open by the lazy series in a data structure
+     returned by nc_read_series(...,lazy=True).  Call this when the series
+     needed from the file have been read, the file is otherwise kept open
+     until every series in it has been used.  Lazy series that are used
+     later are still read, see qcio.LazySeries.
+    Usage:
+     ds = qcio.nc_read_series(nc_name,lazy=True)
+     Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd")
+     qcio.nc_close_series(ds)
+    """
+    for label in ds.series.keys():
+        series = ds.series[label]
+        if isinstance(series,LazySeries) and not series.loaded: nc_close_reader(series.reader)
+
 def nc_read_todf(ncFullName,var_data=[]):
     """
     Purpose:
@@ -1722,6 +2105,21 @@ def nc_read_var(ncFile,ThisOne):
     """ Reads a variable from a netCDF file and returns the data, the QC flag and the variable
         attribute dictionary.
     """
+    data,flag = nc_read_var_data(ncFile,ThisOne)
+    attr = nc_read_var_attr(ncFile,ThisOne)
+    return data,flag,attr
+
+def nc_read_var_attr(ncFile,ThisOne):
+    """ Reads the attribute dictionary of a variable from a netCDF file."""
+    vattrlist = ncFile.variables[ThisOne].ncattrs()
+    attr = {}
+    if len(vattrlist)!=0:
+        for vattr in vattrlist:
+            attr[vattr] = getattr(ncFile.variables[ThisOne],vattr)
+    return attr
+
+def nc_read_var_data(ncFile,ThisOne):
+    """ Reads the data and the QC flag of a variable from a netCDF file."""
     # check the number of dimensions
     nDims = len(ncFile.variables[ThisOne].shape)
     if nDims not in [1,3]:
@@ -1761,13 +2159,7 @@ def nc_read_var(ncFile,ThisOne):
     # check for Year, Month etc as int64, force to int32 if required
     if ThisOne in ["Year","Month","Day","Hour","Minute","Second"]:
         if data.dtype=="int64": data = data.astype(numpy.int32)
-    # get the variable attributes
-    vattrlist = ncFile.variables[ThisOne].ncattrs()
-    attr = {}
-    if len(vattrlist)!=0:
-        for vattr in vattrlist:
-            attr[vattr] = getattr(ncFile.variables[ThisOne],vattr)
-    return data,flag,attr
+    return data,flag
 
 def nc_open_write(ncFullName,nctype='NETCDF4'):
     """
@@ -1791,7 +2183,8 @@ def nc_open_write(ncFullName,nctype='NETCDF4'):
         ncFile = ''
     return ncFile
 
-def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
+@qcprof.profile
+def nc_write_series(ncFile,ds,outputlist=None,ndims=3,write_options=None):
     """
     Purpose:
      Write the contents of a data structure to a netCDF file.
@@ -1800,10 +2193,13 @@ def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
      qcio.nc_write_series(nc_file,ds)
      where nc_file is a netCDF file object returned by qcio.nc_open_write
            ds is a data structure
+     Compression, chunking and float32 output are set by write_options,
+     usually from the control file;
+     qcio.nc_write_series(nc_file,ds,write_options=qcio.get_ncwriteoptionsfromcf(cf))
     Author: PRI
     Date: Back in the day
     """
-    ldt = ds.series["DateTime"]["Data"]
+    ldt = qcutils.get_seriesitem(ds,"DateTime","Data")
     ds.globalattributes['QC_version'] = str(cfg.version_name)+' '+str(cfg.version_number)
     ds.globalattributes["start_date"] = str(ldt[0])
     ds.globalattributes["end_date"] = str(ldt[-1])
@@ -1841,6 +2237,11 @@ def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
     else:
         nRecs = len(ldt)
     ncFile.createDimension("time",nRecs)
+    if write_options is not None:
+        # default chunk size is 1 year of data
+        write_options = dict(write_options)
+        ts = int(ds.globalattributes.get("time_step",30))
+        write_options["chunksize_default"] = 365*24*60/ts
     if ndims==3:
         ncFile.createDimension("latitude",1)
         ncFile.createDimension("longitude",1)
@@ -1861,7 +2262,7 @@ def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
         if ThisOne in outputlist: outputlist.remove(ThisOne)
     # write the time variable
     nc_time = netCDF4.date2num(ldt,"days since 1800-01-01 00:00:00.0",calendar="gregorian")
-    ncVar = ncFile.createVariable("time","d",("time",))
+    ncVar = ncFile.createVariable("time","d",("time",),**get_ncvariablekwargs(ncFile,write_options,("time",)))
     ncVar[:] = nc_time
     setattr(ncVar,"long_name","time")
     setattr(ncVar,"standard_name","time")
@@ -1888,11 +2289,11 @@ def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
     datetimelist = ['xlDateTime','Year','Month','Day','Hour','Minute','Second','Hdh','Ddd']
     # and write them to the netCDF file
     for ThisOne in sorted(datetimelist):
-        if ThisOne in ds.series.keys(): nc_write_var(ncFile,ds,ThisOne,dims)
+        if ThisOne in ds.series.keys(): nc_write_var(ncFile,ds,ThisOne,dims,write_options=write_options)
         if ThisOne in outputlist: outputlist.remove(ThisOne)
     # write everything else to the netCDF file
     for ThisOne in sorted(outputlist):
-        nc_write_var(ncFile,ds,ThisOne,dims)
+        nc_write_var(ncFile,ds,ThisOne,dims,write_options=write_options)
     # write the coordinate reference system (crs) variable
     if "crs" not in outputlist:
         ncVar = ncFile.createVariable("crs","i",())
@@ -1903,7 +2304,7 @@ def nc_write_series(ncFile,ds,outputlist=None,ndims=3):
         setattr(ncVar,"inverse_flattening","298.257223563")
     ncFile.close()
 
-def nc_write_var(ncFile,ds,ThisOne,dim):
+def nc_write_var(ncFile,ds,ThisOne,dim,write_options=None):
     """
     Purpose:
      Function to write data from a series in the data structure to a netCDF variable.
@@ -1913,39 +2314,49 @@ def nc_write_var(ncFile,ds,ThisOne,dim):
             ds is the data structure
             ThisOne is the label of a series in ds
             ("time","latitude","longitude") is the dimension tuple
+            write_options is an optional dictionary of compression, chunking
+            and float32 options (see get_ncwriteoptionsfromcf)
     Author: PRI
     Date: August 2014
     """
+    # read only access so copy-on-write series are not copied
+    data = qcutils.get_seriesitem(ds,ThisOne,'Data')
+    flag = qcutils.get_seriesitem(ds,ThisOne,'Flag')
+    attr_dict = qcutils.get_seriesitem(ds,ThisOne,'Attr')
     # get the data type of the series in ds
-    dt = get_ncdtype(ds.series[ThisOne]['Data'])
+    dt = get_ncdtype(data)
     # force data type to float64 or int32
     if dt not in ["d","i"]:
         dt = "d"
         if ThisOne in ["Year","Month","Day","Hour","Minute","Second"]: dt = "i"
+    # write selected series as float32 if requested
+    if write_options is not None and dt=="d" and ThisOne in write_options["float32"]: dt = "f"
+    # get the compression and chunking options
+    kwargs = get_ncvariablekwargs(ncFile,write_options,dim)
     # create the netCDF variable
     try:
-        ncVar = ncFile.createVariable(ThisOne,dt,dim)
+        ncVar = ncFile.createVariable(ThisOne,dt,dim,**kwargs)
     except RuntimeError:
         print ThisOne
         raise Exception("Error writing variable to netCDF file")
     # different writes to the variable depending on whether it is 1D or 3D
     #print ds.globalattributes["nc_nrecs"],ThisOne,len(ds.series[ThisOne]["Data"])
-    if len(dim)==1: ncVar[:] = ds.series[ThisOne]['Data'].tolist()
-    if len(dim)==3: ncVar[:,0,0] = ds.series[ThisOne]['Data'].tolist()
+    if len(dim)==1: ncVar[:] = data
+    if len(dim)==3: ncVar[:,0,0] = data
     # write the attributes
-    for item in ds.series[ThisOne]['Attr']:
+    for item in attr_dict:
         if item!="_FillValue":
-            attr = str(ds.series[ThisOne]['Attr'][item])
+            attr = str(attr_dict[item])
             setattr(ncVar,item,attr.encode('ascii','ignore'))
     # make sure the missing_value attribute is written
-    if "missing_value" not in ds.series[ThisOne]['Attr']: setattr(ncVar,"missing_value",c.missing_value)
+    if "missing_value" not in attr_dict: setattr(ncVar,"missing_value",c.missing_value)
     # get the data type of the QC flag
-    dt = get_ncdtype(ds.series[ThisOne]['Flag'])
+    dt = get_ncdtype(flag)
     # create the variable
-    ncVar = ncFile.createVariable(ThisOne+'_QCFlag',dt,dim)
+    ncVar = ncFile.createVariable(ThisOne+'_QCFlag',dt,dim,**kwargs)
     # write 1D or 3D
-    if len(dim)==1: ncVar[:] = ds.series[ThisOne]['Flag'].tolist()
-    if len(dim)==3: ncVar[:,0,0] = ds.series[ThisOne]['Flag'].tolist()
+    if len(dim)==1: ncVar[:] = flag
+    if len(dim)==3: ncVar[:,0,0] = flag
     # set the attributes
     setattr(ncVar,'long_name',ThisOne+'QC flag')
     setattr(ncVar,'units','none')
@@ -1959,6 +2370,7 @@ def xl_open_write(xl_name):
         xl_file = ''
     return xl_file
 
+@qcprof.profile
 def xl_read_flags(cf,ds,level,VariablesInFile):
     # First data row in Excel worksheets.
     FirstDataRow = int(qcutils.get_keyvaluefromcf(cf,["Files",level],"first_data_row")) - 1
@@ -1994,6 +2406,96 @@ def xl_read_flags(cf,ds,level,VariablesInFile):
                         log.error('  xl_read_flags: flags for '+ThisOne+' not found in xl file')
     return ds
 
+def xl_column_toseries(Values,Types):
+    """
+    Purpose:
+     Convert the values and cell types of an Excel column to data and flag
+     arrays.  Number (xlrd type 2) and date (xlrd type 3) cells are kept
+     with a flag of 0, all other cells are set to missing with a flag of 1.
+    Usage:
+     data,flag = qcio.xl_column_toseries(Values,Types)
+    """
+    nrecs = len(Values)
+    types = numpy.array(Types,dtype=numpy.int32)
+    ok = (types==xlrd.XL_CELL_NUMBER)|(types==xlrd.XL_CELL_DATE)
+    flag = numpy.where(ok,numpy.int32(0),numpy.int32(1)).astype(numpy.int32)
+    if numpy.all(ok):
+        data = numpy.array(Values,dtype=numpy.float64)
+    else:
+        data = numpy.full(nrecs,float(c.missing_value),dtype=numpy.float64)
+        if numpy.any(ok):
+            data[ok] = numpy.array(Values,dtype=object)[ok].astype(numpy.float64)
+    return data,flag
+
+def xl_read_sheet_xlrd(xlBook,xlsheet_index,HeaderRow,FirstDataRow,names):
+    """
+    Purpose:
+     Read the header row of a worksheet and the columns named in names
+     using xlrd.  The worksheet is released once the columns have been read.
+    Usage:
+     HeaderList,columns = qcio.xl_read_sheet_xlrd(xlBook,xlsheet_index,HeaderRow,FirstDataRow,names)
+     where names is a list of lower case column names
+           HeaderList is the lower case header row
+           columns is a dictionary of (Values,Types) keyed by column name
+    """
+    ActiveSheet = xlBook.sheet_by_index(xlsheet_index)
+    HeaderList = [x.lower() for x in ActiveSheet.row_values(HeaderRow)]
+    LastDataRow = int(ActiveSheet.nrows)
+    columns = {}
+    for name in names:
+        if name not in HeaderList: continue
+        xlCol = HeaderList.index(name)
+        columns[name] = (ActiveSheet.col_values(xlCol,FirstDataRow,LastDataRow),
+                         ActiveSheet.col_types(xlCol,FirstDataRow,LastDataRow))
+    if xlBook.on_demand: xlBook.unload_sheet(xlsheet_index)
+    return HeaderList,columns
+
+def xl_read_sheet_openpyxl(ActiveSheet,HeaderRow,FirstDataRow,names,base_date):
+    """
+    Purpose:
+     Stream the rows of a worksheet opened with openpyxl in read-only mode
+     and return the header row and the columns named in names.  Cell values
+     and types are returned in the same form as xlrd, dates and times are
+     converted to Excel serial numbers relative to base_date.
+    Usage:
+     HeaderList,columns = qcio.xl_read_sheet_openpyxl(ActiveSheet,HeaderRow,FirstDataRow,names,base_date)
+    """
+    HeaderList = []
+    columns = {}
+    cols = []
+    for i,row in enumerate(ActiveSheet.iter_rows()):
+        if i==HeaderRow:
+            HeaderList = [unicode(cell.value).lower() if cell.value is not None else u"" for cell in row]
+            cols = [(name,HeaderList.index(name)) for name in names if name in HeaderList]
+            columns = dict([(name,([],[])) for name,xlCol in cols])
+        if i<FirstDataRow: continue
+        for name,xlCol in cols:
+            value = row[xlCol].value if xlCol<len(row) else None
+            if value is None or value==u"":
+                columns[name][0].append(u"")
+                columns[name][1].append(xlrd.XL_CELL_EMPTY)
+            elif isinstance(value,bool):
+                columns[name][0].append(int(value))
+                columns[name][1].append(xlrd.XL_CELL_BOOLEAN)
+            elif isinstance(value,(int,long,float)):
+                columns[name][0].append(float(value))
+                columns[name][1].append(xlrd.XL_CELL_NUMBER)
+            elif isinstance(value,(datetime.datetime,datetime.date,datetime.time)):
+                if isinstance(value,datetime.time):
+                    dt = datetime.datetime.combine(base_date.date(),value)
+                elif not isinstance(value,datetime.datetime):
+                    dt = datetime.datetime.combine(value,datetime.time())
+                else:
+                    dt = value
+                delta = dt - base_date
+                columns[name][0].append(delta.days+(delta.seconds+delta.microseconds/1E6)/float(86400))
+                columns[name][1].append(xlrd.XL_CELL_DATE)
+            else:
+                columns[name][0].append(value)
+                columns[name][1].append(xlrd.XL_CELL_TEXT)
+    return HeaderList,columns
+
+@qcprof.profile
 def xl_read_series(cf):
     # Instance the data structure object.
     ds = DataStructure()
@@ -2008,14 +2510,27 @@ def xl_read_series(cf):
     # convert from Excel row number to xlrd row number
     FirstDataRow = int(qcutils.get_keyvaluefromcf(cf,["Files"],"in_firstdatarow")) - 1
     HeaderRow = int(qcutils.get_keyvaluefromcf(cf,["Files"],"in_headerrow")) - 1
-    # get the Excel workbook object.
+    # large .xlsx files can be streamed using openpyxl in read-only mode
+    streaming = qcutils.get_keyvaluefromcf(cf,["Options"],"XlStreaming",default="No",mode="quiet")
+    streaming = (streaming.lower()=="yes") and (os.path.splitext(FileName)[1].lower()==".xlsx")
+    if streaming and "openpyxl" not in sys.modules:
+        log.warning(" Unable to import openpyxl, reading "+FileName+" with xlrd")
+        streaming = False
+    # get the Excel workbook object, worksheets are only read when needed
     log.info(" Opening and reading Excel file "+FileName)
-    xlBook = xlrd.open_workbook(FileName)
+    if streaming:
+        xlBook = openpyxl.load_workbook(FileName,read_only=True,data_only=True)
+        datemode = 1 if xlBook.excel_base_date==openpyxl.utils.datetime.CALENDAR_MAC_1904 else 0
+        base_date = datetime.datetime(1904,1,1) if datemode==1 else datetime.datetime(1899,12,30)
+        xlsheet_names = [x.lower() for x in xlBook.sheetnames]
+    else:
+        xlBook = xlrd.open_workbook(FileName,on_demand=True)
+        datemode = xlBook.datemode
+        xlsheet_names = [x.lower() for x in xlBook.sheet_names()]
     log.info(" Opened and read Excel file "+FileName)
     ds.globalattributes['featureType'] = 'timeseries'
     ds.globalattributes['xl_filename'] = FileName
-    ds.globalattributes['xl_datemode'] = str(xlBook.datemode)
-    xlsheet_names = [x.lower() for x in xlBook.sheet_names()]
+    ds.globalattributes['xl_datemode'] = str(datemode)
     # Get the Excel file modification date and time, these will be
     # written to the netCDF file to uniquely identify the version
     # of the Excel file used to create this netCDF file.
@@ -2023,38 +2538,44 @@ def xl_read_series(cf):
     t = time.localtime(s.st_mtime)
     ds.globalattributes['xl_moddatetime'] = str(datetime.datetime(t[0],t[1],t[2],t[3],t[4],t[5]))
     # Loop over the variables defined in the 'Variables' section of the
-    # configuration file.
+    # configuration file and group them by worksheet so that each
+    # worksheet is only read once.
+    sheet_variables = OrderedDict()
     for ThisOne in cf['Variables'].keys():
         if "Function" in cf['Variables'][ThisOne].keys(): continue
         if 'xl' in cf['Variables'][ThisOne].keys():
             if 'sheet' in cf['Variables'][ThisOne]['xl'].keys():
                 xlsheet_name = cf['Variables'][ThisOne]['xl']['sheet']
                 if xlsheet_name.lower() in xlsheet_names:
-                    log.info(' Getting data for '+ThisOne+' from spreadsheet')
                     xlsheet_index = xlsheet_names.index(xlsheet_name.lower())
-                    ActiveSheet = xlBook.sheet_by_index(xlsheet_index)
-                    HeaderList = [x.lower() for x in ActiveSheet.row_values(HeaderRow)]
-                    if cf['Variables'][ThisOne]['xl']['name'].lower() in HeaderList:
-                        LastDataRow = int(ActiveSheet.nrows)
-                        ds.series[unicode(ThisOne)] = {}
-                        xlCol = HeaderList.index(cf['Variables'][ThisOne]['xl']['name'].lower())
-                        Values = ActiveSheet.col_values(xlCol)[FirstDataRow:LastDataRow]
-                        Types = ActiveSheet.col_types(xlCol)[FirstDataRow:LastDataRow]
-                        ds.series[ThisOne]['Data'] = numpy.ones(len(Values),dtype=numpy.float64)*float(c.missing_value)
-                        ds.series[ThisOne]['Flag'] = numpy.ones(len(Values),dtype=numpy.int32)
-                        # we could use "where" and get rid of this for loop
-                        for i in range(len(Values)):
-                            if (Types[i]==3) or (Types[i]==2): #xlType=3 means a date/time value, xlType=2 means a number
-                                ds.series[ThisOne]['Data'][i] = numpy.float64(Values[i])
-                                ds.series[ThisOne]['Flag'][i] = numpy.int32(0)
-                    else:
-                        log.error('  xl_read_series: series '+ThisOne+' not found in xl file')
+                    if xlsheet_index not in sheet_variables: sheet_variables[xlsheet_index] = []
+                    sheet_variables[xlsheet_index].append(ThisOne)
                 else:
                     log.error('  xl_read_series: sheet '+xlsheet_name+' not found in xl file')
             else:
                 log.error('  xl_read_series: key "sheet" not found in control file entry for '+ThisOne)
         else:
             log.error('  xl_read_series: key "xl" not found in control file entry for '+ThisOne)
+    # now read the requested columns from each worksheet
+    for xlsheet_index in sheet_variables.keys():
+        names = [cf['Variables'][ThisOne]['xl']['name'].lower() for ThisOne in sheet_variables[xlsheet_index]]
+        if streaming:
+            ActiveSheet = xlBook[xlBook.sheetnames[xlsheet_index]]
+            HeaderList,columns = xl_read_sheet_openpyxl(ActiveSheet,HeaderRow,FirstDataRow,names,base_date)
+        else:
+            HeaderList,columns = xl_read_sheet_xlrd(xlBook,xlsheet_index,HeaderRow,FirstDataRow,names)
+        for ThisOne,name in zip(sheet_variables[xlsheet_index],names):
+            if name in columns:
+                log.info(' Getting data for '+ThisOne+' from spreadsheet')
+                Values,Types = columns[name]
+                ds.series[unicode(ThisOne)] = {}
+                ds.series[ThisOne]['Data'],ds.series[ThisOne]['Flag'] = xl_column_toseries(Values,Types)
+            else:
+                log.error('  xl_read_series: series '+ThisOne+' not found in xl file')
+    if streaming:
+        xlBook.close()
+    else:
+        xlBook.release_resources()
     ds.globalattributes['nc_nrecs'] = str(len(ds.series['xlDateTime']['Data']))
     return ds
 
@@ -2208,6 +2729,7 @@ def xl_write_data(xl_sheet,data,xlCol=0):
         for j in range(nrows):
             xl_sheet.write(j+2,xlCol,tmp[j],d_xf)
 
+@qcprof.profile
 def xl_write_series(ds, xlfullname, outputlist=None):
     if "nc_nrecs" in ds.globalattributes.keys():
         nRecs = int(ds.globalattributes["nc_nrecs"])
@@ -15,6 +15,8 @@ import ast
 import constants as c
 import copy
 import numpy
+import os
+import qccache
 import qcck
 import qcgf
 import qcio
@@ -27,6 +29,82 @@ import meteorologicalfunctions as mf
 
 log = logging.getLogger('qc.ls')
 
+def incremental_qc(cf,ds_in,qc_function):
+    """
+    Purpose:
+     Run an L2 or L3 QC function (qcls.l2qc or qcls.l3qc) incrementally.
+     If the "Incremental" option is set in the [Options] section of the
+     control file and the output file exists, the output file is used as a
+     checkpoint.  The QC function is only run on the records after the end
+     of the output file plus a warm-up period ("IncrementalWarmUp", days)
+     before it, the records before the end of the output file are taken
+     from the output file.
+     The whole record is processed if the option is not set, the output file
+     does not exist or if it does not match the input data (different start
+     date, time step or series).
+    Usage:
+     ds2 = qcls.incremental_qc(cf,ds1,qcls.l2qc)
+    """
+    inc_opt = qcio.get_incrementaloptionsfromcf(cf)
+    outfilename = qcio.get_outfilenamefromcf(cf)
+    if not inc_opt["incremental"] or not os.path.exists(outfilename):
+        return qc_function(cf,ds_in)
+    ds_old = qcio.nc_read_series(outfilename)
+    ldt_in = ds_in.series["DateTime"]["Data"]
+    ldt_old = ds_old.series["DateTime"]["Data"]
+    ts = int(ds_in.globalattributes["time_step"])
+    nRecs = len(ldt_in)
+    # check the existing output file can be used as a checkpoint
+    ok = (ldt_old[0]==ldt_in[0] and ldt_old[-1]<=ldt_in[-1] and
+          int(ds_old.globalattributes["time_step"])==ts)
+    if ok:
+        # index of the first new record in the input data
+        si_new = qcutils.GetDateIndex(ldt_in,str(ldt_old[-1]),ts=ts,default=-1,match="exact")+1
+        ok = (si_new>0 and ldt_in[si_new-1]==ldt_old[-1] and si_new==len(ldt_old))
+    if not ok:
+        log.warning(" Incremental: "+outfilename+" does not match input data, processing all data")
+        return qc_function(cf,ds_in)
+    # start of the warm-up period
+    nwarmup = int(inc_opt["warmup_days"]*24*60/ts)
+    si = max(0,si_new-nwarmup)
+    msg = " Incremental: "+str(nRecs-si_new)+" new records, processing from "+str(ldt_in[si])
+    log.info(msg)
+    ds_tail = qcutils.get_datastructure_subset(ds_in,si,nRecs-1)
+    ds_tail = qc_function(cf,ds_tail)
+    time_list = qcio.nc_timeaxis_list+["DateTime","DateTime_UTC"]
+    old_list = [label for label in ds_old.series.keys() if label not in time_list]
+    new_list = [label for label in ds_tail.series.keys() if label not in time_list]
+    # only the series in the output list are in the output file
+    outputlist = qcio.get_outputlistfromcf(cf,'nc')
+    if outputlist: new_list = [label for label in new_list if label in outputlist]
+    if sorted(old_list)!=sorted(new_list):
+        log.warning(" Incremental: series in "+outfilename+" have changed, processing all data")
+        return qc_function(cf,ds_in)
+    for label in ds_tail.series.keys():
+        if label not in time_list and label not in new_list: del ds_tail.series[label]
+    # put the existing data before the first new record and the new data together
+    ds_out = ds_tail
+    n = si_new-si
+    for label in ds_out.series.keys():
+        if label in time_list:
+            source = ds_in
+        else:
+            source = ds_old
+        for item in ["Data","Flag"]:
+            head = qcutils.get_seriesitem(source,label,item)[:si_new]
+            tail = ds_out.series[label][item][n:]
+            if isinstance(tail,list):
+                ds_out.series[label][item] = list(head)+tail
+            else:
+                ds_out.series[label][item] = numpy.concatenate((head,tail))
+    ds_out.globalattributes["nc_nrecs"] = str(nRecs)
+    ds_out.globalattributes["start_date"] = str(ldt_in[0])
+    ds_out.globalattributes["end_date"] = str(ldt_in[-1])
+    ds_out.timeaxis = {}
+    # coverage is for the whole record
+    qcutils.get_coverage_individual(ds_out)
+    return ds_out
+
 def l2qc(cf,ds1):
     """
         Perform initial QA/QC on flux data
@@ -43,7 +121,7 @@ def l2qc(cf,ds1):
             qcts.albedo
         """
     # make a copy of the L1 data
-    ds2 = copy.deepcopy(ds1)
+    ds2 = qcio.copy_datastructure_cow(ds1)
     ds2.globalattributes['nc_level'] = 'L2'
     ds2.globalattributes['EPDversion'] = sys.version
     ds2.globalattributes['Functions'] = ''
@@ -106,7 +184,7 @@ def l3qc(cf,ds2):
             y:  required together in option set
         """
     # make a copy of the L2 data
-    ds3 = copy.deepcopy(ds2)
+    ds3 = qcio.copy_datastructure_cow(ds2)
     ds3.globalattributes['nc_level'] = 'L3'
     ds3.globalattributes['EPDversion'] = sys.version
     # initialise the global attribute to document the functions used
@@ -295,6 +373,8 @@ def l5qc(cf,ds4):
     qcgf.GapFillUsingInterpolation(cf,ds5)
     # do the gap filling using SOLO
     qcgf.GapFillUsingSOLO(cf,ds4,ds5)
+    # apply the size limit to the model cache once all of the SOLO models are stored
+    qccache.evict_modelcache()
     if ds5.returncodes["solo"]=="quit": return ds5
     ## gap fill using marginal distribution sampling
     #qcgf.GapFillFluxUsingMDS(cf,ds5)
@@ -334,6 +414,8 @@ def l6qc(cf,ds5):
     qcrp.ERUsingSOLO(cf,ds6)
     # estimate ER using FFNET
     qcrp.ERUsingFFNET(cf,ds6)
+    # apply the size limit to the model cache once all of the SOLO and FFNET models are stored
+    qccache.evict_modelcache()
     # estimate ER using Lloyd-Taylor
     qcrp.ERUsingLloydTaylor(cf,ds6)
     # estimate ER using Lasslop et al
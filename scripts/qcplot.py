@@ -158,12 +158,12 @@ def pltfingerprint_readncfiles(cf):
     ds = {}
     if "Files" in cf:
         infilename = qcio.get_infilenamefromcf(cf)
-        ds[infilename] = qcio.nc_read_series(infilename)
+        ds[infilename] = qcio.nc_read_series(infilename,lazy=True)
     for var in cf["Variables"].keys():
         if "in_filename" in cf["Variables"][var]:
             if cf["Variables"][var]["in_filename"] not in ds:
                 infilename = cf["Variables"][var]["in_filename"]
-                ds[cf["Variables"][var]["in_filename"]] = qcio.nc_read_series(infilename)
+                ds[cf["Variables"][var]["in_filename"]] = qcio.nc_read_series(infilename,lazy=True)
     return ds
 
 def plot_fingerprint(cf):
@@ -258,6 +258,9 @@ def plot_fingerprint(cf):
             plt.ioff()
         else:
             plt.ion()
+    # close the input files, only the plotted variables have been read
+    for infilename in ds.keys():
+        qcio.nc_close_series(ds[infilename])
 
 def plot_fluxnet(cf):
     """ Plot the FluxNet style plots. """
@@ -0,0 +1,188 @@
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows
+    resource = None
+
+log = logging.getLogger('qc.prof')
+
+# profiling state, the stack holds the nodes of the steps that are running
+profile_info = {"enabled":False,"level":"","file_name":"","min_percent":1.0,"stack":[]}
+# argument names used to record the time spent on each series
+series_args = ["series","label","targetlabel"]
+
+def get_usage():
+    """
+    Purpose:
+     Return the wall clock time, the CPU time used by this process, the CPU
+     time used by child processes (eg SOLO) and the peak resident memory of
+     this process in MB.
+    Usage:
+     wall,cpu,child_cpu,max_rss = qcprof.get_usage()
+    """
+    if resource is None:
+        t = os.times()
+        return time.time(),t[0]+t[1],t[2]+t[3],0.0
+    s = resource.getrusage(resource.RUSAGE_SELF)
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on OSX and in kB on Linux
+    if sys.platform=="darwin":
+        max_rss = s.ru_maxrss/float(2**20)
+    else:
+        max_rss = s.ru_maxrss/float(2**10)
+    return time.time(),s.ru_utime+s.ru_stime,ch.ru_utime+ch.ru_stime,max_rss
+
+def new_node(name):
+    return {"name":name,"calls":0,"seconds":0.0,"cpu_seconds":0.0,"child_cpu_seconds":0.0,
+            "rss_delta_mb":0.0,"max_rss_mb":0.0,"children":collections.OrderedDict()}
+
+def enter(name):
+    """ Start timing a step, the step is a child of the step that is running."""
+    parent = profile_info["stack"][-1][0]
+    if name not in parent["children"]: parent["children"][name] = new_node(name)
+    profile_info["stack"].append((parent["children"][name],get_usage()))
+
+def leave():
+    """ Stop timing the step that is running and add its usage to its node."""
+    node,usage0 = profile_info["stack"].pop()
+    usage1 = get_usage()
+    node["calls"] = node["calls"] + 1
+    node["seconds"] = node["seconds"] + usage1[0] - usage0[0]
+    node["cpu_seconds"] = node["cpu_seconds"] + usage1[1] - usage0[1]
+    node["child_cpu_seconds"] = node["child_cpu_seconds"] + usage1[2] - usage0[2]
+    node["rss_delta_mb"] = node["rss_delta_mb"] + usage1[3] - usage0[3]
+    node["max_rss_mb"] = max(node["max_rss_mb"],usage1[3])
+
+@contextlib.contextmanager
+def step(name):
+    """
+    Purpose:
+     Context manager that times the enclosed block as a step called name.
+     Does nothing if profiling is not enabled.
+    Usage:
+     with qcprof.step("Fc"):
+         ...
+    """
+    if not profile_info["enabled"]:
+        yield
+        return
+    enter(name)
+    try:
+        yield
+    finally:
+        leave()
+
+def profile(function):
+    """
+    Purpose:
+     Decorator that times each call of a function when profiling is enabled.
+     If the function has a "series", "label" or "targetlabel" argument, the
+     time is also recorded for each series.  The overhead when profiling is
+     not enabled is a single dictionary look up.
+    Usage:
+     @qcprof.profile
+     def GapFillUsingSOLO(cf,dsa,dsb):
+    """
+    name = function.__module__+"."+function.__name__
+    args = inspect.getargspec(function).args
+    series_arg = None
+    for item in series_args:
+        if item in args:
+            series_arg = item
+            series_index = args.index(item)
+            break
+    @functools.wraps(function)
+    def wrapper(*args,**kwargs):
+        if not profile_info["enabled"]: return function(*args,**kwargs)
+        series = None
+        if series_arg is not None:
+            if series_arg in kwargs:
+                series = kwargs[series_arg]
+            elif len(args)>series_index:
+                series = args[series_index]
+        if not isinstance(series,basestring) or len(series)==0: series = None
+        enter(name)
+        if series is not None: enter(series)
+        try:
+            return function(*args,**kwargs)
+        finally:
+            if series is not None: leave()
+            leave()
+    return wrapper
+
+def start(level,options):
+    """
+    Purpose:
+     Start profiling a processing level.  The options dictionary is returned
+     by qcio.get_profileoptionsfromcf, profiling is only started if
+     options["enabled"] is True.
+    Usage:
+     qcprof.start("L4",qcio.get_profileoptionsfromcf(cf))
+    """
+    profile_info["enabled"] = options["enabled"]
+    profile_info["stack"] = []
+    if not options["enabled"]: return
+    profile_info["level"] = level
+    profile_info["file_name"] = options["file_name"]
+    profile_info["min_percent"] = options["min_percent"]
+    root = new_node(level)
+    profile_info["stack"].append((root,get_usage()))
+    log.info(" Profiling "+level)
+
+def get_report(node):
+    """ Return the report for a node, children are sorted by time taken."""
+    report = collections.OrderedDict()
+    for item in ["name","calls","seconds","cpu_seconds","child_cpu_seconds","rss_delta_mb","max_rss_mb"]:
+        report[item] = node[item]
+    children = sorted(node["children"].values(),key=lambda n: n["seconds"],reverse=True)
+    report["self_seconds"] = node["seconds"]-sum([child["seconds"] for child in children])
+    report["children"] = [get_report(child) for child in children]
+    return report
+
+def log_report(report,total,min_percent,depth=0):
+    """ Write the steps that took more than min_percent of the total time to the log."""
+    msg = " "+"  "*depth+report["name"]+": "+"%.2f"%report["seconds"]+" s"
+    msg = msg+" (cpu "+"%.2f"%report["cpu_seconds"]+" s"
+    if report["child_cpu_seconds"]>0:
+        msg = msg+", child cpu "+"%.2f"%report["child_cpu_seconds"]+" s"
+    msg = msg+", calls "+str(report["calls"])+", rss +"+"%.1f"%report["rss_delta_mb"]+" MB)"
+    log.info(msg)
+    for child in report["children"]:
+        if total>0 and 100*child["seconds"]/total<min_percent: continue
+        log_report(child,total,min_percent,depth=depth+1)
+
+def stop():
+    """
+    Purpose:
+     Stop profiling, write the report for the level to the log and to the
+     JSON file given in the options passed to qcprof.start.
+    Usage:
+     qcprof.stop()
+    """
+    if not profile_info["enabled"]: return
+    root = profile_info["stack"][0][0]
+    # steps left open by an exception are closed along with the level
+    while len(profile_info["stack"])>0: leave()
+    profile_info["enabled"] = False
+    profile_info["stack"] = []
+    report = get_report(root)
+    log.info(" Profile for "+profile_info["level"]+" (steps taking more than "+
+             str(profile_info["min_percent"])+"% of the total time)")
+    log_report(report,root["seconds"],profile_info["min_percent"])
+    file_name = profile_info["file_name"]
+    if len(file_name)==0: return
+    try:
+        with open(file_name,'w') as f:
+            json.dump(report,f,indent=1)
+        log.info(" Profile written to "+file_name)
+    except IOError:
+        log.error(" Unable to write profile to "+file_name)
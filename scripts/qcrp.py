@@ -9,6 +9,7 @@ import meteorologicalfunctions as mf
 import numpy
 import os
 import qcio
+import qcprof
 import qcrpLL
 import qcrpLT
 import qcrpNN
@@ -19,6 +20,7 @@ import xlrd
 
 log = logging.getLogger('qc.rp')
 
+@qcprof.profile
 def CalculateET(ds):
     """
     Purpose:
@@ -38,6 +40,7 @@ def CalculateET(ds):
     attr["units"] = "mm"
     qcutils.CreateSeries(ds,"ET",ET,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def CalculateNEE(cf,ds):
     """
     Purpose:
@@ -86,6 +89,7 @@ def CalculateNEE(cf,ds):
         attr["comment1"] = "Fsd threshold used was "+str(Fsd_threshold)
     del ds.nee
 
+@qcprof.profile
 def CalculateNEP(cf,ds):
     """
     Purpose:
@@ -141,6 +145,7 @@ def cleanup_ustar_dict(ldt,ustar_dict):
         if ustar_dict[year]["ustar_mean"]==float(c.missing_value):
             ustar_dict[year]["ustar_mean"] = ustar_threshold_mean
 
+@qcprof.profile
 def ERUsingFFNET(cf,ds):
     """
     Purpose:
@@ -175,6 +180,7 @@ def ERUsingFFNET(cf,ds):
             if "FFNET" in cf["GUI"]:
                 qcrpNN.rpFFNET_run_nogui(cf,ds,FFNET_info)
 
+@qcprof.profile
 def ERUsingLasslop(cf,ds):
     if "rpLL" not in dir(ds): return
     log.info("Estimating ER using Lasslop")
@@ -329,6 +335,7 @@ def ERUsingLasslop(cf,ds):
     attr = qcutils.MakeAttributeDictionary(long_name=long_name,units=units)
     qcutils.CreateSeries(ds,"NEE_LL_all",NEE_LL,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def ERUsingLloydTaylor(cf,ds):
     """
     Purpose:
@@ -531,6 +538,7 @@ def ERUsingLloydTaylor(cf,ds):
     # close the Excel workbook
     xl_file.save(xl_name)
 
+@qcprof.profile
 def ERUsingSOLO(cf,ds):
     """ Estimate ER using SOLO. """
     if "solo" not in dir(ds): return
@@ -761,6 +769,7 @@ def ERUsingSOLO(cf,ds):
     #qcutils.CreateSeries(ds,"ER",ER,Flag=ER_flag,Attr=ER_attr)
     #return 1
 
+@qcprof.profile
 def GetERFromFc2(cf,ds):
     """
     Purpose:
@@ -1074,16 +1083,20 @@ def get_turbulence_indicator_ustar(ldt,ustar,ustar_dict,ts):
     inds = turbulence_indicator["values"]
     attr = turbulence_indicator["attr"]
     attr["turbulence_filter"] = "ustar"
+    # get the start and end datetime indices for all years in one go
+    start_dates = []
+    end_dates = []
     for year in year_list:
         start_date = str(year)+"-01-01 00:30"
         if ts==60: start_date = str(year)+"-01-01 01:00"
-        end_date = str(int(year)+1)+"-01-01 00:00"
+        start_dates.append(start_date)
+        end_dates.append(str(int(year)+1)+"-01-01 00:00")
+    si_list = qcutils.GetDateIndices(ldt,start_dates,ts=ts,default=0,match='exact')
+    ei_list = qcutils.GetDateIndices(ldt,end_dates,ts=ts,default=len(ldt),match='exact')
+    for year,si,ei in zip(year_list,si_list,ei_list):
         # get the ustar threshold
         ustar_threshold = float(ustar_dict[year]["ustar_mean"])
         attr["ustar_threshold_"+str(year)] = str(ustar_threshold)
-        # get the start and end datetime indices
-        si = qcutils.GetDateIndex(ldt,start_date,ts=ts,default=0,match='exact')
-        ei = qcutils.GetDateIndex(ldt,end_date,ts=ts,default=len(ldt),match='exact')
         # set the QC flag
         idx = numpy.ma.where(ustar[si:ei]>=ustar_threshold)[0]
         inds[si:ei][idx] = numpy.int32(1)
@@ -1183,6 +1196,7 @@ def get_ustar_thresholds_annual(ldt,ustar_threshold):
         ustar_dict[year]["ustar_mean"] = ustar_threshold
     return ustar_dict
 
+@qcprof.profile
 def L6_summary(cf,ds):
     """
     Purpose:
@@ -1582,8 +1596,8 @@ def L6_summary_monthly(ds,series_dict):
     last_date = ldt[-1]
     while start_date<=last_date:
         # *** The Elise Pendall bug fix ***
-        si = qcutils.GetDateIndex(dt,str(start_date),ts=ts,default=0)
-        ei = qcutils.GetDateIndex(dt,str(end_date),ts=ts,default=len(dt)-1)
+        si = qcutils.GetDateIndex(qcutils.get_datetime64(ds),str(start_date),ts=ts,default=0)
+        ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds),str(end_date),ts=ts,default=len(dt)-1)
         monthly_dict["DateTime"]["data"].append(dt[si])
         for item in series_list:
             if item not in ds.series.keys(): continue
@@ -1646,8 +1660,8 @@ def L6_summary_annual(ds,series_dict):
         elif ts==60:
             start_date = str(year)+"-01-01 01:00"
         end_date = str(year+1)+"-01-01 00:00"
-        si = qcutils.GetDateIndex(dt,start_date,ts=ts,default=0)
-        ei = qcutils.GetDateIndex(dt,end_date,ts=ts,default=len(dt)-1)
+        si = qcutils.GetDateIndex(qcutils.get_datetime64(ds),start_date,ts=ts,default=0)
+        ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds),end_date,ts=ts,default=len(dt)-1)
         nDays = int((ei-si+1)/nperDay+0.5)
         annual_dict["nDays"]["data"][i] = nDays
         for item in series_list:
@@ -1699,8 +1713,8 @@ def L6_summary_cumulative(ds,series_dict):
         elif ts==60:
             start_date = str(year)+"-01-01 01:00"
         end_date = str(year+1)+"-01-01 00:00"
-        si = qcutils.GetDateIndex(dt,start_date,ts=ts,default=0)
-        ei = qcutils.GetDateIndex(dt,end_date,ts=ts,default=len(dt)-1)
+        si = qcutils.GetDateIndex(qcutils.get_datetime64(ds),start_date,ts=ts,default=0)
+        ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds),end_date,ts=ts,default=len(dt)-1)
         ldt = dt[si:ei+1]
         cumulative_dict[str(year)]["DateTime"] = {"data":ldt,"units":"Year",
                                                   "format":"dd/mm/yyyy HH:MM"}
@@ -1717,6 +1731,7 @@ def L6_summary_cumulative(ds,series_dict):
             cumulative_dict[str(year)][item]["units"] = cumulative_dict[str(year)][item]["units"]+"/year"
     return cumulative_dict
 
+@qcprof.profile
 def ParseL6ControlFile(cf,ds):
     """ Parse the L6 control file. """
     # start with the repiration section
@@ -1738,6 +1753,7 @@ def ParseL6ControlFile(cf,ds):
         for ThisOne in cf["GPP"].keys():
             rpGPP_createdict(cf,ds,ThisOne)
 
+@qcprof.profile
 def PartitionNEE(cf,ds):
     """
     Purpose:
@@ -71,13 +71,15 @@ def get_LL_params(ldt,Fsd,D,T,NEE,ER,LT_results,info):
     D0 = LL_fixed["D0"]
     drivers = {}
     start_date = ldt[0]
+    # convert the time axis once for the GetDateIndex calls in the loop
+    dt64 = qcutils.get_timeaxis(ldt)
     last_date = ldt[-1]
     end_date = start_date+datetime.timedelta(days=info["window_length"])
     while end_date<=last_date:
         #print start_date,end_date
         sub_results = {"RMSE":[],"alpha":[],"beta":[],"k":[],"rb":[]}
-        si = qcutils.GetDateIndex(ldt,str(start_date),ts=info["ts"])
-        ei = qcutils.GetDateIndex(ldt,str(end_date),ts=info["ts"])
+        si = qcutils.GetDateIndex(dt64,str(start_date),ts=info["ts"])
+        ei = qcutils.GetDateIndex(dt64,str(end_date),ts=info["ts"])
         drivers["Fsd"] = numpy.ma.compressed(Fsd[si:ei+1])
         drivers["D"] = numpy.ma.compressed(D[si:ei+1])
         drivers["T"] = numpy.ma.compressed(T[si:ei+1])
@@ -215,6 +217,8 @@ def get_LT_params(ldt,ER,T,info,mode="verbose"):
     missed_dates = {"start_date":[],"end_date":[]}
     LT_prior = {"rb":1.0,"E0":100}
     start_date = ldt[0]
+    # convert the time axis once for the GetDateIndex calls in the loop
+    dt64 = qcutils.get_timeaxis(ldt)
     last_date = ldt[-1]
     end_date = start_date+datetime.timedelta(days=info["window_length"])
     last_E0_OK = False
@@ -222,8 +226,8 @@ def get_LT_params(ldt,ER,T,info,mode="verbose"):
         LT_results["start_date"] = numpy.append(LT_results["start_date"],start_date)
         LT_results["mid_date"] = numpy.append(LT_results["mid_date"],start_date+(end_date-start_date)/2)
         LT_results["end_date"] = numpy.append(LT_results["end_date"],end_date)
-        si = qcutils.GetDateIndex(ldt,str(start_date),ts=info["ts"])
-        ei = qcutils.GetDateIndex(ldt,str(end_date),ts=info["ts"])
+        si = qcutils.GetDateIndex(dt64,str(start_date),ts=info["ts"])
+        ei = qcutils.GetDateIndex(dt64,str(end_date),ts=info["ts"])
         Tsub = numpy.ma.compressed(T[si:ei+1])
         ERsub = numpy.ma.compressed(ER[si:ei+1])
         if len(ERsub)>=10:
@@ -1,16 +1,18 @@
 import ast
 import constants as c
-import csv
 import dateutil
 import datetime
 import logging
 import numpy
 import matplotlib.pyplot as plt
+import multiprocessing
 import os
-import platform
-import subprocess
+import random
 import Tkinter
+import qccache
 import qcio
+import qcprof
+import qcsolo
 import qcutils
 
 # lets see if ffnet is installed
@@ -328,11 +330,86 @@ def rpFFNET_createdict(cf,ds,series):
         data,flag,attr = qcutils.MakeEmptySeries(ds,ds.merge["standard"][series]["output"])
         qcutils.CreateSeries(ds,ds.merge["standard"][series]["output"],data,Flag=flag,Attr=attr)
 
+def rpFFNET_dispatch(ds,rpFFNET_info):
+    """
+    Purpose:
+     Train the FFNET networks queued by rpFFNET_main using a pool of worker
+     processes, then put the predictions into the data structure and plot the
+     results in the order the networks were queued.
+    Usage:
+     rpFFNET_dispatch(ds,rpFFNET_info)
+    """
+    if "dispatch" not in rpFFNET_info or len(rpFFNET_info["dispatch"])==0: return
+    queue = rpFFNET_info["dispatch"]
+    rpFFNET_info["dispatch"] = []
+    jobs = [item["job"] for item in queue if not item["skip"]]
+    results = rpFFNET_runjobs(jobs,workers=rpFFNET_info["workers"])
+    n = 0
+    for item in queue:
+        series = item["series"]
+        if item["skip"]:
+            rpFFNET_skipresults(ds,series)
+            continue
+        output_predict,weights = results[n]
+        n = n + 1
+        target = item["target"]
+        rpFFNET_putresults(ds,item["drivers"],target,item["output"],output_predict,si=item["si"],ei=item["ei"])
+        pd = rpFFNET_initplot(site_name=item["site_name"],label=target,fig_num=item["fig_num"],title=item["title"],
+                              nDrivers=len(item["drivers"]),startdate=item["startdate"],enddate=item["enddate"])
+        rpFFNET_plot(pd,ds,series,item["drivers"],target,item["output"],item["rpFFNET_info"],si=item["si"],ei=item["ei"])
+
 def rpFFNET_done(ds,FFNET_gui,rpFFNET_info):
     # destroy the FFNET GUI
     FFNET_gui.destroy()
     if "ffnet" in dir(ds): del ds.ffnet
 
+def rpFFNET_getcodefiles():
+    """ Return the files whose contents the FFNET models depend on, this module and ffnet."""
+    file_names = [os.path.splitext(os.path.abspath(__file__))[0]+".py"]
+    if "ffnet" in globals(): file_names.append(ffnet.__file__)
+    return file_names
+
+def rpFFNET_getjob(ds,series,driverlist,targetlabel,rpFFNET_info,si=0,ei=-1):
+    """
+    Purpose:
+     Return a FFNET job (see rpFFNET_trainjob) for the target and drivers
+     between si and ei.  The training data are the records where the target
+     and all drivers are present, the predictions are for all records.  The
+     job includes the model cache key and a random number seed taken from
+     the data and settings so that the same job always gives the same
+     network.  The cache key also depends on the code, see rpFFNET_getcodefiles.
+    Usage:
+     job = rpFFNET_getjob(ds,series,driverlist,targetlabel,rpFFNET_info,si=si,ei=ei)
+    """
+    # prepare the input and target data for training
+    ER,f,a = qcutils.GetSeriesasMA(ds,targetlabel,si=si,ei=ei)
+    mask = numpy.ma.getmaskarray(ER)
+    input_predict = numpy.empty((len(ER),len(driverlist)))
+    for idx,val in enumerate(driverlist):
+        d,f,a = qcutils.GetSeriesasMA(ds,val,si=si,ei=ei)
+        mask = mask | numpy.ma.getmaskarray(d)
+        input_predict[:,idx] = numpy.ma.getdata(d)
+    input_train = input_predict[~mask]
+    target_train = numpy.ma.getdata(ER)[~mask]
+    job = {"input_train":input_train,"target_train":target_train,"input_predict":input_predict,"warm":None}
+    for item in ["hidden","connection","training_type","warm_fraction"]:
+        if item in rpFFNET_info: job[item] = rpFFNET_info[item]
+    ldt = ds.series["DateTime"]["Data"]
+    settings = {"window":[str(ldt[si]),str(ldt[ei])]}
+    for item in ["hidden","connection","training_type"]:
+        settings[item] = str(rpFFNET_info[item])
+    arrays = [input_train,target_train,input_predict]
+    if rpFFNET_info.get("warm_start",False):
+        # a warm started network depends on the weights it started from
+        job["warm"] = rpFFNET_info["warm_models"].get(series)
+        if job["warm"] is not None:
+            settings["warm_fraction"] = str(rpFFNET_info["warm_fraction"])
+            arrays.append(job["warm"])
+    key = qccache.get_modelkey("ffnet",arrays,settings)
+    job["seed"] = int(key[0:8],16)
+    job["key"] = qccache.get_codekey(key,rpFFNET_getcodefiles())
+    return job
+
 def rpFFNET_initplot(**kwargs):
     # set the margins, heights, widths etc
     pd = {"margin_bottom":0.075,"margin_top":0.075,"margin_left":0.05,"margin_right":0.05,
@@ -372,8 +449,8 @@ def rpFFNET_main(ds,rpFFNET_info):
     ldt = ds.series["DateTime"]["Data"]
     xldt = ds.series["xlDateTime"]["Data"]
     # get the start and end datetime indices
-    si = qcutils.GetDateIndex(ldt,startdate,ts=ts,default=0,match="exact")
-    ei = qcutils.GetDateIndex(ldt,enddate,ts=ts,default=-1,match="exact")
+    si = qcutils.GetDateIndex(qcutils.get_datetime64(ds),startdate,ts=ts,default=0,match="exact")
+    ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds),enddate,ts=ts,default=-1,match="exact")
     # check the start and end indices
     if si >= ei:
         log.error(" ERUsingFFNET: end datetime index ("+str(ei)+") smaller that start ("+str(si)+")")
@@ -400,89 +477,30 @@ def rpFFNET_main(ds,rpFFNET_info):
         d,f,a = qcutils.GetSeriesasMA(ds,target,si=si,ei=ei)
         if numpy.ma.count(d)<rpFFNET_info["min_points"]:
             log.error("rpFFNET: Less than "+str(rpFFNET_info["min_points"])+" points available for series "+series+" ...")
-            ds.ffnet[series]["results"]["No. points"].append(float(0))
-            results_list = ds.ffnet[series]["results"].keys()
-            for item in ["startdate","enddate","No. points"]:
-                if item in results_list: results_list.remove(item)
-            for item in results_list:
-                ds.ffnet[series]["results"][item].append(float(c.missing_value))
+            if "dispatch" in rpFFNET_info:
+                rpFFNET_info["dispatch"].append({"series":series,"skip":True})
+            else:
+                rpFFNET_skipresults(ds,series)
             continue
         drivers = ds.ffnet[series]["drivers"]
-        ndrivers = len(drivers)
         output = ds.ffnet[series]["output"]
-        # prepare the input and target data for training
-        ER,f,a = qcutils.GetSeriesasMA(ds,target,si=si,ei=ei)
-        mask = numpy.ma.getmask(ER)
-        for val in drivers:
-            d,f,a = qcutils.GetSeriesasMA(ds,val,si=si,ei=ei)
-            mask = numpy.ma.mask_or(mask,d.mask)
-        ER.mask = mask
-        nRecs = numpy.ma.count(ER)
-        data_nm = numpy.empty((nRecs,len(drivers)+1))
-        for idx,val in enumerate(drivers):
-            d,f,a = qcutils.GetSeriesasMA(ds,val,si=si,ei=ei)
-            d.mask = mask
-            data_nm[:,idx] = numpy.ma.compressed(d)
-        data_nm[:,idx+1] = numpy.ma.compressed(ER)
-        input_train = data_nm[:,0:idx+1]
-        target_train = data_nm[:,idx+1]
-        # design the network
-        hidden_layers = rpFFNET_info["hidden"].split(",")
-        if len(hidden_layers)==1:
-            arch = (ndrivers,int(hidden_layers[0]),1)
-        elif len(hidden_layers)==2:
-            arch = (ndrivers,int(hidden_layers[0]),int(hidden_layers[1]),1)
-        else:
-            log.error("ERUsingFFNET: more than 2 hidden layers specified, using 1 ("+str(ndrivers)+")")
-            arch = (ndrivers,ndrivers,1)
-        if rpFFNET_info["connection"]=="standard":
-            conec = ffnet.mlgraph(arch,biases=True)
-        elif rpFFNET_info["connection"]=="full":
-            conec = ffnet.tmlgraph(arch,biases=True)
-        else:
-            raise Exception("rpFFNET: unrecognised FFNET connection option")
-        net = ffnet.ffnet(conec)
-        # train the network
-        if rpFFNET_info["training_type"].lower()=="tnc":
-            net.train_tnc(input_train,target_train)
-        elif rpFFNET_info["training_type"].lower()=="bfgs":
-            net.train_bfgs(input_train,target_train)
-        elif rpFFNET_info["training_type"].lower()=="cg":
-            net.train_cg(input_train,target_train)
-        elif rpFFNET_info["training_type"].lower()=="genetic":
-            net.train_genetic(input_train,target_train)
-        elif rpFFNET_info["training_type"].lower()=="back":
-            net.train_momentum(input_train,target_train)
-        elif rpFFNET_info["training_type"].lower()=="rprop":
-            try:
-                net.train_rprop(input_train,target_train)
-            except:
-                log.warning("rpFFNET: Rprop training failed, using TNC ...")
-                net.train_tnc(input_train,target_train)
-        else:
-            raise Exception("rpFFNET: unrecognised FFNET training option")
-        #output,regress=net.test(input_train,target_train)
-        # get the predictions
-        input_predict = numpy.empty((len(ER),len(drivers)))
-        for idx,val in enumerate(drivers):
-            d,f,a = qcutils.GetSeries(ds,val,si=si,ei=ei)
-            input_predict[:,idx] = d[:]
-        output_predict = net.call(input_predict)
-        if ei==-1:
-            ds.series[output]['Data'][si:] = output_predict[:,0]
-            ds.series[output]['Flag'][si:] = numpy.int32(30)
-        else:
-            ds.series[output]['Data'][si:ei+1] = output_predict[:,0]
-            ds.series[output]['Flag'][si:ei+1] = numpy.int32(30)
-        # set the attributes
-        ds.series[output]["Attr"]["units"] = ds.series[target]["Attr"]["units"]
-        if "modelled by FFNET" not in ds.series[output]["Attr"]["long_name"]:
-            ds.series[output]["Attr"]["long_name"] = "Ecosystem respiration modelled by FFNET (ANN)"
-            ds.series[output]["Attr"]["comment1"] = "Target was "+str(target)
-            ds.series[output]["Attr"]["comment2"] = "Drivers were "+str(drivers)
-        # plot the results
+        job = rpFFNET_getjob(ds,series,drivers,target,rpFFNET_info,si=si,ei=ei)
         fig_num = fig_num + 1
         title = site_name+" : "+series+" estimated using FFNET"
+        if "dispatch" in rpFFNET_info:
+            # queue the run, the queued runs are done by rpFFNET_dispatch
+            info = dict([(k,v) for k,v in rpFFNET_info.items() if k not in ["dispatch","warm_models"]])
+            rpFFNET_info["dispatch"].append({"series":series,"skip":False,"target":target,"output":output,
+                                             "drivers":drivers,"si":si,"ei":ei,"fig_num":fig_num,
+                                             "title":title,"site_name":site_name,"startdate":startdate,
+                                             "enddate":enddate,"rpFFNET_info":info,"job":job})
+            continue
+        # train the network and get the predictions, the predictions are read from
+        # the model cache if this period has been run before with the same data
+        output_predict,weights = rpFFNET_runjobs([job])[0]
+        if rpFFNET_info.get("warm_start",False): rpFFNET_info["warm_models"][series] = numpy.array(weights)
+        rpFFNET_putresults(ds,drivers,target,output,output_predict,si=si,ei=ei)
+        # plot the results
         pd = rpFFNET_initplot(site_name=site_name,label=target,fig_num=fig_num,title=title,
                              nDrivers=len(drivers),startdate=startdate,enddate=enddate)
         rpFFNET_plot(pd,ds,series,drivers,target,output,rpFFNET_info,si=si,ei=ei)
@@ -630,6 +648,21 @@ def rpFFNET_progress(FFNET_gui,text):
     FFNET_gui.progress.grid(row=FFNET_gui.progress_row,column=0,columnspan=4,sticky="W")
     FFNET_gui.update()
 
+def rpFFNET_putresults(ds,driverlist,targetlabel,outputlabel,output_predict,si=0,ei=-1):
+    """ Put the FFNET predictions between si and ei into the output series."""
+    if ei==-1:
+        ds.series[outputlabel]['Data'][si:] = output_predict[:,0]
+        ds.series[outputlabel]['Flag'][si:] = numpy.int32(30)
+    else:
+        ds.series[outputlabel]['Data'][si:ei+1] = output_predict[:,0]
+        ds.series[outputlabel]['Flag'][si:ei+1] = numpy.int32(30)
+    # set the attributes
+    ds.series[outputlabel]["Attr"]["units"] = ds.series[targetlabel]["Attr"]["units"]
+    if "modelled by FFNET" not in ds.series[outputlabel]["Attr"]["long_name"]:
+        ds.series[outputlabel]["Attr"]["long_name"] = "Ecosystem respiration modelled by FFNET (ANN)"
+        ds.series[outputlabel]["Attr"]["comment1"] = "Target was "+str(targetlabel)
+        ds.series[outputlabel]["Attr"]["comment2"] = "Drivers were "+str(driverlist)
+
 def rpFFNET_quit(ds,FFNET_gui):
     # destroy the GUI
     FFNET_gui.destroy()
@@ -772,6 +805,22 @@ def rpFFNET_run_nogui(cf,ds,rpFFNET_info):
     rpFFNET_info["show_plots"] = True
     opt = qcutils.get_keyvaluefromcf(cf,["GUI","FFNET"],"show_plots",default="yes")
     if opt.lower()=="no": rpFFNET_info["show_plots"] = False
+    # warm start option, each period starts from the network for the previous period
+    rpFFNET_info["warm_start"] = False
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","FFNET"],"warm_start",default="no")
+    if opt.lower()=="yes": rpFFNET_info["warm_start"] = True
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","FFNET"],"warm_fraction",default=0.2)
+    rpFFNET_info["warm_fraction"] = float(opt)
+    rpFFNET_info["warm_models"] = {}
+    # number of worker processes, independent periods and series are queued and
+    # trained in parallel by rpFFNET_dispatch if this is more than 1
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"FFNETWorkers",default=1,mode="quiet")
+    rpFFNET_info["workers"] = max(int(opt),1)
+    if rpFFNET_info["workers"]>1:
+        rpFFNET_info["dispatch"] = []
+        if rpFFNET_info["warm_start"]:
+            log.warning(" ER using FFNET: warm start needs the periods in order, not used with FFNETWorkers > 1")
+            rpFFNET_info["warm_start"] = False
     
     rpFFNET_info["site_name"] = ds.globalattributes["site_name"]
     rpFFNET_info["time_step"] = int(ds.globalattributes["time_step"])
@@ -829,6 +878,174 @@ def rpFFNET_run_nogui(cf,ds,rpFFNET_info):
             rpFFNET_info["enddate"] = enddate.strftime("%Y-%m-%d")
     elif FFNET_gui.peropt.get()==5:
         pass
+    rpFFNET_dispatch(ds,rpFFNET_info)
+    if "dispatch" in rpFFNET_info: del rpFFNET_info["dispatch"]
+
+def rpFFNET_runjobs(jobs,workers=1):
+    """
+    Purpose:
+     Train the networks for a list of independent FFNET jobs, for example
+     different periods or different series, using a pool of worker processes.
+     The results are returned in the same order as the jobs.  Jobs that are in
+     the model cache are not run again, the rest are run one after the other
+     in this process if workers is 1 or there is only one of them, or if this
+     is called from a daemonic worker process (for example when
+     batchprocess.py runs the sites on a pool of workers) because daemonic
+     processes can not start their own pool.  Each job seeds the random
+     number generators so the results do not depend on the number of workers.
+    Usage:
+     results = rpFFNET_runjobs(jobs,workers=4)
+     where jobs is a list of job dictionaries (see rpFFNET_getjob)
+           workers is the number of worker processes
+           results is a list of (output_predict,weights) tuples
+    """
+    results = []
+    for job in jobs:
+        cached = qccache.get_model(job["key"])
+        if cached is None:
+            results.append(None)
+        else:
+            results.append((cached["output_predict"],cached["weights"]))
+    todo = [i for i in range(len(jobs)) if results[i] is None]
+    if len(todo)<len(jobs):
+        log.info(" "+str(len(jobs)-len(todo))+" of "+str(len(jobs))+" FFNET jobs read from the model cache")
+    workers = min(int(workers),len(todo))
+    if workers>1 and multiprocessing.current_process().daemon:
+        log.info(" Running "+str(len(todo))+" FFNET jobs in this worker process, FFNETWorkers ignored")
+        workers = 1
+    if workers<=1:
+        trained = [rpFFNET_trainjob(jobs[i]) for i in todo]
+    else:
+        log.info(" Running "+str(len(todo))+" FFNET jobs using "+str(workers)+" workers")
+        pool = multiprocessing.Pool(processes=workers)
+        try:
+            trained = pool.map(rpFFNET_trainjob,[jobs[i] for i in todo],chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    for i,result in zip(todo,trained):
+        qccache.put_model(jobs[i]["key"],"ffnet",{"output_predict":result[0],"weights":result[1]})
+        results[i] = result
+    return results
+
+def rpFFNET_skipresults(ds,series):
+    """ Add missing values to the results for a period when FFNET was not run."""
+    ds.ffnet[series]["results"]["No. points"].append(float(0))
+    results_list = ds.ffnet[series]["results"].keys()
+    for item in ["startdate","enddate","No. points"]:
+        if item in results_list: results_list.remove(item)
+    for item in results_list:
+        ds.ffnet[series]["results"][item].append(float(c.missing_value))
+
+def rpFFNET_train(input_train,target_train,input_predict,rpFFNET_info,warm=None):
+    """
+    Purpose:
+     Design and train a FFNET network on the training data and return the
+     predictions for the drivers in input_predict and the trained weights.
+     If warm is the weights of a network trained for the previous period, the
+     network starts from these weights (see rpFFNET_trainwarm).
+    Usage:
+     output_predict,weights = rpFFNET_train(input_train,target_train,input_predict,rpFFNET_info)
+     where input_train is an array (nRecs,nDrivers) with no missing data
+           target_train is an array (nRecs) with no missing data
+           input_predict is an array of drivers (nRecs_predict,nDrivers)
+    """
+    ndrivers = input_train.shape[1]
+    # design the network
+    hidden_layers = rpFFNET_info["hidden"].split(",")
+    if len(hidden_layers)==1:
+        arch = (ndrivers,int(hidden_layers[0]),1)
+    elif len(hidden_layers)==2:
+        arch = (ndrivers,int(hidden_layers[0]),int(hidden_layers[1]),1)
+    else:
+        log.error("ERUsingFFNET: more than 2 hidden layers specified, using 1 ("+str(ndrivers)+")")
+        arch = (ndrivers,ndrivers,1)
+    if rpFFNET_info["connection"]=="standard":
+        conec = ffnet.mlgraph(arch,biases=True)
+    elif rpFFNET_info["connection"]=="full":
+        conec = ffnet.tmlgraph(arch,biases=True)
+    else:
+        raise Exception("rpFFNET: unrecognised FFNET connection option")
+    net = ffnet.ffnet(conec)
+    # train the network, starting from the weights for the previous period if given
+    if warm is not None and len(warm)==len(net.weights) and rpFFNET_trainwarm(net,input_train,target_train,warm,rpFFNET_info):
+        pass
+    elif rpFFNET_info["training_type"].lower()=="tnc":
+        net.train_tnc(input_train,target_train)
+    elif rpFFNET_info["training_type"].lower()=="bfgs":
+        net.train_bfgs(input_train,target_train)
+    elif rpFFNET_info["training_type"].lower()=="cg":
+        net.train_cg(input_train,target_train)
+    elif rpFFNET_info["training_type"].lower()=="genetic":
+        net.train_genetic(input_train,target_train)
+    elif rpFFNET_info["training_type"].lower()=="back":
+        net.train_momentum(input_train,target_train)
+    elif rpFFNET_info["training_type"].lower()=="rprop":
+        try:
+            net.train_rprop(input_train,target_train)
+        except:
+            log.warning("rpFFNET: Rprop training failed, using TNC ...")
+            net.train_tnc(input_train,target_train)
+    else:
+        raise Exception("rpFFNET: unrecognised FFNET training option")
+    output_predict = net.call(input_predict)
+    return output_predict,net.weights
+
+def rpFFNET_trainjob(job):
+    """
+    Purpose:
+     Train the network for one FFNET job (see rpFFNET_getjob) and return the
+     predictions and the trained weights.  The random number generators are
+     seeded from the job and restored afterwards.
+    Usage:
+     output_predict,weights = rpFFNET_trainjob(job)
+    """
+    state = random.getstate()
+    numpy_state = numpy.random.get_state()
+    random.seed(job["seed"])
+    numpy.random.seed(job["seed"])
+    try:
+        return rpFFNET_train(job["input_train"],job["target_train"],job["input_predict"],job,warm=job["warm"])
+    finally:
+        random.setstate(state)
+        numpy.random.set_state(numpy_state)
+
+def rpFFNET_trainwarm(net,input_train,target_train,warm,rpFFNET_info,tolerance=1E-3):
+    """
+    Purpose:
+     Train a FFNET network starting from the weights in warm.  The network is
+     trained in steps of warm_fraction of the usual iteration budget and the
+     training stops when a step reduces the training error by less than
+     tolerance (as a fraction), at most the usual budget is used.  Returns
+     False if warm starting is not available for the training type.
+    Usage:
+     trained = rpFFNET_trainwarm(net,input_train,target_train,warm,rpFFNET_info)
+    """
+    nweights = len(net.weights)
+    # the iteration budget keyword and its default for each training type
+    budgets = {"tnc":("maxfun",max(100,10*nweights)),"bfgs":("maxfun",15000),
+               "cg":("maxiter",200*nweights),"back":("maxiter",10000),
+               "rprop":("maxiter",10000)}
+    training_type = rpFFNET_info["training_type"].lower()
+    if training_type not in budgets: return False
+    methods = {"tnc":net.train_tnc,"bfgs":net.train_bfgs,"cg":net.train_cg,
+               "back":net.train_momentum,"rprop":net.train_rprop}
+    fraction = min(max(rpFFNET_info["warm_fraction"],0.01),1.0)
+    keyword,budget = budgets[training_type]
+    kwargs = {keyword:max(int(budget*fraction),1)}
+    net.weights[:] = warm
+    error = None
+    for n in range(int(numpy.ceil(1.0/fraction))):
+        try:
+            methods[training_type](input_train,target_train,**kwargs)
+        except:
+            log.warning("rpFFNET: warm started training failed, training from random weights ...")
+            net.randomweights()
+            return False
+        error_last = error
+        error = net.sqerror(input_train,target_train)
+        if error_last is not None and error_last-error<tolerance*error_last: break
+    return True
 
 def rpSOLO_createdict(cf,ds,series):
     """ Creates a dictionary in ds to hold information about the SOLO data used
@@ -883,11 +1100,58 @@ def rpSOLO_createdict(cf,ds,series):
         data,flag,attr = qcutils.MakeEmptySeries(ds,ds.merge["standard"][series]["output"])
         qcutils.CreateSeries(ds,ds.merge["standard"][series]["output"],data,Flag=flag,Attr=attr)
 
+@qcprof.profile
+def rpSOLO_dispatch(ds,solo_info):
+    """
+    Purpose:
+     Run the SOLO jobs queued by rpSOLO_main using a pool of worker processes,
+     then put the modelled data into the data structure and plot the results
+     in the order the jobs were queued.
+    Usage:
+     rpSOLO_dispatch(ds,solo_info)
+    """
+    if "dispatch" not in solo_info or len(solo_info["dispatch"])==0: return
+    queue = solo_info["dispatch"]
+    solo_info["dispatch"] = []
+    jobs = [item["job"] for item in queue if not item["skip"]]
+    results = qcsolo.run_jobs(jobs,workers=solo_info["workers"])
+    n = 0
+    for item in queue:
+        series = item["series"]
+        if item["skip"]:
+            rpSOLO_skipresults(ds,series)
+            continue
+        modelled,goodindex = results[n]
+        n = n + 1
+        target = item["target"]
+        if modelled is None:
+            log.error(' rpSOLO_dispatch: SOLO did not run for '+target)
+            rpSOLO_skipresults(ds,series)
+            continue
+        rpSOLO_putresults(ds,item["drivers"],target,item["output"],modelled,goodindex,si=item["si"],ei=item["ei"])
+        pd = rpSOLO_initplot(site_name=item["site_name"],label=target,fig_num=item["fig_num"],title=item["title"],
+                             nDrivers=len(item["drivers"]),startdate=item["startdate"],enddate=item["enddate"])
+        rpSOLO_plot(pd,ds,series,item["drivers"],target,item["output"],item["solo_info"],si=item["si"],ei=item["ei"])
+
 def rpSOLO_done(ds,SOLO_gui,solo_info):
     # destroy the SOLO GUI
     SOLO_gui.destroy()
     if "solo" in dir(ds): del ds.solo
 
+def rpSOLO_getjob(ds,driverlist,targetlabel,nRecs,solo_info,si=0,ei=-1):
+    """ Return a SOLO job (see qcsolo.run_job) for the target and drivers between si and ei."""
+    drivers = numpy.zeros((nRecs,len(driverlist)))
+    for i,TheseOnes in enumerate(driverlist):
+        drivers[:,i],flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
+    target,flag,attr = qcutils.GetSeries(ds,targetlabel,si=si,ei=ei)
+    nodes = solo_info["nodes"]
+    if str(nodes).lower()=="auto": nodes = max([len(driverlist)+1,10])
+    ldt = ds.series["DateTime"]["Data"]
+    return {"drivers":drivers,"target":target,"backend":solo_info["backend"],"nodes":nodes,
+            "training":solo_info["training"],"nda_factor":solo_info["nda_factor"],
+            "learningrate":solo_info["learningrate"],"iterations":solo_info["iterations"],
+            "window":[str(ldt[si]),str(ldt[ei])]}
+
 def rpSOLO_initplot(**kwargs):
     # set the margins, heights, widths etc
     pd = {"margin_bottom":0.075,"margin_top":0.075,"margin_left":0.05,"margin_right":0.05,
@@ -901,6 +1165,7 @@ def rpSOLO_initplot(**kwargs):
     pd["ts_height"] = (1.0 - pd["margin_top"] - pd["ts_bottom"])/float(pd["nDrivers"]+1)
     return pd
 
+@qcprof.profile
 def rpSOLO_main(ds,solo_info,SOLO_gui=None):
     """
     This is the main routine for running SOLO, an artifical neural network for estimating ER.
@@ -912,6 +1177,12 @@ def rpSOLO_main(ds,solo_info,SOLO_gui=None):
     # be changed with the SOLO GUI still displayed
     cfname = ds.globalattributes["controlfile_name"]
     cf = qcio.get_controlfilecontents(cfname,mode="quiet")
+    # SOLO backend, "python" runs SOFM, SOLO and SEQSOLO in memory, "external"
+    # runs the executables in solo/bin, set by the run_nogui routine from the
+    # control file passed in (which includes the batch options) if not run from the GUI
+    if "backend" not in solo_info:
+        opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOBackend",default="external",mode="quiet")
+        solo_info["backend"] = str(opt).lower()
     solo_series = ds.solo.keys()
     for series in solo_series:
         section = qcutils.get_cfsection(cf,series=series,mode="quiet")
@@ -927,8 +1198,8 @@ def rpSOLO_main(ds,solo_info,SOLO_gui=None):
     ldt = ds.series["DateTime"]["Data"]
     xldt = ds.series["xlDateTime"]["Data"]
     # get the start and end datetime indices
-    si = qcutils.GetDateIndex(ldt,startdate,ts=ts,default=0,match="exact")
-    ei = qcutils.GetDateIndex(ldt,enddate,ts=ts,default=-1,match="exact")
+    si = qcutils.GetDateIndex(qcutils.get_datetime64(ds),startdate,ts=ts,default=0,match="exact")
+    ei = qcutils.GetDateIndex(qcutils.get_datetime64(ds),enddate,ts=ts,default=-1,match="exact")
     # check the start and end indices
     if si >= ei:
         log.error(" ERUsingSOLO: end datetime index ("+str(ei)+") smaller that start ("+str(si)+")")
@@ -955,34 +1226,36 @@ def rpSOLO_main(ds,solo_info,SOLO_gui=None):
         d,f,a = qcutils.GetSeriesasMA(ds,target,si=si,ei=ei)
         if numpy.ma.count(d)<solo_info["min_points"]:
             log.error("rpSOLO: Less than "+str(solo_info["min_points"])+" points available for series "+target+" ...")
-            ds.solo[series]["results"]["No. points"].append(float(0))
-            results_list = ds.solo[series]["results"].keys()
-            for item in ["startdate","enddate","No. points"]:
-                if item in results_list: results_list.remove(item)
-            for item in results_list:
-                ds.solo[series]["results"][item].append(float(c.missing_value))
+            if "dispatch" in solo_info:
+                solo_info["dispatch"].append({"series":series,"skip":True})
+            else:
+                rpSOLO_skipresults(ds,series)
             continue
         drivers = ds.solo[series]["drivers"]
         output = ds.solo[series]["output"]
         # set the number of nodes for the inf files
         if solo_info["call_mode"].lower()=="interactive":
             nodesAuto = rpSOLO_setnodesEntry(SOLO_gui,drivers,default=10)
-        # write the inf files for sofm, solo and seqsolo
-        # check this one for SOLO_gui change to solo_info
-        rpSOLO_writeinffiles(solo_info)
-        # run SOFM
-        # check this one for SOLO_gui change to solo_info
-        result = rpSOLO_runsofm(ds,solo_info,drivers,target,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # run SOLO
-        result = rpSOLO_runsolo(ds,drivers,target,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # run SEQSOLO and put the SOLO data into the data structure
-        result = rpSOLO_runseqsolo(ds,drivers,target,output,nRecs,si=si,ei=ei)
-        if result!=1: return
-        # plot the results
         fig_num = fig_num + 1
         title = site_name+" : "+series+" estimated using SOLO"
+        if "dispatch" in solo_info:
+            # queue the run, the queued runs are done by rpSOLO_dispatch
+            job = rpSOLO_getjob(ds,drivers,target,nRecs,solo_info,si=si,ei=ei)
+            info = dict([(k,v) for k,v in solo_info.items() if k!="dispatch"])
+            solo_info["dispatch"].append({"series":series,"skip":False,"target":target,"output":output,
+                                          "drivers":drivers,"si":si,"ei":ei,"fig_num":fig_num,
+                                          "title":title,"site_name":site_name,"startdate":startdate,
+                                          "enddate":enddate,"solo_info":info,"job":job})
+            continue
+        if solo_info["backend"]=="external":
+            # run the SOFM, SOLO and SEQSOLO executables and put the SOLO data into the data structure
+            result = rpSOLO_runexternal(ds,drivers,target,output,nRecs,solo_info,si=si,ei=ei)
+            if result!=1: return
+        else:
+            # run SOFM, SOLO and SEQSOLO in memory and put the SOLO data into the data structure
+            result = rpSOLO_runpython(ds,drivers,target,output,nRecs,solo_info,si=si,ei=ei)
+            if result!=1: return
+        # plot the results
         pd = rpSOLO_initplot(site_name=site_name,label=target,fig_num=fig_num,title=title,
                              nDrivers=len(drivers),startdate=startdate,enddate=enddate)
         rpSOLO_plot(pd,ds,series,drivers,target,output,solo_info,si=si,ei=ei)
@@ -992,6 +1265,7 @@ def rpSOLO_main(ds,solo_info,SOLO_gui=None):
     if 'ERUsingSOLO' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', ERUsingSOLO'
 
+@qcprof.profile
 def rpSOLO_plot(pd,ds,series,driverlist,targetlabel,outputlabel,solo_info,si=0,ei=-1):
     """ Plot the results of the SOLO run. """
     # get the time step
@@ -1126,6 +1400,21 @@ def rpSOLO_plot(pd,ds,series,driverlist,targetlabel,outputlabel,solo_info,si=0,e
     else:
         plt.ion()
 
+def rpSOLO_putresults(ds,driverlist,targetlabel,outputlabel,modelled,goodindex,si=0,ei=-1):
+    """ Put the SOLO modelled data into the output series and set the attributes."""
+    if ei==-1:
+        ds.series[outputlabel]['Data'][si:][goodindex] = modelled
+        ds.series[outputlabel]['Flag'][si:][goodindex] = numpy.int32(30)
+    else:
+        ds.series[outputlabel]['Data'][si:ei+1][goodindex] = modelled
+        ds.series[outputlabel]['Flag'][si:ei+1][goodindex] = numpy.int32(30)
+    # set the attributes
+    ds.series[outputlabel]["Attr"]["units"] = ds.series[targetlabel]["Attr"]["units"]
+    if "modelled by SOLO" not in ds.series[outputlabel]["Attr"]["long_name"]:
+        ds.series[outputlabel]["Attr"]["long_name"] = "Ecosystem respiration modelled by SOLO (ANN)"
+        ds.series[outputlabel]["Attr"]["comment1"] = "Target was "+str(targetlabel)
+        ds.series[outputlabel]["Attr"]["comment2"] = "Drivers were "+str(driverlist)
+
 def rpSOLO_progress(SOLO_gui,text):
     """
         Update progress message in SOLO GUI
@@ -1291,6 +1580,25 @@ def rpSOLO_run_nogui(cf,ds,solo_info):
     # learning iterations
     opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"iterations",default="500")
     solo_info["iterations"] = str(opt)
+    # SOLO backend, "python" runs SOFM, SOLO and SEQSOLO in memory, "external"
+    # runs the executables in solo/bin
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOBackend",default="external",mode="quiet")
+    solo_info["backend"] = str(opt).lower()
+    # number of worker processes, independent periods and series are queued and
+    # run in parallel by rpSOLO_dispatch if this is more than 1
+    opt = qcutils.get_keyvaluefromcf(cf,["Options"],"SOLOWorkers",default=1,mode="quiet")
+    solo_info["workers"] = max(int(opt),1)
+    if solo_info["workers"]>1: solo_info["dispatch"] = []
+    # warm start option, each period starts from the model for the previous period
+    solo_info["warm_start"] = False
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"warm_start",default="no")
+    if opt.lower()=="yes": solo_info["warm_start"] = True
+    opt = qcutils.get_keyvaluefromcf(cf,["GUI","SOLO"],"warm_fraction",default=0.2)
+    solo_info["warm_fraction"] = float(opt)
+    solo_info["warm_models"] = {}
+    if solo_info["warm_start"] and "dispatch" in solo_info:
+        log.warning(" ER using SOLO: warm start needs the periods in order, not used with SOLOWorkers > 1")
+        solo_info["warm_start"] = False
     # now set up the rest of the solo_info dictionary
     solo_info["site_name"] = ds.globalattributes["site_name"]
     solo_info["time_step"] = int(ds.globalattributes["time_step"])
@@ -1304,6 +1612,7 @@ def rpSOLO_run_nogui(cf,ds,solo_info):
     #log.info(" Gap filling "+str(series_list)+" using SOLO")
     if solo_info["peropt"]==1:
         rpSOLO_main(ds,solo_info)
+        rpSOLO_dispatch(ds,solo_info)
         log.info(" Finished manual run ...")
     elif solo_info["peropt"]==2:
         # get the start datetime entered in the SOLO GUI
@@ -1323,6 +1632,7 @@ def rpSOLO_run_nogui(cf,ds,solo_info):
         #gfSOLO_autocomplete(dsa,dsb,solo_info)
         ## plot the summary statistics
         #gfSOLO_plotsummary(dsb,solo_info)
+        rpSOLO_dispatch(ds,solo_info)
         log.info(" Finished auto (monthly) run ...")
     elif solo_info["peropt"]==3:
         # get the start datetime entered in the SOLO GUI
@@ -1343,6 +1653,7 @@ def rpSOLO_run_nogui(cf,ds,solo_info):
         #gfSOLO_autocomplete(dsa,dsb,solo_info)
         ## plot the summary statistics
         #gfSOLO_plotsummary(dsb,solo_info)
+        rpSOLO_dispatch(ds,solo_info)
         log.info(" Finished auto (days) run ...")
     elif solo_info["peropt"]==4:
         if len(solo_info["startdate"])==0: solo_info["startdate"] = solo_info["file_startdate"]
@@ -1361,128 +1672,135 @@ def rpSOLO_run_nogui(cf,ds,solo_info):
             enddate = startdate+dateutil.relativedelta.relativedelta(years=1)
             solo_info["startdate"] = startdate.strftime("%Y-%m-%d")
             solo_info["enddate"] = enddate.strftime("%Y-%m-%d")
+        rpSOLO_dispatch(ds,solo_info)
         log.info(" Finished auto (yearly) run ...")
+    if "dispatch" in solo_info: del solo_info["dispatch"]
+
+@qcprof.profile
+def rpSOLO_runexternal(ds,driverlist,targetlabel,outputlabel,nRecs,solo_info,si=0,ei=-1):
+    '''
+    Run the SOFM, SOLO and SEQSOLO executables in their own working directory.
+    The modelled data are read from the model cache if this period has been
+    run before with the same data and settings.
+    '''
+    job = rpSOLO_getjob(ds,driverlist,targetlabel,nRecs,solo_info,si=si,ei=ei)
+    key = qcsolo.get_jobkey(job)
+    cached = qcsolo.get_cachedjob(key)
+    if cached is not None:
+        rpSOLO_putresults(ds,driverlist,targetlabel,outputlabel,cached[0],cached[1],si=si,ei=ei)
+        return 1
+    # each run uses its own working directory for the inf, input and output files
+    workdir = qcsolo.make_workdir()
+    try:
+        # write the inf files for sofm, solo and seqsolo
+        # check this one for SOLO_gui change to solo_info
+        rpSOLO_writeinffiles(solo_info,workdir=workdir)
+        # run SOFM
+        # check this one for SOLO_gui change to solo_info
+        result = rpSOLO_runsofm(ds,solo_info,driverlist,targetlabel,nRecs,si=si,ei=ei,workdir=workdir)
+        # run SOLO
+        if result==1:
+            result = rpSOLO_runsolo(ds,driverlist,targetlabel,nRecs,si=si,ei=ei,workdir=workdir)
+        # run SEQSOLO and put the SOLO data into the data structure
+        if result==1:
+            result = rpSOLO_runseqsolo(ds,driverlist,targetlabel,outputlabel,nRecs,si=si,ei=ei,workdir=workdir)
+    finally:
+        qcsolo.remove_workdir(workdir)
+    if result==1:
+        index = numpy.where(qcsolo.get_goodindex(job["drivers"]))[0]
+        modelled = ds.series[outputlabel]['Data'][si:si+nRecs][index]
+        qcsolo.put_cachedjob(key,(modelled,index,None))
+    return result
 
-def rpSOLO_runseqsolo(ds,driverlist,targetlabel,outputlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def rpSOLO_runpython(ds,driverlist,targetlabel,outputlabel,nRecs,solo_info,si=0,ei=-1):
+    '''
+    Run SOFM, SOLO and SEQSOLO in memory using the numpy implementation in qcsolo.
+    '''
+    job = rpSOLO_getjob(ds,driverlist,targetlabel,nRecs,solo_info,si=si,ei=ei)
+    if solo_info.get("warm_start",False):
+        # start from the model trained for this series in the previous period
+        job["warm"] = solo_info["warm_models"].get(outputlabel)
+        job["warm_fraction"] = solo_info["warm_fraction"]
+    modelled,goodindex,model = qcsolo.run_jobmodel(job)
+    if modelled is None:
+        log.error(' rpSOLO_runpython: SOLO did not run for '+targetlabel)
+        return 0
+    if solo_info.get("warm_start",False): solo_info["warm_models"][outputlabel] = model
+    # put the SOLO modelled data back into the data series
+    rpSOLO_putresults(ds,driverlist,targetlabel,outputlabel,modelled,goodindex,si=si,ei=ei)
+    return 1
+
+@qcprof.profile
+def rpSOLO_runseqsolo(ds,driverlist,targetlabel,outputlabel,nRecs,si=0,ei=-1,workdir="."):
     '''
     Run SEQSOLO.
     '''
-    # get the number of drivers    
+    # get the number of drivers
     ndrivers = len(driverlist)
     # add an extra column for the target data
     seqsoloinputdata = numpy.zeros((nRecs,ndrivers+1))
     # now fill the driver data array
-    i = 0
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
-        seqsoloinputdata[:,i] = driver[:]
-        i = i + 1
-    # a clean copy of the target is pulled from the unmodified ds each time
-    target,flag,attr = qcutils.GetSeries(ds,targetlabel,si=si,ei=ei)
-    # now load the target data into the data array
-    seqsoloinputdata[:,ndrivers] = target[:]
-    # now strip out the bad data
-    cind = numpy.zeros(nRecs)
-    iind = numpy.arange(nRecs)
-    # do only the drivers not the target
-    for i in range(ndrivers):
-        index = numpy.where(seqsoloinputdata[:,i]==c.missing_value)[0]
-        if len(index!=0): cind[index] = 1
-    # index of good data
-    index = numpy.where(cind==0)[0]
-    nRecs_good = len(index)
-    gooddata = numpy.zeros((nRecs_good,ndrivers+1))
-    for i in range(ndrivers+1):
-        gooddata[:,i] = seqsoloinputdata[:,i][index]
-    # keep track of the good data indices
-    goodindex = iind[index]
+    for i,TheseOnes in enumerate(driverlist):
+        seqsoloinputdata[:,i],flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
+    # get the target data
+    seqsoloinputdata[:,ndrivers],flag,attr = qcutils.GetSeries(ds,targetlabel,si=si,ei=ei)
+    # keep track of the records with good drivers, missing target data is modelled
+    goodindex = numpy.where(qcsolo.get_goodindex(seqsoloinputdata[:,0:ndrivers]))[0]
     # and then write the seqsolo input file
-    seqsolofile = open('solo/input/seqsolo_input.csv','wb')
-    wr = csv.writer(seqsolofile,delimiter=',')
-    for i in range(gooddata.shape[0]):
-        wr.writerow(gooddata[i,0:ndrivers+1])
-    seqsolofile.close()
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/seqsolo_input.csv'),seqsoloinputdata[goodindex])
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/seqOut2.out'): os.remove('solo/output/seqOut2.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/seqOut2.out')): os.remove(os.path.join(workdir,'solo/output/seqOut2.out'))
     # now run SEQSOLO
     #log.info(' GapFillUsingSOLO: running SEQSOLO')
-    seqsolologfile = open('solo/log/seqsolo.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/seqsolo.exe','solo/inf/seqsolo.inf'],stdout=seqsolologfile)
-    else:
-        subprocess.call(['./solo/bin/seqsolo','solo/inf/seqsolo.inf'],stdout=seqsolologfile)
-    seqsolologfile.close()
+    qcsolo.call_executable("seqsolo",workdir)
     # check to see if the solo output file exists, this is used to indicate that solo ran correctly
-    if os.path.exists('solo/output/seqOut2.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/seqOut2.out')):
         # now read in the seqsolo results, use the seqOut2 file so that the learning capability of
         # seqsolo can be used via the "learning rate" and "Iterations" GUI options
-        seqdata = numpy.genfromtxt('solo/output/seqOut2.out')
+        seqdata = qcsolo.read_outputfile(os.path.join(workdir,'solo/output/seqOut2.out'))
         # put the SOLO modelled data back into the data series
-        if ei==-1:
-            ds.series[outputlabel]['Data'][si:][goodindex] = seqdata[:,1]
-            ds.series[outputlabel]['Flag'][si:][goodindex] = numpy.int32(30)
-        else:
-            ds.series[outputlabel]['Data'][si:ei+1][goodindex] = seqdata[:,1]
-            ds.series[outputlabel]['Flag'][si:ei+1][goodindex] = numpy.int32(30)
-        # set the attributes
-        ds.series[outputlabel]["Attr"]["units"] = ds.series[targetlabel]["Attr"]["units"]
-        if "modelled by SOLO" not in ds.series[outputlabel]["Attr"]["long_name"]:
-            ds.series[outputlabel]["Attr"]["long_name"] = "Ecosystem respiration modelled by SOLO (ANN)"
-            ds.series[outputlabel]["Attr"]["comment1"] = "Target was "+str(targetlabel)
-            ds.series[outputlabel]["Attr"]["comment2"] = "Drivers were "+str(driverlist)
+        rpSOLO_putresults(ds,driverlist,targetlabel,outputlabel,seqdata[:,1],goodindex,si=si,ei=ei)
         return 1
     else:
         log.error(' SOLO_runseqsolo: SEQSOLO did not run correctly, check the SOLO GUI and the log files')
         return 0
 
-def rpSOLO_runsofm(ds,SOLO_gui,driverlist,targetlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def rpSOLO_runsofm(ds,SOLO_gui,driverlist,targetlabel,nRecs,si=0,ei=-1,workdir="."):
     """
     Run sofm, the pre-processor for SOLO.
     """
     # get the number of drivers
     ndrivers = len(driverlist)
-    # add an extra column for the target data
-    sofminputdata = numpy.zeros((nRecs,ndrivers))
     # now fill the driver data array
-    i = 0
-    badlines = []
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
-        index = numpy.where(abs(driver-float(c.missing_value)<c.eps))[0]
-        if len(index)!=0:
-            log.error(' SOLO_runsofm: c.missing_value found in driver '+TheseOnes+' at lines '+str(index))
-            badlines = badlines+index.tolist()
-        sofminputdata[:,i] = driver[:]
-        i = i + 1
-    if len(badlines)!=0:
-        nBad = len(badlines)
-        goodlines = [x for x in range(0,nRecs) if x not in badlines]
-        sofminputdata = sofminputdata[goodlines,:]
+    sofminputdata = numpy.zeros((nRecs,ndrivers))
+    goodlines = numpy.ones(nRecs,dtype=bool)
+    for i,TheseOnes in enumerate(driverlist):
+        sofminputdata[:,i],flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
+        badlines = ~qcsolo.get_goodindex(sofminputdata[:,i])
+        if numpy.any(badlines):
+            log.error(' SOLO_runsofm: c.missing_value found in driver '+TheseOnes+' at lines '+str(numpy.where(badlines)[0]))
+            goodlines = goodlines & ~badlines
+    if not numpy.all(goodlines):
+        nBad = numpy.sum(~goodlines)
+        sofminputdata = sofminputdata[goodlines]
         log.info(' SOLO_runsofm: removed '+str(nBad)+' lines from sofm input file')
-        nRecs = len(goodlines)
     # now write the drivers to the SOFM input file
-    sofmfile = open('solo/input/sofm_input.csv','wb')
-    wr = csv.writer(sofmfile,delimiter=',')
-    for i in range(sofminputdata.shape[0]):
-        wr.writerow(sofminputdata[i,0:ndrivers])
-    sofmfile.close()
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/sofm_input.csv'),sofminputdata)
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/sofm_4.out'): os.remove('solo/output/sofm_4.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/sofm_4.out')): os.remove(os.path.join(workdir,'solo/output/sofm_4.out'))
     # now run SOFM
-    sofmlogfile = open('solo/log/sofm.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/sofm.exe','solo/inf/sofm.inf'],stdout=sofmlogfile)
-    else:
-        subprocess.call(['./solo/bin/sofm','solo/inf/sofm.inf'],stdout=sofmlogfile)
-    sofmlogfile.close()
+    qcsolo.call_executable("sofm",workdir)
     # check to see if the sofm output file exists, this is used to indicate that sofm ran correctly
-    if os.path.exists('solo/output/sofm_4.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/sofm_4.out')):
         return 1
     else:
         log.error(' SOLO_runsofm: SOFM did not run correctly, check the GUI and the log files')
         return 0
 
-def rpSOLO_runsolo(ds,driverlist,targetlabel,nRecs,si=0,ei=-1):
+@qcprof.profile
+def rpSOLO_runsolo(ds,driverlist,targetlabel,nRecs,si=0,ei=-1,workdir="."):
     '''
     Run SOLO.
     '''
@@ -1490,43 +1808,21 @@ def rpSOLO_runsolo(ds,driverlist,targetlabel,nRecs,si=0,ei=-1):
     # add an extra column for the target data
     soloinputdata = numpy.zeros((nRecs,ndrivers+1))
     # now fill the driver data array, drivers come from the modified ds
-    i = 0
-    for TheseOnes in driverlist:
-        driver,flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
-        soloinputdata[:,i] = driver[:]
-        i = i + 1
-    # a clean copy of the target is pulled from the ds each time
-    target,flag,attr = qcutils.GetSeries(ds,targetlabel,si=si,ei=ei)
-    # now load the target data into the data array
-    soloinputdata[:,ndrivers] = target[:]
-    # now strip out the bad data
-    cind = numpy.zeros(nRecs)
-    for i in range(ndrivers+1):
-        index = numpy.where(soloinputdata[:,i]==c.missing_value)[0]
-        if len(index!=0): cind[index] = 1
-    index = numpy.where(cind==0)[0]
-    nRecs_good = len(index)
-    gooddata = numpy.zeros((nRecs_good,ndrivers+1))
-    for i in range(ndrivers+1):
-        gooddata[:,i] = soloinputdata[:,i][index]
-    # and then write the solo input file, the name is assumed by the solo.inf control file
-    solofile = open('solo/input/solo_input.csv','wb')
-    wr = csv.writer(solofile,delimiter=',')
-    for i in range(gooddata.shape[0]):
-        wr.writerow(gooddata[i,0:ndrivers+1])
-    solofile.close()
+    for i,TheseOnes in enumerate(driverlist):
+        soloinputdata[:,i],flag,attr = qcutils.GetSeries(ds,TheseOnes,si=si,ei=ei)
+    # get the target data
+    soloinputdata[:,ndrivers],flag,attr = qcutils.GetSeries(ds,targetlabel,si=si,ei=ei)
+    # and then write the records with no missing data to the solo input file, the
+    # name is assumed by the solo.inf control file
+    goodlines = qcsolo.get_goodindex(soloinputdata)
+    qcsolo.write_inputfile(os.path.join(workdir,'solo/input/solo_input.csv'),soloinputdata[goodlines])
     # if the output file from a previous run exists, delete it
-    if os.path.exists('solo/output/eigenValue.out'): os.remove('solo/output/eigenValue.out')
+    if os.path.exists(os.path.join(workdir,'solo/output/eigenValue.out')): os.remove(os.path.join(workdir,'solo/output/eigenValue.out'))
     # now run SOLO
     #log.info(' GapFillUsingSOLO: running SOLO')
-    solologfile = open('solo/log/solo.log','wb')
-    if platform.system()=="Windows":
-        subprocess.call(['./solo/bin/solo.exe','solo/inf/solo.inf'],stdout=solologfile)
-    else:
-        subprocess.call(['./solo/bin/solo','solo/inf/solo.inf'],stdout=solologfile)
-    solologfile.close()
+    qcsolo.call_executable("solo",workdir)
     # check to see if the solo output file exists, this is used to indicate that solo ran correctly
-    if os.path.exists('solo/output/eigenValue.out'):
+    if os.path.exists(os.path.join(workdir,'solo/output/eigenValue.out')):
         return 1
     else:
         log.error(' SOLO_runsolo: SOLO did not run correctly, check the SOLO GUI and the log files')
@@ -1541,97 +1837,16 @@ def rpSOLO_setnodesEntry(SOLO_gui,drivers,default=2):
         SOLO_gui.nodesEntry.insert(0,str(num_nodes))
     return nodesAuto
 
-def rpSOLO_writeinffiles(solo_info):
-    # sofm inf file
-    f = open('solo/inf/sofm.inf','w')
-    f.write(str(solo_info["nodes"])+'\n')
-    f.write(str(solo_info["training"])+'\n')
-    f.write(str(20)+'\n')
-    f.write(str(0.01)+'\n')
-    f.write(str(1234)+'\n')
-    f.write('solo/input/sofm_input.csv'+'\n')
-    f.write('solo/output/sofm_1.out'+'\n')
-    f.write('solo/output/sofm_2.out'+'\n')
-    f.write('solo/output/sofm_3.out'+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write(str(50)+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: No. of training iterations - default is 500 (changeable via GUI if used)\n')
-    f.write('Line 3: No. of iterations per screen output - default is 20\n')
-    f.write('Line 4: Spacing between initial weights - default is 0.01\n')
-    f.write('Line 5: Seed for random number generator - default is 1234\n')
-    f.write('Line 6: input data filename with path relative to current directory\n')
-    f.write('Line 7: first output filename with path relative to current directory\n')
-    f.write('Line 8: second output filename with path relative to current directory\n')
-    f.write('Line 9: third output filename with path relative to current directory\n')
-    f.write('Line 10: fourth output filename with path relative to current directory (used by SOLO)\n')
-    f.write('Line 11: No. iterations per write of weights to screen - default is 50\n')
-    f.close()
-    # solo inf file
-    f = open('solo/inf/solo.inf','w')
-    f.write(str(solo_info["nodes"])+'\n')
-    f.write(str(solo_info["nda_factor"])+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write('solo/input/solo_input.csv'+'\n')
-    f.write('training'+'\n')
-    f.write(str(5678)+'\n')
-    f.write(str(0)+'\n')
-    f.write('solo/output/eigenValue.out'+'\n')
-    f.write('solo/output/eigenVector.out'+'\n')
-    f.write('solo/output/accumErr.out'+'\n')
-    f.write('solo/output/accumRR.out'+'\n')
-    f.write('solo/output/trainProcess.out'+'\n')
-    f.write('solo/output/freqTable.out'+'\n')
-    f.write('solo/output/hidOutputWt.out'+'\n')
-    f.write('solo/output/errorMap.out'+'\n')
-    f.write('solo/output/finResult.out'+'\n')
-    f.write('solo/output/trainWin.out'+'\n')
-    f.write('solo/output/trainWout.out'+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: multiplier for minimum number of points per node (NdaFactor) - default is 5 (ie 5*(no. of drivers+1) (changeable via GUI if used)\n')
-    f.write('Line 3: fourth output file from SOFM, used as input to SOLO\n')
-    f.write('Line 4: input data filename with path relative to current directory\n')
-    f.write('Line 5: type of run ("training" or "simulation", always "training" for SOLO)\n')
-    f.write('Line 6: seed for random number generator - default is 5678\n')
-    f.write('Line 7: "calThreshold", not used by SOLO\n')
-    f.write('Lines 8 to 18: output files from SOLO with path relative to current directory\n')
-    f.close()
-    # seqsolo inf file
-    f = open('solo/inf/seqsolo.inf','w')
-    f.write(str(solo_info["nodes"])+'\n')
-    f.write(str(0)+'\n')
-    f.write(str(solo_info["learningrate"])+'\n')
-    f.write(str(solo_info["iterations"])+'\n')
-    f.write('solo/output/sofm_4.out'+'\n')
-    f.write('solo/input/seqsolo_input.csv'+'\n')
-    f.write('simulation'+'\n')
-    f.write(str(9100)+'\n')
-    f.write(str(0)+'\n')
-    f.write('solo/output/eigenValue.out'+'\n')
-    f.write('solo/output/eigenVector.out'+'\n')
-    f.write('solo/output/trainWout.out'+'\n')
-    f.write('solo/output/freqTable.out'+'\n')
-    f.write('solo/output/errorMap.out'+'\n')
-    f.write('solo/output/finResult.out'+'\n')
-    f.write('solo/output/trainingRMSE.out'+'\n')
-    f.write('solo/output/seqOut0.out'+'\n')
-    f.write('solo/output/seqOut1.out'+'\n')
-    f.write('solo/output/seqOut2.out'+'\n')
-    f.write('solo/output/seqHidOutW.out'+'\n')
-    f.write('solo/output/seqFreqMap.out'+'\n')
-    f.write(str(c.missing_value)+'\n')
-    f.write('### Comment lines ###\n')
-    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
-    f.write('Line 2: NdaFactor - not used by SEQSOLO, default value is 0\n')
-    f.write('Line 3: learning rate - default value 0.01 (must be between 0.0 1nd 1.0, changeable via GUI if used)\n')
-    f.write('Line 4: number of iterations for sequential training, default value is 500 (changeable via GUI if used)\n')
-    f.write('Line 5: fourth output file from SOFM, used as input file by SEQSOLO\n')
-    f.write('Line 6: input data filename with path relative to current directory\n')
-    f.write('Line 7: type of run ("training" or "simulation", always "simulation" for SEQSOLO)\n')
-    f.write('Line 8: seed for random number generator - default is 9100\n')
-    f.write('Line 9: "calThreshold" - minimum number of data points for SOLO node to be used in simulation, default value is 0 (use all nodes)\n')
-    f.write('Lines 10 to 21: output files from SEQSOLO with path relative to current directory\n')
-    f.write('Line 22: missing data value, default value is c.missing_value.0\n')
-    f.close()
+def rpSOLO_skipresults(ds,series):
+    """ Add missing values to the results for a period when SOLO was not run."""
+    ds.solo[series]["results"]["No. points"].append(float(0))
+    results_list = ds.solo[series]["results"].keys()
+    for item in ["startdate","enddate","No. points"]:
+        if item in results_list: results_list.remove(item)
+    for item in results_list:
+        ds.solo[series]["results"][item].append(float(c.missing_value))
+
+def rpSOLO_writeinffiles(solo_info,workdir="."):
+    """ Write the inf files for SOFM, SOLO and SEQSOLO in the working directory."""
+    qcsolo.write_inffiles(workdir,solo_info["nodes"],solo_info["training"],solo_info["nda_factor"],
+                          solo_info["learningrate"],solo_info["iterations"])
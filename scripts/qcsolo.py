@@ -0,0 +1,570 @@
+"""
+Purpose:
+ A numpy implementation of SOLO (Self Organising Linear Output map, Hsu et al
+ 2002) used to gap fill fluxes (qcgf) and to estimate ER (qcrpNN).  This runs
+ the same three steps as the SOFM, SOLO and SEQSOLO executables in solo/bin
+ but in memory, without writing input files, launching processes and reading
+ the output files back;
+  - sofm trains a square self organising feature map on the drivers
+  - solo fits a linear regression of the target on the drivers for each
+    node of the map, using at least nda_factor*(number of drivers+1) points
+  - seqsolo refines the regressions using the target data and returns the
+    modelled target for every record with good drivers
+ The results are similar to, but not the same as, those from the executables
+ so the executables remain the default (SOLOBackend = external), this is only
+ used with SOLOBackend = python in the [Options] section of the control file.
+ The training can be warm started from the model trained for the previous
+ period, this uses fewer iterations and stops when the model has converged.
+
+ This module also runs the SOFM, SOLO and SEQSOLO executables, each run gets
+ its own temporary working directory so that runs can execute at the same
+ time, and dispatches independent SOLO runs to a pool of worker processes.
+Usage:
+ modelled,index = qcsolo.run(drivers,target,nodes,training,nda_factor,learningrate,iterations)
+ results = qcsolo.run_jobs(jobs,workers=4)
+"""
+import logging
+import multiprocessing
+import numpy
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import constants as c
+import qccache
+
+log = logging.getLogger('qc.solo')
+
+def get_goodindex(data):
+    """ Return a boolean array, True for the rows of data with no missing values."""
+    if data.ndim==1: data = data.reshape(-1,1)
+    return numpy.all(abs(data-float(c.missing_value))>c.eps,axis=1)
+
+def scale_drivers(model,x):
+    """ Scale the drivers to the range 0 to 1 using the range of the SOFM training data."""
+    return (x-model["xmin"])/model["xrange"]
+
+def get_winningnodes(weights,xs):
+    """ Return the index of the node closest to each row of the scaled drivers."""
+    d2 = (xs**2).sum(axis=1)[:,None] - 2*numpy.dot(xs,weights.T) + (weights**2).sum(axis=1)[None,:]
+    return numpy.argmin(d2,axis=1)
+
+def sofm(x,nodes,training,seed=1234,warm=None,warm_fraction=0.2,tolerance=1E-4):
+    """
+    Purpose:
+     Train a nodes by nodes self organising feature map on the drivers.  The
+     map is trained in batch mode, each iteration moves every node to the
+     neighbourhood weighted mean of the data closest to it and the size of
+     the neighbourhood shrinks from half the map to less than one node over
+     the training iterations.  The nodes start at randomly chosen records.
+     If warm is a model trained on another period with the same number of
+     nodes and drivers, the nodes start at the nodes of that model, the
+     neighbourhood is kept at its final size, only warm_fraction of the
+     training iterations are used and the training stops when no node moves
+     by more than tolerance (in scaled units).  model["warm"] is True if the
+     warm model was used, a warm model with a different shape is ignored.
+    Usage:
+     model = qcsolo.sofm(x,nodes,training)
+     where x is an array of drivers (nRecs,nDrivers) with no missing data
+           nodes is the number of nodes along each side of the map
+           training is the number of training iterations
+    """
+    nodes = max(int(nodes),1)
+    training = max(int(training),1)
+    model = {"nodes":nodes}
+    model["xmin"] = numpy.min(x,axis=0)
+    x_range = numpy.max(x,axis=0)-model["xmin"]
+    x_range[x_range==0] = 1.0
+    model["xrange"] = x_range
+    xs = scale_drivers(model,x)
+    nRecs,nDrivers = xs.shape
+    nNodes = nodes*nodes
+    # position of each node on the map and the squared distances between them
+    grid = numpy.array([(i,j) for i in range(nodes) for j in range(nodes)],dtype=numpy.float64)
+    grid_d2 = ((grid[:,None,:]-grid[None,:,:])**2).sum(axis=2)
+    sigma_end = 0.5
+    if warm is not None and warm["weights"].shape==(nNodes,nDrivers):
+        # start from the nodes of the warm model, rescaled to this data
+        weights = scale_drivers(model,warm["weights"]*warm["xrange"]+warm["xmin"])
+        sigma_start = sigma_end
+        training = max(int(training*float(warm_fraction)),1)
+    else:
+        warm = None
+        rng = numpy.random.RandomState(seed)
+        weights = xs[rng.randint(0,nRecs,size=nNodes)].copy()
+        sigma_start = max(nodes/2.0,1.0)
+    for n in range(training):
+        sigma = sigma_start*(sigma_end/sigma_start)**(float(n)/max(training-1,1))
+        winners = get_winningnodes(weights,xs)
+        counts = numpy.bincount(winners,minlength=nNodes).astype(numpy.float64)
+        sums = numpy.zeros((nNodes,nDrivers))
+        for i in range(nDrivers):
+            sums[:,i] = numpy.bincount(winners,weights=xs[:,i],minlength=nNodes)
+        h = numpy.exp(-grid_d2/(2*sigma**2))
+        numerator = numpy.dot(h,sums)
+        denominator = numpy.dot(h,counts)
+        idx = numpy.where(denominator>0)[0]
+        change = numpy.max(abs(numerator[idx]/denominator[idx,None]-weights[idx])) if len(idx)>0 else 0.0
+        weights[idx] = numerator[idx]/denominator[idx,None]
+        if warm is not None and change<tolerance: break
+    model["weights"] = weights
+    model["warm"] = warm is not None
+    return model
+
+def solo(model,x,y,nda_factor):
+    """
+    Purpose:
+     Fit a linear regression of the target on the drivers for each node of
+     the SOFM.  A node with fewer than nda_factor*(number of drivers+1) data
+     points uses the points closest to the node instead.  The regressions are
+     solved by least squares with small singular values truncated, similar to
+     the principal component regression used by the SOLO executable.
+    Usage:
+     qcsolo.solo(model,x,y,nda_factor)
+     where x is an array of drivers (nRecs,nDrivers) and y is the target, both
+           with no missing data
+    """
+    weights = model["weights"]
+    nNodes,nDrivers = weights.shape
+    xs = scale_drivers(model,x)
+    a = numpy.column_stack((xs,numpy.ones(len(xs))))
+    winners = get_winningnodes(weights,xs)
+    min_points = min(max(int(float(nda_factor)*(nDrivers+1)),nDrivers+1),len(xs))
+    coefficients = numpy.zeros((nNodes,nDrivers+1))
+    coefficients[:,nDrivers] = numpy.mean(y)
+    for k in range(nNodes):
+        idx = numpy.where(winners==k)[0]
+        if len(idx)<min_points:
+            d2 = ((xs-weights[k])**2).sum(axis=1)
+            idx = numpy.argsort(d2,kind="mergesort")[:min_points]
+        coefficients[k] = numpy.linalg.lstsq(a[idx],y[idx],rcond=1E-6)[0]
+    model["coefficients"] = coefficients
+    return model
+
+def seqsolo(model,x,y,learningrate,iterations,tolerance=None):
+    """
+    Purpose:
+     Refine the regression for each node using the target data and return the
+     modelled target.  Each iteration moves the coefficients of each node down
+     the gradient of the mean squared error of the records closest to it, the
+     step is scaled by the number of coefficients so that learning rates
+     between 0 and 1 are stable.  If tolerance is given, the iterations stop
+     when the mean squared error decreases by less than this fraction.
+    Usage:
+     modelled = qcsolo.seqsolo(model,x,y,learningrate,iterations)
+     where x is an array of drivers (nRecs,nDrivers) with no missing data
+           y is the target, missing data is not used
+    """
+    weights = model["weights"]
+    coefficients = model["coefficients"].copy()
+    nNodes,nDrivers = weights.shape
+    xs = scale_drivers(model,x)
+    a = numpy.column_stack((xs,numpy.ones(len(xs))))
+    winners = get_winningnodes(weights,xs)
+    good = get_goodindex(y)
+    if numpy.any(good) and float(learningrate)>0:
+        ag = a[good]
+        yg = y[good]
+        wg = winners[good]
+        counts = numpy.bincount(wg,minlength=nNodes).astype(numpy.float64)
+        counts[counts==0] = 1.0
+        step = float(learningrate)/(nDrivers+1)
+        mse_last = None
+        for n in range(int(iterations)):
+            error = yg - (ag*coefficients[wg]).sum(axis=1)
+            if tolerance is not None:
+                mse = numpy.mean(error**2)
+                if mse_last is not None and mse_last-mse<tolerance*mse_last: break
+                mse_last = mse
+            for i in range(nDrivers+1):
+                gradient = numpy.bincount(wg,weights=error*ag[:,i],minlength=nNodes)/counts
+                coefficients[:,i] = coefficients[:,i] + step*gradient
+    model["coefficients"] = coefficients
+    return (a*coefficients[winners]).sum(axis=1)
+
+def run(drivers,target,nodes,training,nda_factor,learningrate,iterations):
+    """
+    Purpose:
+     Run SOFM, SOLO and SEQSOLO on the drivers and target for one period.
+     Records with missing drivers are not used, records with a missing target
+     are not used for training but are modelled.
+    Usage:
+     modelled,index = qcsolo.run(drivers,target,nodes,training,nda_factor,learningrate,iterations)
+     where drivers is an array (nRecs,nDrivers)
+           target is an array (nRecs)
+           modelled is the modelled target at the records given by index
+     modelled and index are None if there is no good data.
+    """
+    modelled,index,model = train(drivers,target,nodes,training,nda_factor,learningrate,iterations)
+    return modelled,index
+
+def train(drivers,target,nodes,training,nda_factor,learningrate,iterations,warm=None,warm_fraction=0.2):
+    """
+    Purpose:
+     Same as qcsolo.run but also returns the trained model, None if there is
+     no good data.  If warm is a model trained for the previous period, the
+     SOFM starts from the nodes of that model and the SOFM and SEQSOLO use
+     warm_fraction of the training iterations and stop when converged.  The
+     full number of iterations is used if sofm does not accept the warm
+     model (different number of nodes or drivers).
+    Usage:
+     modelled,index,model = qcsolo.train(drivers,target,nodes,training,nda_factor,learningrate,iterations,warm=model)
+    """
+    good_drivers = get_goodindex(drivers)
+    good_target = good_drivers & get_goodindex(target)
+    if numpy.sum(good_target)<=drivers.shape[1]:
+        log.error(" qcsolo.run: not enough good data to train SOLO")
+        return None,None,None
+    model = sofm(drivers[good_drivers],nodes,training,warm=warm,warm_fraction=warm_fraction)
+    tolerance = None
+    if model["warm"]:
+        iterations = max(int(int(iterations)*float(warm_fraction)),1)
+        tolerance = 1E-4
+    solo(model,drivers[good_target],target[good_target],nda_factor)
+    index = numpy.where(good_drivers)[0]
+    modelled = seqsolo(model,drivers[index],target[index],learningrate,iterations,tolerance=tolerance)
+    return modelled,index,model
+
+def make_workdir():
+    """
+    Purpose:
+     Create a temporary working directory for one run of the SOLO executables.
+     The directory has the same solo/inf, solo/input, solo/output and solo/log
+     sub-directories as the OzFluxQC directory so the inf files can use the
+     same relative paths.
+    Usage:
+     workdir = qcsolo.make_workdir()
+    """
+    workdir = tempfile.mkdtemp(prefix="solo_")
+    for item in ["inf","input","output","log"]:
+        os.makedirs(os.path.join(workdir,"solo",item))
+    return workdir
+
+def remove_workdir(workdir):
+    """ Remove a working directory created by make_workdir."""
+    if workdir!=".": shutil.rmtree(workdir,ignore_errors=True)
+
+def get_executable(name):
+    """ Return the absolute path of the SOFM, SOLO or SEQSOLO executable in solo/bin."""
+    if platform.system()=="Windows": name = name+".exe"
+    return os.path.abspath(os.path.join("solo","bin",name))
+
+def call_executable(name,workdir="."):
+    """
+    Purpose:
+     Run the SOFM, SOLO or SEQSOLO executable in workdir using the inf file
+     solo/inf/<name>.inf, the screen output goes to solo/log/<name>.log.
+    Usage:
+     qcsolo.call_executable("sofm",workdir)
+    """
+    logfile = open(os.path.join(workdir,"solo","log",name+".log"),'wb')
+    try:
+        subprocess.call([get_executable(name),"solo/inf/"+name+".inf"],stdout=logfile,cwd=workdir)
+    except OSError:
+        log.error(" qcsolo.call_executable: unable to run "+get_executable(name))
+    finally:
+        logfile.close()
+
+def write_inputfile(file_name,data):
+    """
+    Purpose:
+     Write an array to a SOLO input file as comma separated values.  The whole
+     array is formatted with a single string operation rather than a row at
+     a time, the file is the same as that written by csv.writer.
+    Usage:
+     qcsolo.write_inputfile(file_name,data)
+     where data is an array (nRecs,nColumns) with no missing data
+    """
+    if data.ndim==1: data = data.reshape(-1,1)
+    nRecs,nColumns = data.shape
+    fmt = (",".join(["%r"]*nColumns)+"\r\n")*nRecs
+    f = open(file_name,'wb')
+    f.write(fmt%tuple(numpy.asarray(data,dtype=numpy.float64).ravel().tolist()))
+    f.close()
+
+def read_outputfile(file_name):
+    """
+    Purpose:
+     Read a whitespace delimited SOLO output file (eg seqOut2.out) into an
+     array (nRecs,nColumns).  The file is parsed in a single call, the much
+     slower numpy.genfromtxt is only used if the file is not a regular table
+     of numbers.
+    Usage:
+     data = qcsolo.read_outputfile(file_name)
+    """
+    f = open(file_name,'r')
+    text = f.read()
+    f.close()
+    nColumns = len(text.split("\n",1)[0].split())
+    data = numpy.fromstring(text,sep=" ")
+    # fromstring stops at the first item that is not a number
+    if nColumns==0 or data.size!=len(text.split()) or data.size%nColumns!=0:
+        return numpy.genfromtxt(file_name)
+    return data.reshape(-1,nColumns)
+
+def write_inffiles(workdir,nodes,training,nda_factor,learningrate,iterations):
+    """
+    Purpose:
+     Write the inf files for SOFM, SOLO and SEQSOLO in workdir.
+    Usage:
+     qcsolo.write_inffiles(workdir,nodes,training,nda_factor,learningrate,iterations)
+    """
+    # sofm inf file
+    f = open(os.path.join(workdir,'solo/inf/sofm.inf'),'w')
+    f.write(str(nodes)+'\n')
+    f.write(str(training)+'\n')
+    f.write(str(20)+'\n')
+    f.write(str(0.01)+'\n')
+    f.write(str(1234)+'\n')
+    f.write('solo/input/sofm_input.csv'+'\n')
+    f.write('solo/output/sofm_1.out'+'\n')
+    f.write('solo/output/sofm_2.out'+'\n')
+    f.write('solo/output/sofm_3.out'+'\n')
+    f.write('solo/output/sofm_4.out'+'\n')
+    f.write(str(50)+'\n')
+    f.write('### Comment lines ###\n')
+    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
+    f.write('Line 2: No. of training iterations - default is 500 (changeable via GUI if used)\n')
+    f.write('Line 3: No. of iterations per screen output - default is 20\n')
+    f.write('Line 4: Spacing between initial weights - default is 0.01\n')
+    f.write('Line 5: Seed for random number generator - default is 1234\n')
+    f.write('Line 6: input data filename with path relative to current directory\n')
+    f.write('Line 7: first output filename with path relative to current directory\n')
+    f.write('Line 8: second output filename with path relative to current directory\n')
+    f.write('Line 9: third output filename with path relative to current directory\n')
+    f.write('Line 10: fourth output filename with path relative to current directory (used by SOLO)\n')
+    f.write('Line 11: No. iterations per write of weights to screen - default is 50\n')
+    f.close()
+    # solo inf file
+    f = open(os.path.join(workdir,'solo/inf/solo.inf'),'w')
+    f.write(str(nodes)+'\n')
+    f.write(str(nda_factor)+'\n')
+    f.write('solo/output/sofm_4.out'+'\n')
+    f.write('solo/input/solo_input.csv'+'\n')
+    f.write('training'+'\n')
+    f.write(str(5678)+'\n')
+    f.write(str(0)+'\n')
+    f.write('solo/output/eigenValue.out'+'\n')
+    f.write('solo/output/eigenVector.out'+'\n')
+    f.write('solo/output/accumErr.out'+'\n')
+    f.write('solo/output/accumRR.out'+'\n')
+    f.write('solo/output/trainProcess.out'+'\n')
+    f.write('solo/output/freqTable.out'+'\n')
+    f.write('solo/output/hidOutputWt.out'+'\n')
+    f.write('solo/output/errorMap.out'+'\n')
+    f.write('solo/output/finResult.out'+'\n')
+    f.write('solo/output/trainWin.out'+'\n')
+    f.write('solo/output/trainWout.out'+'\n')
+    f.write('### Comment lines ###\n')
+    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
+    f.write('Line 2: multiplier for minimum number of points per node (NdaFactor) - default is 5 (ie 5*(no. of drivers+1) (changeable via GUI if used)\n')
+    f.write('Line 3: fourth output file from SOFM, used as input to SOLO\n')
+    f.write('Line 4: input data filename with path relative to current directory\n')
+    f.write('Line 5: type of run ("training" or "simulation", always "training" for SOLO)\n')
+    f.write('Line 6: seed for random number generator - default is 5678\n')
+    f.write('Line 7: "calThreshold", not used by SOLO\n')
+    f.write('Lines 8 to 18: output files from SOLO with path relative to current directory\n')
+    f.close()
+    # seqsolo inf file
+    f = open(os.path.join(workdir,'solo/inf/seqsolo.inf'),'w')
+    f.write(str(nodes)+'\n')
+    f.write(str(0)+'\n')
+    f.write(str(learningrate)+'\n')
+    f.write(str(iterations)+'\n')
+    f.write('solo/output/sofm_4.out'+'\n')
+    f.write('solo/input/seqsolo_input.csv'+'\n')
+    f.write('simulation'+'\n')
+    f.write(str(9100)+'\n')
+    f.write(str(0)+'\n')
+    f.write('solo/output/eigenValue.out'+'\n')
+    f.write('solo/output/eigenVector.out'+'\n')
+    f.write('solo/output/trainWout.out'+'\n')
+    f.write('solo/output/freqTable.out'+'\n')
+    f.write('solo/output/errorMap.out'+'\n')
+    f.write('solo/output/finResult.out'+'\n')
+    f.write('solo/output/trainingRMSE.out'+'\n')
+    f.write('solo/output/seqOut0.out'+'\n')
+    f.write('solo/output/seqOut1.out'+'\n')
+    f.write('solo/output/seqOut2.out'+'\n')
+    f.write('solo/output/seqHidOutW.out'+'\n')
+    f.write('solo/output/seqFreqMap.out'+'\n')
+    f.write(str(c.missing_value)+'\n')
+    f.write('### Comment lines ###\n')
+    f.write('Line 1: No. of nodes - default is the number of drivers plus 1 (changeable via GUI if used)\n')
+    f.write('Line 2: NdaFactor - not used by SEQSOLO, default value is 0\n')
+    f.write('Line 3: learning rate - default value 0.01 (must be between 0.0 1nd 1.0, changeable via GUI if used)\n')
+    f.write('Line 4: number of iterations for sequential training, default value is 500 (changeable via GUI if used)\n')
+    f.write('Line 5: fourth output file from SOFM, used as input file by SEQSOLO\n')
+    f.write('Line 6: input data filename with path relative to current directory\n')
+    f.write('Line 7: type of run ("training" or "simulation", always "simulation" for SEQSOLO)\n')
+    f.write('Line 8: seed for random number generator - default is 9100\n')
+    f.write('Line 9: "calThreshold" - minimum number of data points for SOLO node to be used in simulation, default value is 0 (use all nodes)\n')
+    f.write('Lines 10 to 21: output files from SEQSOLO with path relative to current directory\n')
+    f.write('Line 22: missing data value, default value is c.missing_value.0\n')
+    f.close()
+
+def run_external(drivers,target,nodes,training,nda_factor,learningrate,iterations):
+    """
+    Purpose:
+     Run the SOFM, SOLO and SEQSOLO executables on the drivers and target for
+     one period.  The inf, input and output files are written to a temporary
+     working directory that is removed when the run finishes so that several
+     runs can execute at the same time.
+    Usage:
+     modelled,index = qcsolo.run_external(drivers,target,nodes,training,nda_factor,learningrate,iterations)
+     where the arguments and the returned values are the same as for qcsolo.run
+    """
+    good_drivers = get_goodindex(drivers)
+    good_target = good_drivers & get_goodindex(target)
+    index = numpy.where(good_drivers)[0]
+    workdir = make_workdir()
+    try:
+        write_inffiles(workdir,nodes,training,nda_factor,learningrate,iterations)
+        # SOFM uses the drivers
+        write_inputfile(os.path.join(workdir,'solo/input/sofm_input.csv'),drivers[good_drivers])
+        call_executable("sofm",workdir)
+        if not os.path.exists(os.path.join(workdir,'solo/output/sofm_4.out')):
+            log.error(' qcsolo.run_external: SOFM did not run correctly, check the log files')
+            return None,None
+        # SOLO uses the drivers and the target
+        write_inputfile(os.path.join(workdir,'solo/input/solo_input.csv'),
+                        numpy.column_stack((drivers[good_target],target[good_target])))
+        call_executable("solo",workdir)
+        if not os.path.exists(os.path.join(workdir,'solo/output/eigenValue.out')):
+            log.error(' qcsolo.run_external: SOLO did not run correctly, check the log files')
+            return None,None
+        # SEQSOLO models the target for all records with good drivers
+        write_inputfile(os.path.join(workdir,'solo/input/seqsolo_input.csv'),
+                        numpy.column_stack((drivers[index],target[index])))
+        call_executable("seqsolo",workdir)
+        if not os.path.exists(os.path.join(workdir,'solo/output/seqOut2.out')):
+            log.error(' qcsolo.run_external: SEQSOLO did not run correctly, check the log files')
+            return None,None
+        seqdata = read_outputfile(os.path.join(workdir,'solo/output/seqOut2.out'))
+        return seqdata[:,1],index
+    finally:
+        remove_workdir(workdir)
+
+def get_codefiles(backend):
+    """ Return the files whose contents the SOLO models depend on, the executables or this module."""
+    if backend=="external":
+        return [get_executable(name) for name in ["sofm","solo","seqsolo"]]
+    return [os.path.splitext(os.path.abspath(__file__))[0]+".py"]
+
+def get_jobkey(job):
+    """ Return the model cache key for a job, see qccache.get_modelkey and qccache.get_codekey."""
+    settings = {}
+    for item in ["backend","nodes","training","nda_factor","learningrate","iterations","window"]:
+        if item in job: settings[item] = str(job[item])
+    arrays = [job["drivers"],job["target"]]
+    if job.get("warm") is not None and job["backend"]!="external":
+        # a warm started model depends on the model it started from
+        settings["warm_fraction"] = str(job.get("warm_fraction",0.2))
+        arrays = arrays+[job["warm"][item] for item in ["xmin","xrange","weights"]]
+    key = qccache.get_modelkey("solo",arrays,settings)
+    return qccache.get_codekey(key,get_codefiles(job["backend"]))
+
+def get_cachedjob(key):
+    """
+    Return the modelled target, the index and the trained model (None for the
+    external backend) for a job from the model cache, None if not cached.
+    """
+    cached = qccache.get_model(key)
+    if cached is None: return None
+    model = None
+    if "weights" in cached:
+        model = {"nodes":int(numpy.sqrt(len(cached["weights"]))+0.5)}
+        for item in ["xmin","xrange","weights","coefficients"]:
+            model[item] = cached[item]
+    return cached["modelled"],cached["index"],model
+
+def put_cachedjob(key,result):
+    """ Store the results of a job, the SOFM codebook and SOLO weights are stored if available."""
+    modelled,index,model = result
+    if modelled is None: return
+    data = {"modelled":modelled,"index":index}
+    if model is not None:
+        for item in ["xmin","xrange","weights","coefficients"]:
+            data[item] = model[item]
+    qccache.put_model(key,"solo",data)
+
+def train_job(job):
+    """
+    Purpose:
+     Run SOLO for one job, a job is a dictionary with the drivers, the target,
+     the SOLO settings and the backend ("python" or "external").  Returns the
+     modelled target, the index of the modelled records and the trained model
+     (None for the external backend).
+    Usage:
+     modelled,index,model = qcsolo.train_job(job)
+    """
+    args = (job["drivers"],job["target"],job["nodes"],job["training"],
+            job["nda_factor"],job["learningrate"],job["iterations"])
+    if job["backend"]=="external":
+        modelled,index = run_external(*args)
+        return modelled,index,None
+    return train(*args,warm=job.get("warm"),warm_fraction=job.get("warm_fraction",0.2))
+
+def run_job(job):
+    """
+    Purpose:
+     Run SOLO for one job (see qcsolo.train_job).  The results are read from
+     the model cache if the same job has been run before.
+    Usage:
+     modelled,index = qcsolo.run_job(job)
+    """
+    modelled,index,model = run_jobmodel(job)
+    return modelled,index
+
+def run_jobmodel(job):
+    """ Same as qcsolo.run_job but also returns the trained model, used to warm start the next job."""
+    key = get_jobkey(job)
+    cached = get_cachedjob(key)
+    if cached is not None: return cached
+    result = train_job(job)
+    put_cachedjob(key,result)
+    return result
+
+def run_jobs(jobs,workers=1):
+    """
+    Purpose:
+     Run a list of independent SOLO jobs, for example different periods or
+     different series, using a pool of worker processes.  The results are
+     returned in the same order as the jobs.  Jobs that are in the model
+     cache are not run again, the rest are run one after the other in this
+     process if workers is 1 or there is only one of them.
+     The jobs are also run one after the other when this is called from a
+     daemonic worker process, for example when batchprocess.py runs the
+     sites on a pool of workers, because daemonic processes can not start
+     their own pool.
+    Usage:
+     results = qcsolo.run_jobs(jobs,workers=4)
+     where jobs is a list of job dictionaries (see qcsolo.train_job)
+           workers is the number of worker processes
+           results is a list of (modelled,index) tuples
+    """
+    keys = [get_jobkey(job) for job in jobs]
+    results = [get_cachedjob(key) for key in keys]
+    results = [result if result is None else result[0:2] for result in results]
+    todo = [i for i in range(len(jobs)) if results[i] is None]
+    if len(todo)<len(jobs):
+        log.info(" "+str(len(jobs)-len(todo))+" of "+str(len(jobs))+" SOLO jobs read from the model cache")
+    workers = min(int(workers),len(todo))
+    if workers>1 and multiprocessing.current_process().daemon:
+        log.info(" Running "+str(len(todo))+" SOLO jobs in this worker process, SOLOWorkers ignored")
+        workers = 1
+    if workers<=1:
+        trained = [train_job(jobs[i]) for i in todo]
+    else:
+        log.info(" Running "+str(len(todo))+" SOLO jobs using "+str(workers)+" workers")
+        pool = multiprocessing.Pool(processes=workers)
+        try:
+            trained = pool.map(train_job,[jobs[i] for i in todo],chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    for i,result in zip(todo,trained):
+        put_cachedjob(keys[i],result)
+        results[i] = (result[0],result[1])
+    return results
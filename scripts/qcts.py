@@ -12,9 +12,11 @@ from matplotlib.dates import date2num
 import meteorologicalfunctions as mf
 import numpy
 import os
+import qccache
 import qcck
 import qcfunc
 import qcio
+import qcprof
 import qcutils
 from scipy import interpolate, signal
 import time
@@ -22,7 +24,6 @@ import xlrd
 from matplotlib.mlab import griddata
 import xlwt
 import logging
-import pysolar
 
 log = logging.getLogger('qc.ts')
 
@@ -191,6 +192,7 @@ def ApplyLinearDriftLocal(cf,ds,ThisOne):
             ds.series[ThisOne]['Data'] = numpy.ma.filled(data,float(c.missing_value))
             ds.series[ThisOne]['Flag'] = flag
 
+@qcprof.profile
 def AverageSeriesByElements(cf,ds,Av_out):
     """
         Calculates the average of multiple time series.  Multiple time series
@@ -244,6 +246,7 @@ def AverageSeriesByElements(cf,ds,Av_out):
     tmp_attr["long_name"] = tmp_attr["long_name"]+", element-wise average of series " + SeriesNameString
     qcutils.CreateSeries(ds,Av_out,Av_data,Flag=Mn_flag,Attr=tmp_attr)
 
+@qcprof.profile
 def CalculateAvailableEnergy(ds,Fa_out='Fa',Fn_in='Fn',Fg_in='Fg'):
     """
         Calculate the average energy as Fn - G.
@@ -275,6 +278,7 @@ def CalculateAvailableEnergy(ds,Fa_out='Fa',Fn_in='Fn',Fg_in='Fg'):
             flag[idx] = numpy.int32(20)
         qcutils.CreateSeries(ds,Fa_out,Fa_exist,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def CalculateFluxes(cf,ds):
     """
         Calculate the fluxes from the rotated covariances.
@@ -371,6 +375,7 @@ def CalculateLongwave(ds,Fl_out,Fl_in,Tbody_in):
     attr = qcutils.MakeAttributeDictionary(long_name='Calculated longwave radiation using '+Fl_in+','+Tbody_in,units='W/m2')
     qcutils.CreateSeries(ds,Fl_out,Fl,FList=[Fl_in,Tbody_in],Attr=attr)
 
+@qcprof.profile
 def CalculateHumidities(ds):
     """
     Purpose:
@@ -406,6 +411,7 @@ def CalculateHumidities(ds):
         elif "q" in ds.series.keys():
             RelativeHumidityFromq(ds)
 
+@qcprof.profile
 def CalculateHumiditiesAfterGapFill(ds):
     """
     Purpose:
@@ -616,6 +622,7 @@ def SpecificHumidityFromRH(ds):
         attr = qcutils.MakeAttributeDictionary(long_name='Specific humidity',units='kg/kg',standard_name='specific_humidity')
         qcutils.CreateSeries(ds,"q",q_new,Flag=q_new_flag,Attr=attr)
 
+@qcprof.profile
 def CalculateMeteorologicalVariables(ds,Ta_name='Ta',Tv_name='Tv_CSAT',ps_name='ps',
                                      q_name="q",Ah_name='Ah',RH_name='RH'):
     """
@@ -697,6 +704,7 @@ def CalculateMeteorologicalVariables(ds,Ta_name='Ta',Tv_name='Tv_CSAT',ps_name='
     if 'CalculateMetVars' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', CalculateMetVars'
 
+@qcprof.profile
 def CalculateNetRadiation(cf,ds,Fn_out='Fn',Fsd_in='Fsd',Fsu_in='Fsu',Fld_in='Fld',Flu_in='Flu'):
     """
     Purpose:
@@ -743,6 +751,7 @@ def CalculateNetRadiation(cf,ds,Fn_out='Fn',Fsd_in='Fsd',Fsu_in='Fsu',Fld_in='Fl
                              standard_name='surface_net_downwawrd_radiative_flux',units='W/m2')
         qcutils.CreateSeries(ds,Fn_out,Fn,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def CheckCovarianceUnits(ds):
     """
     Purpose:
@@ -773,6 +782,7 @@ def CheckCovarianceUnits(ds):
             if "H" in item: item = item.replace("H","A")
             qcutils.CreateSeries(ds,item,data,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def CoordRotation2D(cf,ds):
     """
         2D coordinate rotation to force v = w = 0.  Based on Lee et al, Chapter
@@ -782,26 +792,26 @@ def CoordRotation2D(cf,ds):
         Usage qcts.CoordRotation2D(ds)
         ds: data structure
         """
-    # get the raw wind velocity components
-    Ux,f,a = qcutils.GetSeriesasMA(ds,'Ux')          # longitudinal component in CSAT coordinate system
-    Uy,f,a = qcutils.GetSeriesasMA(ds,'Uy')          # lateral component in CSAT coordinate system
-    Uz,f,a = qcutils.GetSeriesasMA(ds,'Uz')          # vertical component in CSAT coordinate system
+    # get the raw wind velocity components, read-only views of the data in ds
+    Ux,f,a = qcutils.GetSeriesasMA(ds,'Ux',copy=False)          # longitudinal component in CSAT coordinate system
+    Uy,f,a = qcutils.GetSeriesasMA(ds,'Uy',copy=False)          # lateral component in CSAT coordinate system
+    Uz,f,a = qcutils.GetSeriesasMA(ds,'Uz',copy=False)          # vertical component in CSAT coordinate system
     # get the raw covariances
-    UxUz,f,UxUz_a = qcutils.GetSeriesasMA(ds,'UxUz') # covariance(Ux,Uz)
-    UyUz,f,UyUz_a = qcutils.GetSeriesasMA(ds,'UyUz') # covariance(Uy,Uz)
-    UxUy,f,a = qcutils.GetSeriesasMA(ds,'UxUy')      # covariance(Ux,Uy)
-    UyUy,f,a = qcutils.GetSeriesasMA(ds,'UyUy')      # variance(Uy)
-    UxUx,f,a = qcutils.GetSeriesasMA(ds,'UxUx')      # variance(Ux)
-    UzUz,f,a = qcutils.GetSeriesasMA(ds,'UzUz')      # variance(Ux)
-    UzC,f,UzC_a = qcutils.GetSeriesasMA(ds,'UzC')    # covariance(Uz,C)
-    UzA,f,UzA_a = qcutils.GetSeriesasMA(ds,'UzA')    # covariance(Uz,A)
-    UzT,f,UzT_a = qcutils.GetSeriesasMA(ds,'UzT')    # covariance(Uz,T)
-    UxC,f,a = qcutils.GetSeriesasMA(ds,'UxC')        # covariance(Ux,C)
-    UyC,f,a = qcutils.GetSeriesasMA(ds,'UyC')        # covariance(Uy,C)
-    UxA,f,a = qcutils.GetSeriesasMA(ds,'UxA')        # covariance(Ux,A)
-    UyA,f,a = qcutils.GetSeriesasMA(ds,'UyA')        # covariance(Ux,A)
-    UxT,f,a = qcutils.GetSeriesasMA(ds,'UxT')        # covariance(Ux,T)
-    UyT,f,a = qcutils.GetSeriesasMA(ds,'UyT')        # covariance(Uy,T)
+    UxUz,f,UxUz_a = qcutils.GetSeriesasMA(ds,'UxUz',copy=False) # covariance(Ux,Uz)
+    UyUz,f,UyUz_a = qcutils.GetSeriesasMA(ds,'UyUz',copy=False) # covariance(Uy,Uz)
+    UxUy,f,a = qcutils.GetSeriesasMA(ds,'UxUy',copy=False)      # covariance(Ux,Uy)
+    UyUy,f,a = qcutils.GetSeriesasMA(ds,'UyUy',copy=False)      # variance(Uy)
+    UxUx,f,a = qcutils.GetSeriesasMA(ds,'UxUx',copy=False)      # variance(Ux)
+    UzUz,f,a = qcutils.GetSeriesasMA(ds,'UzUz',copy=False)      # variance(Ux)
+    UzC,f,UzC_a = qcutils.GetSeriesasMA(ds,'UzC',copy=False)    # covariance(Uz,C)
+    UzA,f,UzA_a = qcutils.GetSeriesasMA(ds,'UzA',copy=False)    # covariance(Uz,A)
+    UzT,f,UzT_a = qcutils.GetSeriesasMA(ds,'UzT',copy=False)    # covariance(Uz,T)
+    UxC,f,a = qcutils.GetSeriesasMA(ds,'UxC',copy=False)        # covariance(Ux,C)
+    UyC,f,a = qcutils.GetSeriesasMA(ds,'UyC',copy=False)        # covariance(Uy,C)
+    UxA,f,a = qcutils.GetSeriesasMA(ds,'UxA',copy=False)        # covariance(Ux,A)
+    UyA,f,a = qcutils.GetSeriesasMA(ds,'UyA',copy=False)        # covariance(Ux,A)
+    UxT,f,a = qcutils.GetSeriesasMA(ds,'UxT',copy=False)        # covariance(Ux,T)
+    UyT,f,a = qcutils.GetSeriesasMA(ds,'UyT',copy=False)        # covariance(Uy,T)
     nRecs = int(ds.globalattributes['nc_nrecs'])     # number of records
     # get the instrument heights
     fm_height = "not defined"
@@ -932,6 +942,7 @@ def CoordRotation2D(cf,ds):
         if 'RelaxRotation' not in ds.globalattributes['Functions']:
             ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', RelaxRotation'
 
+@qcprof.profile
 def CalculateComponentsFromWsWd(ds):
     """
     Purpose:
@@ -950,6 +961,7 @@ def CalculateComponentsFromWsWd(ds):
     qcutils.CreateSeries(ds,"U",u,Flag=Wd_flag,Attr=u_attr)
     qcutils.CreateSeries(ds,"V",v,Flag=Wd_flag,Attr=v_attr)
 
+@qcprof.profile
 def CalculateFcStorage(cf,ds,Fc_out='Fc_storage',CO2_in='Cc'):
     """
     Calculate CO2 flux storage term in the air column beneath the CO2 instrument.  This
@@ -996,6 +1008,7 @@ def CalculateFcStorage(cf,ds,Fc_out='Fc_storage',CO2_in='Cc'):
     else:
         log.info('CalculateFcStorage: Fc_storage found in data structure, not calculated')
 
+@qcprof.profile
 def CorrectFcForStorage(cf,ds,Fc_out='Fc',Fc_in='Fc',Fc_storage_in='Fc_storage'):
     """
     Correct CO2 flux for storage in the air column beneath the CO2 instrument.
@@ -1032,6 +1045,7 @@ def CorrectFcForStorage(cf,ds,Fc_out='Fc',Fc_in='Fc',Fc_storage_in='Fc_storage')
     if "CorrectFcForStorage" not in ds.globalattributes["Functions"]:
         ds.globalattributes["Functions"] = ds.globalattributes["Functions"]+", CorrectFcForStorage"
 
+@qcprof.profile
 def CorrectIndividualFgForStorage(cf,ds):
     if qcutils.cfkeycheck(cf,Base='FunctionArgs',ThisOne='CFgArgs'):
         List = cf['FunctionArgs']['CFgArgs'].keys()
@@ -1040,6 +1054,7 @@ def CorrectIndividualFgForStorage(cf,ds):
             CorrectFgForStorage(cf,ds,Fg_out=CFgArgs[0],Fg_in=CFgArgs[1],Ts_in=CFgArgs[2],Sws_in=CFgArgs[3])
         return
 
+@qcprof.profile
 def CorrectFgForStorage(cf,ds,Fg_out='Fg',Fg_in='Fg',Ts_in='Ts',Sws_in='Sws'):
     """
         Correct ground heat flux for storage in the layer above the heat flux plate
@@ -1140,6 +1155,7 @@ def CorrectFgForStorage(cf,ds,Fg_out='Fg',Fg_in='Fg',Ts_in='Ts',Sws_in='Sws'):
         if 'RelaxFgStorage' not in ds.globalattributes['Functions']:
             ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', RelaxFgStorage'
 
+@qcprof.profile
 def CorrectSWC(cf,ds):
     """
         Correct soil moisture data using calibration curve developed from
@@ -1506,6 +1522,7 @@ def do_solo(cf,ds4,Fc_in='Fc',Fe_in='Fe',Fh_in='Fh',Fc_out='Fc',Fe_out='Fe',Fh_o
         attr = qcutils.MakeAttributeDictionary(long_name='ANN gapfilled Sensible Heat Flux',units='W/m2',standard_name='surface_upward_sensible_heat_flux')
         qcutils.CreateSeries(ds4,Fh_out,Fh,Flag=flag,Attr=attr)
 
+@qcprof.profile
 def Fc_WPL(cf,ds,Fc_wpl_out='Fc',Fc_raw_in='Fc',Fh_in='Fh',Fe_in='Fe',Ta_in='Ta',Ah_in='Ah',Cc_in='Cc',ps_in='ps'):
     """
         Apply Webb, Pearman and Leuning correction to carbon flux.  This
@@ -1577,6 +1594,7 @@ def Fc_WPL(cf,ds,Fc_wpl_out='Fc',Fc_raw_in='Fc',Fh_in='Fh',Fe_in='Fe',Ta_in='Ta'
     if "height" in Fc_raw_attr: attr["height"] = Fc_raw_attr["height"]
     qcutils.CreateSeries(ds,'co2_wpl_Fh',co2_wpl_Fh,Flag=Fc_wpl_flag,Attr=attr)
 
+@qcprof.profile
 def Fe_WPL(cf,ds,Fe_wpl_out='Fe',Fe_raw_in='Fe',Fh_in='Fh',Ta_in='Ta',Ah_in='Ah',ps_in='ps'):
     """
         Apply Webb, Pearman and Leuning correction to vapour flux.  This
@@ -1647,6 +1665,7 @@ def Fe_WPL(cf,ds,Fe_wpl_out='Fe',Fe_raw_in='Fe',Fh_in='Fh',Ta_in='Ta',Ah_in='Ah'
         if 'RelaxFeWPL' not in ds.globalattributes['Functions']:
             ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', RelaxFeWPL'
 
+@qcprof.profile
 def FhvtoFh(cf,ds,Fh_out='Fh',Fhv_in='Fhv',Tv_in='Tv_CSAT',q_in='q',wA_in='wA',wT_in='wT'):
     '''
     Convert the virtual heat flux to the sensible heat flux.
@@ -1946,12 +1965,12 @@ def get_synthetic_fsd(ds):
     # get the latitude and longitude
     lat = float(ds.globalattributes["latitude"])
     lon = float(ds.globalattributes["longitude"])
+    ts = int(ds.globalattributes["time_step"])
     # get the UTC time from the local time
     ldt_UTC = qcutils.get_UTCfromlocaltime(ds)
-    # get the solar altitude
-    alt_solar = [pysolar.GetAltitude(lat,lon,dt) for dt in ldt_UTC]
-    # get the synthetic downwelling shortwave radiation
-    Fsd_syn = [pysolar.GetRadiationDirect(dt,alt) for dt,alt in zip(ldt_UTC,alt_solar)]
+    # get the solar altitude and the synthetic downwelling shortwave radiation,
+    # these only depend on the site and the time so they are cached on disk
+    alt_solar,Fsd_syn = qccache.get_solar(lat,lon,ts,ldt_UTC)
     Fsd_syn = numpy.ma.array(Fsd_syn)
     # get the QC flag
     nRecs = len(Fsd_syn)
@@ -2038,6 +2057,7 @@ def InterpolateOverMissing(ds,series='',maxlen=0):
     if 'InterpolateOverMissing2' not in ds.globalattributes['Functions']:
         ds.globalattributes['Functions'] = ds.globalattributes['Functions']+', InterpolateOverMissing2'
 
+@qcprof.profile
 def MassmanStandard(cf,ds,Ta_in='Ta',Ah_in='Ah',ps_in='ps',ustar_in='ustar',ustar_out='ustar',L_in='L',L_out ='L',uw_out='uw',vw_out='vw',wT_out='wT',wA_out='wA',wC_out='wC'):
     """
        Massman corrections.
@@ -2075,20 +2095,20 @@ def MassmanStandard(cf,ds,Ta_in='Ta',Ah_in='Ah',ps_in='ps',ustar_in='ustar',usta
     #  The code for the first and second passes is very similar.  It would be useful to make them the
     #  same and put into a loop to reduce the nu,ber of lines in this function.
     # calculate ustar and Monin-Obukhov length from rotated but otherwise uncorrected covariances
-    Ta,f,a = qcutils.GetSeriesasMA(ds,Ta_in)
-    Ah,f,a = qcutils.GetSeriesasMA(ds,Ah_in)
-    ps,f,a = qcutils.GetSeriesasMA(ds,ps_in)
+    Ta,f,a = qcutils.GetSeriesasMA(ds,Ta_in,copy=False)
+    Ah,f,a = qcutils.GetSeriesasMA(ds,Ah_in,copy=False)
+    ps,f,a = qcutils.GetSeriesasMA(ds,ps_in,copy=False)
     nRecs = numpy.size(Ta)
-    u,f,a = qcutils.GetSeriesasMA(ds,'u')
-    uw,f,a = qcutils.GetSeriesasMA(ds,'uw')
-    vw,f,a = qcutils.GetSeriesasMA(ds,'vw')
-    wT,f,a = qcutils.GetSeriesasMA(ds,'wT')
-    wC,f,a = qcutils.GetSeriesasMA(ds,'wC')
-    wA,f,a = qcutils.GetSeriesasMA(ds,'wA')
+    u,f,a = qcutils.GetSeriesasMA(ds,'u',copy=False)
+    uw,f,a = qcutils.GetSeriesasMA(ds,'uw',copy=False)
+    vw,f,a = qcutils.GetSeriesasMA(ds,'vw',copy=False)
+    wT,f,a = qcutils.GetSeriesasMA(ds,'wT',copy=False)
+    wC,f,a = qcutils.GetSeriesasMA(ds,'wC',copy=False)
+    wA,f,a = qcutils.GetSeriesasMA(ds,'wA',copy=False)
     if ustar_in not in ds.series.keys():
         ustarm = numpy.ma.sqrt(numpy.ma.sqrt(uw ** 2 + vw ** 2))
     else:
-        ustarm,f,a = qcutils.GetSeriesasMA(ds,ustar_in)
+        ustarm,f,a = qcutils.GetSeriesasMA(ds,ustar_in,copy=False)
     if L_in not in ds.series.keys():
         Lm = mf.molen(Ta, Ah, ps, ustarm, wT, fluxtype='kinematic')
     else:
@@ -2173,6 +2193,7 @@ def MassmanStandard(cf,ds,Ta_in='Ta',Ah_in='Ah',ps_in='ps',ustar_in='ustar',usta
             index = numpy.where(mask.astype(int)==1)
             ds.series[ThisOne]['Flag'][index] = numpy.int32(12)
 
+@qcprof.profile
 def MergeSeriesUsingDict(ds,merge_order=""):
     """ Merge series as defined in the ds.merge dictionary."""
     # check that ds has a "merge" attribute
@@ -2212,6 +2233,7 @@ def MergeSeriesUsingDict(ds,merge_order=""):
         qcutils.CreateSeries(ds,target,data,Flag=flag1,Attr=attr)
     del ds.merge[merge_order]
 
+@qcprof.profile
 def MergeHumidities(cf,ds,convert_units=False):
     if "Ah" not in cf["Variables"] and "RH" not in cf["Variables"] and "q" not in cf["Variables"]:
         log.error(" MergeHumidities: No humidities found in control file, returning ...")
@@ -2226,6 +2248,7 @@ def MergeHumidities(cf,ds,convert_units=False):
         MergeSeries(cf,ds,'q',[0,10],convert_units=convert_units)
         qcutils.CheckUnits(ds,"q","kg/kg",convert_units=False)
 
+@qcprof.profile
 def MergeSeries(cf,ds,series,okflags,convert_units=False):
     """
         Merge two series of data to produce one series containing the best data from both.
@@ -2462,6 +2485,7 @@ def SquareRoot(Series):
     tmp[index] = Series[index] ** .5
     return tmp
 
+@qcprof.profile
 def TaFromTv(cf,ds,Ta_out='Ta_CSAT',Tv_in='Tv_CSAT',Ah_in='Ah',RH_in='RH',q_in='q',ps_in='ps'):
     # Calculate the air temperature from the virtual temperature, the
     # absolute humidity and the pressure.
@@ -11,7 +11,9 @@ import meteorologicalfunctions as mf
 import netCDF4
 import numpy
 import os
+import pandas
 import platform
+import qcprof
 import pytz
 import sys
 import time
@@ -21,6 +23,12 @@ import xlwt
 
 log = logging.getLogger('qc.utils')
 
+# day 0 of the Excel 1900 (datemode=0) and 1904 (datemode=1) date systems,
+# the 1900 system is only valid from 1 March 1900
+xl_base_date = {0:numpy.datetime64("1899-12-30","D"),1:numpy.datetime64("1904-01-01","D")}
+# standard time (no daylight saving) UTC offsets of time zones, see get_standardoffset
+standard_offset_lookup = {}
+
 def bp(fx,tao):
     """
     Function to calculate the b and p coeficients of the Massman frequency correction.
@@ -81,18 +89,29 @@ def CheckQCFlags(ds):
     Author: PRI
     Date: August 2014
     """
-    # force any values of -9999 with QC flags of 0 to have a QC flag of 8
     for ThisOne in ds.series.keys():
-        data = numpy.ma.masked_values(ds.series[ThisOne]["Data"],-9999)
-        flag = numpy.ma.masked_equal(numpy.mod(ds.series[ThisOne]["Flag"],10),0)
-        mask = data.mask&flag.mask
-        index = numpy.ma.where(mask==True)[0]
-        ds.series[ThisOne]["Flag"][index] = numpy.int32(8)
+        CheckSeriesQCFlags(ds.series[ThisOne]["Data"],ds.series[ThisOne]["Flag"])
+
+def CheckSeriesQCFlags(data,flag):
+    """
+    Purpose:
+     Make sure that all values of -9999 in a single data series have a non-zero
+     QC flag value.  The QC flag is modified in place.
+    Usage:
+     qcutils.CheckSeriesQCFlags(data,flag)
+     where data is the data series (numpy array)
+           flag is the QC flag series (numpy array)
+    """
+    # force any values of -9999 with QC flags of 0 to have a QC flag of 8
+    mdata = numpy.ma.masked_values(data,-9999)
+    mflag = numpy.ma.masked_equal(numpy.mod(flag,10),0)
+    mask = mdata.mask&mflag.mask
+    index = numpy.ma.where(mask==True)[0]
+    flag[index] = numpy.int32(8)
     # force all values != -9999 to have QC flag = 0, 10, 20 etc
-    for ThisOne in ds.series.keys():
-        index = numpy.where((abs(ds.series[ThisOne]['Data']-numpy.float64(c.missing_value))>c.eps)&
-                            (numpy.mod(ds.series[ThisOne]["Flag"],10)!=0))
-        ds.series[ThisOne]["Flag"][index] = numpy.int32(0)
+    index = numpy.where((abs(data-numpy.float64(c.missing_value))>c.eps)&
+                        (numpy.mod(flag,10)!=0))
+    flag[index] = numpy.int32(0)
 
 def CheckTimeStep(ds):
     """
@@ -124,6 +143,7 @@ def CheckTimeStep(ds):
         log.warning(" CheckTimeStep: "+str(len(index))+" problems found with the time stamp")
     return has_gaps
 
+@qcprof.profile
 def CheckUnits(ds,label,units,convert_units=False):
     """
     Purpose:
@@ -177,6 +197,7 @@ def contiguous_regions(condition):
     idx.shape = (-1,2)
     return idx
 
+@qcprof.profile
 def ConvertCO2Units(cf,ds,Cc='Cc'):
     Cc_units_out = "mg/m3"            # default value
     Cc_units_in = ds.series[Cc]['Attr']['units']
@@ -208,6 +229,7 @@ def ConvertCO2Units(cf,ds,Cc='Cc'):
     else:
         log.info(" CO2 concentration already in requested units")
 
+@qcprof.profile
 def ConvertFcUnits(cf,ds,Fc='Fc',Fc_storage='Fc_storage'):
     if 'Options' not in cf: return
     if 'FcUnits' not in cf['Options']: return
@@ -460,6 +482,54 @@ def convert_anglestring(anglestring):
         # return with the string converted to a float
         return (float(new[0])+float(new[1])/60.0+float(new[2])/3600.0) * direction[new_dir]    
 
+def convert_datetimetodatetime64(ldt):
+    """
+    Purpose:
+     Convert a list of Python datetimes to a numpy datetime64[us] array.
+     pandas does the conversion in compiled code, this is much faster than
+     numpy.array(ldt,dtype="datetime64[us]") for long lists.  Time zone
+     aware datetimes are converted to UTC.
+    Usage:
+     dt64 = qcutils.convert_datetimetodatetime64(ldt)
+    """
+    if isinstance(ldt,numpy.ndarray) and ldt.dtype.kind=="M":
+        return ldt.astype("datetime64[us]")
+    return pandas.to_datetime(list(ldt)).values.astype("datetime64[us]")
+
+def convert_stringtodatetime(strings,fmt=None):
+    """
+    Purpose:
+     Convert an array of datetime strings to a list of Python datetimes in
+     one go using pandas.  If the format is not given, a sample of the
+     strings is parsed with dateutil and the first of a list of common
+     formats that gives the same datetimes for the sample is used.  If none
+     of the formats match, every string is parsed with dateutil.
+    Usage:
+     ldt = qcutils.convert_stringtodatetime(strings,fmt=None)
+     where strings is an array of datetime strings
+           fmt is an optional strptime format string
+    """
+    strings = numpy.array(strings,dtype=str)
+    if len(strings)==0: return []
+    if fmt is None:
+        isample = numpy.unique(numpy.linspace(0,len(strings)-1,num=min(len(strings),500)).astype(int))
+        sample = [dateutil.parser.parse(strings[i]) for i in isample]
+        for item in ["%Y-%m-%d %H:%M:%S","%Y-%m-%d %H:%M","%Y/%m/%d %H:%M:%S","%Y/%m/%d %H:%M",
+                     "%d/%m/%Y %H:%M:%S","%d/%m/%Y %H:%M","%m/%d/%Y %H:%M:%S","%m/%d/%Y %H:%M",
+                     "%Y-%m-%dT%H:%M:%S","%Y-%m-%d %H:%M:%S.%f"]:
+            try:
+                if [datetime.datetime.strptime(strings[i],item) for i in isample]==sample:
+                    fmt = item
+                    break
+            except ValueError:
+                continue
+    if fmt is not None:
+        try:
+            return list(pandas.to_datetime(strings,format=fmt).to_pydatetime())
+        except ValueError:
+            log.warning(" convert_stringtodatetime: format "+fmt+" failed, using dateutil")
+    return [dateutil.parser.parse(item) for item in strings]
+
 def convert_WsWdtoUV(Ws,Wd):
     """
     Purpose:
@@ -517,6 +587,10 @@ def CreateSeries(ds,Label,Data,FList=None,Flag=None,Attr=None):
     # put the data into the temporary series
     if numpy.ma.isMA(Data):
         ds.series['_tmp_']['Data'] = numpy.ma.filled(Data,float(c.missing_value))
+        # masked arrays without a mask fill to their data, which may be a
+        # read-only view of another series (see GetSeries)
+        if not ds.series['_tmp_']['Data'].flags.writeable:
+            ds.series['_tmp_']['Data'] = ds.series['_tmp_']['Data'].copy()
     else:
         ds.series['_tmp_']['Data'] = numpy.array(Data)
     # copy or make the QC flag
@@ -603,11 +677,12 @@ def RemoveDuplicateRecords(ds):
     for item in ["DateTime","DateTime_UTC"]:
         if item in ds.series.keys():
             ldt,ldt_flag,ldt_attr = GetSeries(ds,item)
-            # ldt_nodups is returned as an ndarray
-            ldt_nodups,idx_nodups = numpy.unique(numpy.array(ldt),return_index=True)
-            # now get ldt_nodups as a list
-            ldt_nodups = ldt_nodups.tolist()
-            # and put it back into the data structure
+            # sort the times as integer microseconds since the epoch and keep
+            # the first occurrence of each
+            us = convert_datetimetodatetime64(ldt).astype(numpy.int64)
+            us_nodups,idx_nodups = numpy.unique(us,return_index=True)
+            # and put the datetimes back into the data structure as a list
+            ldt_nodups = numpy.array(ldt,dtype=object)[idx_nodups].tolist()
             ds.series[item]["Data"] = ldt_nodups
             ds.series[item]["Flag"] = ldt_flag[idx_nodups]
     # get a list of the series in the data structure
@@ -640,8 +715,10 @@ def FixNonIntegralTimeSteps(ds,fixtimestepmethod=""):
      Implement [I]nterpolate
     """
     ts = int(ds.globalattributes["time_step"])
-    ldt = ds.series["DateTime"]["Data"]
-    dt_diffs = numpy.array([(ldt[i]-rounddttots(ldt[i],ts=ts)).total_seconds() for i in range(1,len(ldt))])
+    # work in integer microseconds since the epoch
+    us = convert_datetimetodatetime64(ds.series["DateTime"]["Data"]).astype(numpy.int64)
+    us_rounded = rounddttots_array(us,ts=ts)
+    dt_diffs = (us[1:]-us_rounded[1:])/float(10**6)
     log.info(" Maximum drift is "+str(numpy.max(dt_diffs))+" seconds, minimum drift is "+str(numpy.min(dt_diffs))+" seconds")
     ans = fixtimestepmethod
     if ans=="": ans = raw_input("Do you want to [Q]uit, [I]nterploate or [R]ound? ")
@@ -653,11 +730,10 @@ def FixNonIntegralTimeSteps(ds,fixtimestepmethod=""):
         sys.exit()
     if ans.lower()[0]=="r":
         log.info(" Rounding to the nearest time step")
-        ldt_rounded = [rounddttots(dt,ts=ts) for dt in ldt]
-        rdt = numpy.array([(ldt_rounded[i]-ldt_rounded[i-1]).total_seconds() for i in range(1,len(ldt))])
+        rdt = numpy.diff(us_rounded)/float(10**6)
         log.info(" Maximum time step is now "+str(numpy.max(rdt))+" seconds, minimum time step is now "+str(numpy.min(rdt)))
         # replace the existing datetime series with the datetime series rounded to the nearest time step
-        ds.series["DateTime"]["Data"] = ldt_rounded
+        set_datetime64(ds,us_rounded.astype("datetime64[us]"))
     ds.globalattributes['nc_nrecs'] = len(ds.series["DateTime"]["Data"])
     
 def FixTimeGaps(ds):
@@ -675,19 +751,20 @@ def FixTimeGaps(ds):
      February 2015 - and again ...
     """
     ts = int(ds.globalattributes["time_step"])
-    #ldt_gaps,ldt_flag,ldt_attr = GetSeries(ds,"DateTime")
-    ldt_gaps = ds.series["DateTime"]["Data"]
-    # generate a datetime list from the start datetime to the end datetime
-    ldt_start = ldt_gaps[0]
-    ldt_end = ldt_gaps[-1]
-    ldt_nogaps = [result for result in perdelta(ldt_start,ldt_end,datetime.timedelta(minutes=ts))]
+    # the time axis with gaps as seconds since the epoch
+    t_gaps = get_datetime64(ds).astype(numpy.int64)
+    # generate a time axis from the start datetime to the end datetime
+    t_nogaps = numpy.arange(t_gaps[0],t_gaps[-1]+1,ts*60,dtype=numpy.int64)
     # update the global attribute containing the number of records
-    nRecs = len(ldt_nogaps)
+    nRecs = len(t_nogaps)
     ds.globalattributes['nc_nrecs'] = nRecs
     # find the indices of the no-gap data in the original data
-    idx_gaps = FindIndicesOfBInA(ldt_gaps,ldt_nogaps)
+    if len(numpy.unique(t_gaps))!=len(t_gaps):
+        msg = " FixTimeGaps: datetime series contains duplicate values"
+        log.warning(msg)
+    idx_gaps = numpy.where(numpy.in1d(t_nogaps,t_gaps))[0]
     # update the series of Python datetimes
-    ds.series['DateTime']['Data'] = ldt_nogaps
+    set_datetime64(ds,t_nogaps.astype("datetime64[s]"))
     org_flag = ds.series['DateTime']['Flag'].astype(numpy.int32)
     ds.series['DateTime']['Flag'] = numpy.ones(nRecs,dtype=numpy.int32)
     ds.series['DateTime']['Flag'][idx_gaps] = org_flag
@@ -803,7 +880,7 @@ def GetAttributeDictionary(ds,ThisOne):
     attr = {}
     # if series ThisOne is in the data structure
     if ThisOne in ds.series.keys():
-        attr = ds.series[ThisOne]['Attr']
+        attr = get_seriesitem(ds,ThisOne,'Attr')
     else:
         attr = MakeAttributeDictionary()
     return copy.deepcopy(attr)
@@ -854,7 +931,9 @@ def GetDateIndex(dts,date,ts=30,default=0,match='exact'):
     Usage:
      si = qcutils.GetDateIndex(datetimeseries,date_str,ts=30,default=0,match='exact')
     where
-     dts      - array of datetime objects
+     dts      - array of datetime objects or a numpy datetime64 array, the
+                latter can be got from the data structure using
+                qcutils.get_datetime64(ds)
      date_str - a date or date/time string in a format dateutils can parse
      ts       - time step for the data, optional (integer)
      default  - default value, optional (integer)
@@ -875,60 +954,190 @@ def GetDateIndex(dts,date,ts=30,default=0,match='exact'):
                                      in the previous month
                 NOTE: "startnextday" and "endpreviousday" can be used to pick
                     out time periods with an integer number of days
+     The datetimes are converted to a datetime64 time axis (pass the cached
+     axis from qcutils.get_datetime64 to avoid this) and the index is found
+     with a binary search.  The
+     record-by-record search is only used when the time axis has gaps or
+     duplicates where the match is being made.
+     Use qcutils.GetDateIndices to find the indices of many dates in one call.
     Author: PRI
     Date: Back in the day
     """
-    try:
-        if len(date)!=0:
-            i = dts.index(dateutil.parser.parse(date))
-        else:
-            if default==-1:
-                i = len(dts)-1
-            else:
-                i = default
-    except ValueError:
-        if default==-1:
-            i = len(dts)-1
-        else:
-            i = default
+    t = get_timeaxis(dts).view(numpy.int64)
+    return dateindex_fromtimeaxis(t,date,ts,default,match)
+
+def GetDateIndices(dts,dates,ts=30,default=0,match='exact'):
+    """
+    Purpose:
+     Batch version of qcutils.GetDateIndex, returns a list of the indices of
+     the dates in the list dates.
+    Usage:
+     indices = qcutils.GetDateIndices(datetimeseries,date_list,ts=30,default=0,match='exact')
+     where the arguments are the same as for qcutils.GetDateIndex except
+           date_list is a list of date/datetime strings
+    """
+    t = get_timeaxis(dts).view(numpy.int64)
+    return [dateindex_fromtimeaxis(t,date,ts,default,match) for date in dates]
+
+def dateindex_fromtimeaxis(t,date,ts,default,match):
+    """
+    Purpose:
+     Does the work for qcutils.GetDateIndex.
+     t is the time axis as int64 seconds since 1970-01-01 00:00.
+    """
+    n = len(t)
+    ts = int(float(ts))
+    if default==-1: default = n-1
+    # find the exact match
+    target = None
+    if isinstance(date,datetime.datetime):
+        target = date
+    elif len(date)!=0:
+        try:
+            target = dateutil.parser.parse(date)
+        except ValueError:
+            target = None
+    i = default
+    if target is not None and target.microsecond==0 and target.tzinfo is None:
+        target = (target-datetime.datetime(1970,1,1)).days*86400+(target-datetime.datetime(1970,1,1)).seconds
+        i = int(numpy.searchsorted(t,target))
+        if i>=n or t[i]!=target:
+            # not found by the binary search, the time axis may not be sorted
+            idx = numpy.where(t==target)[0]
+            i = int(idx[0]) if len(idx)!=0 else default
     if match=="exact":
         # if an exact match is required, do nothing
         pass
-    elif match=="startnextmonth":
+    elif match in ["startnextday","startnextmonth","startnexthour",
+                   "endpreviousday","endpreviousmonth","endprevioushour"]:
+        j = dateindex_match(t,i,ts,match)
+        if j is None:
+            # gaps or duplicates in the time axis, walk the records
+            j = dateindex_walk(t,i,ts,match)
+        i = j
+    else:
+        log.error("GetDateIndex: Unrecognised match option")
+    return i
+
+def dateindex_match(t,i,ts,match):
+    """
+    Purpose:
+     Find the index for the "start..." and "end..." options of GetDateIndex
+     using a binary search on the time axis.  Returns None if the time axis
+     is not regular around the index so the caller can walk the records.
+    """
+    n = len(t)
+    if i<0 or i>=n: return None
+    ti = int(t[i])
+    ts_s = 60*ts
+    nperday = int(float(24)/(float(ts)/60))
+    tod = (ti%86400)//60
+    def locate(target):
+        j = int(numpy.searchsorted(t,target))
+        if j<n and t[j]==target: return j
+        return None
+    def isregular(j0,j1):
+        if j0>j1: j0,j1 = j1,j0
+        return numpy.all(numpy.diff(t[j0:j1+1])==ts_s)
+    if match in ["startnextday","startnextmonth"]:
+        if tod==ts:
+            j = i
+        else:
+            target = ti-ti%86400+ts_s
+            if target<ti: target = target+86400
+            j = locate(target)
+            if j is None: return None
+        if match=="startnextmonth":
+            tj = numpy.datetime64(int(t[j]),"s")
+            if (tj.astype("datetime64[D]")-tj.astype("datetime64[M]")).astype(int)!=0:
+                month = tj.astype("datetime64[M]")+numpy.timedelta64(1,"M")
+                target = month.astype("datetime64[s]").astype(numpy.int64)+int(t[j])%86400
+                k = locate(target)
+                if k is None or (k-j)%nperday!=0 or not isregular(j,k): return None
+                j = k
+    elif match in ["endpreviousday","endpreviousmonth"]:
+        if tod==0:
+            j = i
+        else:
+            target = ti-ti%86400
+            j = locate(target)
+            if j is None: return None
+            # make sure there is no other record in the same minute
+            if j<i and t[j+1]<target+60: return None
+        if match=="endpreviousmonth":
+            tj = numpy.datetime64(int(t[j]),"s")
+            if (tj.astype("datetime64[D]")-tj.astype("datetime64[M]")).astype(int)!=0:
+                month = tj.astype("datetime64[M]")
+                target = month.astype("datetime64[s]").astype(numpy.int64)+int(t[j])%86400
+                k = locate(target)
+                if k is None or (j-k)%nperday!=0 or not isregular(k,j): return None
+                j = k
+    elif match=="startnexthour":
+        # if the time step is 60 then it is always the start of the next hour
+        if ts==60: return i
+        if (ti%3600)//60==ts:
+            j = i
+        else:
+            target = ti-ti%3600+ts_s
+            if target<ti: target = target+3600
+            j = locate(target)
+    elif match=="endprevioushour":
+        # if the time step is 60 then it is always the end of the previous hour
+        if ts==60: return i
+        if (ti%3600)//60==0:
+            j = i
+        else:
+            target = ti-ti%3600
+            j = locate(target)
+            if j is not None and j<i and t[j+1]<target+60: return None
+    return j
+
+def dateindex_walk(t,i,ts,match):
+    """
+    Purpose:
+     Find the index for the "start..." and "end..." options of GetDateIndex
+     by walking the time axis one record at a time.
+     This is the original GetDateIndex algorithm, it is used when the time
+     axis has gaps or duplicates.
+    """
+    def tod(k): return (int(t[k])%86400)//60
+    def minute(k): return (int(t[k])%3600)//60
+    def day(k):
+        tk = numpy.datetime64(int(t[k]),"s")
+        return int((tk.astype("datetime64[D]")-tk.astype("datetime64[M]")).astype(int))+1
+    if match=="startnextmonth":
         # get to the start of the next day
-        while abs(dts[i].hour+float(dts[i].minute)/60-float(ts)/60)>c.eps:
+        while tod(i)!=ts:
             i = i + 1
-        while dts[i].day!=1:
+        while day(i)!=1:
             i = i + int(float(24)/(float(ts)/60))
     elif match=='startnextday':
-        while abs(dts[i].hour+float(dts[i].minute)/60-float(ts)/60)>c.eps:
+        while tod(i)!=ts:
             i = i + 1
     elif match=="startnexthour":
         # check the time step value
         if int(ts)!=60:
             # if the time step is 60 then it is always the start of the next hour
             # we assume here that the time period ends on the datetime stamp
-            while dts[i].minute!=ts:
+            while minute(i)!=ts:
                 # iterate until the minutes equal the time step
                 i = i + 1
     elif match=='endpreviousmonth':
-        while abs(dts[i].hour+float(dts[i].minute)/60)>c.eps:
+        while tod(i)!=0:
             i = i - 1
-        while dts[i].day!=1:
+        while day(i)!=1:
             i = i - int(float(24)/(float(ts)/60))
     elif match=='endpreviousday':
-        while abs(dts[i].hour+float(dts[i].minute)/60)>c.eps:
+        while tod(i)!=0:
             i = i - 1
     elif match=="endprevioushour":
         # check the time step value
         if int(ts)!=60:
             # if the time step is 60 then it is always the end of the previous hour
             # we assume here that the time period ends on the datetime stamp
-            while dts[i].minute!=0:
+            while minute(i)!=0:
                 # iterate until the minutes equal 0
                 i = i - 1
-    else:
-        log.error("GetDateIndex: Unrecognised match option")
     return i
 
 def GetGlobalAttributeValue(cf,ds,ThisOne):
@@ -979,32 +1188,55 @@ def GetPlotVariableNamesFromCF(cf, n):
         print 'GetPlotVariableNamesFromCF: Plots key not in control file'
     return SeriesList
 
-def GetSeries(ds,ThisOne,si=0,ei=-1,mode="truncate"):
-    """ Returns the data, QC flag and attributes of a series from the data structure."""
+def GetSeries(ds,ThisOne,si=0,ei=-1,mode="truncate",copy=True):
+    """
+    Purpose:
+     Returns the data, QC flag and attributes of a series from the data structure.
+     If copy is True (default), the data, QC flag and attributes are copies
+     and can be changed by the caller.
+     If copy is False, the data and QC flag are read-only views of the series
+     in the data structure and the attribute dictionary is the one in the
+     data structure.  This avoids copying for routines that only read the
+     series.  Use qcutils.CreateSeries to write results back to the data
+     structure.
+    Usage:
+     data,flag,attr = qcutils.GetSeries(ds,"Fsd")
+     data,flag,attr = qcutils.GetSeries(ds,"Fsd",copy=False)
+    """
     # number of records
     if "nc_nrecs" in ds.globalattributes:
         nRecs = int(ds.globalattributes["nc_nrecs"])
     else:
-        nRecs = len(ds.series[ThisOne]["Data"])
+        nRecs = len(get_seriesitem(ds,ThisOne,"Data"))
     # check the series requested is in the data structure
     if ThisOne in ds.series.keys():
         # series is in the data structure
-        if isinstance(ds.series[ThisOne]['Data'],list):
+        data = get_seriesitem(ds,ThisOne,'Data')
+        if isinstance(data,list):
             # return a list if the series is a list
-            Series = list(ds.series[ThisOne]['Data'])
-        elif isinstance(ds.series[ThisOne]['Data'],numpy.ndarray):
+            Series = list(data)
+        elif isinstance(data,numpy.ndarray):
             # return a numpy array if series is an array
-            Series = ds.series[ThisOne]['Data'].copy()
+            if copy:
+                Series = data.copy()
+            else:
+                Series = readonly_view(data)
         # now get the QC flag
         if 'Flag' in ds.series[ThisOne].keys():
             # return the QC flag if it exists
-            Flag = ds.series[ThisOne]['Flag'].copy()
+            if copy:
+                Flag = get_seriesitem(ds,ThisOne,'Flag').copy()
+            else:
+                Flag = readonly_view(get_seriesitem(ds,ThisOne,'Flag'))
         else:
             # create a QC flag if one does not exist
             Flag = numpy.zeros(nRecs,dtype=numpy.int32)
         # now get the attribute dictionary
         if "Attr" in ds.series[ThisOne].keys():
-            Attr = GetAttributeDictionary(ds,ThisOne)
+            if copy:
+                Attr = GetAttributeDictionary(ds,ThisOne)
+            else:
+                Attr = get_seriesitem(ds,ThisOne,'Attr')
         else:
             Attr = MakeAttributeDictionary()
     else:
@@ -1074,6 +1306,20 @@ def GetSeries(ds,ThisOne,si=0,ei=-1,mode="truncate"):
         raise ValueError("GetSeries: unrecognised mode option "+str(mode))
     return Series,Flag,Attr
 
+def get_seriesitem(ds,label,item):
+    """
+    Purpose:
+     Return an item ("Data", "Flag" or "Attr") of a series in the data
+     structure for reading only.  Unlike ds.series[label][item], this does
+     not make a private copy of a copy-on-write series (see qcio.CowSeries)
+     so the returned item must not be changed in place.
+    Usage:
+     data = qcutils.get_seriesitem(ds,"Fsd","Data")
+    """
+    series = ds.series[label]
+    if hasattr(series,"peek"): return series.peek(item)
+    return series[item]
+
 def MakeEmptySeries(ds,ThisOne):
     nRecs = int(ds.globalattributes['nc_nrecs'])
     Series = float(c.missing_value)*numpy.ones(nRecs,dtype=numpy.float64)
@@ -1081,7 +1327,7 @@ def MakeEmptySeries(ds,ThisOne):
     Attr = MakeAttributeDictionary()
     return Series,Flag,Attr
 
-def GetSeriesasMA(ds,ThisOne,si=0,ei=-1,mode="truncate"):
+def GetSeriesasMA(ds,ThisOne,si=0,ei=-1,mode="truncate",copy=True):
     """
     Purpose:
      Returns a data series and the QC flag series from the data structure.
@@ -1092,6 +1338,8 @@ def GetSeriesasMA(ds,ThisOne,si=0,ei=-1,mode="truncate"):
       label - label of the data series in ds (string)
       si    - start index (integer), default 0
       ei    - end index (integer), default -1
+      copy  - if False, return read-only views of the data in ds (see GetSeries),
+              default True
     and the returned values are;
       data - values for the requested series in ds
              (numpy masked array, float64)
@@ -1103,10 +1351,17 @@ def GetSeriesasMA(ds,ThisOne,si=0,ei=-1,mode="truncate"):
      (Fsd) and the associated QC flag (f) as numpy masked arrays;
       ds = qcio.nc_read_series("HowardSprings_2011_L3.nc")
       Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd")
+     Read-only routines can avoid copying the data by using;
+      Fsd,f,a = qcutils.GetSeriesasMA(ds,"Fsd",copy=False)
+     in which case Fsd has no mask array (numpy.ma.nomask) if there are no
+     missing values.
     Author: PRI
     """
-    Series,Flag,Attr = GetSeries(ds,ThisOne,si=si,ei=ei,mode=mode)
-    Series,WasND = SeriestoMA(Series)
+    Series,Flag,Attr = GetSeries(ds,ThisOne,si=si,ei=ei,mode=mode,copy=copy)
+    if copy:
+        Series,WasND = SeriestoMA(Series)
+    else:
+        Series = SeriestoMA_view(Series)
     return Series,Flag,Attr
 
 def GetUnitsFromds(ds, ThisOne):
@@ -1137,6 +1392,7 @@ def get_cfsection(cf,series='',mode='quiet'):
         if mode!='quiet': log.info(msgtxt)
     return section
 
+@qcprof.profile
 def get_coverage_groups(ds,rad=None,met=None,flux=None,soil=None):
     level = "L1"
     if "nc_level" in ds.globalattributes:
@@ -1157,6 +1413,7 @@ def get_coverage_groups(ds,rad=None,met=None,flux=None,soil=None):
             coverage_group = 0
         ds.globalattributes['coverage_'+ThisLabel+'_'+level] = str('%d'%coverage_group)
 
+@qcprof.profile
 def get_coverage_individual(ds):
     level = "L1"
     if "nc_level" in ds.globalattributes:
@@ -1165,10 +1422,104 @@ def get_coverage_individual(ds):
     for ThisOne in ["DateTime","DateTime_UTC"]:
         if ThisOne in SeriesList: SeriesList.remove(ThisOne)
     for ThisOne in SeriesList:
-        num_good = len(numpy.where(abs(ds.series[ThisOne]['Data']-float(c.missing_value))>c.eps)[0])
+        data = get_seriesitem(ds,ThisOne,'Data')
+        num_good = len(numpy.where(abs(data-float(c.missing_value))>c.eps)[0])
         coverage = 100*float(num_good)/float(ds.globalattributes['nc_nrecs'])
         ds.series[ThisOne]['Attr']['coverage_'+level] = str('%d'%coverage)
 
+def get_datastructure_subset(ds,si,ei):
+    """
+    Purpose:
+     Return a new data structure containing records si to ei (inclusive)
+     of every series in ds.  The global attributes are copied and the
+     number of records, start and end dates are updated.
+    Usage:
+     ds_tail = qcutils.get_datastructure_subset(ds,si,nRecs-1)
+    """
+    ds_out = ds.__class__()
+    ds_out.globalattributes = copy.deepcopy(ds.globalattributes)
+    for label in ds.series.keys():
+        ds_out.series[label] = {}
+        for item in ["Data","Flag"]:
+            data = get_seriesitem(ds,label,item)
+            if isinstance(data,list):
+                ds_out.series[label][item] = data[si:ei+1]
+            else:
+                ds_out.series[label][item] = numpy.array(data[si:ei+1])
+        ds_out.series[label]["Attr"] = copy.deepcopy(get_seriesitem(ds,label,"Attr"))
+    ldt = ds_out.series["DateTime"]["Data"]
+    ds_out.globalattributes["nc_nrecs"] = str(len(ldt))
+    ds_out.globalattributes["start_date"] = str(ldt[0])
+    ds_out.globalattributes["end_date"] = str(ldt[-1])
+    return ds_out
+
+def get_datetime64(ds,label="DateTime"):
+    """
+    Purpose:
+     Return the datetime series in the data structure as a numpy array of
+     datetime64[s].
+     The datetime series in ds.series[label]["Data"] is a list of Python
+     datetimes for compatibility with existing code but iterating over it
+     is slow.  The datetime64 array is cached in ds.timeaxis and is only
+     rebuilt when the list in ds.series[label]["Data"] is replaced or changes
+     length.  Code that changes elements of the list in place must call
+     qcutils.set_datetime64 (or replace the list) afterwards.
+     Time zone aware datetimes (eg "DateTime_UTC") are converted to UTC.
+    Usage:
+     dt64 = qcutils.get_datetime64(ds)
+     where ds is a data structure
+           dt64 is a numpy datetime64[s] array
+    Assumptions:
+     The datetimes have been rounded to the nearest second (see round_datetime),
+     any fractional seconds are truncated.
+    """
+    ldt = get_seriesitem(ds,label,"Data")
+    if not hasattr(ds,"timeaxis"): ds.timeaxis = {}
+    if label in ds.timeaxis:
+        cache = ds.timeaxis[label]
+        if cache["list"] is ldt and cache["nrecs"]==len(ldt):
+            return cache["dt64"]
+    dt64 = get_timeaxis(ldt)
+    ds.timeaxis[label] = {"list":ldt,"nrecs":len(ldt),"dt64":dt64}
+    return dt64
+
+def get_timeaxis(dts):
+    """
+    Purpose:
+     Return the numpy datetime64[s] time axis for a list of Python datetimes
+     or a numpy datetime64 array.
+     The conversion is not cached, use qcutils.get_datetime64 to get the
+     time axis of a data structure, this is cached in ds.timeaxis.
+    Usage:
+     dt64 = qcutils.get_timeaxis(ldt)
+    """
+    if isinstance(dts,numpy.ndarray) and dts.dtype.kind=="M":
+        return dts.astype("datetime64[s]",copy=False)
+    return convert_datetimetodatetime64(dts).astype("datetime64[s]")
+
+def set_datetime64(ds,dt64,label="DateTime"):
+    """
+    Purpose:
+     Put a numpy datetime64 array into the data structure as the datetime
+     series.  The list of Python datetimes in ds.series[label]["Data"] is
+     created from the array and the array is cached for qcutils.get_datetime64.
+     The "Flag" and "Attr" of an existing datetime series are preserved.
+    Usage:
+     qcutils.set_datetime64(ds,dt64)
+     where ds is a data structure
+           dt64 is a numpy datetime64 array
+    """
+    dt64 = numpy.asarray(dt64).astype("datetime64[s]")
+    nRecs = len(dt64)
+    if label not in ds.series.keys():
+        ds.series[unicode(label)] = {}
+        ds.series[label]["Flag"] = numpy.zeros(nRecs,dtype=numpy.int32)
+        ds.series[label]["Attr"] = {"long_name":"Datetime in local timezone","units":"None"}
+    ldt = dt64.tolist()
+    ds.series[label]["Data"] = ldt
+    if not hasattr(ds,"timeaxis"): ds.timeaxis = {}
+    ds.timeaxis[label] = {"list":ldt,"nrecs":nRecs,"dt64":dt64}
+
 def get_datetimefromnctime(ds,time,time_units):
     """
     Purpose:
@@ -1213,34 +1564,41 @@ def get_datetimefromxldate(ds):
 
 def get_datetimefromymdhms(ds):
     ''' Creates a series of Python datetime objects from the year, month,
-    day, hour, minute and second series stored in the netCDF file.'''
+    day, hour, minute and second series stored in the netCDF file.
+    The datetime64 time axis is only cached in ds.timeaxis when all of the
+    microseconds are 0, files with sub-second times leave ds.timeaxis unset
+    and take the slower path of converting the list in get_datetime64.'''
     SeriesList = ds.series.keys()
     if 'Year' not in SeriesList or 'Month' not in SeriesList or 'Day' not in SeriesList or 'Hour' not in SeriesList or 'Minute' not in SeriesList or 'Second' not in SeriesList:
         log.info(' get_datetimefromymdhms: unable to find all datetime fields required')
         return
     log.info(' Getting the date and time series')
     nRecs = get_nrecs(ds)
-    ts = ds.globalattributes["time_step"]
-    ds.series[unicode('DateTime')] = {}
-    ds.series['DateTime']['Data'] = [None]*nRecs
     if "Microseconds" in ds.series.keys():
         microseconds = ds.series["Microseconds"]["Data"]
     else:
         microseconds = numpy.zeros(nRecs,dtype=numpy.float64)
-    for i in range(nRecs):
-        #print i,int(ds.series['Year']['Data'][i]),int(ds.series['Month']['Data'][i]),int(ds.series['Day']['Data'][i])
-        #print i,int(ds.series['Hour']['Data'][i]),int(ds.series['Minute']['Data'][i]),int(ds.series['Second']['Data'][i])
-        ds.series['DateTime']['Data'][i] = datetime.datetime(int(ds.series['Year']['Data'][i]),
-                                                       int(ds.series['Month']['Data'][i]),
-                                                       int(ds.series['Day']['Data'][i]),
-                                                       int(ds.series['Hour']['Data'][i]),
-                                                       int(ds.series['Minute']['Data'][i]),
-                                                       int(ds.series['Second']['Data'][i]),
-                                                       int(microseconds[i]))
+    # build the time axis from the calendar fields as microseconds since the epoch
+    field = {}
+    for item in ['Year','Month','Day','Hour','Minute','Second']:
+        field[item] = numpy.asarray(ds.series[item]['Data'][:nRecs]).astype(numpy.int64)
+    months = (field['Year']-1970)*12+field['Month']-1
+    days = months.astype("datetime64[M]").astype("datetime64[D]").astype(numpy.int64)+field['Day']-1
+    seconds = days*86400+field['Hour']*3600+field['Minute']*60+field['Second']
+    us = seconds*1000000+numpy.asarray(microseconds[:nRecs]).astype(numpy.int64)
+    dt64 = us.astype("datetime64[us]")
+    ldt = dt64.tolist()
+    ds.series[unicode('DateTime')] = {}
+    ds.series['DateTime']['Data'] = ldt
     ds.series['DateTime']['Flag'] = numpy.zeros(nRecs)
     ds.series['DateTime']['Attr'] = {}
     ds.series['DateTime']['Attr']['long_name'] = 'Date-time object'
     ds.series['DateTime']['Attr']['units'] = 'None'
+    # cache the time axis, see get_datetime64
+    if numpy.all(us%1000000==0):
+        dt64 = dt64.astype("datetime64[s]")
+        if not hasattr(ds,"timeaxis"): ds.timeaxis = {}
+        ds.timeaxis['DateTime'] = {"list":ldt,"nrecs":nRecs,"dt64":dt64}
 
 def get_diurnalstats(dt,data,info):
     ts = info["time_step"]
@@ -1305,6 +1663,7 @@ def get_keyvaluefromcf(cf,sections,key,default=None,mode="quiet"):
         value = default
     return value
 
+@qcprof.profile
 def get_missingingapfilledseries(ds):
     """
     Purpose:
@@ -1379,10 +1738,10 @@ def get_timestep(ds):
     Author: PRI
     Date: February 2015
     """
-    # local pointer to the Python datetime series
-    ldt = ds.series["DateTime"]["Data"]
-    # time step between records in seconds
-    dt = numpy.array([(ldt[i]-ldt[i-1]).total_seconds() for i in range(1,len(ldt))])
+    # time step between records in seconds, this is done at microsecond
+    # resolution so that non-integral time steps are found by CheckTimeStep
+    dt64 = convert_datetimetodatetime64(get_seriesitem(ds,"DateTime","Data"))
+    dt = numpy.diff(dt64.astype(numpy.int64)).astype(numpy.float64)/float(1E6)
     return dt
 
 def get_timezone(site_name,prompt="no"):
@@ -1404,13 +1763,15 @@ def get_timezone(site_name,prompt="no"):
                 found = True
     return time_zone,found
 
-def get_UTCfromlocaltime(ds):
+def get_UTCfromlocaltime(ds,tz_aware=True):
     '''
     Purpose:
      Creates a UTC datetime series in the data structure from the
      local datetime series.
     Usage:
      ldt_UTC = qcutils.get_UTCfromlocaltime(ds)
+     where tz_aware is True to return time zone aware datetimes (default)
+                   or False to return naive datetimes
     Assumptions:
      No daylight savings used in the local datetime
     Author: PRI
@@ -1431,22 +1792,116 @@ def get_UTCfromlocaltime(ds):
             log.info("get_UTCfromlocaltime: time_zone found in time zone dictionary")
             ds.globalattributes["time_zone"] = time_zone
     log.info(' Getting the UTC datetime from the local datetime')
-    # get the number of records
-    nRecs = len(ds.series['xlDateTime']['Data'])
     # get the time zone
     tz = ds.globalattributes["time_zone"]
-    # create a timezone object
-    loc_tz = pytz.timezone(tz)
     # local pointer to the datetime series in ds
     ldt = ds.series["DateTime"]["Data"]
-    # localise the datetime by assigning a time zone
-    ldt_loc = [loc_tz.localize(dt) for dt in ldt]
-    # remove any daylight saving time
-    ldt_loc_nodst = [dt+dt.dst() for dt in ldt_loc]
-    # convert to UTC
-    ldt_utc = [dt.astimezone(pytz.utc) for dt in ldt_loc_nodst]
+    # convert to UTC using the standard time offset of the time zone
+    ldt_utc = convert_localtoutc(ldt,tz,tz_aware=tz_aware)
     return ldt_utc
 
+def get_standardoffset(time_zone):
+    """
+    Purpose:
+     Return the standard time (no daylight saving) UTC offset of a time zone
+     as a datetime.timedelta.  The offset is only worked out once for each
+     time zone, the offsets are cached in qcutils.standard_offset_lookup.
+    Usage:
+     offset = qcutils.get_standardoffset("Australia/Sydney")
+    """
+    if time_zone not in standard_offset_lookup:
+        loc_tz = pytz.timezone(time_zone)
+        standard_offset_lookup[time_zone] = get_standardoffsetatdatetime(loc_tz,datetime.datetime(2000,1,1))
+    return standard_offset_lookup[time_zone]
+
+def get_standardoffsetatdatetime(loc_tz,dt):
+    """ Return the standard time UTC offset of the time zone loc_tz at the local datetime dt."""
+    dt_loc = loc_tz.localize(dt.replace(tzinfo=None))
+    return dt_loc.utcoffset()-dt_loc.dst()
+
+def check_standardoffset(ldt,time_zone,offset):
+    """
+    Purpose:
+     Check the cached standard time offset applies to the first and last
+     local datetimes in ldt.  This will only fail if the standard time of
+     the time zone changed during the period covered by ldt.
+    Usage:
+     ok = qcutils.check_standardoffset(ldt,time_zone,offset)
+    """
+    loc_tz = pytz.timezone(time_zone)
+    for dt in [ldt[0],ldt[-1]]:
+        if get_standardoffsetatdatetime(loc_tz,dt)!=offset:
+            msg = " Standard time offset for "+time_zone+" changes between "+str(ldt[0])+" and "+str(ldt[-1])
+            log.warning(msg)
+            return False
+    return True
+
+def convert_localtoutc(ldt,time_zone,tz_aware=True):
+    """
+    Purpose:
+     Convert a list of local standard time datetimes to UTC.  Daylight
+     saving is ignored, the standard time offset of the time zone is
+     applied to the whole list using numpy.
+    Usage:
+     ldt_utc = qcutils.convert_localtoutc(ldt,time_zone,tz_aware=True)
+     where ldt is a list of naive local datetimes
+           time_zone is the time zone name eg "Australia/Sydney"
+           tz_aware is True to return time zone aware datetimes (default)
+                    or False to return naive datetimes
+    """
+    if len(ldt)==0: return []
+    offset = get_standardoffset(time_zone)
+    if not check_standardoffset(ldt,time_zone,offset):
+        # fall back to converting each datetime
+        loc_tz = pytz.timezone(time_zone)
+        ldt_loc = [loc_tz.localize(dt) for dt in ldt]
+        ldt_utc = [(dt+dt.dst()).astimezone(pytz.utc) for dt in ldt_loc]
+        if not tz_aware: ldt_utc = [dt.replace(tzinfo=None) for dt in ldt_utc]
+        return ldt_utc
+    dt64_utc = convert_datetimetodatetime64(ldt)-numpy.timedelta64(offset)
+    if tz_aware:
+        return pandas.DatetimeIndex(dt64_utc).tz_localize(pytz.utc).to_pydatetime().tolist()
+    return dt64_utc.tolist()
+
+def convert_utctolocal(ldt_utc,time_zone):
+    """
+    Purpose:
+     Convert a list of UTC datetimes to naive local standard time datetimes.
+     Daylight saving is ignored, the standard time offset of the time zone
+     is applied to the whole list using numpy.
+    Usage:
+     ldt = qcutils.convert_utctolocal(ldt_utc,time_zone)
+     where ldt_utc is a list of UTC datetimes, naive or time zone aware
+           time_zone is the time zone name eg "Australia/Sydney"
+    """
+    if len(ldt_utc)==0: return []
+    offset = get_standardoffset(time_zone)
+    dt64 = convert_datetimetodatetime64(ldt_utc)+numpy.timedelta64(offset)
+    ldt = dt64.tolist()
+    if not check_standardoffset(ldt,time_zone,offset):
+        # fall back to converting each datetime
+        loc_tz = pytz.timezone(time_zone)
+        ldt_loc = [dt.replace(tzinfo=pytz.utc).astimezone(loc_tz) for dt in ldt_utc]
+        ldt = [(dt-dt.dst()).replace(tzinfo=None) for dt in ldt_loc]
+    return ldt
+
+def get_xldatefromdatetime64(dt64,datemode=0):
+    """
+    Purpose:
+     Return the Excel dates for a numpy datetime64 array.  Gives the same
+     result as xlrd.xldate.xldate_from_datetime_tuple applied to each
+     element, fractional seconds are truncated.
+    Usage:
+     xldate = qcutils.get_xldatefromdatetime64(dt64,datemode=0)
+    """
+    dt64 = numpy.asarray(dt64).astype("datetime64[s]")
+    dt64_day = dt64.astype("datetime64[D]")
+    xldays = (dt64_day-xl_base_date[datemode]).astype(numpy.int64).astype(numpy.float64)
+    Year,Month,Day,Hour,Minute,Second = get_ymdhmsfromdatetime64(dt64)
+    # same order of operations as xlrd.xldate.xldate_from_time_tuple
+    frac = ((Second/60.0+Minute)/60.0+Hour)/24.0
+    return xldays+frac
+
 def get_xldatefromdatetime(ds):
     '''
     Purpose:
@@ -1470,20 +1925,32 @@ def get_xldatefromdatetime(ds):
     else:
         xldt_flag = numpy.zeros(nRecs,dtype=numpy.int32)
         xldt_attr = MakeAttributeDictionary(long_name="Date/time in Excel format",units="days since 1899-12-31 00:00:00")
-    # get a local pointer to the Python DateTime series in ds
-    ldt = ds.series["DateTime"]["Data"]
-    # get a list of Excel datetimes from the Python datetime objects
-    xldate = [xlrd.xldate.xldate_from_datetime_tuple((ldt[i].year,
-                                                      ldt[i].month,
-                                                      ldt[i].day,
-                                                      ldt[i].hour,
-                                                      ldt[i].minute,
-                                                      ldt[i].second),
-                                                      datemode) for i in range(0,len(ldt))]
+    # get the Excel datetimes from the Python datetimes
+    xldate = get_xldatefromdatetime64(get_datetime64(ds),datemode)
     xldt_new = numpy.ma.array(xldate, dtype=numpy.float64)
     # overwrite the existing Excel datetime series
     CreateSeries(ds,"xlDateTime",xldt_new,Flag=xldt_flag,Attr=xldt_attr)
 
+def get_ymdhmsfromdatetime64(dt64):
+    """
+    Purpose:
+     Return the year, month, day, hour, minute and second of a numpy
+     datetime64 array as int32 arrays.  Fractional seconds are truncated.
+    Usage:
+     Year,Month,Day,Hour,Minute,Second = qcutils.get_ymdhmsfromdatetime64(dt64)
+    """
+    dt64 = numpy.asarray(dt64).astype("datetime64[s]")
+    months = dt64.astype("datetime64[M]").astype(numpy.int64)
+    Year = (months//12+1970).astype(numpy.int32)
+    Month = (months%12+1).astype(numpy.int32)
+    dt64_day = dt64.astype("datetime64[D]")
+    Day = ((dt64_day-dt64.astype("datetime64[M]")).astype(numpy.int64)+1).astype(numpy.int32)
+    seconds = (dt64-dt64_day).astype(numpy.int64)
+    Hour = (seconds//3600).astype(numpy.int32)
+    Minute = ((seconds%3600)//60).astype(numpy.int32)
+    Second = (seconds%60).astype(numpy.int32)
+    return Year,Month,Day,Hour,Minute,Second
+
 def get_ymdhmsfromdatetime(ds):
     '''
     Purpose:
@@ -1498,16 +1965,13 @@ def get_ymdhmsfromdatetime(ds):
     Author: PRI
     '''
     nRecs = int(ds.globalattributes["nc_nrecs"])
-    dt = ds.series["DateTime"]["Data"]
+    dt64 = get_datetime64(ds)[:nRecs]
     flag = numpy.zeros(nRecs,dtype=numpy.int32)
-    Year = numpy.array([dt[i].year for i in range(0,nRecs)]).astype(numpy.int32)
-    Month = numpy.array([dt[i].month for i in range(0,nRecs)]).astype(numpy.int32)
-    Day = numpy.array([dt[i].day for i in range(0,nRecs)]).astype(numpy.int32)
-    Hour = numpy.array([dt[i].hour for i in range(0,nRecs)]).astype(numpy.int32)
-    Minute = numpy.array([dt[i].minute for i in range(0,nRecs)]).astype(numpy.int32)
-    Second = numpy.array([dt[i].second for i in range(0,nRecs)]).astype(numpy.int32)
-    Hdh = numpy.array([float(Hour[i])+float(Minute[i])/60. for i in range(0,nRecs)]).astype(numpy.float64)
-    Ddd = numpy.array([(dt[i] - datetime.datetime(Year[i],1,1)).days+1+Hdh[i]/24. for i in range(0,nRecs)]).astype(numpy.float64)
+    Year,Month,Day,Hour,Minute,Second = get_ymdhmsfromdatetime64(dt64)
+    Hdh = Hour.astype(numpy.float64)+Minute.astype(numpy.float64)/60.
+    # day of the year plus the decimal hour
+    doy = (dt64.astype("datetime64[D]")-dt64.astype("datetime64[Y]")).astype(numpy.int64)
+    Ddd = (doy+1)+Hdh/24.
     CreateSeries(ds,'Year',Year,Flag=flag,Attr=MakeAttributeDictionary(long_name='Year',units='none'))
     CreateSeries(ds,'Month',Month,Flag=flag,Attr=MakeAttributeDictionary(long_name='Month',units='none'))
     CreateSeries(ds,'Day',Day,Flag=flag,Attr=MakeAttributeDictionary(long_name='Day',units='none'))
@@ -1529,26 +1993,21 @@ def get_ymdhmsfromxldate(ds):
     log.info(' Getting date and time variables')
     # get the date mode of the original Excel datetime
     datemode = int(ds.globalattributes['xl_datemode'])
-    nRecs = len(ds.series['xlDateTime']['Data'])
-    Year = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Month = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Day = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Hour = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Minute = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Second = numpy.array([c.missing_value]*nRecs,numpy.int32)
-    Hdh = numpy.array([c.missing_value]*nRecs,numpy.float64)
-    Ddd = numpy.array([c.missing_value]*nRecs,numpy.float64)
+    xldate = numpy.asarray(ds.series['xlDateTime']['Data'],dtype=numpy.float64)
+    nRecs = len(xldate)
     flag = numpy.zeros(nRecs)
-    for i in range(nRecs):
-        DateTuple = xlrd.xldate_as_tuple(ds.series['xlDateTime']['Data'][i],datemode)
-        Year[i] = int(DateTuple[0])
-        Month[i] = int(DateTuple[1])
-        Day[i] = int(DateTuple[2])
-        Hour[i] = int(DateTuple[3])
-        Minute[i] = int(DateTuple[4])
-        Second[i] = int(DateTuple[5])
-        Hdh[i] = float(DateTuple[3])+float(DateTuple[4])/60.
-        Ddd[i] = ds.series['xlDateTime']['Data'][i] - xlrd.xldate.xldate_from_date_tuple((Year[i],1,1),datemode) + 1
+    # split the Excel date into days and seconds, rounded to the nearest
+    # second the same way as xlrd.xldate_as_tuple
+    xldays = xldate.astype(numpy.int64)
+    seconds = round_halfup((xldate-xldays)*86400.0).astype(numpy.int64)
+    xldays = xldays+seconds//86400
+    seconds = seconds%86400
+    dt64 = (xl_base_date[datemode]+xldays).astype("datetime64[s]")+seconds
+    Year,Month,Day,Hour,Minute,Second = get_ymdhmsfromdatetime64(dt64)
+    Hdh = Hour.astype(numpy.float64)+Minute.astype(numpy.float64)/60.
+    # Excel date of the start of the year
+    jan1 = (dt64.astype("datetime64[Y]").astype("datetime64[D]")-xl_base_date[datemode]).astype(numpy.int64)
+    Ddd = xldate-jan1.astype(numpy.float64)+1
     CreateSeries(ds,'Year',Year,Flag=flag,Attr=MakeAttributeDictionary(long_name='Year',units='none'))
     CreateSeries(ds,'Month',Month,Flag=flag,Attr=MakeAttributeDictionary(long_name='Month',units='none'))
     CreateSeries(ds,'Day',Day,Flag=flag,Attr=MakeAttributeDictionary(long_name='Day',units='none'))
@@ -1606,7 +2065,7 @@ def MakeQCFlag(ds,SeriesList):
         pass
     if len(SeriesList)==1:
         if SeriesList[0] in ds.series.keys():
-            flag = ds.series[SeriesList[0]]['Flag'].copy()
+            flag = get_seriesitem(ds,SeriesList[0],'Flag').copy()
         else:
             log.error('  MakeQCFlag: series '+str(SeriesList[0])+' not in ds.series')
     if len(SeriesList)>1:
@@ -1614,9 +2073,9 @@ def MakeQCFlag(ds,SeriesList):
             if ThisOne in ds.series.keys():
                 if len(flag)==0:
                     #flag = numpy.ones(numpy.size(ds.series[ThisOne]['Flag']))
-                    flag = ds.series[ThisOne]['Flag'].copy()
+                    flag = get_seriesitem(ds,ThisOne,'Flag').copy()
                 else:
-                    tmp_flag = ds.series[ThisOne]['Flag'].copy()      # get a temporary copy of the flag
+                    tmp_flag = get_seriesitem(ds,ThisOne,'Flag').copy()      # get a temporary copy of the flag
                     index = numpy.where(numpy.mod(tmp_flag,10)==0)    # find the elements with flag = 0, 10, 20 etc
                     tmp_flag[index] = 0                               # set them all to 0
                     flag = numpy.maximum(flag,tmp_flag)               # now take the maximum
@@ -1703,6 +2162,36 @@ def polyval(p,x):
         y = x*y + p[i]
     return y
 
+def round_halfup(x):
+    """
+    Purpose:
+     Round an array of positive numbers to the nearest integer with halves
+     rounded up, the same as the Python 2 round().  numpy.round rounds
+     halves to the nearest even number.
+    Usage:
+     y = qcutils.round_halfup(x)
+    """
+    x = numpy.asarray(x,dtype=numpy.float64)
+    y = numpy.floor(x+0.5)
+    # x+0.5 can round up to the next integer when x is just less than a half
+    y[(y-x)>0.5] -= 1
+    return y
+
+def rounddttots_array(us,ts=30):
+    """
+    Purpose:
+     Round an array of times, in integer microseconds since the epoch, to
+     the nearest time step.  Gives the same result as qcutils.rounddttots
+     applied to each element.
+    Usage:
+     us_rounded = qcutils.rounddttots_array(us,ts=30)
+    """
+    us = numpy.asarray(us,dtype=numpy.int64)+int(ts/2)*60*10**6
+    # microseconds since the start of the hour
+    us_hour = us%(3600*10**6)
+    minute = us_hour//(60*10**6)
+    return us-(minute%int(ts))*60*10**6-us_hour%(60*10**6)
+
 def rounddttots(dt,ts=30):
     dt += datetime.timedelta(minutes=int(ts/2))
     dt -= datetime.timedelta(minutes=dt.minute % int(ts),seconds=dt.second,microseconds=dt.microsecond)
@@ -1739,8 +2228,13 @@ def round_datetime(ds,mode="nearest_timestep"):
         # round to the nearest time step
         rldt = [rounddttots(dt,ts=ts) for dt in ldt]
     elif mode.lower()=="nearest_second":
-        # round to the nearest second
-        rldt = [rounddttoseconds(dt) for dt in ldt]
+        # round to the nearest second using integer microseconds since the epoch,
+        # this gives the same result as rounddttoseconds
+        us = convert_datetimetodatetime64(ldt).astype(numpy.int64)
+        rdt64 = ((us+500000)//1000000).astype("datetime64[s]")
+        # replace the original datetime series with the rounded one
+        set_datetime64(ds,rdt64)
+        return
     else:
         # unrecognised option for mode, return original datetime series
         log.error(" round_datetime: unrecognised mode ("+str(mode)+")"+" ,returning original time series")
@@ -1782,6 +2276,25 @@ def SeriestoMA(Series):
         Series = numpy.ma.masked_where(abs(Series-numpy.float64(c.missing_value))<c.eps,Series)
     return Series, WasND
 
+def SeriestoMA_view(Series):
+    """
+    Convert a numpy ndarray to a masked array without copying the data.
+    The mask is only created if the series contains missing values, otherwise
+    the masked array has numpy.ma.nomask.
+    Useage:
+     Series = SeriestoMA_view(Series)
+    """
+    if numpy.ma.isMA(Series): return Series
+    missing = abs(Series-numpy.float64(c.missing_value))<c.eps
+    if not missing.any(): missing = numpy.ma.nomask
+    return numpy.ma.MaskedArray(Series,mask=missing,copy=False)
+
+def readonly_view(data):
+    """ Return a read-only view of a numpy array."""
+    view = data.view()
+    view.flags.writeable = False
+    return view
+
 def SetUnitsInds(ds, ThisOne, units):
     ds.series[ThisOne]['Attr']['units'] = units
 
@@ -1800,6 +2313,7 @@ def startlog(loggername,loggerfile):
     logger.addHandler(ch)
     return logger
 
+@qcprof.profile
 def UpdateGlobalAttributes(cf,ds,level):
     ds.globalattributes["nc_level"] = str(level)
     ds.globalattributes["EPDversion"] = sys.version
@@ -0,0 +1,243 @@
+"""
+Purpose:
+ Array versions of the pysolar routines used by OzFluxQC.
+ The functions in this module follow the scalar functions in pysolar.py
+ (Reda and Andreas, NREL/TP-560-34302 and Masters) but take arrays of UTC
+ times and return arrays so that the solar altitude and the direct
+ radiation for a whole data set are calculated in a few numpy operations
+ instead of one pysolar call per time step.  The coefficient tables are
+ taken from pysolar.py.
+Usage:
+ import solarposition
+ alt_solar = solarposition.GetAltitude(latitude,longitude,ldt_UTC)
+ Fsd_syn = solarposition.GetRadiationDirect(ldt_UTC,alt_solar)
+ where ldt_UTC is a list of UTC datetimes or an array of numpy datetime64
+"""
+import numpy
+import pandas
+import pysolar
+
+# the J2000.0 epoch (2000-01-01 12:00 UTC) and its Julian day
+j2000_datetime64 = numpy.datetime64("2000-01-01T12:00:00","us")
+j2000_julianday = 2451545.0
+
+def get_termarrays(constant_array):
+    """ Return the columns of a pysolar coefficient table as arrays."""
+    a = numpy.array(constant_array,dtype=numpy.float64)
+    return a[:,0],a[:,1],a[:,2]
+
+# the VSOP87 series as arrays of (amplitude, phase, frequency)
+vsop87_terms = {}
+for name in ["L0","L1","L2","L3","L4","L5","B0","B1","R0","R1","R2","R3","R4"]:
+    vsop87_terms[name] = get_termarrays(getattr(pysolar,name))
+# the nutation terms
+nutation_coefficients = numpy.array(pysolar.nutation_coefficients,dtype=numpy.float64)
+aberration_sin_terms = numpy.array(pysolar.aberration_sin_terms,dtype=numpy.float64)
+
+def GetDatetime64(utc_datetime):
+    """
+    Purpose:
+     Return an array of numpy datetime64 (microseconds) from a list of UTC
+     datetimes (time zone naive or aware) or an array of datetime64.
+    Usage:
+     dt64 = solarposition.GetDatetime64(ldt_UTC)
+    """
+    if isinstance(utc_datetime,numpy.ndarray) and numpy.issubdtype(utc_datetime.dtype,numpy.datetime64):
+        return utc_datetime.astype("datetime64[us]")
+    if len(utc_datetime)==0:
+        return numpy.array([],dtype="datetime64[us]")
+    # pandas converts time zone aware datetimes to UTC
+    return pandas.DatetimeIndex(list(utc_datetime)).values.astype("datetime64[us]")
+
+def GetJulianDay(utc_datetime):
+    """ Return the Julian day of each UTC time as an array of floats."""
+    dt64 = GetDatetime64(utc_datetime)
+    return j2000_julianday + (dt64-j2000_datetime64)/numpy.timedelta64(86400000000,"us")
+
+def GetDayOfYear(utc_datetime):
+    """ Return the number of whole days since the start of the year for each UTC time."""
+    dt64 = GetDatetime64(utc_datetime)
+    return (dt64.astype("datetime64[D]")-dt64.astype("datetime64[Y]")).astype(numpy.int64)
+
+def GetJulianEphemerisMillenium(julian_day,delta_seconds=65.0):
+    """ Return the Julian ephemeris century and millenium from the Julian day."""
+    jde = julian_day + delta_seconds/86400.0
+    jce = (jde - j2000_julianday)/36525.0
+    return jce,jce/10.0
+
+def GetCoefficient(jme,name):
+    """ Return the sum of a VSOP87 series, the series is summed term by term to keep memory use low."""
+    a,b,c = vsop87_terms[name]
+    total = numpy.zeros(numpy.shape(jme),dtype=numpy.float64)
+    for i in range(len(a)):
+        total += a[i]*numpy.cos(b[i]+c[i]*jme)
+    return total
+
+def GetPolynomial(jme,names):
+    """ Return the polynomial in jme whose coefficients are the VSOP87 series in names."""
+    total = numpy.zeros(numpy.shape(jme),dtype=numpy.float64)
+    for n,name in enumerate(names):
+        total += GetCoefficient(jme,name)*jme**n
+    return total/1E8
+
+def GetHeliocentricLongitude(jme):
+    l = GetPolynomial(jme,["L0","L1","L2","L3","L4","L5"])
+    return numpy.degrees(l) % 360
+
+def GetHeliocentricLatitude(jme):
+    b = GetPolynomial(jme,["B0","B1"])
+    return numpy.degrees(b)
+
+def GetRadiusVector(jme):
+    return GetPolynomial(jme,["R0","R1","R2","R3","R4"])
+
+def GetGeocentricLongitude(jme):
+    return (GetHeliocentricLongitude(jme) + 180) % 360
+
+def GetGeocentricLatitude(jme):
+    return -1*GetHeliocentricLatitude(jme)
+
+def GetNutation(jce):
+    """
+    Purpose:
+     Return the nutation in longitude and obliquity (degrees) as arrays.
+    Usage:
+     nutation = solarposition.GetNutation(jce)
+     where nutation is a dictionary with keys "longitude" and "obliquity"
+    """
+    p = pysolar.buildPolyDict()
+    # order of the arguments is the same as in pysolar.PrecalculateAberrations
+    x = [p[name](jce) for name in ["MeanElongationOfMoon","MeanAnomalyOfSun","MeanAnomalyOfMoon",
+                                   "ArgumentOfLatitudeOfMoon","LongitudeOfAscendingNode"]]
+    nutation_long = numpy.zeros(numpy.shape(jce),dtype=numpy.float64)
+    nutation_oblique = numpy.zeros(numpy.shape(jce),dtype=numpy.float64)
+    for i in range(len(nutation_coefficients)):
+        a,b,c,d = nutation_coefficients[i]
+        y = aberration_sin_terms[i]
+        sigmaxy = numpy.radians(x[0]*y[0]+x[1]*y[1]+x[2]*y[2]+x[3]*y[3]+x[4]*y[4])
+        nutation_long += (a + b*jce)*numpy.sin(sigmaxy)
+        nutation_oblique += (c + d*jce)*numpy.cos(sigmaxy)
+    # 36000000 scales from 0.0001 arcseconds to degrees
+    return {"longitude":nutation_long/36000000.0,"obliquity":nutation_oblique/36000000.0}
+
+def GetTrueEclipticObliquity(jme,nutation):
+    u = jme/10.0
+    mean_obliquity = 84381.448 - (4680.93 * u) - (1.55 * u ** 2) + (1999.25 * u ** 3) \
+        - (51.38 * u ** 4) -(249.67 * u ** 5) - (39.05 * u ** 6) + (7.12 * u ** 7) \
+        + (27.87 * u ** 8) + (5.79 * u ** 9) + (2.45 * u ** 10)
+    return (mean_obliquity / 3600.0) + nutation["obliquity"]
+
+def GetApparentSiderealTime(julian_day,true_ecliptic_obliquity,nutation):
+    jc = (julian_day - j2000_julianday)/36525.0
+    mean_sidereal_time = 280.46061837 + (360.98564736629 * (julian_day - j2000_julianday)) + (0.000387933 * jc ** 2) - (jc ** 3 / 38710000)
+    mean_sidereal_time = mean_sidereal_time % 360
+    # pysolar takes the cosine of the obliquity in degrees, kept here so the results agree
+    return mean_sidereal_time + nutation["longitude"]*numpy.cos(true_ecliptic_obliquity)
+
+def GetGeocentricSunRightAscension(apparent_sun_longitude,true_ecliptic_obliquity,geocentric_latitude):
+    asl_rad = numpy.radians(apparent_sun_longitude)
+    teo_rad = numpy.radians(true_ecliptic_obliquity)
+    gl_rad = numpy.radians(geocentric_latitude)
+    a = numpy.sin(asl_rad)*numpy.cos(teo_rad)
+    b = numpy.tan(gl_rad)*numpy.sin(teo_rad)
+    c = numpy.cos(asl_rad)
+    return numpy.degrees(numpy.arctan2((a - b),c)) % 360
+
+def GetGeocentricSunDeclination(apparent_sun_longitude,true_ecliptic_obliquity,geocentric_latitude):
+    asl_rad = numpy.radians(apparent_sun_longitude)
+    teo_rad = numpy.radians(true_ecliptic_obliquity)
+    gl_rad = numpy.radians(geocentric_latitude)
+    a = numpy.sin(gl_rad)*numpy.cos(teo_rad)
+    b = numpy.cos(gl_rad)*numpy.sin(teo_rad)*numpy.sin(asl_rad)
+    return numpy.degrees(numpy.arcsin(a + b))
+
+def GetParallaxSunRightAscension(projected_radial_distance,equatorial_horizontal_parallax,local_hour_angle,geocentric_sun_declination):
+    prd = projected_radial_distance
+    ehp_rad = numpy.radians(equatorial_horizontal_parallax)
+    lha_rad = numpy.radians(local_hour_angle)
+    gsd_rad = numpy.radians(geocentric_sun_declination)
+    a = -1*prd*numpy.sin(ehp_rad)*numpy.sin(lha_rad)
+    b = numpy.cos(gsd_rad) - prd*numpy.sin(ehp_rad)*numpy.cos(lha_rad)
+    return numpy.degrees(numpy.arctan2(a,b))
+
+def GetTopocentricSunDeclination(geocentric_sun_declination,projected_axial_distance,equatorial_horizontal_parallax,parallax_sun_right_ascension,local_hour_angle):
+    gsd_rad = numpy.radians(geocentric_sun_declination)
+    pad = projected_axial_distance
+    ehp_rad = numpy.radians(equatorial_horizontal_parallax)
+    psra_rad = numpy.radians(parallax_sun_right_ascension)
+    lha_rad = numpy.radians(local_hour_angle)
+    a = (numpy.sin(gsd_rad) - pad*numpy.sin(ehp_rad))*numpy.cos(psra_rad)
+    b = numpy.cos(gsd_rad) - (pad*numpy.sin(ehp_rad)*numpy.cos(lha_rad))
+    return numpy.degrees(numpy.arctan2(a,b))
+
+def GetTopocentricElevationAngle(latitude,topocentric_sun_declination,topocentric_local_hour_angle):
+    latitude_rad = numpy.radians(latitude)
+    tsd_rad = numpy.radians(topocentric_sun_declination)
+    tlha_rad = numpy.radians(topocentric_local_hour_angle)
+    return numpy.degrees(numpy.arcsin((numpy.sin(latitude_rad)*numpy.sin(tsd_rad)) + numpy.cos(latitude_rad)*numpy.cos(tsd_rad)*numpy.cos(tlha_rad)))
+
+def GetRefractionCorrection(pressure_millibars,temperature_celsius,topocentric_elevation_angle):
+    tea = topocentric_elevation_angle
+    temperature_kelvin = temperature_celsius + 273.15
+    a = pressure_millibars*283.0*1.02
+    b = 1010.0*temperature_kelvin*60.0*numpy.tan(numpy.radians(tea + (10.3/(tea + 5.11))))
+    return a/b
+
+def GetAltitude(latitude_deg,longitude_deg,utc_datetime,elevation=0,temperature_celsius=25,pressure_millibars=1013.25):
+    """
+    Purpose:
+     Return the solar altitude (degrees) at each UTC time as an array.
+     This is the array version of pysolar.GetAltitude and agrees with it
+     to better than 1E-6 degrees.
+    Usage:
+     alt_solar = solarposition.GetAltitude(latitude,longitude,ldt_UTC)
+     where latitude and longitude are the site location in degrees
+           ldt_UTC is a list of UTC datetimes or an array of datetime64
+    """
+    # location-dependent calculations, these are scalars
+    projected_radial_distance = pysolar.GetProjectedRadialDistance(elevation,latitude_deg)
+    projected_axial_distance = pysolar.GetProjectedAxialDistance(elevation,latitude_deg)
+    # time-dependent calculations
+    jd = GetJulianDay(utc_datetime)
+    jce,jme = GetJulianEphemerisMillenium(jd,65)
+    geocentric_latitude = GetGeocentricLatitude(jme)
+    geocentric_longitude = GetGeocentricLongitude(jme)
+    radius_vector = GetRadiusVector(jme)
+    aberration_correction = -20.4898/(3600.0*radius_vector)
+    equatorial_horizontal_parallax = 8.794/(3600/radius_vector)
+    nutation = GetNutation(jce)
+    true_ecliptic_obliquity = GetTrueEclipticObliquity(jme,nutation)
+    apparent_sidereal_time = GetApparentSiderealTime(jd,true_ecliptic_obliquity,nutation)
+    # calculations dependent on location and time
+    apparent_sun_longitude = geocentric_longitude + nutation["longitude"] + aberration_correction
+    geocentric_sun_right_ascension = GetGeocentricSunRightAscension(apparent_sun_longitude,true_ecliptic_obliquity,geocentric_latitude)
+    geocentric_sun_declination = GetGeocentricSunDeclination(apparent_sun_longitude,true_ecliptic_obliquity,geocentric_latitude)
+    local_hour_angle = (apparent_sidereal_time + longitude_deg - geocentric_sun_right_ascension) % 360
+    parallax_sun_right_ascension = GetParallaxSunRightAscension(projected_radial_distance,equatorial_horizontal_parallax,local_hour_angle,geocentric_sun_declination)
+    topocentric_local_hour_angle = local_hour_angle - parallax_sun_right_ascension
+    topocentric_sun_declination = GetTopocentricSunDeclination(geocentric_sun_declination,projected_axial_distance,equatorial_horizontal_parallax,parallax_sun_right_ascension,local_hour_angle)
+    topocentric_elevation_angle = GetTopocentricElevationAngle(latitude_deg,topocentric_sun_declination,topocentric_local_hour_angle)
+    refraction_correction = GetRefractionCorrection(pressure_millibars,temperature_celsius,topocentric_elevation_angle)
+    return topocentric_elevation_angle + refraction_correction
+
+def GetRadiationDirect(utc_datetime,altitude_deg):
+    """
+    Purpose:
+     Return the direct radiation (W/m2) at each UTC time as an array, the
+     radiation is 0 when the sun is below the horizon.  This is the array
+     version of pysolar.GetRadiationDirect.
+    Usage:
+     Fsd_syn = solarposition.GetRadiationDirect(ldt_UTC,alt_solar)
+    """
+    altitude_deg = numpy.asarray(altitude_deg,dtype=numpy.float64)
+    day = GetDayOfYear(utc_datetime)
+    radiation = numpy.zeros(len(altitude_deg),dtype=numpy.float64)
+    idx = numpy.where(altitude_deg>0)[0]
+    if len(idx)==0: return radiation
+    # from Masters, p. 412
+    flux = 1160 + (75*numpy.sin(numpy.radians((360./365)*(day[idx] - 275))))
+    optical_depth = 0.174 + (0.035*numpy.sin(numpy.radians((360./365)*(day[idx] - 100))))
+    sin_altitude = numpy.sin(numpy.radians(altitude_deg[idx]))
+    air_mass_ratio = 1/sin_altitude
+    radiation[idx] = flux*numpy.exp(-1*optical_depth*air_mass_ratio)*sin_altitude
+    return radiation
@@ -68,9 +68,7 @@ def get_datetime(ds_60minutes,f,info):
     idx = numpy.where(time_step!=0)[0]
     dt_utc = dt_utc_all[idx]
     dt_utc = [x.replace(tzinfo=pytz.utc) for x in dt_utc]
-    dt_loc = [x.astimezone(info["site_tz"]) for x in dt_utc]
-    dt_loc = [x-x.dst() for x in dt_loc]
-    dt_loc = [x.replace(tzinfo=None) for x in dt_loc]
+    dt_loc = qcutils.convert_utctolocal(dt_utc,info["site_timezone"])
     ds_60minutes.series["DateTime"] = {}
     ds_60minutes.series["DateTime"]["Data"] = dt_loc
     nRecs = len(ds_60minutes.series["DateTime"]["Data"])
@@ -105,9 +103,7 @@ def get_accessdata(cf,ds_60minutes,f,info):
     idxeq0 = idxeq0[idx_clipped]
     dt_utc = dt_utc_all[idxne0]
     dt_utc = [x.replace(tzinfo=pytz.utc) for x in dt_utc]
-    dt_loc = [x.astimezone(info["site_tz"]) for x in dt_utc]
-    dt_loc = [x-x.dst() for x in dt_loc]
-    dt_loc = [x.replace(tzinfo=None) for x in dt_loc]
+    dt_loc = qcutils.convert_utctolocal(dt_utc,info["site_timezone"])
     flag = numpy.zeros(len(dt_loc),dtype=numpy.int32)
     ds_60minutes.series["DateTime"] = {}
     ds_60minutes.series["DateTime"]["Data"] = dt_loc
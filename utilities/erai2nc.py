@@ -14,7 +14,7 @@ if not os.path.exists("../scripts/"):
 # since the scripts directory is there, try importing the modules
 sys.path.append('../scripts')
 import meteorologicalfunctions as mf
-import pysolar
+import solarposition
 import qcio
 import qcutils
 
@@ -85,7 +85,6 @@ for cf_name in cf_list:
         ds_erai.globalattributes['xl_datemode'] = str(0)
         ds_erai.globalattributes["nc_level"] = "L1"
         # get the UTC and local datetime series
-        site_tz = pytz.timezone(site_timezone)
         # now we get the datetime series at the tower time step
         tdts = datetime.timedelta(minutes=site_timestep)
         # get the start and end datetimes rounded to the nearest time steps
@@ -101,13 +100,9 @@ for cf_name in cf_list:
         # UTC netCDF time series at tower time step for interpolation
         tmp = [x.replace(tzinfo=None) for x in dt_erai_utc_tts]
         erai_time_tts = netCDF4.date2num(tmp,time_units)
-        # local datetime series at tower time step
-        dt_erai_loc_tts = [x.astimezone(site_tz) for x in dt_erai_utc_tts]
-        # NOTE: will have to disable daylight saving at some stage, towers stay on Standard Time
-        # PRI hopes that the following line will do this ...
-        dt_erai_loc_tts = [x-x.dst() for x in dt_erai_loc_tts]
-        # make the datetime series timezone naive and put it in data structure
-        dt_erai_loc_tts = [x.replace(tzinfo=None) for x in dt_erai_loc_tts]
+        # local datetime series at tower time step, towers stay on standard time
+        # so the datetimes are timezone naive and have no daylight saving
+        dt_erai_loc_tts = qcutils.convert_utctolocal(dt_erai_utc_tts,site_timezone)
         ds_erai.series["DateTime"]["Data"] = dt_erai_loc_tts
         ds_erai.globalattributes["nc_nrecs"] = len(dt_erai_loc_tts)
         ds_erai.globalattributes["start_datetime"] = str(dt_erai_loc_tts[0])
@@ -119,9 +114,9 @@ for cf_name in cf_list:
         # get the solar altitude, we will use this later to interpolate the ERA Interim solar
         # data from the ERA-I 3 hour time step to the tower time step.
         # NOTE: alt_solar is in degrees
-        alt_solar_3hr = numpy.array([pysolar.GetAltitude(erai_latitude,erai_longitude,dt) for dt in dt_erai_utc_cor])
+        alt_solar_3hr = solarposition.GetAltitude(erai_latitude,erai_longitude,dt_erai_utc_cor)
         # get the solar altitude at the tower time step
-        alt_solar_tts = numpy.array([pysolar.GetAltitude(erai_latitude,erai_longitude,dt) for dt in dt_erai_utc_tts])
+        alt_solar_tts = solarposition.GetAltitude(erai_latitude,erai_longitude,dt_erai_utc_tts)
         idx = numpy.where(alt_solar_tts<=0)[0]
         alt_solar_tts[idx] = float(0)
         